@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_init
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aiDocuMines.settings")
@@ -12,6 +13,20 @@ app.config_from_object("django.conf:settings", namespace="CELERY")
 # Autodiscover tasks
 app.autodiscover_tasks()
 
+
+# Load anonymizer models in the parent before the pool forks (opt-in via
+# ANONYMIZER_PRELOAD), so prefork children share them copy-on-write
+@worker_init.connect
+def preload_anonymizer_models(**kwargs):
+    from document_anonymizer.nlp_registry import preload_for_worker
+    preload_for_worker(**kwargs)
+
+
+@worker_process_init.connect
+def report_anonymizer_memory(**kwargs):
+    from document_anonymizer.nlp_registry import report_child_memory
+    report_child_memory(**kwargs)
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
@@ -289,6 +289,15 @@ CORS_ALLOW_METHODS = ["GET", "POST", "OPTIONS", "PUT", "PATCH", "DELETE"]
 
 FILE_UPLOAD_MAX_MEMORY_SIZE = 25 * 1024 * 1024
 DATA_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024
+# Larger uploads are spooled here by Django; on MEDIA_ROOT's filesystem the spooled
+# file is renamed into the blob store instead of copied (core/utils.store_upload)
+FILE_UPLOAD_TEMP_DIR = os.getenv("FILE_UPLOAD_TEMP_DIR", os.path.join(MEDIA_ROOT, "tmp_uploads"))
+os.makedirs(FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+# Multi-file and folder uploads are registered in batches of this many files:
+# one duplicate query, bulk row inserts and one set of downstream tasks per batch
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "200"))
 
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
@@ -304,6 +313,49 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 
+# Anonymizer models (document_anonymizer/nlp_registry.py): languages to load in
+# the worker parent before fork, and an optional dedicated queue for its tasks
+ANONYMIZER_PRELOAD = os.getenv("ANONYMIZER_PRELOAD", "")
+ANONYMIZER_QUEUE = os.getenv("ANONYMIZER_QUEUE", "")
+if ANONYMIZER_QUEUE:
+    CELERY_TASK_ROUTES = {"document_anonymizer.tasks.*": {"queue": ANONYMIZER_QUEUE}}
+
+# Advanced OCR (document_ocr/engine.py): page pool size (0 = available cores),
+# rasterisation DPI and tesseract language(s)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+# OCR triage (document_ocr/triage.py): pages with a usable text layer skip OCR;
+# batches are sized by work across the Celery workers that run them
+OCR_MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", "50"))
+OCR_PARALLEL_BATCHES = int(os.getenv("OCR_PARALLEL_BATCHES", "4"))
+OCR_MAX_BATCH_PAGES = int(os.getenv("OCR_MAX_BATCH_PAGES", "50"))
+# Page-level OCR cache (core/ocr_cache.py): entries unused for this many days expire,
+# then least recently used ones go until the cache fits in the byte cap
+OCR_PAGE_CACHE_MAX_AGE_DAYS = int(os.getenv("OCR_PAGE_CACHE_MAX_AGE_DAYS", "30"))
+OCR_PAGE_CACHE_MAX_BYTES = int(os.getenv("OCR_PAGE_CACHE_MAX_BYTES", str(10 * 1024 ** 3)))
+# Document translation (document_translation/batch.py): "azure", or "local" for the
+# filesystem stand-in; status polling cadence and parallel blob transfers per run
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "azure")
+TRANSLATION_POLL_INTERVAL = int(os.getenv("TRANSLATION_POLL_INTERVAL", "10"))
+TRANSLATION_POLL_MAX_INTERVAL = int(os.getenv("TRANSLATION_POLL_MAX_INTERVAL", "60"))
+TRANSLATION_TRANSFER_WORKERS = int(os.getenv("TRANSLATION_TRANSFER_WORKERS", "8"))
+# Segment translation memory (document_translation/memory.py): documents with fewer
+# segments in memory than the min hit ratio are sent whole; and the per-character
+# price billed to Run.cost for what is actually sent to the provider
+TRANSLATION_MEMORY_ENABLED = os.getenv("TRANSLATION_MEMORY_ENABLED", "true").lower() == "true"
+TRANSLATION_MEMORY_MIN_HIT_RATIO = float(os.getenv("TRANSLATION_MEMORY_MIN_HIT_RATIO", "0.5"))
+TRANSLATION_COST_PER_MILLION_CHARS = float(os.getenv("TRANSLATION_COST_PER_MILLION_CHARS", "15"))
+# ZIP exports (document_operations/zipstream.py): read/stream chunk size; larger
+# selections (or ?async=1) are written in the background and downloaded when ready
+ZIP_STREAM_CHUNK = int(os.getenv("ZIP_STREAM_CHUNK", str(1024 * 1024)))
+ZIP_ASYNC_THRESHOLD_BYTES = int(os.getenv("ZIP_ASYNC_THRESHOLD_BYTES", str(2 * 1024 ** 3)))
+ZIP_EXPORT_TTL_HOURS = int(os.getenv("ZIP_EXPORT_TTL_HOURS", "24"))
+# Content-addressed blob store (core/blobstore.py) behind uploads, versions and outputs;
+# keep it on the same filesystem as MEDIA_ROOT so paths can be hard links
+BLOB_STORE_ROOT = os.getenv("BLOB_STORE_ROOT", os.path.join(MEDIA_ROOT, "blobs"))
+BLOB_GC_GRACE_HOURS = int(os.getenv("BLOB_GC_GRACE_HOURS", "24"))
+
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
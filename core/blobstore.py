@@ -0,0 +1,274 @@
+"""
+core.blobstore
+~~~~~~~~~~~~~~
+
+Content-addressed blob store behind uploads, file versions and generated
+outputs.
+
+    sha256(content) ─▶ <BLOB_STORE_ROOT>/<d[:2]>/<d[2:4]>/<digest>   (read-only)
+    user-facing path ─▶ hard link to that object (uploads/…, versions/…, outputs)
+
+Every path the rest of the code reads (File.filepath, FileVersion.file_path,
+OCR/anonymized/translated outputs) stays where it was – it is a hard link
+to the stored object, so identical content costs its bytes once however
+many files, versions, tenants or re-runs carry it. Duplicate detection is
+one primary-key lookup on Blob.
+
+• Blob.ref_count counts the File and FileVersion rows pointing at a blob
+  (acquire/release, post_delete signals). Generated outputs are protected
+  by their hard links instead: an object with st_nlink > 1 is still in use.
+• `collect_garbage` removes blobs with no references and no links once
+  they are older than BLOB_GC_GRACE_HOURS; `recount` repairs ref_count from
+  the rows themselves. `lookup` and `ingest` refresh the blob's updated_at
+  under its row lock, and GC re-checks each candidate under that lock
+  before deleting row and object – an upload that found a blob always has
+  the grace period to link and reference it.
+• Objects are chmod 0444, which does not stop a worker running as root.
+  Any path that may be linked (uploads, versions, every output passed to
+  register_generated_file) must be written through `replacing(path)` –
+  tmp file + os.replace – never rewritten in place: that would change the
+  stored object and every file sharing it.
+• When the store and the target are on different filesystems hard links
+  are impossible and the path gets a copy (no saving, still correct).
+"""
+
+from __future__ import annotations
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Iterator, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, ProtectedError, Sum
+from django.utils import timezone
+
+from core.models import Blob, File
+from document_operations.models import FileVersion
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE_ROOT = getattr(settings, "BLOB_STORE_ROOT", os.path.join(settings.MEDIA_ROOT, "blobs"))
+BLOB_GC_GRACE_HOURS = getattr(settings, "BLOB_GC_GRACE_HOURS", 24)
+HASH_CHUNK = 1024 * 1024
+
+
+def file_digest(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(HASH_CHUNK), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def object_path(digest: str) -> str:
+    return os.path.join(BLOB_STORE_ROOT, digest[:2], digest[2:4], digest)
+
+
+def _place(src: str, dst: str, move: bool = False) -> None:
+    """Put `src` at `dst` atomically: rename (move) or hard link, copying across filesystems."""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp = f"{dst}.{uuid.uuid4().hex}.tmp"
+    try:
+        if move:
+            os.rename(src, tmp)
+        else:
+            os.link(src, tmp)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+            raise
+        shutil.copyfile(src, tmp)
+        if move:
+            os.remove(src)
+    os.replace(tmp, dst)
+
+
+@contextmanager
+def replacing(path: str) -> Iterator[str]:
+    """
+    Write a new version of `path`: yields a temp path beside it (same
+    extension) that is renamed over `path` when the block succeeds, so a
+    hard-linked blob behind `path` is never written through.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp = f"{root}.{uuid.uuid4().hex}.tmp{ext}"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# ───────────────────────────── Store ────────────────────────────────────────
+def _touch(digest: str) -> None:
+    Blob.objects.filter(digest=digest).update(updated_at=timezone.now())
+
+
+def lookup(digest: str) -> Optional[Blob]:
+    """
+    The stored blob for `digest`, if its object is present – refreshed, so
+    GC leaves it alone while the caller links and references it.
+    """
+    with transaction.atomic():
+        blob = Blob.objects.select_for_update().filter(digest=digest).first()
+        if not blob or not os.path.exists(object_path(digest)):
+            return None
+        _touch(digest)
+    return blob
+
+
+def ingest(path: str, digest: Optional[str] = None, move: bool = False) -> Tuple[Blob, bool]:
+    """
+    Store the content of `path` → (blob, created). With `move` the file is
+    consumed (renamed into the store, or removed when the content is known).
+    """
+    digest = digest or file_digest(path)
+    obj = object_path(digest)
+    size = os.path.getsize(path)
+    with transaction.atomic():
+        # Row first, locked: GC deletes row and object under the same lock
+        blob, _ = Blob.objects.select_for_update().get_or_create(digest=digest, defaults={"size": size})
+        created = not os.path.exists(obj)
+        if created:
+            _place(path, obj, move=move)
+            os.chmod(obj, 0o444)
+        elif move:
+            os.remove(path)
+        _touch(digest)
+    return blob, created
+
+
+def materialize(digest: str, target: str) -> str:
+    """Make `target` a (hard-linked) copy of the blob; replaces whatever is there."""
+    _place(object_path(digest), target)
+    return target
+
+
+def adopt(path: str, digest: Optional[str] = None) -> Blob:
+    """Move an existing file's content into the store, leaving `path` linked to it."""
+    blob, _ = ingest(path, digest)
+    if not os.path.samefile(path, object_path(blob.digest)):
+        materialize(blob.digest, path)
+    return blob
+
+
+def share_output(path: Optional[str]) -> Optional[str]:
+    """`adopt` for pipeline outputs: best effort, never fails the pipeline."""
+    if not path or not os.path.isfile(path):
+        return path
+    try:
+        adopt(path)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not move {path} into the blob store: {e}")
+    return path
+
+
+def acquire(digest: Optional[str], n: int = 1) -> None:
+    if digest:
+        Blob.objects.filter(digest=digest).update(ref_count=F("ref_count") + n, updated_at=timezone.now())
+
+
+def release(digest: Optional[str], n: int = 1) -> None:
+    if digest:
+        Blob.objects.filter(digest=digest).update(ref_count=F("ref_count") - n, updated_at=timezone.now())
+
+
+# ───────────────────────────── Maintenance ──────────────────────────────────
+def recount() -> int:
+    """Reset ref_count from the File and FileVersion rows → number of blobs corrected."""
+    counts = Counter()
+    for model in (File, FileVersion):
+        for row in model.objects.exclude(blob=None).values("blob_id").annotate(n=Count("pk")):
+            counts[row["blob_id"]] += row["n"]
+
+    stale = []
+    for blob in Blob.objects.only("digest", "ref_count").iterator(chunk_size=2000):
+        if blob.ref_count != counts.get(blob.digest, 0):
+            blob.ref_count = counts.get(blob.digest, 0)
+            stale.append(blob)
+    Blob.objects.bulk_update(stale, ["ref_count"], batch_size=1000)
+    return len(stale)
+
+
+def collect_garbage(grace_hours: Optional[int] = None, dry_run: bool = False) -> dict:
+    """
+    Delete unreferenced blobs older than the grace period, and objects on
+    disk that have no Blob row (a crash between ingest and the row insert).
+    """
+    grace = BLOB_GC_GRACE_HOURS if grace_hours is None else grace_hours
+    cutoff = timezone.now() - timedelta(hours=grace)
+    result = {"deleted": 0, "bytes": 0, "linked": 0, "orphans": 0}
+
+    candidates = list(Blob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff).values_list("digest", flat=True))
+    for digest in candidates:
+        obj = object_path(digest)
+        with transaction.atomic():
+            # Re-check under the row lock: an upload may have found (and touched) it since
+            blob = (
+                Blob.objects.select_for_update()
+                .filter(digest=digest, ref_count__lte=0, updated_at__lt=cutoff)
+                .first()
+            )
+            if blob is None:
+                continue
+            try:
+                if os.stat(obj).st_nlink > 1:       # an output (or legacy path) still links to it
+                    result["linked"] += 1
+                    continue
+            except FileNotFoundError:
+                pass
+            if dry_run:
+                result["deleted"] += 1
+                result["bytes"] += blob.size
+                continue
+            try:
+                blob.delete()
+            except ProtectedError:                  # ref_count drifted; `recount` fixes it
+                continue
+            if os.path.exists(obj):                 # before the commit, still under the lock
+                os.remove(obj)
+        result["deleted"] += 1
+        result["bytes"] += blob.size
+
+    cutoff_ts = cutoff.timestamp()
+    for root, _, names in os.walk(BLOB_STORE_ROOT):
+        digests = {n for n in names if len(n) == 64}
+        known = set(Blob.objects.filter(digest__in=digests).values_list("digest", flat=True)) if digests else set()
+        for name in (digests - known) | {n for n in names if n.endswith(".tmp")}:
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            if st.st_nlink == 1 and st.st_mtime < cutoff_ts:
+                result["orphans"] += 1
+                if not dry_run:
+                    os.remove(path)
+
+    logger.info(
+        f"🧹 Blob GC{' (dry run)' if dry_run else ''}: {result['deleted']} blobs / {result['bytes']} bytes, "
+        f"{result['orphans']} orphan objects, {result['linked']} kept for linked outputs"
+    )
+    return result
+
+
+def blob_store_stats() -> dict:
+    """Stored bytes vs. the bytes the referencing rows would take without sharing."""
+    stored = Blob.objects.aggregate(n=Count("pk"), size=Sum("size"))
+    logical = sum(
+        model.objects.exclude(blob=None).aggregate(size=Sum("blob__size"))["size"] or 0
+        for model in (File, FileVersion)
+    )
+    stored_bytes = stored["size"] or 0
+    return {
+        "blobs": stored["n"],
+        "stored_bytes": stored_bytes,
+        "referenced_bytes": logical,
+        "saved_bytes": max(logical - stored_bytes, 0),
+    }
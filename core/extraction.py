@@ -0,0 +1,205 @@
+"""
+core.extraction
+~~~~~~~~~~~~~~~
+
+One content-addressed cache for extracted text, shared by every pipeline.
+
+An upload used to be extracted independently by search indexing, the
+anonymizer, document structures, grid interrogation, PE due diligence and
+the `File.content` task – `partition_pdf` ran several times per file. Now
+each extractor runs at most once per (md5, extractor, version):
+
+    <EXTRACTION_CACHE_DIR>/<md5[:2]>/<md5>.<extractor>.v<version>.json.gz
+
+    {"text": "...", "elements": [<unstructured element dicts>]}
+
+Entries are keyed on file content only, so identical uploads by different
+users share them. Writes are atomic (tmp file + rename), so concurrent
+workers at worst both extract and one rename wins.
+
+Extractors
+----------
+"unstructured:<kind>"  unstructured partition_<kind> (pdf, docx, html, text,
+                       auto); text + element dicts
+"text"                 `core.utils.extract_document_text` (PyMuPDF / docx /
+                       tika); text only
+Callers may register others with `register_extractor`.
+
+Hit rate
+--------
+Hits and misses are counted per extractor in the shared cache;
+`extraction_stats()` returns {extractor: {"hits", "misses", "hit_rate"}}.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_CACHE_DIR = getattr(
+    settings, "EXTRACTION_CACHE_DIR", os.path.join(settings.MEDIA_ROOT, "extraction_cache")
+)
+
+UNSTRUCTURED_KINDS = {".pdf": "pdf", ".docx": "docx", ".html": "html", ".htm": "html", ".txt": "text", ".md": "text"}
+
+
+@dataclass
+class Extraction:
+    text: str
+    elements: List[dict] = field(default_factory=list)
+
+    def joined(self, sep: str = "\n\n", strip: bool = True) -> str:
+        """Element texts joined the way the unstructured call sites always did."""
+        parts = [e.get("text") or "" for e in self.elements]
+        if strip:
+            return sep.join(p.strip() for p in parts if p.strip())
+        return sep.join(p for p in parts if p)
+
+    def as_elements(self) -> list:
+        """Rebuild unstructured Element objects from the cached dicts."""
+        from unstructured.staging.base import elements_from_dicts
+        return elements_from_dicts(self.elements)
+
+
+_EXTRACTORS: Dict[str, tuple] = {}   # name → (fn(path) -> Extraction, version)
+
+
+def register_extractor(name: str, version: int = 1):
+    """Decorator: register `fn(path) -> Extraction` under `name`."""
+    def deco(fn: Callable[[str], Extraction]):
+        _EXTRACTORS[name] = (fn, version)
+        return fn
+    return deco
+
+
+# ───────────────────────────── Built-in extractors ──────────────────────────
+def _partition(kind: str, path: str) -> Extraction:
+    if kind == "pdf":
+        from unstructured.partition.pdf import partition_pdf as fn
+    elif kind == "docx":
+        from unstructured.partition.docx import partition_docx as fn
+    elif kind == "html":
+        from unstructured.partition.html import partition_html as fn
+    elif kind == "text":
+        from unstructured.partition.text import partition_text as fn
+    else:
+        from unstructured.partition.auto import partition as fn
+    elements = fn(filename=path)
+    out = Extraction(text="", elements=[el.to_dict() for el in elements])
+    out.text = out.joined()
+    return out
+
+
+for _kind in ("pdf", "docx", "html", "text", "auto"):
+    register_extractor(f"unstructured:{_kind}")(lambda path, _k=_kind: _partition(_k, path))
+
+
+@register_extractor("text")
+def _plain_text(path: str) -> Extraction:
+    from core.utils import _extract_document_text
+    return Extraction(text=_extract_document_text(path))
+
+
+def unstructured_kind(path: str) -> str:
+    return UNSTRUCTURED_KINDS.get(Path(path).suffix.lower(), "auto")
+
+
+# ───────────────────────────── Cache ────────────────────────────────────────
+def file_md5(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _entry_path(md5: str, extractor: str, version: int) -> Path:
+    safe = extractor.replace(":", "_")
+    return Path(EXTRACTION_CACHE_DIR) / md5[:2] / f"{md5}.{safe}.v{version}.json.gz"
+
+
+def _read(path: Path) -> Optional[Extraction]:
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            data = json.load(fh)
+        return Extraction(text=data["text"], elements=data.get("elements") or [])
+    except FileNotFoundError:
+        return None
+    except Exception as exc:
+        logger.warning("⚠️ Corrupt extraction cache entry %s: %s", path, exc)
+        return None
+
+
+def _write(path: Path, result: Extraction) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as fh:
+            fh.write(json.dumps({"text": result.text, "elements": result.elements}, default=str).encode("utf-8"))
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _count(extractor: str, outcome: str) -> None:
+    key = f"extract:{outcome}:{extractor}"
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception:   # metrics must never break extraction
+        pass
+
+
+def extract(path: str, extractor: str, md5: Optional[str] = None) -> Extraction:
+    """
+    Cached extraction of `path` with `extractor`. Pass the file's md5 when it
+    is already known (File.md5_hash); otherwise it is computed from disk.
+    Extractor errors propagate and are not cached.
+    """
+    fn, version = _EXTRACTORS[extractor]
+    md5 = md5 or file_md5(path)
+    entry = _entry_path(md5, extractor, version)
+
+    hit = _read(entry)
+    if hit is not None:
+        _count(extractor, "hit")
+        return hit
+
+    _count(extractor, "miss")
+    result = fn(path)
+    try:
+        _write(entry, result)
+    except OSError as exc:
+        logger.warning("⚠️ Could not store extraction for %s (%s): %s", md5, extractor, exc)
+    return result
+
+
+def extract_for_file(file, extractor: str) -> Extraction:
+    """`extract` for a core.File, reusing its stored md5."""
+    return extract(file.filepath, extractor, md5=getattr(file, "md5_hash", None))
+
+
+def extraction_stats() -> Dict[str, dict]:
+    keys = [f"extract:{o}:{name}" for name in _EXTRACTORS for o in ("hit", "miss")]
+    found = cache.get_many(keys)
+    out = {}
+    for name in _EXTRACTORS:
+        hits = found.get(f"extract:hit:{name}", 0)
+        misses = found.get(f"extract:miss:{name}", 0)
+        if hits or misses:
+            out[name] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4)}
+    return out
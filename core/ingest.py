@@ -0,0 +1,357 @@
+"""
+core.ingest
+~~~~~~~~~~~
+
+Batch ingest of uploaded files, shared by FileUploadView and
+BulkFolderUploadView.
+
+    per batch of INGEST_BATCH_SIZE uploads
+      validate + hash (nothing written)          core.utils.hash_upload
+      ─▶ own duplicates: one query               File (user, md5_hash IN … or
+                                                 blob_id IN declared sha256)
+      ─▶ new content into the blob store         core.utils.store_upload
+      ─▶ hard-linked user paths                  core.blobstore.materialize
+      ─▶ bulk_create Storage, File, FileFolderLink, EffectiveAccess
+         (folder trees resolved once per distinct directory)
+      ─▶ downstream tasks after commit: one index_files_batch, one group of
+         text extractions, one group of anonymizations
+    per request
+      ─▶ process_bulk_metadata once per run, UserInsights reset and
+         regenerated once per user
+
+bulk_create sends no signals, so what the File signals do per row –
+EffectiveAccess, access-cache invalidation, blob ref counts, the
+Elasticsearch document – is done here once per batch. If the rows cannot
+be written, the hard links made for them are removed again, so the blob
+store's GC can reclaim the content.
+"""
+
+from __future__ import annotations
+
+import logging
+import mimetypes
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from celery import group
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+
+from core import blobstore
+from core.models import EndpointResponseTable, File, Storage
+from core.utils import hash_upload, store_upload, validate_upload
+from document_operations.access_cache import invalidate_user_access
+from document_operations.models import EffectiveAccess, FileFolderLink
+from document_operations.signals import DEFAULT_PERMISSIONS
+from document_operations.utils import get_or_create_folder_tree
+
+logger = logging.getLogger(__name__)
+
+INGEST_BATCH_SIZE = getattr(settings, "INGEST_BATCH_SIZE", 200)
+
+STRUCTURED_TYPES = {
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+# downstream work an upload can trigger (FileUploadView runs all of it)
+INDEX, EXTRACT, ANONYMIZE, METADATA, INSIGHTS = "index", "extract", "anonymize", "metadata", "insights"
+ALL_DOWNSTREAM = frozenset({INDEX, EXTRACT, ANONYMIZE, METADATA, INSIGHTS})
+
+
+@dataclass
+class IngestItem:
+    upload: object
+    relative_dir: str = ""                      # sub-folders below the upload dir (folder uploads)
+    declared_sha256: Optional[str] = None
+    filename: str = ""
+    mime_type: str = ""
+    md5: str = ""
+    sha256: str = ""
+    error: Optional[str] = None
+    duplicate_of: Optional[File] = None         # own file with this content
+    repeat_of: Optional["IngestItem"] = None    # same content earlier in the batch
+    file: Optional[File] = None                 # created row (new upload or clone)
+    stored: bool = False                        # content was new to the blob store
+
+    @property
+    def is_new(self) -> bool:
+        return self.file is not None and self.duplicate_of is None
+
+
+# ───────────────────────────── Steps ────────────────────────────────────────
+def _prepare(items: List[IngestItem]) -> None:
+    """Validate and hash; nothing is written yet."""
+    for item in items:
+        try:
+            item.filename, item.mime_type = validate_upload(item.upload, os.path.basename(item.upload.name))
+        except ValueError as e:
+            item.error = str(e)
+            continue
+        item.md5, item.sha256 = hash_upload(item.upload)
+        if item.declared_sha256 and item.declared_sha256 != item.sha256:
+            item.error = "Declared sha256 does not match the uploaded content."
+
+
+def _resolve_duplicates(items: List[IngestItem], user) -> None:
+    """
+    The caller's own files with the same content – one query, by md5 or, for
+    items with a (verified) declared sha256, by blob. A repeat of content
+    earlier in the batch becomes a duplicate of that item's file once it is
+    created (see _create_rows).
+    """
+    valid = [i for i in items if not i.error]
+    declared = {i.sha256 for i in valid if i.declared_sha256}
+    own, own_blobs = {}, {}
+    rows = File.objects.filter(user=user).filter(
+        Q(md5_hash__in={i.md5 for i in valid}) | Q(blob_id__in=declared)
+    ).order_by("-id")
+    for f in rows:
+        if f.md5_hash:
+            own[f.md5_hash] = f
+        if f.blob_id in declared:
+            own_blobs[f.blob_id] = f
+    first_in_batch: Dict[str, IngestItem] = {}
+    for item in valid:
+        dup = own.get(item.md5) or (own_blobs.get(item.sha256) if item.declared_sha256 else None)
+        if dup is not None:
+            item.duplicate_of = dup
+        elif item.md5 in first_in_batch:
+            item.repeat_of = first_in_batch[item.md5]
+        else:
+            first_in_batch[item.md5] = item
+
+
+def _unique_path(directory: str, name: str, taken: set) -> str:
+    path = os.path.join(directory, name)
+    stem, ext = os.path.splitext(path)
+    n = 1
+    while path in taken or os.path.exists(path):     # never replace another file's hard link
+        n += 1
+        path = f"{stem}_{n}{ext}"
+    taken.add(path)
+    return path
+
+
+def _folder_parts(filepath: str, project_id: str, service_id: str) -> Tuple[str, ...]:
+    # same derivation as register_file_folder_link
+    relative_path = filepath.split(f"{project_id}/{service_id}/", 1)[-1]
+    return tuple(os.path.dirname(relative_path).split("/"))
+
+
+def _extension(filename: str) -> str:
+    _, guessed_ext = mimetypes.guess_type(filename)
+    if guessed_ext:
+        return guessed_ext.split("/")[-1].lower()
+    return os.path.splitext(filename)[-1].replace(".", "").lower() or "unknown"
+
+
+def _clone(dup: File, *, user, run, project_id, service_id) -> File:
+    # md5_hash stays with the original: (user, md5_hash) is unique
+    return File(
+        run=run, storage=dup.storage, filename=dup.filename, filepath=dup.filepath,
+        file_size=dup.file_size, file_type=dup.file_type, md5_hash=None, blob=dup.blob,
+        user=user, project_id=project_id, service_id=service_id, origin_file=dup,
+        extension=dup.extension,
+    )
+
+
+def _remove_links(paths: Iterable[str]) -> None:
+    """Undo materialize() for rows that were never written; the blobs are left to GC."""
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("⚠️ Could not remove %s after a failed ingest: %s", path, e)
+
+
+def _create_rows(items, *, user, run, project_id, service_id, base_dir, prefix, clone) -> List[File]:
+    """Store new content and bulk-insert every row the batch needs → the created files."""
+    run_type = ContentType.objects.get_for_model(run)
+    taken: set = set()
+    storages, fresh, linked = [], [], []
+    try:
+        for item in items:
+            if item.error or item.duplicate_of is not None or item.repeat_of is not None:
+                continue
+            blob, item.stored = store_upload(item.upload, item.sha256)
+            path = _unique_path(os.path.join(base_dir, item.relative_dir), f"{prefix}{item.filename}", taken)
+            blobstore.materialize(blob.digest, path)
+            linked.append(path)
+            storages.append(Storage(user=user, content_type=run_type, upload_storage_location=path))
+            item.file = File(
+                run=run, filename=item.filename, filepath=path, file_size=item.upload.size,
+                file_type=item.mime_type or mimetypes.guess_type(item.filename)[0] or "application/octet-stream",
+                md5_hash=item.md5, blob=blob, user=user, project_id=project_id, service_id=service_id,
+                extension=_extension(item.filename),
+            )
+            fresh.append(item.file)
+
+        with transaction.atomic():
+            if fresh:
+                Storage.objects.bulk_create(storages)
+                for storage, f in zip(storages, fresh):
+                    f.storage = storage
+                File.objects.bulk_create(fresh)
+
+            clones = []
+            for item in items:
+                if item.repeat_of is not None:
+                    item.duplicate_of = item.repeat_of.file
+                if item.duplicate_of is not None and clone:
+                    item.file = _clone(item.duplicate_of, user=user, run=run, project_id=project_id, service_id=service_id)
+                    clones.append(item.file)
+            File.objects.bulk_create(clones)
+
+            files = fresh + clones
+            if not files:
+                return files
+
+            folders = {}
+            for parts in {_folder_parts(f.filepath, project_id, service_id) for f in files}:
+                folders[parts] = get_or_create_folder_tree(parts, user=user, project_id=project_id, service_id=service_id)
+            FileFolderLink.objects.bulk_create([
+                FileFolderLink(file=f, folder=folders[_folder_parts(f.filepath, project_id, service_id)]) for f in files
+            ])
+            EffectiveAccess.objects.bulk_create(
+                [EffectiveAccess(user=user, file=f, **DEFAULT_PERMISSIONS) for f in files], ignore_conflicts=True
+            )
+            for digest, n in Counter(f.blob_id for f in files if f.blob_id).items():
+                blobstore.acquire(digest, n)
+            transaction.on_commit(lambda: invalidate_user_access(user.id))
+            transaction.on_commit(lambda: _index_in_elasticsearch(files))
+    except Exception:
+        # no row points at these links; left behind they would keep their blobs alive (st_nlink > 1)
+        _remove_links(linked)
+        raise
+    return files
+
+
+def _index_in_elasticsearch(files: List[File]) -> None:
+    from core.signals import index_files_bulk
+
+    try:
+        index_files_bulk(files)
+    except Exception:
+        logger.exception("❌ Bulk Elasticsearch indexing failed for %d files", len(files))
+
+
+def _schedule(files: List[File], *, user, run, project_id, service_id, downstream) -> None:
+    """One deduplicated set of downstream tasks for the batch, queued after commit."""
+    from document_anonymizer.models import AnonymizationRun
+    from document_anonymizer.tasks import anonymize_document_task
+    from document_search.tasks import index_files_batch
+    from core.tasks import extract_document_text_task
+
+    if not files:
+        return
+
+    if INDEX in downstream:
+        candidates = [f for f in files if (f.file_type or "").lower() in STRUCTURED_TYPES]
+        if not getattr(getattr(user, "settings", None), "auto_index_enabled", True):
+            logger.info("⚙️ Auto-indexing disabled for user %s", user.id)
+            candidates = []
+        if candidates:
+            indexed = set(
+                File.objects.filter(md5_hash__in={f.md5_hash for f in candidates}, vector_chunks__isnull=False)
+                .exclude(id__in=[f.id for f in candidates]).values_list("md5_hash", flat=True).distinct()
+            )
+            to_index = [f.id for f in candidates if f.md5_hash not in indexed]
+            if len(to_index) < len(candidates):
+                logger.info("♻️ Skipping indexing of %d files – vector chunks already exist for the same MD5", len(candidates) - len(to_index))
+            if to_index:
+                endpoint = EndpointResponseTable.objects.create(
+                    run=run, client=user, endpoint_name="/api/v1/document-search/index/",
+                    response_data={"auto_trigger": True, "file_ids": to_index}, status="Pending",
+                )
+                transaction.on_commit(lambda: index_files_batch.apply_async((to_index,), {"force": True}, task_id=str(endpoint.id)))
+                logger.info("🧠 Queued one indexing batch for %d files", len(to_index))
+
+    if EXTRACT in downstream:
+        ids = [f.id for f in files]
+        transaction.on_commit(lambda: group(extract_document_text_task.s(i) for i in ids).apply_async())
+
+    if ANONYMIZE in downstream:
+        jobs = []
+        for f in files:
+            file_type = "structured" if (f.file_type or "").lower() in STRUCTURED_TYPES else "plain"
+            anon_run = AnonymizationRun(
+                project_id=project_id, service_id=service_id, client_name=user.username or user.email,
+                status="Processing", anonymization_type="Presidio",
+            )
+            jobs.append((f, file_type, anon_run))
+        AnonymizationRun.objects.bulk_create([r for _, _, r in jobs])
+        EndpointResponseTable.objects.bulk_create([
+            EndpointResponseTable(
+                run=run, client=user, endpoint_name="/api/v1/document-anonymizer/submit-anonymization/",
+                response_data={"auto_trigger": True, "file_id": f.id, "file_type": file_type}, status="Pending",
+            )
+            for f, file_type, _ in jobs
+        ])
+        signatures = [anonymize_document_task.s(f.id, file_type, str(r.id)) for f, file_type, r in jobs]
+        transaction.on_commit(lambda: group(signatures).apply_async())
+        logger.info("🔐 Auto-anonymization queued for %d files", len(jobs))
+
+
+def _schedule_request(user, run, downstream) -> None:
+    """Per-user / per-run work: once per request, however many batches."""
+    from core.tasks import process_bulk_metadata
+    from platform_data_insights.models import UserInsights
+    from platform_data_insights.tasks import generate_insights_for_user
+
+    if INSIGHTS in downstream:
+        UserInsights.objects.filter(user=user).delete()
+        transaction.on_commit(lambda: generate_insights_for_user.delay(user.id))
+    if METADATA in downstream:
+        transaction.on_commit(lambda: process_bulk_metadata.delay(str(run.run_id)))
+
+
+# ───────────────────────────── Entry point ──────────────────────────────────
+def ingest_uploads(
+    items: Iterable[IngestItem],
+    *,
+    user,
+    run,
+    project_id: str,
+    service_id: str,
+    base_dir: str,
+    prefix: str = "",
+    clone: bool = False,
+    downstream=ALL_DOWNSTREAM,
+    batch_size: int = INGEST_BATCH_SIZE,
+) -> List[IngestItem]:
+    """
+    Store and register `items` in batches of `batch_size`. Each item ends up
+    with `file` (a new upload, or with `clone` a copy of `duplicate_of`),
+    `duplicate_of` alone (an own duplicate, nothing created) or `error`.
+    """
+    items = list(items)
+    created: List[File] = []
+    fresh = 0
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        _prepare(batch)
+        _resolve_duplicates(batch, user)
+        files = _create_rows(
+            batch, user=user, run=run, project_id=project_id, service_id=service_id,
+            base_dir=base_dir, prefix=prefix, clone=clone,
+        )
+        new = [i.file for i in batch if i.is_new]
+        _schedule(new, user=user, run=run, project_id=project_id, service_id=service_id, downstream=downstream)
+        created.extend(files)
+        fresh += len(new)
+
+    if fresh:
+        _schedule_request(user, run, downstream)
+    logger.info(
+        "📥 Ingested %d uploads for user %s: %d created, %d duplicates, %d rejected",
+        len(items), user.id, len(created),
+        sum(1 for i in items if i.duplicate_of is not None), sum(1 for i in items if i.error),
+    )
+    return items
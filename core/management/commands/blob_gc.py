@@ -0,0 +1,40 @@
+"""
+Reclaim unreferenced blobs from the content-addressed store (core.blobstore).
+
+A blob is deleted once no File/FileVersion row references it, no path links
+to it any more, and it has been unreferenced for `--grace-hours`. `--recount`
+first rebuilds every ref_count from the rows themselves (after bulk deletes
+or manual database surgery).
+
+Usage
+-----
+
+python manage.py blob_gc [--grace-hours 24] [--recount] [--dry-run]
+"""
+from django.core.management.base import BaseCommand
+
+from core import blobstore
+
+
+class Command(BaseCommand):
+    help = "Delete unreferenced blobs from the blob store"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace-hours", type=int, default=None, help="Default: BLOB_GC_GRACE_HOURS")
+        parser.add_argument("--recount", action="store_true", help="Rebuild ref_count before sweeping")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["recount"]:
+            self.stdout.write(f"🔢 Corrected ref_count on {blobstore.recount()} blobs")
+        result = blobstore.collect_garbage(options["grace_hours"], dry_run=options["dry_run"])
+        stats = blobstore.blob_store_stats()
+        self.stdout.write(
+            f"🧹 {'Would delete' if options['dry_run'] else 'Deleted'} {result['deleted']} blobs "
+            f"({result['bytes'] / 1024 ** 2:.1f} MiB) and {result['orphans']} orphan objects; "
+            f"{result['linked']} kept for linked outputs"
+        )
+        self.stdout.write(
+            f"📦 {stats['blobs']} blobs, {stats['stored_bytes'] / 1024 ** 2:.1f} MiB stored for "
+            f"{stats['referenced_bytes'] / 1024 ** 2:.1f} MiB referenced"
+        )
@@ -0,0 +1,28 @@
+"""
+Show hit rates of the shared extraction cache (core.extraction) and the
+page-level OCR cache (core.ocr_cache).
+
+Usage
+-----
+
+python manage.py extraction_stats
+"""
+from django.core.management.base import BaseCommand
+
+from core.extraction import extraction_stats
+from core.ocr_cache import ocr_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show shared extraction and OCR page cache hit rates"
+
+    def handle(self, *args, **options):
+        stats = extraction_stats()
+        stats.update({f"ocr-page:{kind}": s for kind, s in ocr_cache_stats().items()})
+        if not stats:
+            self.stdout.write("ℹ️  No extractions recorded yet")
+            return
+        for name, s in sorted(stats.items()):
+            self.stdout.write(
+                f"{name:<22} hits={s['hits']:<8} misses={s['misses']:<8} hit_rate={s['hit_rate']:.1%}"
+            )
@@ -0,0 +1,84 @@
+"""
+Upload ingest benchmark (core.ingest): registers `--files` synthetic
+uploads for a user once per file (`batch_size=1`) and once in batches of
+`--batch-size`, and reports files/sec and SQL queries per file.
+
+Everything runs inside a transaction that is rolled back, against a
+temporary blob store and upload directory; no downstream task is queued.
+
+Usage
+-----
+
+python manage.py ingest_benchmark --user alice [--files 500] [--batch-size 200] [--size 64]
+"""
+import os
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core import blobstore
+from core.ingest import INGEST_BATCH_SIZE, IngestItem, ingest_uploads
+from core.models import Run
+
+
+class Command(BaseCommand):
+    help = "Measure batched vs. per-file upload ingest (files/sec, queries per file)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", required=True, help="Username the uploads are registered for")
+        parser.add_argument("--files", type=int, default=500)
+        parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+        parser.add_argument("--size", type=int, default=64, help="KiB per synthetic file")
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options["user"])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"No user {options['user']}")
+
+        self.stdout.write(f"📦 {options['files']} files of {options['size']} KiB for {user.username}")
+        results = {}
+        for label, batch_size in (("per file", 1), (f"batch {options['batch_size']}", options["batch_size"])):
+            results[label] = self._run(user, label, options["files"], batch_size, options["size"] * 1024)
+            elapsed, queries = results[label]
+            self.stdout.write(
+                f"{label:<12} {options['files'] / elapsed:8.1f} files/s  "
+                f"{queries / options['files']:6.1f} queries/file  {elapsed:6.2f}s"
+            )
+
+        (slow, slow_q), (fast, fast_q) = results.values()
+        self.stdout.write(f"✅ {slow / fast:.1f}× faster, {slow_q / max(fast_q, 1):.1f}× fewer queries")
+
+    def _run(self, user, label, count, batch_size, size):
+        with tempfile.TemporaryDirectory() as tmp:
+            original_root = blobstore.BLOB_STORE_ROOT
+            blobstore.BLOB_STORE_ROOT = os.path.join(tmp, "blobs")
+            try:
+                with transaction.atomic():
+                    run = Run.objects.create(user=user, status="Pending")
+                    items = [
+                        IngestItem(SimpleUploadedFile(
+                            f"benchmark_{i}.txt", f"{label} {run.run_id} {i}\n".encode().ljust(size, b"."), "text/plain",
+                        ))
+                        for i in range(count)
+                    ]
+                    base_dir = os.path.join(tmp, "uploads", "bench-project", "bench-service")
+                    with CaptureQueriesContext(connection) as queries:
+                        t0 = time.perf_counter()
+                        ingest_uploads(
+                            items, user=user, run=run, project_id="bench-project", service_id="bench-service",
+                            base_dir=base_dir, downstream=frozenset(), batch_size=batch_size,
+                        )
+                        elapsed = time.perf_counter() - t0
+                    rejected = [i.error for i in items if i.error]
+                    if rejected:
+                        raise CommandError(f"{len(rejected)} uploads rejected: {rejected[0]}")
+                    transaction.set_rollback(True)
+            finally:
+                blobstore.BLOB_STORE_ROOT = original_root
+        return elapsed, len(queries.captured_queries)
@@ -64,6 +64,21 @@ class Storage(models.Model):
         return f"Storage {self.storage_id} - {self.upload_storage_location}"
 
 
+class Blob(models.Model):
+    """
+    One stored content object of the blob store (core/blobstore.py), keyed
+    by its SHA-256. `ref_count` counts the File and FileVersion rows using it.
+    """
+    digest = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return f"Blob {self.digest[:12]} ({self.size} bytes, {self.ref_count} refs)"
+
+
 class File(models.Model):
     """
     Represents a document uploaded for processing.
@@ -83,6 +98,14 @@ class File(models.Model):
         blank=True,
         help_text="MD5 checksum for duplicate detection"
     )
+    blob = models.ForeignKey(
+        Blob,
+        null=True,
+        blank=True,
+        on_delete=models.PROTECT,
+        related_name="files",
+        help_text="Stored content; filepath is a hard link to it (core/blobstore.py)"
+    )
 
 
     origin_file = models.ForeignKey(
@@ -149,6 +172,7 @@ class File(models.Model):
             file_size=original_file.file_size,
             file_type=original_file.file_type,
             md5_hash=original_file.md5_hash,  # allowed since constraint is (user, md5)
+            blob=original_file.blob,
             storage=original_file.storage,
             project_id=project_id,
             service_id=service_id,
@@ -0,0 +1,203 @@
+"""
+core.ocr_cache
+~~~~~~~~~~~~~~
+
+Content-addressed OCR results at page granularity, shared by every OCR
+path (document_ocr's page engine, grid interrogation's PDF/image readers)
+across files and tenants.
+
+    key = blake2b(rendered page image ‖ engine options)
+    <OCR_PAGE_CACHE_DIR>/<key[:2]>/<key>.<kind>          kind: pdf | hocr | txt
+
+The key is the page as the OCR engine would see it, not the file or its
+path – so re-uploads, `File.make_copy` clones and the same exhibit inside
+different bundles all hit. Options (engine, DPI, language, psm, output
+format, …) are part of the key, so a change in settings never serves a
+stale result. Writes are atomic (tmp file + rename).
+
+Engines that OCR a whole document in one call (ocrmypdf) use `get` / `put`
+with `page_key` directly: look every page up first, run the engine on the
+misses only, then store its output page by page.
+
+Hits and misses are counted per kind in the shared cache;
+`ocr_cache_stats()` returns {kind: {"hits", "misses", "hit_rate"}}.
+
+A hit refreshes the entry's mtime, so `sweep()` (run periodically by
+core.tasks.sweep_ocr_page_cache_task) can expire entries unused for
+OCR_PAGE_CACHE_MAX_AGE_DAYS and then drop the least recently used ones
+until the directory fits in OCR_PAGE_CACHE_MAX_BYTES.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+OCR_PAGE_CACHE_DIR = getattr(
+    settings, "OCR_PAGE_CACHE_DIR", os.path.join(settings.MEDIA_ROOT, "ocr_page_cache")
+)
+
+OCR_PAGE_CACHE_MAX_AGE_DAYS = getattr(settings, "OCR_PAGE_CACHE_MAX_AGE_DAYS", 30)
+OCR_PAGE_CACHE_MAX_BYTES = getattr(settings, "OCR_PAGE_CACHE_MAX_BYTES", 10 * 1024 ** 3)
+TMP_GRACE_SECONDS = 3600     # a .tmp older than this is a crashed write
+
+KINDS = ("pdf", "hocr", "txt")
+
+
+def page_key(image: bytes, options: dict) -> str:
+    h = hashlib.blake2b(image, digest_size=20)
+    h.update(json.dumps(options, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _entry_path(key: str, kind: str) -> Path:
+    return Path(OCR_PAGE_CACHE_DIR) / key[:2] / f"{key}.{kind}"
+
+
+def _read(path: Path) -> Optional[bytes]:
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        logger.warning("⚠️ Unreadable OCR cache entry %s: %s", path, exc)
+        return None
+    try:
+        os.utime(path)          # recency for sweep()
+    except OSError:
+        pass
+    return data
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def _count(kind: str, outcome: str) -> None:
+    key = f"ocrpage:{outcome}:{kind}"
+    try:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    except Exception:   # metrics must never break OCR
+        pass
+
+
+def get(key: str, kind: str) -> Optional[bytes]:
+    """Cached output for a `page_key`, or None (counted as a hit / miss)."""
+    hit = _read(_entry_path(key, kind))
+    _count(kind, "miss" if hit is None else "hit")
+    return hit
+
+
+def put(key: str, kind: str, data: bytes) -> None:
+    """Store output for a `page_key`; empty results are not cached."""
+    if not data:
+        return
+    entry = _entry_path(key, kind)
+    try:
+        _write(entry, data)
+    except OSError as exc:
+        logger.warning("⚠️ Could not store OCR page %s: %s", entry.name, exc)
+
+
+def cached_page(image: bytes, kind: str, options: dict, compute: Callable[[], bytes]) -> bytes:
+    """
+    OCR output of one page image: from the cache, or `compute()` and store.
+    Empty results and errors are not cached.
+    """
+    key = page_key(image, options)
+    hit = get(key, kind)
+    if hit is not None:
+        return hit
+    data = compute()
+    put(key, kind, data)
+    return data
+
+
+def cached_page_text(image: bytes, options: dict, compute: Callable[[], str]) -> str:
+    """`cached_page` for engines that return text."""
+    return cached_page(image, "txt", options, lambda: compute().encode("utf-8")).decode("utf-8")
+
+
+def sweep(max_age_days: Optional[float] = None, max_bytes: Optional[int] = None, dry_run: bool = False) -> dict:
+    """
+    Remove entries unused for `max_age_days`, then the least recently used
+    ones until the cache fits in `max_bytes`; crashed .tmp writes go too.
+    """
+    max_age_days = OCR_PAGE_CACHE_MAX_AGE_DAYS if max_age_days is None else max_age_days
+    max_bytes = OCR_PAGE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    now = time.time()
+    cutoff = now - max_age_days * 86400
+    result = {"expired": 0, "evicted": 0, "bytes": 0, "kept_bytes": 0}
+
+    def remove(path: str, size: int, reason: str) -> None:
+        result[reason] += 1
+        result["bytes"] += size
+        if not dry_run:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    live = []
+    for root, _, names in os.walk(OCR_PAGE_CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(".tmp"):
+                if st.st_mtime < now - TMP_GRACE_SECONDS:
+                    remove(path, st.st_size, "expired")
+            elif st.st_mtime < cutoff:
+                remove(path, st.st_size, "expired")
+            else:
+                live.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in live)
+    live.sort()                                     # least recently used first
+    for _, size, path in live:
+        if total <= max_bytes:
+            break
+        remove(path, size, "evicted")
+        total -= size
+    result["kept_bytes"] = total
+
+    logger.info(
+        "🧹 OCR page cache sweep%s: %d expired, %d evicted, %.1f MiB freed, %.1f MiB kept",
+        " (dry run)" if dry_run else "", result["expired"], result["evicted"],
+        result["bytes"] / 1024 ** 2, total / 1024 ** 2,
+    )
+    return result
+
+
+def ocr_cache_stats() -> Dict[str, dict]:
+    found = cache.get_many([f"ocrpage:{o}:{k}" for k in KINDS for o in ("hit", "miss")])
+    out = {}
+    for kind in KINDS:
+        hits = found.get(f"ocrpage:hit:{kind}", 0)
+        misses = found.get(f"ocrpage:miss:{kind}", 0)
+        if hits or misses:
+            out[kind] = {"hits": hits, "misses": misses, "hit_rate": round(hits / (hits + misses), 4)}
+    return out
@@ -10,6 +10,7 @@ from django.conf import settings
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 
+from core import blobstore
 from core.models import File
 from core.onlyoffice_utils import file_md5
 
@@ -63,13 +64,15 @@ def onlyoffice_fetch_and_save(self, file_id: int, file_url: str) -> dict:
     # ---- update DB metadata ----
     new_size = os.path.getsize(final_path)
     new_md5 = file_md5(final_path)
+    blob = blobstore.adopt(final_path)   # the saved content becomes the file's blob
 
     with transaction.atomic():
         f.file_size = new_size
         # keep same MIME/extension — still a DOCX for normal edits
         f.md5_hash = new_md5
+        f.blob = blob
         f.status = "Saved"
-        f.save(update_fields=["file_size", "md5_hash", "status"])
+        f.save(update_fields=["file_size", "md5_hash", "blob", "status"])
 
     logger.info("OnlyOffice saved file_id=%s size=%s md5=%s", f.id, new_size, new_md5)
     return {"ok": True, "file_id": f.id, "size": new_size, "md5": new_md5}
@@ -2,14 +2,11 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from core.models import File
 from core.elastic_indexes import FileIndex
+from elasticsearch.helpers import bulk
+from elasticsearch_dsl.connections import connections
 
-@receiver(post_save, sender=File)
-def index_file(sender, instance, **kwargs):
-    """
-    Called whenever a File is created or updated.
-    Saves the File into the Elasticsearch index.
-    """
-    doc = FileIndex(
+def _file_document(instance):
+    return FileIndex(
         meta={'id': str(instance.id)},
         id=str(instance.id),
         filename=instance.filename,
@@ -21,11 +18,31 @@ def index_file(sender, instance, **kwargs):
         created_at=instance.created_at,
         updated_at=instance.updated_at,
         md5_hash=instance.md5_hash,
-        user_id=instance.user.id if instance.user else None,
+        user_id=instance.user_id,
     )
-    doc.save()
+
+
+@receiver(post_save, sender=File)
+def index_file(sender, instance, **kwargs):
+    """
+    Called whenever a File is created or updated.
+    Saves the File into the Elasticsearch index.
+    """
+    _file_document(instance).save()
     print(f"Indexed file {instance.id} -> Elasticsearch.")
 
+
+def index_files_bulk(files):
+    """
+    `index_file` for rows created with bulk_create (no post_save):
+    one bulk request instead of one request per file.
+    """
+    docs = [_file_document(f).to_dict(include_meta=True) for f in files]
+    if docs:
+        bulk(connections.get_connection(), docs)
+        print(f"Indexed {len(docs)} files -> Elasticsearch.")
+
+
 @receiver(post_delete, sender=File)
 def delete_file_from_index(sender, instance, **kwargs):
     """
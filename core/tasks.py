@@ -13,6 +13,7 @@ from .models import File, Metadata, Storage, Run, EndpointResponseTable
 from .utils import save_uploaded_file, extract_metadata, calculate_md5, convert_pdf_date, str_to_bool
 from .serializers import MetadataSerializer
 from document_operations.utils import register_file_folder_link
+from . import blobstore, ocr_cache
 
 logger = logging.getLogger(__name__)
 
@@ -281,7 +282,7 @@ def extract_document_text_task(file_id):
     except File.DoesNotExist:
         return
 
-    text = extract_document_text(file_obj.filepath, file_obj.file_type)
+    text = extract_document_text(file_obj.filepath, file_obj.file_type, md5=file_obj.md5_hash)
     file_obj.content = text
     file_obj.save(update_fields=["content"])
 
@@ -317,3 +318,15 @@ def extract_document_text_task(file_id):
         # logger.error(f"❌ File upload failed - Error: {str(e)}")
         # return {"error": f"File upload failed: {str(e)}"}
 # 
+
+
+@shared_task
+def collect_blob_garbage_task(grace_hours=None):
+    """Periodic sweep of unreferenced blobs (core/blobstore.py)."""
+    return blobstore.collect_garbage(grace_hours)
+
+
+@shared_task
+def sweep_ocr_page_cache_task(max_age_days=None, max_bytes=None):
+    """Periodic age/size sweep of the shared OCR page cache (core/ocr_cache.py)."""
+    return ocr_cache.sweep(max_age_days, max_bytes)
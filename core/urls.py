@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import FileUploadView, MetadataView, BulkFolderUploadView, FileDownloadView, health_check  # UniversalTaskStatusView,
+from .views import FileUploadView, UploadCheckView, MetadataView, BulkFolderUploadView, FileDownloadView, health_check  # UniversalTaskStatusView,
 from .task_statuses import UploadStatusView, MetadataStatusView # MetadataExtractionTriggerView
 from core.views import AssociateTopicToFileView
 
@@ -27,6 +27,7 @@ from core.onlyoffice_views import (
 urlpatterns = [
     # ✅ File Upload Endpoint
     path("upload/", FileUploadView.as_view(), name="file-upload"),
+    path("upload/check/", UploadCheckView.as_view(), name="file-upload-check"),
 
     # ✅ Task Status (Universal)
     # path("task-status/", UniversalTaskStatusView.as_view(), name="universal-task-status"),
@@ -6,6 +6,7 @@ import logging
 import mimetypes
 import zipfile
 import hashlib
+import uuid
 import subprocess
 from pathlib import Path
 from datetime import datetime, timedelta
@@ -25,6 +26,7 @@ from unidecode import unidecode
 from tika import parser as tika_parser  # keep as used in extract_document_text
 import pandas as pd
 
+from core import blobstore
 from core.models import File, Storage
 from document_operations.models import Folder, FileFolderLink
 from document_operations.utils import register_file_folder_link
@@ -52,6 +54,9 @@ ALLOWED_FILE_TYPES = {
 MAX_FILE_SIZE_MB = 100
 MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
 
+# ✅ Read/write buffer for uploads
+UPLOAD_CHUNK_SIZE = getattr(settings, "UPLOAD_CHUNK_SIZE", 1024 * 1024)
+
 
 def str_to_bool(value):
     """Converts various truthy/falsy string values to boolean."""
@@ -85,15 +90,8 @@ def rename_files_in_folder(folder_path: str) -> None:
                 logger.info("Renamed %s -> %s", src, dst)
 
 
-def save_uploaded_file(uploaded_file, storage_path: str, custom_filename=None):
-    """
-    Saves uploaded files synchronously.
-
-    :param uploaded_file: File object from Django (InMemoryUploadedFile or TemporaryUploadedFile)
-    :param storage_path: System location of uploaded files
-    :param custom_filename: Optional new filename (sanitized automatically)
-    :return: File metadata dictionary
-    """
+def validate_upload(uploaded_file, custom_filename=None):
+    """Size/type checks → (sanitized file name, mime type); raises ValueError."""
     # ✅ Validate file size
     if uploaded_file.size > MAX_FILE_SIZE_BYTES:
         raise ValueError(f"File size exceeds {MAX_FILE_SIZE_MB}MB limit.")
@@ -106,24 +104,71 @@ def save_uploaded_file(uploaded_file, storage_path: str, custom_filename=None):
 
     if file_ext not in ALLOWED_FILE_TYPES:
         raise ValueError(f"Unsupported file type: {file_ext}")
+    return file_name, mime_type
+
+
+def _upload_chunks(uploaded_file):
+    """The upload's bytes: read back from Django's spooled temp file, or from memory."""
+    spooled = getattr(uploaded_file, "temporary_file_path", None)
+    if spooled:
+        with open(spooled(), "rb") as fh:
+            yield from iter(lambda: fh.read(UPLOAD_CHUNK_SIZE), b"")
+    else:
+        uploaded_file.seek(0)
+        yield from uploaded_file.chunks(UPLOAD_CHUNK_SIZE)
+
+
+def hash_upload(uploaded_file) -> tuple[str, str]:
+    """MD5 and SHA-256 of an upload, without writing it anywhere."""
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    for chunk in _upload_chunks(uploaded_file):
+        md5.update(chunk)
+        sha256.update(chunk)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
+def store_upload(uploaded_file, sha256: str):
+    """
+    Put an upload into the blob store → (blob, stored). Known content is not
+    written at all; a spooled upload is renamed into the store (or copied by
+    the kernel when the temp dir is on another filesystem).
+    """
+    blob = blobstore.lookup(sha256)
+    if blob:
+        return blob, False
+    spooled = getattr(uploaded_file, "temporary_file_path", None)
+    if spooled:
+        return blobstore.ingest(spooled(), sha256, move=True)
+
+    os.makedirs(blobstore.BLOB_STORE_ROOT, exist_ok=True)
+    tmp_path = os.path.join(blobstore.BLOB_STORE_ROOT, f".upload-{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "wb") as out_file:
+        for chunk in _upload_chunks(uploaded_file):
+            out_file.write(chunk)
+    return blobstore.ingest(tmp_path, sha256, move=True)
+
+
+def save_uploaded_file(uploaded_file, storage_path: str, custom_filename=None):
+    """
+    Saves uploaded files synchronously, hashing while writing.
+
+    :param uploaded_file: File object from Django (InMemoryUploadedFile or TemporaryUploadedFile)
+    :param storage_path: System location of uploaded files
+    :param custom_filename: Optional new filename (sanitized automatically)
+    :return: File metadata dictionary
+    """
+    file_name, mime_type = validate_upload(uploaded_file, custom_filename)
 
     os.makedirs(storage_path, exist_ok=True)
     file_path = os.path.join(storage_path, file_name)
 
-    # ✅ Save file in chunks
-    chunk_size = 64 * 1024  # 64KB chunks
+    # ✅ Save file in chunks; md5 for per-user duplicates, sha256 for the blob store
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
     with open(file_path, "wb") as out_file:
-        while True:
-            chunk = uploaded_file.read(chunk_size)
-            if not chunk:
-                break
+        for chunk in _upload_chunks(uploaded_file):
+            md5.update(chunk)
+            sha256.update(chunk)
             out_file.write(chunk)
-
-    # Ensure all names in folder are sanitized (idempotent)
-    rename_files_in_folder(storage_path)
-
-    # ✅ Calculate file hash
-    file_hash = calculate_md5(file_path)
     logger.info("✅ File %s saved at %s", file_name, file_path)
 
     return {
@@ -131,7 +176,8 @@ def save_uploaded_file(uploaded_file, storage_path: str, custom_filename=None):
         "filename": file_name,
         "file_size": uploaded_file.size,
         "file_type": mime_type,
-        "md5_hash": file_hash,
+        "md5_hash": md5.hexdigest(),
+        "sha256": sha256.hexdigest(),
         "upload_timestamp": datetime.utcnow().isoformat(),
     }
 
@@ -145,6 +191,16 @@ def calculate_md5(file_path: str) -> str:
     return md5.hexdigest()
 
 
+def calculate_hashes(file_path: str) -> tuple[str, str]:
+    """MD5 and SHA-256 of a file in one read."""
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+            sha256.update(chunk)
+    return md5.hexdigest(), sha256.hexdigest()
+
+
 def convert_pdf_date(raw_date: str | None):
     """
     Converts extracted PDF (or ISO-ish) dates to ISO 8601 (YYYY-MM-DDTHH:MM:SS).
@@ -495,9 +551,10 @@ def register_generated_file(file_path, user, run, project_id, service_id, folder
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Cannot register missing file: {file_path}")
 
-    # Calculate MD5
-    with open(file_path, "rb") as f:
-        md5_hash = hashlib.md5(f.read()).hexdigest()
+    # Calculate hashes; the output becomes a hard link into the blob store, so
+    # identical outputs (re-runs, other tenants) share their bytes
+    md5_hash, sha256 = calculate_hashes(file_path)
+    blob = blobstore.adopt(file_path, sha256)
 
     # ContentType for the given run instance
     content_type = ContentType.objects.get_for_model(run)
@@ -525,6 +582,7 @@ def register_generated_file(file_path, user, run, project_id, service_id, folder
         file_size=os.path.getsize(file_path),
         file_type=mimetypes.guess_type(file_path)[0] or os.path.splitext(file_path)[1].lstrip("."),
         md5_hash=md5_hash,
+        blob=blob,
         user=user,
         project_id=project_id,
         service_id=service_id,
@@ -544,42 +602,48 @@ def register_generated_file(file_path, user, run, project_id, service_id, folder
     return file_instance
 
 
-def extract_document_text(path, mime_type=None) -> str:
+def extract_document_text(path, mime_type=None, md5=None) -> str:
     """
     Extract text from various file types.
+    Served from the shared extraction cache (core.extraction) when possible.
     """
     if not os.path.exists(path):
         return ""
 
-    ext = os.path.splitext(path)[-1].lower()
+    from core.extraction import extract
     try:
-        if ext == ".pdf":
-            text = ""
-            doc = fitz.open(path)
-            for page in doc:
-                text += page.get_text()
-            return text
+        return extract(path, "text", md5=md5).text
+    except Exception as e:
+        return f"Error extracting text: {e}"
 
-        if ext == ".docx":
-            doc = Document(path)
-            return "\n".join(p.text for p in doc.paragraphs)
 
-        if ext == ".txt":
-            with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                return f.read()
+def _extract_document_text(path) -> str:
+    """Uncached extraction behind `extract_document_text`; raises on failure."""
+    ext = os.path.splitext(path)[-1].lower()
+    if ext == ".pdf":
+        text = ""
+        doc = fitz.open(path)
+        for page in doc:
+            text += page.get_text()
+        return text
 
-        if ext == ".csv":
-            df = pd.read_csv(path, nrows=1000)
-            return df.to_string(index=False)
+    if ext == ".docx":
+        doc = Document(path)
+        return "\n".join(p.text for p in doc.paragraphs)
 
-        if ext == ".xlsx":
-            df = pd.read_excel(path, nrows=1000)
-            return df.to_string(index=False)
+    if ext == ".txt":
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
 
-        # Fallback for other formats
-        parsed = tika_parser.from_file(path)
-        return (parsed.get("content") or "").strip()
+    if ext == ".csv":
+        df = pd.read_csv(path, nrows=1000)
+        return df.to_string(index=False)
 
-    except Exception as e:
-        return f"Error extracting text: {e}"
+    if ext == ".xlsx":
+        df = pd.read_excel(path, nrows=1000)
+        return df.to_string(index=False)
+
+    # Fallback for other formats
+    parsed = tika_parser.from_file(path)
+    return (parsed.get("content") or "").strip()
 
@@ -10,15 +10,14 @@ from drf_yasg import openapi
 import os
 import uuid
 from datetime import datetime
-from .models import Run, File, Storage, EndpointResponseTable, Metadata
+from .models import Run, File, EndpointResponseTable, Metadata
 from .tasks import process_metadata
 from django.shortcuts import get_object_or_404
 from oauth2_provider.models import Application
 from oauth2_provider.contrib.rest_framework import OAuth2Authentication, TokenHasReadWriteScope
-from .utils import save_uploaded_file
+from .ingest import IngestItem, ingest_uploads, METADATA, INSIGHTS
 from django.http import FileResponse
 import logging
-from django.db.utils import IntegrityError
 from django.http import JsonResponse
 
 from core.models import File
@@ -27,25 +26,7 @@ from django.shortcuts import get_object_or_404
 from rest_framework import status, permissions
 from rest_framework.permissions import IsAuthenticated
 from custom_authentication.permissions import IsClientOrAdminOrSuperUser
-from document_operations.models import Folder, FileFolderLink
-from django.utils import timezone
-from django.contrib.contenttypes.models import ContentType
 import mimetypes
-from document_operations.utils import register_file_folder_link
-
-from core.tasks import extract_document_text_task
-from document_search.tasks import index_file  # at the top of views.py
-from django.db import transaction
-
-from platform_data_insights.tasks import generate_insights_for_user
-from platform_data_insights.models import UserInsights
-
-from core.tasks import process_bulk_metadata
-
-import mimetypes
-
-from document_anonymizer.models import AnonymizationRun
-from document_anonymizer.tasks import anonymize_document_task, compute_risk_score_task
 
 
 logger = logging.getLogger(__name__)
@@ -90,6 +71,11 @@ class FileUploadView(APIView):
     • Blocks accidental re-uploads by the SAME user (md5 + user scope)
     • Re-uses storage when a DIFFERENT user uploads the same file
     • Allows intentional clones when   clone_file=true   is sent
+    • Optional   sha256   per file (same order as   file  ): checked against
+      the content, and an own file with that blob is that file's duplicate;
+      a mismatch is that file's error
+    • Multi-file uploads are registered in batches (core/ingest.py); with more
+      than one file, duplicates and rejected files are listed per file
     """
     parser_classes = [MultiPartParser, FormParser]
     authentication_classes = [OAuth2Authentication]
@@ -140,194 +126,37 @@ class FileUploadView(APIView):
                 settings.MEDIA_ROOT, "uploads", client_id, str(user.id), project_id, service_id, str(timestamp)[:8])
         os.makedirs(base_dir, exist_ok=True)
 
-        file_payload = []
+        # Optional client-side SHA-256 per file, in the same order as "file"
+        declared = [d.strip().lower() for d in request.data.getlist("sha256")] if hasattr(request.data, "getlist") else []
+
+        # ── Validate, hash, store and register in batches (core/ingest.py) ──
+        # Own duplicates are found with one query per batch, content already
+        # in the blob store is never written again, and the rows, folder
+        # links and downstream tasks are created per batch, not per file.
+        items = ingest_uploads(
+            [IngestItem(uploaded, declared_sha256=declared[i] if i < len(declared) else None)
+             for i, uploaded in enumerate(files)],
+            user=user, run=run, project_id=project_id, service_id=service_id,
+            base_dir=base_dir, prefix=str(timestamp)[8:] + "_", clone=clone_file,
+        )
 
-        # ── Iterate through each uploaded file ───────────────────────────────
-        for uploaded in files:
-            temp_dir = os.path.join(base_dir, "temp")
-            os.makedirs(temp_dir, exist_ok=True)
-
-            meta = save_uploaded_file(uploaded, temp_dir)     # md5, size, etc.
-
-            # ---- 1️⃣ same-user duplicate check -----------------------------
-            dup_self = File.objects.filter(user=user, md5_hash=meta["md5_hash"]).first()
-            if dup_self:
-                if not clone_file:
-                    os.remove(meta["file_path"])
-                    return Response({
-                        "message"   : "Duplicate file already exists under your account.",
-                        "file_id"   : dup_self.id,
-                        "filename"  : dup_self.filename,
-                        "md5_hash"  : dup_self.md5_hash,
-                        "project_id": dup_self.project_id,
-                        "service_id": dup_self.service_id,
-                        "filepath"  : dup_self.filepath,
-                        "extension" : dup_self.extension
-                    }, status=200)
-
-                # clone requested
-                logger.info("📄 Cloning file for user %s : %s", user.id, meta["filename"])
-                os.remove(meta["file_path"])  # cleanup temp
-                clone = File.objects.create(
-                    run=run,
-                    storage=dup_self.storage,
-                    filename=dup_self.filename,
-                    filepath=dup_self.filepath,
-                    file_size=dup_self.file_size,
-                    file_type=dup_self.file_type,
-                    md5_hash=dup_self.md5_hash,
-                    user=user,
-                    project_id=project_id,
-                    service_id=service_id,
-                    origin_file=dup_self,
-                    extension=dup_self.extension,
-                )
-                register_file_folder_link(clone)
-                _link_to_folder(clone, user, project_id, service_id)
-                file_payload.append(_resp(clone, "File cloned for reuse."))
-                continue  # next upload
-
-            # ---- 2️⃣ cross-user duplicate check ----------------------------
-            dup_other = File.objects.exclude(user=user).filter(md5_hash=meta["md5_hash"]).first()
-            if dup_other:
-                logger.info("🔗 Re-using storage from user %s for user %s", dup_other.user_id, user.id)
-                os.remove(meta["file_path"])
-                reused = File.objects.create(
-                    run=run,
-                    storage=dup_other.storage,
-                    filename=dup_other.filename,
-                    filepath=dup_other.filepath,
-                    file_size=dup_other.file_size,
-                    file_type=dup_other.file_type,
-                    md5_hash=dup_other.md5_hash,
-                    user=user,
-                    project_id=project_id,
-                    service_id=service_id,
-                    extension=dup_other.extension
-                )
-                register_file_folder_link(reused)
-                _link_to_folder(reused, user, project_id, service_id)
-                file_payload.append(_resp(reused, "Duplicate file reused from another user."))
-                continue
-
-            # ---- 3️⃣ brand-new upload --------------------------------------
-            # final_dir  = os.path.join(base_dir, str(uuid.uuid4()))
-            final_dir  = base_dir
-            os.makedirs(final_dir, exist_ok=True)
-            final_path = os.path.join(final_dir, str(timestamp)[8:]+"_"+meta["filename"])
-            os.rename(meta["file_path"], final_path)
-
-            storage = Storage.objects.create(
-                user=user,
-                content_type=ContentType.objects.get_for_model(run),
-                upload_storage_location=final_path
-            )
+        if len(items) == 1:
+            item = items[0]
+            if item.error:
+                return Response({"error": item.error, "filename": item.filename or item.upload.name}, status=400)
+            if item.file is None:
+                return Response(_duplicate_resp(item.duplicate_of), status=200)
 
-            _, guessed_ext = mimetypes.guess_type(meta["filename"])
-            if guessed_ext:
-                extension = guessed_ext.split("/")[-1].lower()
-            else:
-                extension = os.path.splitext(meta["filename"])[-1].replace('.', '').lower() or "unknown"
-
-            fresh = File.objects.create(
-                run=run,
-                storage=storage,
-                filename=meta["filename"],
-                filepath=final_path,
-                file_size=meta["file_size"],
-                # file_type=meta["file_type"],
-                file_type = meta.get("file_type") or mimetypes.guess_type(meta["filename"])[0] or "application/octet-stream",
-                md5_hash=meta["md5_hash"],
-                user=user,
-                project_id=project_id,
-                service_id=service_id,
-                extension=extension
-            )
-            register_file_folder_link(fresh)
-            _link_to_folder(fresh, user, project_id, service_id)
-            file_payload.append(_resp(fresh, "File uploaded successfully."))
-
-
-            def trigger_indexing():
-                try:
-                    from core.models import EndpointResponseTable
-
-                    endpoint_response = EndpointResponseTable.objects.create(
-                        run=run,
-                        client=user,  # ✅ correct field name in model
-                        endpoint_name="/api/v1/document-search/index/",
-                        response_data={"auto_trigger": True},  # ✅ corresponds to JSONField
-                        status="Pending"  # ✅ must match one of the allowed choices
-                    )
-                    logger.info("✅ Created EndpointResponseTable entry with ID: %s for file_id=%s", endpoint_response.id, fresh.id)
-
-                    index_file.apply_async((fresh.id,), {"force": True}, task_id=str(endpoint_response.id))
-                    logger.info("🚀 Indexing task successfully queued for file_id=%s", fresh.id)
-
-                except Exception as e:
-                    logger.exception("❌ Failed to trigger indexing for file_id=%s. Error: %s", fresh.id, str(e))
-
-
-            def trigger_anonymization():
-                try:
-                    # Decide anonymization file_type for your pipeline
-                    # Use "structured" if you want JSON blocks; fallback to "plain"
-                    file_type = "structured" if fresh.file_type.lower() in [
-                        "application/pdf",
-                        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                    ] else "plain"
-
-                    # Create a run record to track this anonymization
-                    anon_run = AnonymizationRun.objects.create(
-                        project_id=project_id,
-                        service_id=service_id,
-                        client_name=user.username or user.email,
-                        status="Processing",
-                        anonymization_type="Presidio"  # or "Presidio-Spacy" to match your choice
-                    )
-
-                    # Queue anonymization (idempotence handled inside the task if you prefer)
-                    anonymize_document_task.apply_async((fresh.id, file_type, str(anon_run.id)))
-
-                    # If your anonymize task doesn’t already compute risk, also queue this:
-                    compute_risk_score_task.apply_async((fresh.id,), countdown=0)
-
-                    # (Optional) log to EndpointResponseTable (like you do for indexing)
-                    EndpointResponseTable.objects.create(
-                        run=run,
-                        client=user,
-                        endpoint_name="/api/v1/document-anonymizer/submit-anonymization/",
-                        response_data={"auto_trigger": True, "file_id": fresh.id, "file_type": file_type},
-                        status="Pending"
-                    )
-                    logger.info("🔐 Auto-anonymization queued for file_id=%s (type=%s)", fresh.id, file_type)
-                except Exception:
-                    logger.exception("❌ Failed to queue anonymization for file_id=%s", fresh.id)
-
-
-            if fresh.file_type.lower() not in ["application/pdf", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"]:
-                logger.info("⏭️   Skipping indexing for unsupported type: %s", fresh.file_type)
-            elif not getattr(getattr(user, "settings", None), "auto_index_enabled", True):
-                logger.info("⚙️ Auto-indexing disabled for user %s", user.id)
-            elif File.objects.filter(md5_hash=fresh.md5_hash, vector_chunks__isnull=False).exclude(id=fresh.id).exists():
-                logger.info("♻️ Skipping indexing – vector chunks already exist for file with same MD5: %s", fresh.md5_hash)
+        file_payload = []
+        for item in items:
+            if item.error:
+                file_payload.append({"filename": item.filename or item.upload.name, "error": item.error})
+            elif item.file is None:
+                file_payload.append(_duplicate_resp(item.duplicate_of))
+            elif item.duplicate_of is not None:
+                file_payload.append(_resp(item.file, "File cloned for reuse."))
             else:
-                logger.info("🧠 Queueing indexing to happen after transaction commit")
-                transaction.on_commit(trigger_indexing)
-
-            # NEW:
-            transaction.on_commit(lambda: extract_document_text_task.delay(fresh.id))
-            
-            # queue after transaction commits (same pattern you use for indexing)
-            transaction.on_commit(trigger_anonymization)
-
-            # Delete any old cached insights
-            UserInsights.objects.filter(user=request.user).delete()
-
-            # Launch async insights regeneration
-            generate_insights_for_user.delay(request.user.id)
-
-            process_bulk_metadata.delay(str(run.run_id))
+                file_payload.append(_resp(item.file, "File uploaded successfully." if item.stored else "Duplicate file reused from another user."))
 
         return Response({"run_id": str(run.run_id), "files": file_payload}, status=201)
 
@@ -358,6 +187,49 @@ def _link_to_folder(file_obj, user, project_id, service_id):
         logger.warning(f"Failed to link file {file_obj.id} to folder tree: {e}")
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class UploadCheckView(APIView):
+    """
+    POST /upload/check/   {"sha256": ["<hex>", ...]}
+
+    Which of these contents the caller already has, so the client can skip
+    sending them. Only the caller's own files are matched – whether another
+    user holds a content is never revealed.
+    """
+    authentication_classes = [OAuth2Authentication]
+    permission_classes = [IsAuthenticated, TokenHasReadWriteScope, IsClientOrAdminOrSuperUser]
+
+    def post(self, request):
+        user = get_user_from_client_id(request.headers.get("X-Client-ID"))
+        if not user:
+            return Response({"error": "Invalid client ID"}, status=401)
+
+        hashes = request.data.get("sha256") or []
+        if isinstance(hashes, str):
+            hashes = [hashes]
+        hashes = {str(h).strip().lower() for h in hashes}
+        if not hashes:
+            return Response({"error": "Missing sha256"}, status=400)
+
+        known = dict(
+            File.objects.filter(user=user, blob_id__in=hashes).order_by("-id").values_list("blob_id", "id")
+        )
+        return Response({"known": known, "unknown": sorted(hashes - set(known))}, status=200)
+
+
+def _duplicate_resp(f):
+    return {
+        "message"   : "Duplicate file already exists under your account.",
+        "file_id"   : f.id,
+        "filename"  : f.filename,
+        "md5_hash"  : f.md5_hash,
+        "project_id": f.project_id,
+        "service_id": f.service_id,
+        "filepath"  : f.filepath,
+        "extension" : f.extension
+    }
+
+
 def _resp(f, message):
     return {
         "file_id"  : f.id,
@@ -589,65 +461,30 @@ class BulkFolderUploadView(APIView):
         upload_dir_base = os.path.join(settings.MEDIA_ROOT, "uploads", user_id, timestamp, client_id, project_id, service_id, run_id)
         os.makedirs(upload_dir_base, exist_ok=True)
 
-        uploaded_files_data = []
-
-        for f in files:
-            relative_path = f.name  # `webkitRelativePath` from frontend
-            target_path = os.path.join(upload_dir_base, relative_path)
-            os.makedirs(os.path.dirname(target_path), exist_ok=True)
-
-            file_details = save_uploaded_file(f, os.path.dirname(target_path), custom_filename=os.path.basename(target_path))
-
-            try:
-                storage = Storage.objects.create(user=user, content_type=ContentType.objects.get_for_model(run.__class__), upload_storage_location=file_details["file_path"])
-
-                file_instance = File.objects.create(
-                    run=run,
-                    storage=storage,
-                    filename=file_details["filename"],
-                    filepath=file_details["file_path"],
-                    file_size=file_details["file_size"],
-                    file_type=file_details["file_type"],
-                    md5_hash=file_details["md5_hash"],
-                    user=user,
-                    project_id=project_id,
-                    service_id=service_id,
-                )
-                register_file_folder_link(file_instance)
+        items = ingest_uploads(
+            [IngestItem(f, relative_dir=os.path.dirname(f.name)) for f in files],  # `webkitRelativePath` from frontend
+            user=user, run=run, project_id=project_id, service_id=service_id,
+            base_dir=upload_dir_base, downstream={METADATA, INSIGHTS},
+        )
 
+        uploaded_files_data = []
+        for item in items:
+            relative_path = os.path.join(item.relative_dir, item.filename or os.path.basename(item.upload.name))
+            if item.error:
+                uploaded_files_data.append({"filename": item.filename or item.upload.name, "relative_path": relative_path,
+                                            "error": item.error})
+            elif item.file is None:
+                uploaded_files_data.append({"filename": item.filename, "relative_path": relative_path,
+                                            "error": "Duplicate file detected.", "existing_file_id": item.duplicate_of.id})
+            else:
                 uploaded_files_data.append({
-                    "file_id": file_instance.id,
-                    "filename": file_details["filename"],
+                    "file_id": item.file.id,
+                    "filename": item.file.filename,
                     "relative_path": relative_path,
-                    "file_size": file_details["file_size"],
-                    "mime_type": file_details["file_type"],
+                    "file_size": item.file.file_size,
+                    "mime_type": item.file.file_type,
                 })
 
-                # 🔹 Create/get folder for project-service-user
-                folder, _ = Folder.objects.get_or_create(
-                    name=project_id,
-                    user=user,
-                    project_id=project_id,
-                    service_id=service_id,
-                    defaults={"created_at": timezone.now()}
-                    )
-
-                # 🔹 Link file to folder if not already linked
-                if not FileFolderLink.objects.filter(file=file_instance).exists():
-                    FileFolderLink.objects.create(file=file_instance, folder=folder)
-
-
-            except IntegrityError as e:
-                if 'core_file_md5_hash_key' in str(e):
-                    existing = File.objects.filter(md5_hash=file_details["md5_hash"]).first()
-                    return Response({
-                        "error": "Duplicate file detected.",
-                        "filename": file_details["filename"],
-                        "existing_file_id": existing.id if existing else None,
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                else:
-                    return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
         return Response({
             "message": "Folder upload successful.",
             "run_id": run_id,
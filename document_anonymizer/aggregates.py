@@ -0,0 +1,229 @@
+"""
+document_anonymizer.aggregates
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Incremental anonymization statistics.
+
+Each `Anonymize` row carries `entity_counts` – {label: masks} over its
+Presidio + spaCy maps – and its risk score, both written by the
+anonymization pass. Every file owner has one `AnonymizationAggregate` row
+holding the running totals over their ACTIVE anonymizations:
+
+    anonymization created       → apply(+1)
+    deactivated / deleted       → apply(-1)
+    de-anonymization created    → deanonymization_count += 1
+    file changes owner          → move_file(): old owner −, new owner +
+
+Every update locks the aggregate row (`select_for_update`) in the same
+transaction as the Anonymize / DeAnonymize write, so concurrent workers
+serialise per user. A missing row is created and built from the tables
+right there, under that lock – excluding the rows being applied – and
+`rebuild()` likewise locks (creating if needed) the rows before reading
+its snapshot. A rebuild therefore either sees a concurrent write and the
+write waits for it, or the write lands after the rebuild; nothing is lost
+or counted twice. Building also backfills `entity_counts` on legacy rows.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+
+from document_anonymizer.models import AnonymizationAggregate, Anonymize, DeAnonymize
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_USERS = 500       # users per transaction in a full rebuild
+
+_FIELDS = (
+    "documents", "files_with_entities", "files_without_entities",
+    "total_entities_anonymized", "entity_type_breakdown",
+    "risk_level_counts", "risk_score_sum", "deanonymization_count",
+)
+
+
+def entity_counts_for(presidio_map: Optional[dict], spacy_map: Optional[dict]) -> Dict[str, int]:
+    """{label: masks} over both maps (spaCy overlays Presidio, as the stats always did)."""
+    combined = dict(presidio_map or {})
+    combined.update(spacy_map or {})
+    counts: Dict[str, int] = {}
+    for mask in combined:
+        label = mask.split("_MASKED_")[0]
+        counts[label] = counts.get(label, 0) + 1
+    return counts
+
+
+def counts_of(anon) -> Dict[str, int]:
+    """Stored count vector, or computed from the maps for legacy rows."""
+    if anon.entity_counts is not None:
+        return anon.entity_counts
+    return entity_counts_for(anon.presidio_masking_map, anon.spacy_masking_map)
+
+
+def apply_delta(agg, counts: Dict[str, int], risk_level: Optional[str], risk_score: Optional[float], sign: int) -> None:
+    """Add (sign=+1) or remove (sign=-1) one document's contribution to `agg`, in memory."""
+    total = sum(counts.values())
+    agg.documents = max(0, agg.documents + sign)
+    agg.total_entities_anonymized = max(0, agg.total_entities_anonymized + sign * total)
+    if total:
+        agg.files_with_entities = max(0, agg.files_with_entities + sign)
+    else:
+        agg.files_without_entities = max(0, agg.files_without_entities + sign)
+
+    breakdown = dict(agg.entity_type_breakdown or {})
+    for label, n in counts.items():
+        value = breakdown.get(label, 0) + sign * n
+        if value > 0:
+            breakdown[label] = value
+        else:
+            breakdown.pop(label, None)
+    agg.entity_type_breakdown = breakdown
+
+    if risk_level:
+        levels = dict(agg.risk_level_counts or {})
+        value = levels.get(risk_level, 0) + sign
+        if value > 0:
+            levels[risk_level] = value
+        else:
+            levels.pop(risk_level, None)
+        agg.risk_level_counts = levels
+    if risk_score is not None:
+        agg.risk_score_sum = max(0.0, agg.risk_score_sum + sign * risk_score)
+
+
+def _locked(user_id, exclude: Iterable = ()) -> Tuple[AnonymizationAggregate, bool]:
+    """
+    The user's aggregate row, locked for this transaction → (row, built).
+    A missing row is created and built from the tables without the
+    Anonymize rows in `exclude`; `built` tells the caller so.
+    """
+    agg = AnonymizationAggregate.objects.select_for_update().filter(user_id=user_id).first()
+    if agg is not None:
+        return agg, False
+    _rebuild_locked([user_id], exclude)
+    return AnonymizationAggregate.objects.select_for_update().get(user_id=user_id), True
+
+
+def _apply_all(user_id, anons: List[Anonymize], sign: int, deanonymizations: int = 0) -> None:
+    agg, built = _locked(user_id, exclude=[a.pk for a in anons])
+    if built and sign < 0:
+        return          # built without them – nothing to remove
+    for anon in anons:
+        apply_delta(agg, counts_of(anon), anon.risk_level, anon.risk_score, sign)
+    if not built:       # a build already counted the DeAnonymize rows in the tables
+        agg.deanonymization_count = max(0, agg.deanonymization_count + sign * deanonymizations)
+    agg.save()
+
+
+def apply(anon: Anonymize, sign: int = 1) -> None:
+    """Fold one active anonymization into its owner's aggregate (sign=-1 to remove it)."""
+    if not anon.is_active:
+        return
+    with transaction.atomic():
+        _apply_all(anon.original_file.user_id, [anon], sign)
+
+
+def deactivate(queryset) -> int:
+    """`queryset.update(is_active=False)`, removing the rows from their aggregates."""
+    with transaction.atomic():
+        rows = list(queryset.filter(is_active=True).select_related("original_file"))
+        for anon in rows:
+            apply(anon, -1)
+        return queryset.filter(pk__in=[a.pk for a in rows]).update(is_active=False)
+
+
+def record_deanonymization(user_id, sign: int = 1) -> None:
+    with transaction.atomic():
+        agg, built = _locked(user_id)
+        if built:
+            return      # the build counted it (or its absence) from the table
+        agg.deanonymization_count = max(0, agg.deanonymization_count + sign)
+        agg.save(update_fields=["deanonymization_count", "updated_at"])
+
+
+def move_file(file_id, from_user_id, to_user_id) -> None:
+    """A file changed owner (File row already saved): move its contributions between the two aggregates."""
+    with transaction.atomic():
+        anons = list(Anonymize.objects.filter(original_file_id=file_id, is_active=True))
+        deanons = DeAnonymize.objects.filter(file_id=file_id).count()
+        if not anons and not deanons:
+            return
+        # fixed lock order → two opposite transfers cannot deadlock
+        for user_id, sign in sorted([(from_user_id, -1), (to_user_id, 1)]):
+            _apply_all(user_id, anons, sign, deanonymizations=deanons)
+
+
+def _rebuild_locked(user_ids: List, exclude: Iterable = ()) -> int:
+    """
+    Recompute the aggregates of `user_ids` inside the caller's transaction:
+    rows are created if missing and locked before the tables are read.
+    Returns the number of `entity_counts` backfilled.
+    """
+    AnonymizationAggregate.objects.bulk_create(
+        [AnonymizationAggregate(user_id=uid) for uid in user_ids], ignore_conflicts=True
+    )
+    rows = list(AnonymizationAggregate.objects.select_for_update().filter(user_id__in=user_ids).order_by("user_id"))
+
+    fresh: Dict[int, AnonymizationAggregate] = {uid: AnonymizationAggregate(user_id=uid) for uid in user_ids}
+    backfill = []
+    anons = Anonymize.objects.filter(is_active=True, original_file__user_id__in=user_ids).exclude(pk__in=list(exclude))
+    for anon in anons.select_related("original_file").iterator(chunk_size=500):
+        if anon.entity_counts is None:
+            anon.entity_counts = counts_of(anon)
+            backfill.append(anon)
+        apply_delta(fresh[anon.original_file.user_id], anon.entity_counts, anon.risk_level, anon.risk_score, 1)
+
+    deanons = DeAnonymize.objects.filter(file__user_id__in=user_ids)
+    for uid in deanons.values_list("file__user_id", flat=True).iterator():
+        fresh[uid].deanonymization_count += 1
+
+    if backfill:
+        Anonymize.objects.bulk_update(backfill, ["entity_counts"], batch_size=500)
+    for agg in rows:
+        for f in _FIELDS:
+            setattr(agg, f, getattr(fresh[agg.user_id], f))
+        agg.save()
+    return len(backfill)
+
+
+def rebuild(user_ids: Optional[Iterable] = None) -> int:
+    """
+    Recompute aggregates from the Anonymize / DeAnonymize tables (all users,
+    or only `user_ids`), backfilling `entity_counts` where missing.
+    Returns the number of aggregate rows written.
+    """
+    if user_ids is None:
+        user_ids = (
+            set(Anonymize.objects.filter(is_active=True).values_list("original_file__user_id", flat=True))
+            | set(DeAnonymize.objects.values_list("file__user_id", flat=True))
+            | set(AnonymizationAggregate.objects.values_list("user_id", flat=True))
+        )
+    user_ids = sorted({uid for uid in user_ids if uid is not None})
+
+    backfilled = 0
+    for start in range(0, len(user_ids), REBUILD_BATCH_USERS):
+        with transaction.atomic():
+            backfilled += _rebuild_locked(user_ids[start:start + REBUILD_BATCH_USERS])
+    logger.info(f"✅ Rebuilt {len(user_ids)} anonymization aggregates ({backfilled} count vectors backfilled)")
+    return len(user_ids)
+
+
+def aggregate_for(user_id) -> AnonymizationAggregate:
+    """The user's aggregate row, built on first access."""
+    agg = AnonymizationAggregate.objects.filter(user_id=user_id).first()
+    if agg is None:
+        rebuild([user_id])
+        agg = AnonymizationAggregate.objects.get(user_id=user_id)
+    return agg
+
+
+def ensure_all() -> int:
+    """Build the rows still missing for users with active anonymizations (before summing them all)."""
+    missing = list(
+        Anonymize.objects.filter(is_active=True, original_file__user__anonymization_aggregate__isnull=True)
+        .values_list("original_file__user_id", flat=True)
+        .distinct()
+    )
+    return rebuild(missing) if missing else 0
@@ -7,3 +7,4 @@ class DocumentAnonymizerConfig(AppConfig):
     def ready(self):
         """Ensure Celery registers the tasks when Django starts."""
         import document_anonymizer.tasks  # Ensure tasks are imported
+        import document_anonymizer.signals  # Keeps the per-user aggregates in step with deletes
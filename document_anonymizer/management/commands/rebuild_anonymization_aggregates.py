@@ -0,0 +1,23 @@
+"""
+Recompute the per-user anonymization aggregates from the Anonymize /
+DeAnonymize tables and backfill `Anonymize.entity_counts` on legacy rows.
+
+Usage
+-----
+
+python manage.py rebuild_anonymization_aggregates [--user <id> ...]
+"""
+from django.core.management.base import BaseCommand
+
+from document_anonymizer.aggregates import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild per-user anonymization aggregates (running stats behind the insights endpoints)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", type=int, action="append", dest="users", help="Only this user id (repeatable)")
+
+    def handle(self, *args, **options):
+        written = rebuild(options["users"])
+        self.stdout.write(f"✅ {written} aggregate rows rebuilt")
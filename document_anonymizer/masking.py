@@ -0,0 +1,124 @@
+"""
+document_anonymizer.masking
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Span-based masking: detected entities are (start, end) offsets into the
+ORIGINAL text, and the masked text is assembled once from slices.
+
+    spans  = presidio_spans(text, results) + spacy_spans(doc)
+    masked, maps = mask_text(text, spans, registry)
+
+• Linear in document length: no `re.sub` over the whole text per entity, and
+  every occurrence is masked at its own offsets (never "the first match").
+• Overlaps are resolved before masking: Presidio beats spaCy, then the
+  longer span wins, then the earlier one.
+• A `MaskRegistry` numbers masks per label and gives a repeated value the
+  same mask; share one registry across a document's blocks so masks are
+  unique document-wide.
+
+`unmask` restores text in one regex pass over the mask tokens.
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+PRESIDIO = "presidio"
+SPACY = "spacy"
+_PRIORITY = {PRESIDIO: 0, SPACY: 1}
+
+MASK_TOKEN_RE = re.compile(r"\b[A-Z][A-Z0-9_]*_MASKED_\d+\b")
+
+
+@dataclass(frozen=True)
+class Span:
+    start: int
+    end: int
+    label: str
+    source: str
+
+
+def presidio_spans(text: str, results) -> List[Span]:
+    return [_trimmed(text, r.start, r.end, r.entity_type, PRESIDIO) for r in results]
+
+
+def spacy_spans(text: str, doc) -> List[Span]:
+    return [_trimmed(text, e.start_char, e.end_char, e.label_, SPACY) for e in doc.ents]
+
+
+def _trimmed(text: str, start: int, end: int, label: str, source: str) -> Span:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return Span(start, end, label, source)
+
+
+def resolve_overlaps(spans: Iterable[Span]) -> List[Span]:
+    """Non-overlapping spans in text order, chosen by (source, length, start)."""
+    ranked = sorted(
+        (s for s in spans if s.end > s.start),
+        key=lambda s: (_PRIORITY.get(s.source, 9), -(s.end - s.start), s.start),
+    )
+    taken: List[Span] = []
+    starts: List[int] = []     # sorted starts of taken spans, for bisect
+    for span in ranked:
+        i = bisect_left(starts, span.start)
+        if i < len(taken) and taken[i].start < span.end:
+            continue
+        if i > 0 and taken[i - 1].end > span.start:
+            continue
+        starts.insert(i, span.start)
+        taken.insert(i, span)
+    return taken
+
+
+class MaskRegistry:
+    """(label, value) → mask, numbered per label in order of first sight."""
+
+    def __init__(self):
+        self._masks: Dict[Tuple[str, str], str] = {}
+        self._counters: Dict[str, int] = {}
+
+    def mask_for(self, label: str, value: str) -> str:
+        key = (label, value)
+        mask = self._masks.get(key)
+        if mask is None:
+            n = self._counters.get(label, 0) + 1
+            self._counters[label] = n
+            mask = self._masks[key] = f"{label}_MASKED_{n}"
+        return mask
+
+
+def mask_text(
+    text: str,
+    spans: Iterable[Span],
+    registry: MaskRegistry | None = None,
+) -> Tuple[str, Dict[str, Dict[str, str]]]:
+    """
+    Returns (masked_text, {source: {mask: original}}) – one map per engine,
+    matching the presidio/spaCy maps stored on `Anonymize`.
+    """
+    registry = registry or MaskRegistry()
+    maps: Dict[str, Dict[str, str]] = {PRESIDIO: {}, SPACY: {}}
+    parts: List[str] = []
+    pos = 0
+    for span in resolve_overlaps(spans):
+        value = text[span.start:span.end]
+        mask = registry.mask_for(span.label, value)
+        maps.setdefault(span.source, {})[mask] = value
+        parts.append(text[pos:span.start])
+        parts.append(mask)
+        pos = span.end
+    parts.append(text[pos:])
+    return "".join(parts), maps
+
+
+def unmask(text: str, mapping: Dict[str, str]) -> str:
+    """Replace every known mask token in a single pass; unknown tokens stay."""
+    if not mapping:
+        return text
+    return MASK_TOKEN_RE.sub(lambda m: mapping.get(m.group(0), m.group(0)), text)
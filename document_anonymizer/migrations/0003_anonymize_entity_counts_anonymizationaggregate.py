@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-16 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_anonymizer', '0002_anonymizationstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anonymize',
+            name='entity_counts',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AnonymizationAggregate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('documents', models.PositiveIntegerField(default=0)),
+                ('files_with_entities', models.PositiveIntegerField(default=0)),
+                ('files_without_entities', models.PositiveIntegerField(default=0)),
+                ('total_entities_anonymized', models.PositiveIntegerField(default=0)),
+                ('entity_type_breakdown', models.JSONField(default=dict)),
+                ('risk_level_counts', models.JSONField(default=dict)),
+                ('risk_score_sum', models.FloatField(default=0.0)),
+                ('deanonymization_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='anonymization_aggregate', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
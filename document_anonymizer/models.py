@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 from core.models import File
 import uuid
@@ -67,6 +68,9 @@ class Anonymize(models.Model):
     risk_score = models.FloatField(blank=True, null=True)
     risk_level = models.CharField(max_length=20, blank=True, null=True)
     risk_breakdown = models.JSONField(blank=True, null=True)
+    # {label: masks} over both engine maps, written by the anonymization pass
+    # (NULL on rows created before it; see document_anonymizer.aggregates)
+    entity_counts = models.JSONField(blank=True, null=True)
 
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Processing', db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -142,3 +146,23 @@ class AnonymizationStats(models.Model):
     def __str__(self):
         return f"AnonymizationStats {self.id} ({self.created_at.date()})"
 
+
+class AnonymizationAggregate(models.Model):
+    """
+    Running anonymization totals per file owner, over ACTIVE anonymizations.
+    Maintained incrementally by document_anonymizer.aggregates so stats and
+    insights read one row instead of rescanning every document.
+    """
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="anonymization_aggregate")
+    documents = models.PositiveIntegerField(default=0)
+    files_with_entities = models.PositiveIntegerField(default=0)
+    files_without_entities = models.PositiveIntegerField(default=0)
+    total_entities_anonymized = models.PositiveIntegerField(default=0)
+    entity_type_breakdown = models.JSONField(default=dict)
+    risk_level_counts = models.JSONField(default=dict)
+    risk_score_sum = models.FloatField(default=0.0)
+    deanonymization_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"AnonymizationAggregate user={self.user_id} ({self.documents} docs)"
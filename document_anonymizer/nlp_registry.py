@@ -0,0 +1,162 @@
+"""
+document_anonymizer.nlp_registry
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+One copy of the anonymizer's NLP models per worker host, not per task.
+
+• spaCy pipelines and Presidio engines are loaded lazily, once per language,
+  and shared by every AnonymizationService instance in the process.
+• Presidio's AnalyzerEngine reuses the SAME spaCy pipeline instead of
+  loading its own `en_core_web_lg` (previously two ~600 MB copies).
+• `preload()` runs in the Celery parent (`worker_init`, before the prefork
+  pool forks) when ANONYMIZER_PRELOAD lists languages, e.g. "en". Children
+  then share the model pages copy-on-write and their first task pays no
+  load; `gc.freeze()` keeps the collector from dirtying those pages.
+• `memory_report()` gives RSS / PSS / private memory of the current process
+  plus the load time of each model.
+
+Dedicated queue: set ANONYMIZER_QUEUE (settings / env) to route the
+anonymizer tasks there and start a worker with SERVICE_NAME=celery_anonymizer
+(see entrypoint.sh).
+"""
+
+from __future__ import annotations
+
+import gc
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SPACY_MODELS: Dict[str, str] = getattr(settings, "ANONYMIZER_SPACY_MODELS", {"en": "en_core_web_lg"})
+
+
+def _load_spacy(model_name: str):
+    import spacy
+    return spacy.load(model_name)
+
+
+def _build_analyzer(lang: str, nlp):
+    """AnalyzerEngine whose NLP engine wraps the already-loaded spaCy pipeline."""
+    from presidio_analyzer import AnalyzerEngine
+    from presidio_analyzer.nlp_engine import SpacyNlpEngine
+
+    engine = SpacyNlpEngine(models=[{"lang_code": lang, "model_name": SPACY_MODELS.get(lang, "")}])
+    engine.nlp = {lang: nlp}        # skip SpacyNlpEngine.load(): no second copy
+    return AnalyzerEngine(nlp_engine=engine, supported_languages=[lang])
+
+
+def _build_anonymizer():
+    from presidio_anonymizer import AnonymizerEngine
+    return AnonymizerEngine()
+
+
+class NLPModelRegistry:
+    def __init__(
+        self,
+        spacy_loader: Callable[[str], object] = _load_spacy,
+        analyzer_factory: Callable[[str, object], object] = _build_analyzer,
+        anonymizer_factory: Callable[[], object] = _build_anonymizer,
+        models: Optional[Dict[str, str]] = None,
+    ):
+        self._spacy_loader = spacy_loader
+        self._analyzer_factory = analyzer_factory
+        self._anonymizer_factory = anonymizer_factory
+        self.models = dict(models or SPACY_MODELS)
+        self._loaded: Dict[tuple, object] = {}
+        self.load_seconds: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key: tuple, build: Callable[[], object]):
+        obj = self._loaded.get(key)
+        if obj is not None:
+            return obj
+        with self._lock:
+            obj = self._loaded.get(key)
+            if obj is None:
+                t0 = time.perf_counter()
+                obj = build()
+                self._loaded[key] = obj
+                self.load_seconds[":".join(key)] = round(time.perf_counter() - t0, 3)
+                logger.info(f"📦 Loaded {':'.join(key)} in {self.load_seconds[':'.join(key)]}s (pid {os.getpid()})")
+        return obj
+
+    def spacy(self, lang: str = "en"):
+        if lang not in self.models:
+            raise ValueError(f"No spaCy model configured for language '{lang}'")
+        return self._get(("spacy", lang), lambda: self._spacy_loader(self.models[lang]))
+
+    def analyzer(self, lang: str = "en"):
+        return self._get(("analyzer", lang), lambda: self._analyzer_factory(lang, self.spacy(lang)))
+
+    def anonymizer(self):
+        return self._get(("anonymizer",), self._anonymizer_factory)
+
+    def preload(self, languages: Iterable[str] = ("en",), freeze: bool = True) -> dict:
+        """Load everything for `languages` now (call before forking)."""
+        for lang in languages:
+            self.spacy(lang)
+            self.analyzer(lang)
+        self.anonymizer()
+        if freeze and hasattr(gc, "freeze"):
+            gc.collect()
+            gc.freeze()     # loaded objects → permanent generation, pages stay shared
+        report = self.memory_report()
+        logger.info(f"✅ Anonymizer models preloaded: {report}")
+        return report
+
+    def loaded(self) -> list:
+        return sorted(":".join(k) for k in self._loaded)
+
+    def memory_report(self) -> dict:
+        return {"pid": os.getpid(), "loaded": self.loaded(), "load_seconds": dict(self.load_seconds), **process_memory()}
+
+
+def process_memory() -> dict:
+    """RSS / PSS / private MB of this process (Linux /proc; {} elsewhere)."""
+    out = {}
+    try:
+        with open("/proc/self/smaps_rollup") as fh:
+            for line in fh:
+                key, _, rest = line.partition(":")
+                if key in ("Rss", "Pss", "Private_Clean", "Private_Dirty", "Shared_Clean", "Shared_Dirty"):
+                    out[key.lower() + "_mb"] = round(int(rest.split()[0]) / 1024, 1)
+    except (OSError, ValueError):
+        pass
+    return out
+
+
+_REGISTRY: Optional[NLPModelRegistry] = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_model_registry() -> NLPModelRegistry:
+    global _REGISTRY
+    if _REGISTRY is None:
+        with _REGISTRY_LOCK:
+            if _REGISTRY is None:
+                _REGISTRY = NLPModelRegistry()
+    return _REGISTRY
+
+
+def preload_languages() -> list:
+    raw = getattr(settings, "ANONYMIZER_PRELOAD", None) or os.getenv("ANONYMIZER_PRELOAD", "")
+    return [lang.strip() for lang in raw.split(",") if lang.strip()]
+
+
+def preload_for_worker(**_kwargs) -> None:
+    """celery `worker_init` handler: runs in the parent before the pool forks."""
+    languages = preload_languages()
+    if languages:
+        get_model_registry().preload(languages)
+
+
+def report_child_memory(**_kwargs) -> None:
+    """celery `worker_process_init` handler: log what each child starts with."""
+    if preload_languages():
+        logger.info(f"🧠 Anonymizer worker child ready: {get_model_registry().memory_report()}")
@@ -0,0 +1,39 @@
+# document_anonymizer/signals.py
+
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+from core.models import File
+from . import aggregates
+from .models import Anonymize, DeAnonymize
+
+
+def _owner_id(file_id):
+    return File.objects.filter(id=file_id).values_list("user_id", flat=True).first()
+
+
+@receiver(post_delete, sender=Anonymize)
+def remove_anonymization_from_aggregate(sender, instance, **kwargs):
+    # Deactivated rows were already removed by aggregates.deactivate()
+    if instance.is_active and _owner_id(instance.original_file_id) is not None:
+        aggregates.apply(instance, -1)
+
+
+@receiver(post_delete, sender=DeAnonymize)
+def remove_deanonymization_from_aggregate(sender, instance, **kwargs):
+    user_id = _owner_id(instance.file_id)
+    if user_id is not None:
+        aggregates.record_deanonymization(user_id, -1)
+
+
+@receiver(post_init, sender=File)
+def remember_anonymization_owner(sender, instance, **kwargs):
+    instance._anonymization_owner_id = instance.__dict__.get("user_id")
+
+
+@receiver(post_save, sender=File)
+def move_anonymizations_on_owner_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_anonymization_owner_id", None)
+    instance._anonymization_owner_id = instance.user_id
+    if created or previous is None or previous == instance.user_id:
+        return
+    aggregates.move_file(instance.id, previous, instance.user_id)
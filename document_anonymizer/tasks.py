@@ -11,6 +11,8 @@ from document_anonymizer.utils import AnonymizationService, generate_anonymized_
 from core.utils import register_generated_file
 from document_anonymizer.utils import compute_global_anonymization_stats
 from document_anonymizer.models import AnonymizationStats
+from document_anonymizer import aggregates
+from document_anonymizer.aggregates import entity_counts_for
 from django.contrib.auth import get_user_model
 # from platform_data_insights.utils import calculate_anonymization_insights
 from document_anonymizer.utils import calculate_anonymization_insights, get_shared_anonymization_service
@@ -114,9 +116,10 @@ def anonymize_document_task(file_id, file_type="plain", run_id=None):
     global_presidio_map = {}
     global_spacy_map = {}
 
-    for block in elements_json:
-        original_text = block.get("text", "")
-        masked_text, combined_map, presidio_map, spacy_map = service.anonymize_text(original_text)
+    original_blocks = [block.get("text", "") for block in elements_json]
+    masked_blocks = service.anonymize_blocks(original_blocks)
+
+    for block, (masked_text, combined_map, presidio_map, spacy_map) in zip(elements_json, masked_blocks):
         block["text"] = masked_text
         updated_blocks.append(block)
         global_combined_map.update(combined_map)
@@ -190,19 +193,10 @@ def anonymize_document_task(file_id, file_type="plain", run_id=None):
             original_for_risk = final_masked_doc  # last resort fallback
     '''
 
-    original_for_risk = file_entry.content
-    if not original_for_risk:
-        try:
-            extracted_text, _, _ = service.extract_text_from_file(file_entry.filepath)
-            original_for_risk = extracted_text or ""
-        except Exception:
-            original_for_risk = ""
-
-    if not original_for_risk.strip():
-        original_for_risk = final_masked_doc  # last resort
-
-
-    risk_result = service.compute_risk_score(original_for_risk, global_presidio_map, global_spacy_map)
+    # Risk is scored here, on the text the maps were built from, and stored with
+    # the per-label count vector – nothing re-reads the document afterwards.
+    risk_result = service.compute_risk_score("\n\n".join(original_blocks), global_presidio_map, global_spacy_map)
+    entity_counts = entity_counts_for(global_presidio_map, global_spacy_map)
 
     if run_id:
         anonymization_run = get_object_or_404(AnonymizationRun, id=run_id)
@@ -231,9 +225,9 @@ def anonymize_document_task(file_id, file_type="plain", run_id=None):
                     "message": "An active anonymization already exists for this file."
                     }
 
-        Anonymize.objects.filter(original_file=file_entry, file_type=file_type, is_active=True).update(is_active=False)
+        aggregates.deactivate(Anonymize.objects.filter(original_file=file_entry, file_type=file_type, is_active=True))
 
-        Anonymize.objects.create(
+        created = Anonymize.objects.create(
             original_file=file_entry,
             run=anonymization_run,
             file_type=file_type,
@@ -250,8 +244,10 @@ def anonymize_document_task(file_id, file_type="plain", run_id=None):
             risk_score=risk_result["risk_score"],
             risk_level=risk_result["risk_level"],
             risk_breakdown=risk_result["breakdown"],
+            entity_counts=entity_counts,
             status="Completed"
         )
+        aggregates.apply(created, +1)
 
 
         # ✅ Register each generated file in the File table
@@ -330,6 +326,7 @@ def deanonymize_document_task(file_id):
             spacy_masking_map=instance.spacy_masking_map,
             status="Completed"
         )
+        aggregates.record_deanonymization(instance.original_file.user_id)
 
     logger.info(f"✅ De-anonymization complete for file_id={file_id}")
     return {"file_id": file_id, "deanonymized_txt": txt_path, "status": "Completed"}
@@ -394,6 +391,16 @@ def compute_risk_score_task(file_id):
     if not instance:
         return {"error": "No active anonymized file found."}
 
+    # Scored in the anonymization pass: serve what was stored
+    if instance.risk_score is not None and instance.entity_counts is not None:
+        return {
+            "file_id": file_id,
+            "risk_score": instance.risk_score,
+            "risk_level": instance.risk_level,
+            "breakdown": instance.risk_breakdown or {},
+        }
+
+    # Legacy rows (anonymized before scoring moved into the pass)
     presidio_map = instance.presidio_masking_map or {}
     spacy_map    = instance.spacy_masking_map or {}
 
@@ -420,10 +427,14 @@ def compute_risk_score_task(file_id):
 
     risk_result = service.compute_risk_score(original_for_risk, presidio_map, spacy_map)
 
-    instance.risk_score     = risk_result["risk_score"]
-    instance.risk_level     = risk_result["risk_level"]
-    instance.risk_breakdown = risk_result["breakdown"]
-    instance.save(update_fields=["risk_score", "risk_level", "risk_breakdown", "updated_at"])
+    with transaction.atomic():
+        aggregates.apply(instance, -1)
+        instance.risk_score     = risk_result["risk_score"]
+        instance.risk_level     = risk_result["risk_level"]
+        instance.risk_breakdown = risk_result["breakdown"]
+        instance.entity_counts  = entity_counts_for(presidio_map, spacy_map)
+        instance.save(update_fields=["risk_score", "risk_level", "risk_breakdown", "entity_counts", "updated_at"])
+        aggregates.apply(instance, +1)
 
     return {
         "file_id": file_id,
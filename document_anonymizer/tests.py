@@ -0,0 +1,291 @@
+import re
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from document_anonymizer.masking import MaskRegistry, Span, mask_text, unmask
+from document_anonymizer.utils import AnonymizationService
+
+
+# ─────────────── Fake engines that count model calls ───────────────
+PERSON = re.compile(r"\b(?:Mr|Ms)\. [A-Z][a-z]+\b")
+EMAIL = re.compile(r"\b[\w.]+@[\w.]+\.\w+\b")
+ENGINE_CALLS = Counter()    # analyze() / nlp() invocations, each paying the pipeline setup
+
+
+def _presidio_hits(text):
+    return [SimpleNamespace(entity_type="EMAIL_ADDRESS", start=m.start(), end=m.end()) for m in EMAIL.finditer(text)]
+
+
+def _doc(text):
+    return SimpleNamespace(ents=[
+        SimpleNamespace(label_="PERSON", text=m.group(), start_char=m.start(), end_char=m.end())
+        for m in PERSON.finditer(text)
+    ])
+
+
+class _FakeAnalyzer:
+    def analyze(self, text, entities=None, language="en"):
+        ENGINE_CALLS["presidio"] += 1
+        return _presidio_hits(text)
+
+
+class _FakeBatchAnalyzer:
+    def __init__(self, analyzer_engine):
+        pass
+
+    def analyze_iterator(self, texts, language="en", batch_size=1, **kwargs):
+        texts = list(texts)
+        for i in range(0, len(texts), batch_size):
+            ENGINE_CALLS["presidio"] += 1
+            for text in texts[i:i + batch_size]:
+                yield _presidio_hits(text)
+
+
+class _FakeNlp:
+    def __call__(self, text):
+        ENGINE_CALLS["spacy"] += 1
+        return _doc(text)
+
+    def pipe(self, texts, batch_size=1, n_process=1):
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) == batch_size:
+                ENGINE_CALLS["spacy"] += 1
+                yield from (_doc(t) for t in batch)
+                batch = []
+        if batch:
+            ENGINE_CALLS["spacy"] += 1
+            yield from (_doc(t) for t in batch)
+
+
+def _service():
+    service = AnonymizationService.__new__(AnonymizationService)
+    service.analyzer = _FakeAnalyzer()
+    service.nlp = _FakeNlp()
+    return service
+
+
+def _legal_blocks(n):
+    """Synthetic contract: short clauses, headings and signature blocks."""
+    blocks = []
+    for i in range(n):
+        if i % 10 == 0:
+            blocks.append(f"ARTICLE {i // 10 + 1}")
+        elif i % 7 == 0:
+            blocks.append(f"Notices to Ms. Novak at novak{i}@example.com shall be in writing.")
+        else:
+            blocks.append(f"{i}. Mr. Okafor shall indemnify the Company against all losses arising under clause {i}.")
+    return blocks
+
+
+@mock.patch("document_anonymizer.utils.BatchAnalyzerEngine", _FakeBatchAnalyzer)
+class BatchAnonymizationTests(SimpleTestCase):
+    def test_batch_output_matches_per_block_output(self):
+        service = _service()
+        blocks = _legal_blocks(40) + ["", "   "]
+        batched = service.anonymize_blocks(blocks, batch_size=16)
+        registry = MaskRegistry()
+        single = [service.anonymize_text(b, registry) if b.strip() else (b, {}, {}, {}) for b in blocks]
+        self.assertEqual(batched, single)
+        self.assertIn("EMAIL_ADDRESS_MASKED_1", batched[7][0])
+        self.assertIn("EMAIL_ADDRESS_MASKED_2", batched[14][0])    # unique across blocks
+
+    def test_batches_pay_the_engine_call_once_per_batch(self):
+        service = _service()
+        blocks = _legal_blocks(300)
+
+        ENGINE_CALLS.clear()
+        for b in blocks:
+            service.anonymize_text(b)
+        self.assertEqual(ENGINE_CALLS, {"presidio": 300, "spacy": 300})
+
+        ENGINE_CALLS.clear()
+        service.anonymize_blocks(blocks, batch_size=128)
+        self.assertEqual(ENGINE_CALLS, {"presidio": 3, "spacy": 3})
+
+
+# ─────────────────────────── Span masking engine ───────────────────────────
+class SpanMaskingTests(SimpleTestCase):
+    def test_masks_each_occurrence_at_its_own_offsets(self):
+        text = "Ann met Bob. Later Ann paid Annabel."
+        spans = [Span(19, 22, "PERSON", "spacy"), Span(8, 11, "PERSON", "spacy")]
+        masked, maps = mask_text(text, spans)
+        # the second "Ann" is masked, not the first (re.sub would hit the first)
+        self.assertEqual(masked, "Ann met PERSON_MASKED_1. Later PERSON_MASKED_2 paid Annabel.")
+        self.assertEqual(unmask(masked, maps["spacy"]), text)
+
+    def test_presidio_wins_overlaps_then_longest(self):
+        text = "Mail john.smith@acme.com now"
+        spans = [
+            Span(5, 15, "PERSON", "spacy"),
+            Span(5, 24, "EMAIL_ADDRESS", "presidio"),
+            Span(16, 24, "ORG", "spacy"),
+        ]
+        masked, maps = mask_text(text, spans)
+        self.assertEqual(masked, "Mail EMAIL_ADDRESS_MASKED_1 now")
+        self.assertEqual(maps["spacy"], {})
+
+    def test_masking_is_one_pass_over_the_spans(self):
+        class CountingStr(str):
+            slices = 0
+
+            def __getitem__(self, key):
+                CountingStr.slices += 1
+                return str.__getitem__(self, key)
+
+        text = "".join(f"Party{i} shall pay. " for i in range(2400))
+        spans = [Span(m.start(), m.end(), "PERSON", "spacy") for m in re.finditer(r"Party\d+", text)]
+        masked, maps = mask_text(CountingStr(text), spans)
+
+        # one slice for each value and each gap, plus the tail: no rescans of the text
+        self.assertEqual(CountingStr.slices, 2 * len(spans) + 1)
+        self.assertEqual(len(maps["spacy"]), 2400)
+        self.assertEqual(unmask(masked, maps["spacy"]), text)
+
+
+# ───────────────────────────── Model registry ──────────────────────────────
+class NLPModelRegistryTests(SimpleTestCase):
+    MODEL_MB = 64
+
+    def _registry(self, loads):
+        from document_anonymizer.nlp_registry import NLPModelRegistry
+
+        def load(name):
+            loads.append(name)
+            return bytearray(self.MODEL_MB << 20)      # stands in for en_core_web_lg
+
+        return NLPModelRegistry(
+            spacy_loader=load,
+            analyzer_factory=lambda lang, nlp: SimpleNamespace(nlp=nlp),
+            anonymizer_factory=SimpleNamespace,
+            models={"en": "en_core_web_lg", "de": "de_core_news_lg"},
+        )
+
+    def test_services_share_one_lazily_loaded_copy_per_language(self):
+        loads = []
+        registry = self._registry(loads)
+        with mock.patch("document_anonymizer.utils.get_model_registry", return_value=registry):
+            a, b = AnonymizationService(), AnonymizationService()
+            self.assertEqual(loads, [])                     # constructing is free
+            self.assertIs(a.nlp, b.nlp)
+            self.assertIs(a.analyzer.nlp, a.nlp)            # Presidio reuses the spaCy pipeline
+            AnonymizationService(language="de").nlp
+        self.assertEqual(loads, ["en_core_web_lg", "de_core_news_lg"])
+
+    def test_preloaded_models_are_shared_with_forked_children(self):
+        import os
+        from document_anonymizer.nlp_registry import process_memory
+
+        if not process_memory() or not hasattr(os, "fork"):
+            self.skipTest("needs Linux /proc and fork()")
+
+        def child_stats(registry, loads):
+            r, w = os.pipe()
+            pid = os.fork()
+            if pid == 0:                                    # prefork child: first task
+                before = len(loads)
+                model = registry.spacy("en")
+                checksum = sum(model[:: 1 << 20])           # touch every MB read-only
+                mem = process_memory()
+                os.write(w, f"{len(loads) - before} {mem['private_dirty_mb']} {checksum}".encode())
+                os._exit(0)
+            os.close(w)
+            out = os.read(r, 1024).decode().split()
+            os.waitpid(pid, 0)
+            return int(out[0]), float(out[1])
+
+        cold_calls, warm_calls = [], []
+        cold_loads, cold_private = child_stats(self._registry(cold_calls), cold_calls)
+        warm = self._registry(warm_calls)
+        warm.preload(["en"], freeze=False)
+        warm_loads, warm_private = child_stats(warm, warm_calls)
+
+        self.assertEqual(cold_loads, 1)
+        self.assertEqual(warm_loads, 0)                     # the child uses the parent's copy
+        self.assertLess(warm_private, cold_private - self.MODEL_MB / 2)
+
+
+# ───────────────────────── Incremental aggregates ──────────────────────────
+class AnonymizationAggregateTests(SimpleTestCase):
+    @staticmethod
+    def _empty():
+        return SimpleNamespace(
+            documents=0, files_with_entities=0, files_without_entities=0, total_entities_anonymized=0,
+            entity_type_breakdown={}, risk_level_counts={}, risk_score_sum=0.0,
+        )
+
+    def _docs(self, n):
+        from document_anonymizer.aggregates import entity_counts_for
+
+        docs = []
+        for i in range(n):
+            presidio = {f"EMAIL_ADDRESS_MASKED_{k}": f"u{k}@x.io" for k in range(1, i % 4 + 1)}
+            spacy = {f"PERSON_MASKED_{k}": f"P{k}" for k in range(1, i % 3 + 1)}
+            level = ("Ok", "Low", "Medium", "High")[i % 4]
+            docs.append((entity_counts_for(presidio, spacy), level, float(i % 100)))
+        return docs
+
+    def _full_scan(self, docs):
+        from document_anonymizer.aggregates import apply_delta
+
+        agg = self._empty()
+        for counts, level, score in docs:
+            apply_delta(agg, counts, level, score, +1)
+        return agg
+
+    def test_count_vector_matches_legacy_map_scan(self):
+        from document_anonymizer.aggregates import entity_counts_for
+
+        presidio = {"EMAIL_ADDRESS_MASKED_1": "a@b.c", "PERSON_MASKED_1": "Ann"}
+        spacy = {"PERSON_MASKED_1": "Ann", "PERSON_MASKED_2": "Bob", "ORG_MASKED_1": "Acme"}
+        self.assertEqual(entity_counts_for(presidio, spacy), {"EMAIL_ADDRESS": 1, "PERSON": 2, "ORG": 1})
+        self.assertEqual(entity_counts_for(None, None), {})
+
+    def test_incremental_updates_equal_a_full_rescan(self):
+        from document_anonymizer.aggregates import apply_delta
+
+        docs = self._docs(200)
+        running = self._empty()
+        for counts, level, score in docs:
+            apply_delta(running, counts, level, score, +1)
+        for counts, level, score in docs[::3]:              # deactivations
+            apply_delta(running, counts, level, score, -1)
+
+        kept = [d for i, d in enumerate(docs) if i % 3]
+        self.assertEqual(vars(running), vars(self._full_scan(kept)))
+
+        for counts, level, score in kept:
+            apply_delta(running, counts, level, score, -1)
+        self.assertEqual(vars(running), vars(self._empty()))   # no negative or zero leftovers
+
+    def test_aggregate_size_is_independent_of_document_count(self):
+        from document_anonymizer.aggregates import apply_delta
+
+        small, big = self._full_scan(self._docs(500)), self._full_scan(self._docs(20000))
+        self.assertEqual(set(small.entity_type_breakdown), set(big.entity_type_breakdown))
+        self.assertEqual(set(small.risk_level_counts), set(big.risk_level_counts))
+
+        # a new document moves only its own counters, by its own amounts
+        before = dict(big.entity_type_breakdown)
+        counts, level, score = self._docs(4)[3]
+        apply_delta(big, counts, level, score, +1)
+        changed = {k: v - before.get(k, 0) for k, v in big.entity_type_breakdown.items() if v != before.get(k, 0)}
+        self.assertEqual(changed, counts)
+
+    def test_row_built_under_the_lock_is_not_applied_twice(self):
+        from document_anonymizer import aggregates
+
+        anon = SimpleNamespace(pk=7, entity_counts={"PERSON": 2}, risk_level="High", risk_score=80.0)
+        built = SimpleNamespace(**vars(self._empty()), deanonymization_count=3, save=mock.Mock())
+        locked = mock.Mock(return_value=(built, True))
+        with mock.patch.object(aggregates, "_locked", locked):
+            aggregates._apply_all(1, [anon], -1, deanonymizations=1)     # built without it → nothing to remove
+            built.save.assert_not_called()
+            aggregates._apply_all(1, [anon], +1, deanonymizations=1)     # built without it → added once
+        locked.assert_called_with(1, exclude=[7])
+        self.assertEqual(built.entity_type_breakdown, {"PERSON": 2})
+        self.assertEqual(built.deanonymization_count, 3)                 # the build counted the table
@@ -1,22 +1,36 @@
 import os
 import json
-import re
 import logging
+import multiprocessing
 from django.conf import settings
 from docx import Document
-import spacy
-from presidio_analyzer import AnalyzerEngine
-from presidio_anonymizer import AnonymizerEngine
-from unstructured.partition.pdf import partition_pdf
+from presidio_analyzer import BatchAnalyzerEngine
+from core.extraction import extract
+from document_anonymizer.nlp_registry import get_model_registry
+from document_anonymizer.masking import (
+    PRESIDIO,
+    SPACY,
+    MaskRegistry,
+    mask_text,
+    presidio_spans,
+    spacy_spans,
+    unmask,
+)
 from document_anonymizer.models import Anonymize
 
-from django.db.models import Avg, Count, Q
-from document_anonymizer.models import AnonymizationRun, Anonymize, DeAnonymize
+from django.db.models import Avg, Count, F, Q, Sum
+from document_anonymizer.models import AnonymizationAggregate, AnonymizationRun, Anonymize
+from document_anonymizer.aggregates import aggregate_for, counts_of, ensure_all
 
 from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# Batch anonymization (anonymize_blocks): blocks per nlp.pipe / Presidio batch,
+# spaCy worker processes (only honoured outside daemonic Celery children)
+ANONYMIZER_BATCH_SIZE = getattr(settings, "ANONYMIZER_BATCH_SIZE", 256)
+ANONYMIZER_N_PROCESS = getattr(settings, "ANONYMIZER_N_PROCESS", 1)
+
 
 class AnonymizationService:
     """
@@ -24,11 +38,37 @@ class AnonymizationService:
     Now supports structured PDF extraction using unstructured.
     """
 
-    def __init__(self):
-        logger.info("📦 Initializing AnonymizationService with shared models...")
-        self.analyzer = AnalyzerEngine()
-        self.anonymizer = AnonymizerEngine()
-        self.nlp = spacy.load("en_core_web_lg")  # Load once per task
+    # Engines come from the process-wide model registry (nlp_registry.py):
+    # constructing a service is free and every instance shares one copy.
+    language = "en"
+    _analyzer = _anonymizer = _nlp = None
+
+    def __init__(self, language="en"):
+        self.language = language
+
+    @property
+    def analyzer(self):
+        return self._analyzer or get_model_registry().analyzer(self.language)
+
+    @analyzer.setter
+    def analyzer(self, engine):
+        self._analyzer = engine
+
+    @property
+    def anonymizer(self):
+        return self._anonymizer or get_model_registry().anonymizer()
+
+    @anonymizer.setter
+    def anonymizer(self, engine):
+        self._anonymizer = engine
+
+    @property
+    def nlp(self):
+        return self._nlp or get_model_registry().spacy(self.language)
+
+    @nlp.setter
+    def nlp(self, pipeline):
+        self._nlp = pipeline
 
     def extract_text_from_file(self, file_path):
         logger.info(f"🔄 Extracting text from: {file_path}")
@@ -59,17 +99,14 @@ class AnonymizationService:
         logger.info(f"📄 extract_structured_text() ➔ Processing {file_path}")
         try:
             if file_path.lower().endswith(".pdf"):
-                from unstructured.partition.pdf import partition_pdf
-                elements = partition_pdf(filename=file_path)
+                result = extract(file_path, "unstructured:pdf")
             elif file_path.lower().endswith(".docx"):
-                from unstructured.partition.docx import partition_docx
-                elements = partition_docx(filename=file_path)
+                result = extract(file_path, "unstructured:docx")
             else:
                 logger.warning(f"⚠️ Unsupported file type for structured extraction: {file_path}")
                 return None, [], []
 
-            structured_text = "\n\n".join(el.text.strip() for el in elements if el.text and el.text.strip())
-            return structured_text, elements, [el.to_dict() for el in elements]
+            return result.joined(), result.as_elements(), result.elements
         except Exception as e:
             logger.error(f"❌ extract_structured_text() failed: {e}")
             return None, [], []
@@ -78,10 +115,8 @@ class AnonymizationService:
     def extract_text_from_pdf(self, file_path):
         try:
             logger.info(f"📄 Using unstructured to extract structured PDF text from: {file_path}")
-            elements = partition_pdf(filename=file_path)
-            structured_text = "\n\n".join(el.text.strip() for el in elements if el.text and el.text.strip())
-
-            return structured_text, elements, [el.to_dict() for el in elements]
+            result = extract(file_path, "unstructured:pdf")
+            return result.joined(), result.as_elements(), result.elements
         except Exception as e:
             logger.error(f"❌ Structured PDF extraction failed via unstructured: {e}")
             return None, [], []
@@ -94,45 +129,67 @@ class AnonymizationService:
             logger.error(f"❌ DOCX text extraction failed: {e}")
             return None
     
-    def anonymize_text(self, text):
+    def anonymize_text(self, text, registry=None):
         """
         Anonymizes the input text using both Presidio and SpaCy engines.
         Reuses shared engine instances for performance and memory efficiency.
+
+        Both engines run on the original text; their spans are merged and
+        masked in one pass (see masking.py). Pass a shared MaskRegistry to
+        keep mask numbering consistent across the blocks of a document.
         """
         logger.info("🔄 Running Presidio anonymization...")
         presidio_results = self.analyzer.analyze(text=text, entities=[], language="en")
-        presidio_map = {}
-        presidio_counter = {}
-        presidio_masked = text
-    
-        for result in presidio_results:
-            entity_type = result.entity_type
-            presidio_counter[entity_type] = presidio_counter.get(entity_type, 0) + 1
-            mask = f"{entity_type}_MASKED_{presidio_counter[entity_type]}"
-            value = text[result.start:result.end].strip()
-            presidio_map[mask] = value
-            presidio_masked = re.sub(r'\b' + re.escape(value) + r'\b', mask, presidio_masked, 1)
-    
+
         logger.info("🔄 Running SpaCy anonymization...")
-        spacy_map = {}
-        spacy_counter = {}
-        final_masked = presidio_masked
-        doc = self.nlp(presidio_masked)
-    
-        for ent in doc.ents:
-            entity_type = ent.label_
-            spacy_counter[entity_type] = spacy_counter.get(entity_type, 0) + 1
-            mask = f"{entity_type}_MASKED_{spacy_counter[entity_type]}"
-            spacy_map[mask] = ent.text.strip()
-            final_masked = re.sub(r'\b' + re.escape(ent.text.strip()) + r'\b', mask, final_masked, 1)
-    
+        doc = self.nlp(text)
+
+        final_masked, presidio_map, spacy_map = self._mask(text, presidio_results, doc, registry)
         combined_map = {**spacy_map, **presidio_map}
-    
+
         logger.info(f"✅ Presidio map: {json.dumps(presidio_map, indent=2)}")
         logger.info(f"✅ SpaCy map: {json.dumps(spacy_map, indent=2)}")
-    
+
         return final_masked, combined_map, presidio_map, spacy_map
 
+    def anonymize_blocks(self, texts, batch_size=ANONYMIZER_BATCH_SIZE, n_process=ANONYMIZER_N_PROCESS):
+        """
+        Batch version of `anonymize_text` for structured blocks.
+
+        Presidio runs through BatchAnalyzerEngine and spaCy through
+        `nlp.pipe`, so thousands of small elements pay the per-call overhead
+        once per batch instead of once per block. One MaskRegistry spans all
+        blocks, so a mask means the same value everywhere in the document.
+
+        Returns one (masked, combined_map, presidio_map, spacy_map) per text.
+        """
+        texts = [t or "" for t in texts]
+        live = [i for i, t in enumerate(texts) if t.strip()]
+        results = [(t, {}, {}, {}) for t in texts]
+        if not live:
+            return results
+
+        if n_process > 1 and multiprocessing.current_process().daemon:
+            n_process = 1   # prefork Celery children can't spawn processes
+
+        logger.info(f"🔄 Batch anonymizing {len(live)} blocks (batch={batch_size}, n_process={n_process})")
+        live_texts = [texts[i] for i in live]
+        presidio_batches = BatchAnalyzerEngine(analyzer_engine=self.analyzer).analyze_iterator(
+            live_texts, language="en", batch_size=batch_size,
+        )
+        docs = self.nlp.pipe(live_texts, batch_size=batch_size, n_process=n_process)
+
+        registry = MaskRegistry()
+        for i, found, doc in zip(live, presidio_batches, docs):
+            final_masked, presidio_map, spacy_map = self._mask(texts[i], found, doc, registry)
+            results[i] = (final_masked, {**spacy_map, **presidio_map}, presidio_map, spacy_map)
+        return results
+
+    @staticmethod
+    def _mask(text, presidio_results, doc, registry=None):
+        spans = presidio_spans(text, presidio_results) + spacy_spans(text, doc)
+        masked, maps = mask_text(text, spans, registry)
+        return masked, maps[PRESIDIO], maps[SPACY]
 
     def deanonymize_pipeline(self, masked_text, spacy_mapping, presidio_mapping):
         partially_restored = self.reverse_masking(masked_text, spacy_mapping)
@@ -141,10 +198,7 @@ class AnonymizationService:
 
 
     def reverse_masking(self, text, entity_mapping):
-        for mask, original in sorted(entity_mapping.items(), key=lambda x: len(x[0]), reverse=True):
-            pattern = re.compile(r'\b' + re.escape(mask) + r'\b')
-            text = pattern.sub(original, text)
-        return text
+        return unmask(text, entity_mapping)
 
 
     def get_file_path(self, original_file_path, folder="anonymized", extension="txt"):
@@ -744,24 +798,35 @@ def compute_global_anonymization_stats(
     if date_to:
         filters &= Q(updated_at__date__lte=date_to)
 
-    queryset = Anonymize.objects.filter(filters)
+    if not any((client_name, project_id, service_id, date_from, date_to)):
+        # Unfiltered: sum the per-user running aggregates
+        ensure_all()
+        totals = AnonymizationAggregate.objects.aggregate(
+            files_with_entities=Sum("files_with_entities"),
+            files_without_entities=Sum("files_without_entities"),
+            total_entities_anonymized=Sum("total_entities_anonymized"),
+        )
+        entity_type_breakdown = {}
+        for breakdown in AnonymizationAggregate.objects.values_list("entity_type_breakdown", flat=True):
+            for entity_type, count in (breakdown or {}).items():
+                entity_type_breakdown[entity_type] = entity_type_breakdown.get(entity_type, 0) + count
+        return {
+            "files_with_entities": totals["files_with_entities"] or 0,
+            "files_without_entities": totals["files_without_entities"] or 0,
+            "total_entities_anonymized": totals["total_entities_anonymized"] or 0,
+            "entity_type_breakdown": entity_type_breakdown,
+        }
+
+    # Filtered: read the stored count vectors (maps only for legacy rows)
+    queryset = Anonymize.objects.filter(filters).only("entity_counts", "presidio_masking_map", "spacy_masking_map")
 
     files_with_entities = 0
     files_without_entities = 0
     total_entities_anonymized = 0
     entity_type_breakdown = {}
 
-    for record in queryset:
-        combined_map = {}
-        if record.presidio_masking_map:
-            combined_map.update(record.presidio_masking_map)
-        if record.spacy_masking_map:
-            combined_map.update(record.spacy_masking_map)
-
-        entity_counts = {}
-        for mask, original in combined_map.items():
-            entity_type = mask.split("_MASKED_")[0]
-            entity_counts[entity_type] = entity_counts.get(entity_type, 0) + 1
+    for record in queryset.iterator(chunk_size=1000):
+        entity_counts = counts_of(record)
 
         file_entity_total = sum(entity_counts.values())
         total_entities_anonymized += file_entity_total
@@ -794,15 +859,11 @@ def calculate_anonymization_insights(user):
     status_counts = runs.values("status").annotate(count=Count("id"))
     insights["anonymization_status_counts"] = list(status_counts)
 
-    # Average duration
-    durations = []
-    for run in runs:
-        if run.updated_at and run.created_at:
-            delta = (run.updated_at - run.created_at).total_seconds()
-            durations.append(delta)
-    insights["average_anonymization_time_seconds"] = sum(durations)/len(durations) if durations else 0
+    # Average duration (in the database, not per run in Python)
+    avg = runs.aggregate(avg=Avg(F("updated_at") - F("created_at")))["avg"]
+    insights["average_anonymization_time_seconds"] = avg.total_seconds() if avg else 0
 
-    # Risk levels
+    # Risk levels: every anonymization of the user's files, active or not (one GROUP BY)
     risk_counts = (
         Anonymize.objects.filter(original_file__user=user)
         .values("risk_level")
@@ -819,17 +880,14 @@ def calculate_anonymization_insights(user):
     )
     insights["top_high_risk_files"] = list(high_risk_files)
 
-    # De-anonymization count
-    deanonymize_count = (
-        DeAnonymize.objects.filter(file__user=user).count()
-    )
-    insights["deanonymization_count"] = deanonymize_count
+    # De-anonymizations: the user's running aggregate (one row)
+    insights["deanonymization_count"] = aggregate_for(user.id).deanonymization_count
 
     return insights
 
 
 
-# Reuse one heavy service (spaCy + Presidio) per worker
+# Reuse one service per worker (models themselves live in nlp_registry)
 @lru_cache(maxsize=1)
 def get_shared_anonymization_service():
     return AnonymizationService()
@@ -855,6 +913,7 @@ def list_supported_entities_runtime():
 
         # Presidio
         data["presidio"] = sorted(set(svc.analyzer.get_supported_entities()))
+        data["meta"]["memory"] = get_model_registry().memory_report()
     except Exception as e:
         logger.warning(f"[entities] Introspection failed: {e}")
 
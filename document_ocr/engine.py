@@ -0,0 +1,303 @@
+"""
+document_ocr.engine
+~~~~~~~~~~~~~~~~~~~
+
+Page-parallel OCR engine used by the "Advanced-ocr" mode.
+
+    PDF ─▶ PyMuPDF pixmap (in memory) ─▶ tesseract stdin→stdout ─▶ page PDF bytes
+          └──────────── one page per pool worker, N = available cores ─────────┘
+
+• Pages are rasterised with PyMuPDF straight to PNG bytes – no ImageMagick
+  pass and no PNG files next to the source document.
+• Each page is OCR'd independently on a bounded pool. Outside Celery this is
+  a process pool (render + tesseract per worker, each process with its own
+  MuPDF context). Inside a prefork Celery child (daemonic, cannot fork) it
+  is a thread pool, and MuPDF is not thread-safe even with one document per
+  thread: pages are rendered serially in the calling thread and only the
+  cache lookup + tesseract subprocess runs on the threads – tesseract is
+  where the time goes, so pages still use every core.
+• Per-page outputs (searchable PDF, optionally hOCR) come back as bytes and
+  are assembled in page order into the output PDF in one save.
+• Page results go through core.ocr_cache, keyed by the rendered image, so a
+  page recognised before – in any file – is not OCR'd again.
+• The "Basic-ocr" mode (`ocrmypdf_pdf`) shares that cache: pages are
+  rendered once for their keys, ocrmypdf runs only over the misses
+  (`--pages`), its output is stored page by page, and hits are spliced in.
+
+`python manage.py ocr_benchmark <pdf>` reports pages/sec for basic and
+advanced modes.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import re
+import subprocess
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import repeat
+from typing import Callable, Iterable, List, Optional
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+from core import blobstore
+from core import ocr_cache
+from core.ocr_cache import cached_page, page_key
+
+logger = logging.getLogger(__name__)
+
+OCR_WORKERS = getattr(settings, "OCR_WORKERS", 0)      # 0 → available cores
+OCR_DPI = getattr(settings, "OCR_DPI", 300)
+OCR_LANG = getattr(settings, "OCR_LANG", "eng")
+OCRMYPDF_ARGS = ("--optimize", "1", "--force-ocr", "--rotate-pages")
+
+
+@dataclass(frozen=True)
+class OCROptions:
+    dpi: int = OCR_DPI
+    lang: str = OCR_LANG
+    oem: int = 1
+    psm: int = 3
+    hocr: bool = False
+
+
+@dataclass
+class PageResult:
+    index: int
+    pdf: bytes
+    hocr: Optional[str] = None
+    seconds: float = 0.0
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# ───────────────────────────── Per-page work ────────────────────────────────
+_local = threading.local()
+
+
+def _open(path: str):
+    """
+    Documents stay open for the length of one `recognize` – per pool process,
+    or in the calling thread, the only thread that ever renders; pool
+    processes drop theirs when the pool shuts down, the calling thread in
+    `close_documents`.
+    """
+    docs = getattr(_local, "docs", None)
+    if docs is None:
+        docs = _local.docs = {}
+    doc = docs.get(path)
+    if doc is None:
+        doc = docs[path] = fitz.open(path)
+    return doc
+
+
+def close_documents() -> None:
+    """Close the documents this thread has open."""
+    for doc in getattr(_local, "docs", {}).values():
+        doc.close()
+    _local.docs = {}
+
+
+def page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def render_page(path: str, index: int, dpi: int = OCR_DPI) -> bytes:
+    """Rasterise one page to grayscale PNG bytes."""
+    pix = _open(path).load_page(index).get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return pix.tobytes("png")
+
+
+def tesseract(image: bytes, options: OCROptions, fmt: str = "pdf") -> bytes:
+    cmd = [
+        "tesseract", "stdin", "stdout",
+        "-l", options.lang,
+        "--oem", str(options.oem),
+        "--psm", str(options.psm),
+        "--dpi", str(options.dpi),
+        fmt,
+    ]
+    return subprocess.run(cmd, input=image, capture_output=True, check=True).stdout
+
+
+def _cache_options(options: OCROptions, fmt: str) -> dict:
+    return {"engine": "tesseract", "dpi": options.dpi, "lang": options.lang, "oem": options.oem, "psm": options.psm, "fmt": fmt}
+
+
+def ocr_image(image: bytes, index: int, options: OCROptions) -> PageResult:
+    """OCR one rendered page – served from the page cache when seen before. No fitz: safe on threads."""
+    t0 = time.perf_counter()
+    pdf = cached_page(image, "pdf", _cache_options(options, "pdf"), lambda: tesseract(image, options, "pdf"))
+    hocr = None
+    if options.hocr:
+        hocr = cached_page(
+            image, "hocr", _cache_options(options, "hocr"), lambda: tesseract(image, options, "hocr")
+        ).decode("utf-8")
+    return PageResult(index=index, pdf=pdf, hocr=hocr, seconds=time.perf_counter() - t0)
+
+
+def ocr_page(path: str, index: int, options: OCROptions) -> PageResult:
+    """Render one page and OCR it (serial runs and process-pool workers)."""
+    t0 = time.perf_counter()
+    result = ocr_image(render_page(path, index, options.dpi), index, options)
+    result.seconds = time.perf_counter() - t0
+    return result
+
+
+# ───────────────────────────── Assembly ─────────────────────────────────────
+def assemble_pdf(results: Iterable[PageResult], output_path: str, source: Optional[str] = None) -> str:
+    """
+    OCR'd pages in order. With `source`, every page of the source document is
+    written and pages without a result are copied through unchanged.
+    """
+    by_index = {r.index: r for r in results}
+    out = fitz.open()
+    src = fitz.open(source) if source else None
+    indexes = range(src.page_count) if src else sorted(by_index)
+    for i in indexes:
+        if i in by_index:
+            with fitz.open("pdf", by_index[i].pdf) as page_doc:
+                out.insert_pdf(page_doc)
+        else:
+            out.insert_pdf(src, from_page=i, to_page=i)
+    with blobstore.replacing(output_path) as tmp:
+        out.save(tmp, garbage=3, deflate=True)
+    out.close()
+    if src:
+        src.close()
+    return output_path
+
+
+# ───────────────────────────── Basic mode (ocrmypdf) ────────────────────────
+def ocrmypdf_pdf(path: str, output_path: str, pages: Optional[Iterable[int]] = None) -> str:
+    """
+    ocrmypdf over `pages` (0-based; default all) of `path`, through the page
+    cache: ocrmypdf runs once over the pages it has not seen, hits are copied
+    in from the cache. Other pages pass through.
+    """
+    options = {"engine": "ocrmypdf", "args": OCRMYPDF_ARGS, "dpi": OCR_DPI, "fmt": "pdf"}
+    try:
+        indexes = sorted(set(range(page_count(path)) if pages is None else pages))
+        keys = {i: page_key(render_page(path, i, OCR_DPI), options) for i in indexes}
+    finally:
+        close_documents()
+    hits = {i: data for i, key in keys.items() if (data := ocr_cache.get(key, "pdf")) is not None}
+    misses = [i for i in indexes if i not in hits]
+
+    if misses:
+        subprocess.run(
+            ["ocrmypdf", *OCRMYPDF_ARGS, "--pages", ",".join(str(i + 1) for i in misses), path, output_path],
+            capture_output=True, text=True, check=True,
+        )
+        with fitz.open(output_path) as done:
+            for i in misses:
+                with fitz.open() as page_doc:
+                    page_doc.insert_pdf(done, from_page=i, to_page=i)
+                    ocr_cache.put(keys[i], "pdf", page_doc.tobytes(garbage=3, deflate=True))
+    logger.info(f"🔎 ocrmypdf on {len(misses)} pages, {len(hits)} from the page cache: {os.path.basename(path)}")
+
+    base = output_path if misses else path
+    with fitz.open(base) as doc:
+        for i, data in sorted(hits.items()):
+            with fitz.open("pdf", data) as page_doc:
+                doc.insert_pdf(page_doc, start_at=i)
+            doc.delete_page(i + 1)
+        with blobstore.replacing(output_path) as tmp:
+            doc.save(tmp, garbage=3, deflate=True)
+    return output_path
+
+
+_HOCR_BODY = re.compile(r"<body>(.*)</body>", re.S)
+
+
+def assemble_hocr(results: Iterable[PageResult]) -> str:
+    """One hOCR document: the first page's head, every page's body in order."""
+    pages = [r.hocr for r in sorted(results, key=lambda r: r.index) if r.hocr]
+    if not pages:
+        return ""
+    bodies = [m.group(1) if (m := _HOCR_BODY.search(p)) else p for p in pages]
+    head = pages[0].split("<body>", 1)[0]
+    return f"{head}<body>{''.join(bodies)}</body>\n</html>\n"
+
+
+# ───────────────────────────── Engine ───────────────────────────────────────
+class PageOCREngine:
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        options: Optional[OCROptions] = None,
+        page_fn: Callable[[str, int, OCROptions], PageResult] = ocr_page,
+        render_fn: Callable[[str, int, int], bytes] = render_page,
+        image_fn: Callable[[bytes, int, OCROptions], PageResult] = ocr_image,
+    ):
+        self.workers = workers or OCR_WORKERS or available_cores()
+        self.options = options or OCROptions()
+        self.page_fn = page_fn      # top-level callable (pickled to pool workers)
+        self.render_fn = render_fn  # thread mode: calling thread only
+        self.image_fn = image_fn    # thread mode: on the pool
+
+    def _recognize_on_threads(self, path: str, indexes: List[int], workers: int) -> List[PageResult]:
+        """
+        Prefork Celery child: render here, in page order, and OCR on threads.
+        At most 2 × workers rendered pages wait in memory.
+        """
+        results, pending = [], deque()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for i in indexes:
+                if len(pending) >= 2 * workers:
+                    results.append(pending.popleft().result())
+                image = self.render_fn(path, i, self.options.dpi)
+                pending.append(pool.submit(self.image_fn, image, i, self.options))
+            results.extend(f.result() for f in pending)
+        return results
+
+    def recognize(self, path: str, pages: Optional[Iterable[int]] = None) -> List[PageResult]:
+        indexes = list(range(page_count(path)) if pages is None else pages)
+        workers = max(1, min(self.workers, len(indexes)))
+        t0 = time.perf_counter()
+        try:
+            if workers == 1:
+                results = [self.page_fn(path, i, self.options) for i in indexes]
+            elif multiprocessing.current_process().daemon:
+                results = self._recognize_on_threads(path, indexes, workers)
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = list(pool.map(self.page_fn, repeat(path), indexes, repeat(self.options)))
+        finally:
+            close_documents()   # serial and thread-mode runs render in this (long-lived) thread
+        elapsed = time.perf_counter() - t0
+        logger.info(
+            f"🔍 OCR'd {len(indexes)} pages of {os.path.basename(path)} in {elapsed:.1f}s "
+            f"({len(indexes) / elapsed if elapsed else 0:.2f} pages/s, {workers} workers)"
+        )
+        return results
+
+    def ocr_pdf(
+        self,
+        path: str,
+        output_path: str,
+        hocr_path: Optional[str] = None,
+        pages: Optional[Iterable[int]] = None,
+    ) -> str:
+        """
+        OCR `path` into a searchable PDF at `output_path` – every page, or only
+        `pages` (0-based) with the others copied through.
+        """
+        results = self.recognize(path, pages)
+        assemble_pdf(results, output_path, source=path if pages is not None else None)
+        if hocr_path and self.options.hocr:
+            with blobstore.replacing(hocr_path) as tmp, open(tmp, "w", encoding="utf-8") as fh:
+                fh.write(assemble_hocr(results))
+        return output_path
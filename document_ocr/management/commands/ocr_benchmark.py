@@ -0,0 +1,125 @@
+"""
+OCR throughput (pages/sec) of the basic (ocrmypdf) and advanced
+(page-parallel PyMuPDF + tesseract) modes on a sample PDF, or – with
+`--mode merge` – wall time and peak RSS of merging its batch parts
+(legacy PyPDF2 merge + bookmark rewrite vs. document_ocr.merge) over half
+and all of the parts, and the peak RSS of a single per-batch append step
+as the OCR batch tasks run it. The incremental peaks should stay flat as
+the document doubles; the legacy one grows with it.
+
+Usage
+-----
+
+python manage.py ocr_benchmark sample.pdf [--mode basic|advanced|both|merge] [--workers N] [--batch-pages N]
+"""
+import os
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_ocr.engine import PageOCREngine, available_cores, ocrmypdf_pdf, page_count
+from document_ocr.merge import append_part, extract_outline, finalize, merge_parts
+
+
+class Command(BaseCommand):
+    help = "Measure OCR pages/sec for basic and advanced modes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("pdf")
+        parser.add_argument("--mode", choices=["basic", "advanced", "both", "merge"], default="both")
+        parser.add_argument("--workers", type=int, default=None, help="Advanced-mode pool size (default: cores)")
+        parser.add_argument("--batch-pages", type=int, default=10, help="Merge mode: pages per part")
+
+    def handle(self, *args, **options):
+        pdf = options["pdf"]
+        if not os.path.exists(pdf):
+            raise CommandError(f"{pdf} not found")
+        pages = page_count(pdf)
+        self.stdout.write(f"📄 {os.path.basename(pdf)}: {pages} pages, {available_cores()} cores")
+
+        if options["mode"] == "merge":
+            return self._merge(pdf, pages, options["batch_pages"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            if options["mode"] in ("basic", "both"):
+                t0 = time.perf_counter()
+                ocrmypdf_pdf(pdf, os.path.join(tmp, "basic.pdf"))
+                self._report("basic", pages, time.perf_counter() - t0)
+
+            if options["mode"] in ("advanced", "both"):
+                engine = PageOCREngine(workers=options["workers"])
+                t0 = time.perf_counter()
+                engine.ocr_pdf(pdf, os.path.join(tmp, "advanced.pdf"))
+                self._report(f"advanced ({engine.workers} workers)", pages, time.perf_counter() - t0)
+
+    def _report(self, mode, pages, elapsed):
+        self.stdout.write(f"{mode:<24} {elapsed:8.1f}s  {pages / elapsed:6.2f} pages/s")
+
+    # ───── Merge step ─────
+    def _merge(self, pdf, pages, batch_pages):
+        outline = extract_outline(pdf)
+        with tempfile.TemporaryDirectory() as tmp:
+            parts = []
+            with fitz.open(pdf) as src:
+                for start in range(0, pages, batch_pages):
+                    part = fitz.open()
+                    part.insert_pdf(src, from_page=start, to_page=min(start + batch_pages, pages) - 1)
+                    path = os.path.join(tmp, f"part-{start:06d}.pdf")
+                    part.save(path)
+                    part.close()
+                    parts.append((start + 1, path))
+            self.stdout.write(f"🧩 {len(parts)} parts of {batch_pages} pages, {len(outline)} bookmarks")
+
+            half = parts[:max(1, len(parts) // 2)]
+            for name, fn in (("legacy PyPDF2", _legacy_merge), ("incremental", _incremental_merge)):
+                for subset in (half, parts):
+                    output = os.path.join(tmp, f"{name.split()[0]}-{len(subset)}.pdf")
+                    elapsed, peak_mb = _in_child(fn, subset, outline, output)
+                    self.stdout.write(f"{name:<16} {len(subset):>5} parts {elapsed:8.2f}s  peak RSS {peak_mb:8.1f} MB")
+
+            # One child per step, like one batch task per part: the worst step is the per-task peak
+            merged = os.path.join(tmp, "steps.pdf")
+            peaks = []
+            t0 = time.perf_counter()
+            for _, path in parts:
+                peaks.append(_in_child(append_part, merged, path)[1])
+            peaks.append(_in_child(finalize, merged, os.path.join(tmp, "steps-final.pdf"), outline)[1])
+            self.stdout.write(
+                f"{'per-batch append':<16} {len(parts):>5} parts {time.perf_counter() - t0:8.2f}s  "
+                f"peak RSS {max(peaks):8.1f} MB (first half {max(peaks[:len(half)]):.1f} MB)"
+            )
+
+
+def _legacy_merge(parts, outline, output_path):
+    """What merge_ocr_batches did before: PdfMerger, then a second full rewrite for bookmarks."""
+    from PyPDF2 import PdfMerger
+
+    merger = PdfMerger()
+    for _, path in parts:
+        merger.append(path)
+    with open(output_path, "wb") as fh:
+        merger.write(fh)
+    doc = fitz.open(output_path)
+    doc.set_toc(outline)
+    doc.save(output_path.replace(".pdf", "_with_bookmarks.pdf"), incremental=False)
+    doc.close()
+
+
+def _incremental_merge(parts, outline, output_path):
+    merge_parts(parts, output_path, outline=outline, delete_parts=False)
+
+
+def _in_child(fn, *args):
+    """Run `fn` in a forked child; returns (seconds, peak RSS MB of that child)."""
+    t0 = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            fn(*args)
+        finally:
+            os._exit(0)
+    _, _, usage = os.wait4(pid, 0)
+    return time.perf_counter() - t0, usage.ru_maxrss / 1024
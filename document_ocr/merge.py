@@ -0,0 +1,152 @@
+"""
+document_ocr.merge
+~~~~~~~~~~~~~~~~~~
+
+Incremental, disk-backed merge of OCR'd batch PDFs.
+
+    batch done ─▶ next in page order? ─▶ appended to <merged>.pdf (incremental save)
+    last batch ─▶ outline set (incremental save) ─▶ renamed to the output path
+
+• `append_part(merged, part)` opens the merged PDF from disk, inserts the
+  part and writes only the new objects (PDF incremental update). PyMuPDF
+  loads objects lazily, so a step holds one part plus the cross-reference
+  table – peak memory follows the largest batch, not the production.
+• document_ocr.tasks calls it from each batch task as it completes: the
+  OCRBatch rows are the queue, and every completed batch at the head of
+  it (in page order) is appended under a row lock on the OCRFile. The
+  chord callback only finalises.
+• `IncrementalMerger` does the same ordering in-process for parts given
+  in any order (`merge_parts`, the benchmark).
+• The bookmark outline travels as plain data – PyMuPDF's TOC format,
+  `[[level, title, page], ...]` with 1-based pages – so it is JSON
+  serialisable for Celery and needs no DataFrame. `finalize` sets it with
+  one more incremental save; there is no full rewrite.
+"""
+
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import shutil
+from typing import List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+from core import blobstore
+
+logger = logging.getLogger(__name__)
+
+Outline = List[list]     # [[level, title, page (1-based)], ...]
+
+
+def extract_outline(path: str) -> Outline:
+    with fitz.open(path) as doc:
+        return [list(entry[:3]) for entry in doc.get_toc(simple=True)]
+
+
+def outline_from_records(records) -> Outline:
+    """Accept the legacy DataFrame records ({"line", "bookmark", "page" 0-based}) too."""
+    out = []
+    for item in records or []:
+        if isinstance(item, dict):
+            out.append([int(item["line"]), item["bookmark"], int(item["page"]) + 1])
+        else:
+            out.append([int(item[0]), item[1], int(item[2])])
+    return out
+
+
+def clamp_outline(outline: Outline, page_count: int) -> Outline:
+    """Drop entries past the last page and keep levels valid for set_toc."""
+    clean, previous = [], 0
+    for level, title, page in outline:
+        if not 1 <= page <= page_count:
+            continue
+        level = max(1, min(level, previous + 1))
+        clean.append([level, title, page])
+        previous = level
+    return clean
+
+
+def _save_incremental(doc) -> None:
+    if doc.can_save_incrementally():
+        doc.saveIncr()
+        return
+    # repaired on open – PyMuPDF cannot append to it; this one save is a full rewrite
+    tmp = f"{doc.name}.rewrite"
+    doc.save(tmp, garbage=1, deflate=True)
+    os.replace(tmp, doc.name)
+
+
+def append_part(merged_path: str, part_path: str) -> int:
+    """Append `part_path` to the PDF at `merged_path` (created from it when missing) → pages appended."""
+    with fitz.open(part_path) as part:
+        count = part.page_count
+        if not os.path.exists(merged_path):
+            shutil.copyfile(part_path, merged_path)
+            return count
+        with fitz.open(merged_path) as doc:
+            doc.insert_pdf(part)
+            _save_incremental(doc)
+    return count
+
+
+def finalize(merged_path: str, output_path: str, outline: Optional[Outline] = None) -> str:
+    """Set the outline on the merged PDF and move it to `output_path`."""
+    if not os.path.exists(merged_path):
+        raise ValueError("No OCR parts to merge")
+    if outline:
+        with fitz.open(merged_path) as doc:
+            doc.set_toc(clamp_outline(outline, doc.page_count))
+            _save_incremental(doc)
+    with blobstore.replacing(output_path) as tmp:     # a re-run's output may be linked
+        os.replace(merged_path, tmp)
+    return output_path
+
+
+class IncrementalMerger:
+    def __init__(self, output_path: str, first_page: int = 1, delete_parts: bool = True):
+        self.output_path = output_path
+        self.merged_path = f"{output_path}.merging"
+        if os.path.exists(self.merged_path):         # left by an interrupted run
+            os.remove(self.merged_path)
+        self.delete_parts = delete_parts
+        self._next_page = first_page
+        self._pending: List[Tuple[int, str]] = []    # heap of (first_page, path)
+        self.pages = 0
+
+    def add(self, first_page: int, path: str) -> None:
+        heapq.heappush(self._pending, (first_page, path))
+        while self._pending and self._pending[0][0] == self._next_page:
+            _, ready = heapq.heappop(self._pending)
+            self._next_page += self._append(ready)
+
+    def _append(self, path: str) -> int:
+        count = append_part(self.merged_path, path)
+        if self.delete_parts:
+            os.remove(path)
+        self.pages += count
+        logger.debug(f"🔹 Appended {os.path.basename(path)} ({count} pages, {self.pages} total)")
+        return count
+
+    @property
+    def missing(self) -> Optional[int]:
+        """First page still waiting for its part, if any part is buffered behind it."""
+        return self._next_page if self._pending else None
+
+    def finish(self, outline: Optional[Outline] = None) -> str:
+        if self._pending:
+            raise ValueError(f"OCR parts missing from page {self._next_page} (buffered: {[p for p, _ in self._pending]})")
+        finalize(self.merged_path, self.output_path, outline)
+        logger.info(f"✅ Merged {self.pages} pages into {self.output_path}")
+        return self.output_path
+
+
+def merge_parts(parts, output_path: str, outline: Optional[Outline] = None, delete_parts: bool = True) -> str:
+    """Merge `(first_page, path)` parts (any order) into `output_path`."""
+    if not parts:
+        raise ValueError("No OCR parts to merge")
+    merger = IncrementalMerger(output_path, first_page=min(p for p, _ in parts), delete_parts=delete_parts)
+    for first_page, path in parts:
+        merger.add(first_page, path)
+    return merger.finish(outline)
@@ -1,24 +1,57 @@
 import os
 import logging
-import pandas as pd
-import fitz
 from celery import shared_task, chord
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils.timezone import now
 from core.models import File
-import shutil
 from docx import Document
-from document_ocr.models import OCRRun, OCRFile
+from document_ocr.models import OCRRun, OCRFile, OCRBatch
 from document_ocr.utils import OCRService, cleanup_tmp_dir
+from document_ocr.merge import append_part, extract_outline, finalize, outline_from_records
 import uuid
+from core import blobstore
 from core.utils import register_generated_file
-# from glob import glob
-import glob 
-from PyPDF2 import PdfMerger
 
 logger = logging.getLogger(__name__)
 
+
+def _merged_path(ocr_file):
+    """Where the batches of `ocr_file` accumulate, in page order, until the chord callback finalises them."""
+    return os.path.join(
+        os.path.dirname(ocr_file.original_file.filepath), "ocr", ocr_file.ocr_option.lower(), "tmp",
+        f"merged-{ocr_file.id}.pdf",
+    )
+
+
+def _append_ready_batches(ocr_file_id, start_page=None, batch_output=None):
+    """
+    Record a finished batch, then append every completed batch at the head of
+    the page order to the merged PDF. The OCRFile row lock serialises the
+    batch tasks, so each part is appended exactly once and in order.
+    """
+    done = []
+    with transaction.atomic():
+        ocr_file = OCRFile.objects.select_for_update().select_related("original_file").get(id=ocr_file_id)
+        if start_page is not None:
+            ocr_file.ocr_batches.filter(start_page=start_page).update(
+                batch_status="Completed", batch_filepath=batch_output
+            )
+        merged_path = _merged_path(ocr_file)
+        for batch in ocr_file.ocr_batches.order_by("start_page"):
+            if batch.batch_status != "Completed":
+                break
+            append_part(merged_path, batch.batch_filepath)
+            done.append(batch)
+        OCRBatch.objects.filter(id__in=[b.id for b in done]).delete()
+
+    for batch in done:
+        os.remove(batch.batch_filepath)
+    if done:
+        logger.info(f"🔹 Appended pages {done[0].start_page}-{done[-1].end_page} to {os.path.basename(merged_path)}")
+    return len(done)
+
+
 @shared_task
 def process_ocr(run_id, file_id, ocr_option="basic"):
     """
@@ -46,9 +79,8 @@ def process_ocr(run_id, file_id, ocr_option="basic"):
             ocr_file.save()
             return {"message": "File is not a PDF. OCR skipped."}
 
-        # Step 1: Extract bookmarks before processing
-        bookmarks_df = ocr_service.extract_bookmarks_to_dataframe(file_obj.filepath)
-        bookmarks_list = bookmarks_df.to_dict(orient="records")  # Convert to list for Celery serialization
+        # Step 1: Extract bookmarks before processing (plain TOC list, JSON-serialisable)
+        bookmarks_list = extract_outline(file_obj.filepath)
 
         # Step 2: Burst the PDF into page batches
         batch_files = ocr_service.burst_pdf(file_obj.filepath, ocr_option=ocr_option)
@@ -62,13 +94,23 @@ def process_ocr(run_id, file_id, ocr_option="basic"):
         output_dir = os.path.join(os.path.dirname(file_obj.filepath), "ocr", ocr_option.lower(), "tmp")
         os.makedirs(output_dir, exist_ok=True)
 
+        # The batch rows are the merge queue – each batch task appends what is ready as it finishes
+        with transaction.atomic():
+            ocr_file.ocr_batches.all().delete()
+            OCRBatch.objects.bulk_create([
+                OCRBatch(ocr_file=ocr_file, batch_filepath=batch_file, start_page=start_page, end_page=end_page)
+                for start_page, end_page, batch_file, _ in batch_files
+            ])
+        if os.path.exists(_merged_path(ocr_file)):          # left by an interrupted run
+            os.remove(_merged_path(ocr_file))
+
         # Step 3: Define OCR tasks for each batch
         ocr_tasks = [
-            ocr_pdf_page_batch.s(ocr_file.id, batch_file, start_page, end_page, ocr_option)  # Pass ocr_option
-            for start_page, end_page, batch_file in batch_files
+            ocr_pdf_page_batch.s(ocr_file.id, batch_file, start_page, end_page, ocr_option, ocr_pages)  # Pass ocr_option
+            for start_page, end_page, batch_file, ocr_pages in batch_files
         ]
 
-        # Step 4: Wait for all OCR tasks to finish before merging
+        # Step 4: Finalise the merged PDF once every batch has been appended
         workflow = chord(ocr_tasks)(merge_ocr_batches.s(ocr_file.id, bookmarks_list))  # Pass bookmarks_list
 
         return workflow
@@ -81,7 +123,7 @@ def process_ocr(run_id, file_id, ocr_option="basic"):
         return {"error": str(e)}
 
 @shared_task
-def ocr_pdf_page_batch(file_id, batch_file_path, start_page, end_page, ocr_option="basic"):
+def ocr_pdf_page_batch(file_id, batch_file_path, start_page, end_page, ocr_option="basic", ocr_pages=None):
     """OCR task for a batch of pages in a PDF."""
     try:
         # Ensure the file exists
@@ -93,11 +135,15 @@ def ocr_pdf_page_batch(file_id, batch_file_path, start_page, end_page, ocr_optio
         ocr_service = OCRService()
 
         # Apply OCR to the batch file
-        ocr_file = ocr_service.apply_ocr(file_id, batch_file_path, ocr_option)  # Pass ocr_option
-        return {"start_page": start_page, "end_page": end_page, "ocr_file": ocr_file}
+        ocr_file = ocr_service.apply_ocr(file_id, batch_file_path, ocr_option, ocr_pages)  # Pass ocr_option
+
+        # Append this batch (and any completed batches waiting behind it) to the merged PDF now
+        appended = _append_ready_batches(file_id, start_page, ocr_file)
+        return {"start_page": start_page, "end_page": end_page, "ocr_file": ocr_file, "appended": appended}
 
     except Exception as e:
         logger.error(f"❌ OCR processing failed: {str(e)}")
+        OCRBatch.objects.filter(ocr_file_id=file_id, start_page=start_page).update(batch_status="Failed")
         return {"error": str(e), "batch_file_path": batch_file_path}
 
 
@@ -105,7 +151,7 @@ def ocr_pdf_page_batch(file_id, batch_file_path, start_page, end_page, ocr_optio
 
 @shared_task
 def merge_ocr_batches(results, ocr_file_id, bookmarks_list):
-    """Merges all OCR'ed PDF batches and reattaches bookmarks."""
+    """Finalises the merged PDF the batch tasks built: appends any leftovers and reattaches bookmarks."""
     file_entry = get_object_or_404(OCRFile, id=ocr_file_id)
 
     # Ensure the OCR option is passed correctly
@@ -116,165 +162,57 @@ def merge_ocr_batches(results, ocr_file_id, bookmarks_list):
         return {"error": "OCR option missing"}
 
     ocr_service = OCRService()
-
-    # Locate the tmp directory where the batch PDFs are stored
     ocr_dir = os.path.join(os.path.dirname(file_entry.original_file.filepath), "ocr", file_entry.ocr_option.lower(), "tmp")
-    logger.info(f"🔍 Searching for OCR tmp directory: {ocr_dir}"
-                )
-    if not os.path.exists(ocr_dir):
-        if "basic-ocr" in ocr_dir:
-            ocr_dir = ocr_dir.replace("basic-ocr", "advanced-ocr")
-            
-            logger.info(f"🔄 Updated OCR tmp directory to: {ocr_dir}")
-            
-            # There is a folder inside the ocr_dir that needs to be removed. i.e delete os.path.join(ocr_dir, "ocr")
-            
-            tmp_ocr_dir = os.path.join(os.path.dirname(file_entry.original_file.filepath), "ocr", file_entry.ocr_option.lower(), "ocr")
-            tmp_ocr_dir = tmp_ocr_dir.replace("basic-ocr", "advanced-ocr")
-            
-            if os.path.exists(tmp_ocr_dir):
-                # Remove the tmp_ocr_dir
-                shutil.rmtree(tmp_ocr_dir)
-                logger.info(f"🔄 Removed OCR folder inside tmp directory: {tmp_ocr_dir}")
-                
-        else:
-            logger.error(f"❌ OCR tmp directory not found: {ocr_dir}.")
-             
-    
-    # Find all PDF files under the OCR tmp directory (recursively)
-    pdf_files = glob.glob(os.path.join(ocr_dir, '*.pdf'))
-
-    # Ensure there are files to merge
-    if not pdf_files:
-        logger.error(f"❌ No OCR batches found to merge in {ocr_dir}.")
+
+    # The chord results say where each batch's output is – no directory globbing
+    failed = [r for r in results if not r or r.get("error") or not r.get("ocr_file")]
+    if failed or not results:
+        logger.error(f"❌ {len(failed)} OCR batches failed for OCRFile {ocr_file_id}: {failed[:3]}")
         file_entry.status = "Failed"
         file_entry.save()
-        return {"error": "No OCR batches found"}
-
-    logger.info(f"🔄 Found {len(pdf_files)} PDFs to merge.")
+        return {"error": "OCR batches failed", "failed_batches": failed}
 
-    # Merge PDFs using PdfMerger
     final_pdf_dir = os.path.join(os.path.dirname(file_entry.original_file.filepath), "ocr", file_entry.ocr_option.lower(), "final")
-    if "advanced-ocr" in ocr_dir:
-        final_pdf_dir = final_pdf_dir.replace("basic-ocr", "advanced-ocr")
-        
-    logger.info(f"🔄 Final PDF directory: {final_pdf_dir}")
-    
     os.makedirs(final_pdf_dir, exist_ok=True)
+    final_pdf_path = os.path.join(final_pdf_dir, f"ocr-{uuid.uuid4()}.pdf")
 
+    logger.info(f"🔄 Finalising {len(results)} OCR batches into {final_pdf_path}")
     try:
-        final_pdf_path = os.path.join(final_pdf_dir, f"ocr-{uuid.uuid4()}.pdf")
-        try:
-            merger = PdfMerger()
-            for pdf in pdf_files:
-                logger.info(f"🔹 Adding {pdf} to the merger.")
-                merger.append(pdf)
-
-            # Write the merged PDF to the final output path
-            with open(final_pdf_path, "wb") as output_file:
-                merger.write(output_file)
-
-            logger.info(f"✅ Merged PDF saved to: {final_pdf_path}")
-        except Exception as e:
-            logger.error(f"❌ Error during merging PDFs: {e}")
-            file_entry.status = "Failed"
-            file_entry.save()
-            return {"error": f"Error merging PDFs: {e}"}
-
-        # Register the OCR'ed PDF
-        upload_run = file_entry.original_file.run
-        registered = register_generated_file(
-            file_path=final_pdf_path,
-            user=file_entry.original_file.user,
-            run=upload_run,
-            project_id=file_entry.original_file.project_id,
-            service_id=file_entry.original_file.service_id,
-            folder_name="ocr"
-        )
-
-        # Reattach bookmarks
-        pdf_document = fitz.open(final_pdf_path)
-        total_pages = pdf_document.page_count
-        pdf_document.close()
-
-        bookmarks_df = pd.DataFrame(bookmarks_list)
-
-        try:
-            final_pdf_with_bookmarks = ocr_service.reattach_bookmarks_from_dataframe(final_pdf_path, bookmarks_df, 1, total_pages)
-        except Exception as e:
-            logger.error(f"❌ Failed to reattach bookmarks: {e}")
-            final_pdf_with_bookmarks = final_pdf_path
-
-
-        # Register the final PDF with bookmarks
-        registered_pdf = register_generated_file(
-            file_path=final_pdf_with_bookmarks,  # Use the file with bookmarks
-            user=file_entry.original_file.user,
-            run=file_entry.original_file.run,
-            project_id=file_entry.original_file.project_id,
-            service_id=file_entry.original_file.service_id,
-            folder_name="ocr"
-        )
-
-        # Update the database record
-        with transaction.atomic():
-            file_entry.ocr_filepath = final_pdf_path
-            file_entry.status = "Processed"
-            file_entry.updated_at = now()
-            file_entry.save()
+        _append_ready_batches(ocr_file_id)
+        pending = list(file_entry.ocr_batches.values_list("start_page", flat=True))
+        if pending:
+            raise ValueError(f"OCR batches not appended (first pages: {pending})")
+        finalize(_merged_path(file_entry), final_pdf_path, outline_from_records(bookmarks_list))
+    except Exception as e:
+        logger.error(f"❌ Error during merging PDFs: {e}")
+        file_entry.status = "Failed"
+        file_entry.save()
+        return {"error": f"Error merging PDFs: {e}"}
 
-        # Cleanup temporary files
-        ocr_service.cleanup_tmp_dir(ocr_dir)
+    # Register the OCR'ed PDF (bookmarks included)
+    registered = register_generated_file(
+        file_path=final_pdf_path,
+        user=file_entry.original_file.user,
+        run=file_entry.original_file.run,
+        project_id=file_entry.original_file.project_id,
+        service_id=file_entry.original_file.service_id,
+        folder_name="ocr"
+    )
 
-        # Trigger DOCX conversion
-        process_pdf_to_docx.delay(file_entry.id, final_pdf_path)
+    # Update the database record
+    with transaction.atomic():
+        file_entry.ocr_filepath = final_pdf_path
+        file_entry.status = "Processed"
+        file_entry.updated_at = now()
+        file_entry.save()
 
-        logger.info(f"✅ OCR processing completed and saved: {final_pdf_path}")
+    # Cleanup temporary files
+    ocr_service.cleanup_tmp_dir(ocr_dir)
 
-    # If we enter the except block, this part of the code will handle the final file detection in Advanced-ocr case
-    except Exception as e:
-        logger.error(f"❌ Advanced OCR processing failed, attempting to detect final file: {e}")
-
-        try:
-            # Get the last final file found (i.e. final_merged_ocr_file.pdf) and re-attach bookmarks
-            final_pdf_dir = os.path.join(os.path.dirname(file_entry.original_file.filepath), "ocr", file_entry.ocr_option.lower(), "final")
-            files_in_final = glob.glob(os.path.join(final_pdf_dir, "*final_merged_ocr_file.pdf"))
-
-            if files_in_final:
-                final_pdf_with_bookmarks = files_in_final[0]
-                logger.info(f"✅ Found final PDF at: {final_pdf_with_bookmarks}")
-
-                # Register the final file
-                registered_pdf = register_generated_file(
-                    file_path=final_pdf_with_bookmarks,
-                    user=file_entry.original_file.user,
-                    run=file_entry.original_file.run,
-                    project_id=file_entry.original_file.project_id,
-                    service_id=file_entry.original_file.service_id,
-                    folder_name="ocr"
-                )
-
-                # Update the database record
-                with transaction.atomic():
-                    file_entry.ocr_filepath = final_pdf_with_bookmarks
-                    file_entry.status = "Processed"
-                    file_entry.updated_at = now()
-                    file_entry.save()
-
-                logger.info(f"✅ Advanced OCR processed and saved: {final_pdf_with_bookmarks}")
-
-                # Cleanup temporary files
-                ocr_service.cleanup_tmp_dir(ocr_dir)
-                return {"status": "Completed", "ocr_merged_pdf": final_pdf_with_bookmarks}
-            else:
-                raise FileNotFoundError("Final OCR PDF not found in the 'final' folder.")
-
-        except Exception as e:
-            logger.error(f"❌ Advanced OCR failed to detect final file: {e}")
-            file_entry.status = "Failed"
-            file_entry.save()
-            return {"error": "Advanced OCR final file not found or error occurred."}
+    # Trigger DOCX conversion
+    process_pdf_to_docx.delay(file_entry.id, final_pdf_path)
 
+    logger.info(f"✅ OCR processing completed and saved: {final_pdf_path}")
 
     return {
         "ocr_run_id": str(file_entry.run.id),
@@ -373,7 +311,8 @@ def generate_raw_docx(ocr_file_id):
                 run.italic = False
                 run.underline = False
 
-    raw_doc.save(raw_docx_path)
+    with blobstore.replacing(raw_docx_path) as tmp:
+        raw_doc.save(tmp)
 
     # Register file
     registered = register_generated_file(
@@ -0,0 +1,303 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from document_ocr.engine import PageOCREngine, PageResult, assemble_hocr
+
+def _fake_ocr_page(path, index, options):
+    return PageResult(index=index, pdf=f"%PDF page {index}".encode(), hocr=f"<body><div>p{index}</div></body>")
+
+
+def _fake_render(path, index, dpi):
+    return f"png {index}".encode()
+
+
+class PageOCREngineTests(SimpleTestCase):
+    def test_pages_come_back_in_order_from_the_pool(self):
+        engine = PageOCREngine(workers=4, page_fn=_fake_ocr_page)
+        results = engine.recognize("doc.pdf", pages=range(12))
+        self.assertEqual([r.index for r in results], list(range(12)))
+
+    def test_daemonic_celery_child_renders_only_in_the_calling_thread(self):
+        render_threads, ocr_threads = set(), set()
+
+        def render(path, index, dpi):
+            render_threads.add(threading.get_ident())
+            return _fake_render(path, index, dpi)
+
+        def ocr(image, index, options):
+            ocr_threads.add(threading.get_ident())
+            return PageResult(index=index, pdf=image)
+
+        engine = PageOCREngine(workers=3, page_fn=None, render_fn=render, image_fn=ocr)
+        with mock.patch("document_ocr.engine.multiprocessing.current_process") as proc:
+            proc.return_value.daemon = True
+            results = engine.recognize("doc.pdf", pages=range(6))
+        self.assertEqual([r.pdf for r in results], [f"png {i}".encode() for i in range(6)])
+        self.assertEqual(render_threads, {threading.get_ident()})      # MuPDF is never touched by the pool
+        self.assertNotIn(threading.get_ident(), ocr_threads)
+
+    def test_hocr_pages_are_merged_into_one_document(self):
+        head = "<html><head><title>x</title></head>"
+        results = [
+            PageResult(index=1, pdf=b"", hocr=f"{head}<body><div class='ocr_page'>two</div></body></html>"),
+            PageResult(index=0, pdf=b"", hocr=f"{head}<body><div class='ocr_page'>one</div></body></html>"),
+        ]
+        merged = assemble_hocr(results)
+        self.assertEqual(merged.count("<body>"), 1)
+        self.assertLess(merged.index("one"), merged.index("two"))
+
+    def test_pages_run_concurrently_on_every_worker(self):
+        workers = 6
+        barrier = threading.Barrier(workers, timeout=10)   # passes only if 6 pages are in flight at once
+
+        def ocr(image, index, options):
+            barrier.wait()
+            return PageResult(index=index, pdf=b"")
+
+        engine = PageOCREngine(workers=workers, render_fn=_fake_render, image_fn=ocr)
+        with mock.patch("document_ocr.engine.multiprocessing.current_process") as proc:
+            proc.return_value.daemon = True
+            results = engine.recognize("doc.pdf", pages=range(workers * 4))
+        self.assertEqual([r.index for r in results], list(range(workers * 4)))
+
+    def test_single_worker_run_closes_its_documents(self):
+        from document_ocr import engine as ocr_engine
+
+        def page(path, index, options):
+            ocr_engine._open(path)
+            return PageResult(index=index, pdf=b"")
+
+        with mock.patch.object(ocr_engine.fitz, "open") as fitz_open:
+            PageOCREngine(workers=1, page_fn=page).recognize("doc.pdf", pages=[0, 1, 2])
+        fitz_open.assert_called_once_with("doc.pdf")
+        fitz_open.return_value.close.assert_called_once()
+        self.assertEqual(ocr_engine._local.docs, {})
+
+
+# ───────────────────────────── Page triage ─────────────────────────────────
+def _profiles(kinds):
+    from document_ocr.triage import PageProfile
+
+    return [PageProfile(index=i, text_chars=0, text_quality=0.0, image_coverage=1.0, kind=k) for i, k in enumerate(kinds)]
+
+
+def _makespan(costs, workers):
+    """Greedy finish time of batch costs on `workers` parallel workers."""
+    loads = [0.0] * workers
+    for cost in costs:
+        loads[loads.index(min(loads))] += cost
+    return max(loads)
+
+
+class OCRTriageTests(SimpleTestCase):
+    def test_classify_text_layers(self):
+        from document_ocr.triage import BLANK, DIGITAL, SCANNED, classify, text_quality
+
+        clause = "The Licensee shall indemnify the Licensor against all claims arising hereunder."
+        self.assertEqual(classify(len(clause), text_quality(clause), 0.0), DIGITAL)
+        self.assertEqual(classify(len(clause), text_quality(clause), 1.0), DIGITAL)   # scan with an OCR layer
+        self.assertEqual(classify(3, 1.0, 0.98), SCANNED)
+        garbage = "¤¦¨©ª«¬®¯°±²³´µ¶·¸¹º»¼½¾¿" * 4
+        self.assertEqual(classify(len(garbage), text_quality(garbage), 0.9), SCANNED)
+        self.assertEqual(classify(0, 0.0, 0.0), BLANK)
+
+    def test_batches_cover_every_page_and_list_only_ocr_pages(self):
+        from document_ocr.triage import plan_batches
+
+        kinds = ["digital"] * 30 + ["scanned"] * 10 + ["blank", "digital"] * 5 + ["scanned"] * 3
+        batches = plan_batches(_profiles(kinds), workers=4)
+        self.assertEqual(batches[0][0], 0)
+        self.assertEqual(batches[-1][1], len(kinds))
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(batches, batches[1:])))
+        ocr = [s + i for s, _, pages in batches for i in pages]
+        self.assertEqual(ocr, [i for i, k in enumerate(kinds) if k == "scanned"])
+
+    def test_mixed_bundle_ocrs_only_scanned_pages_in_balanced_batches(self):
+        from document_ocr.triage import OCR_PAGE_COST, plan_batches
+
+        # 400-page case bundle: born-digital pleadings with scanned exhibits
+        kinds = (["digital"] * 35 + ["scanned"] * 5) * 10
+        profiles = _profiles(kinds)
+        workers = 4
+
+        legacy = [10 * OCR_PAGE_COST for _ in range(0, len(kinds), 10)]     # fixed 10-page batches, --force-ocr
+        adaptive = [sum(p.cost for p in profiles[s:e]) for s, e, _ in plan_batches(profiles, workers)]
+
+        batches = plan_batches(profiles, workers)
+        self.assertEqual(sum(len(pages) for _, _, pages in batches), kinds.count("scanned"))
+        # modelled cost, not wall-clock: deterministic
+        self.assertGreater(_makespan(legacy, workers) / _makespan(adaptive, workers), 3)
+
+
+# ───────────────────────────── Batch merge ─────────────────────────────────
+class IncrementalMergerTests(SimpleTestCase):
+    def test_parts_are_appended_in_page_order_as_they_arrive(self):
+        from document_ocr.merge import IncrementalMerger
+
+        sizes = {"a.pdf": 10, "b.pdf": 10, "c.pdf": 5}
+        appended = []
+
+        def fake_append(self, path):
+            appended.append(path)
+            return sizes[path]
+
+        with mock.patch.object(IncrementalMerger, "_append", fake_append):
+            merger = IncrementalMerger("out.pdf")
+            merger.add(21, "c.pdf")                 # chord results in completion order
+            self.assertEqual(appended, [])
+            self.assertEqual(merger.missing, 1)
+            merger.add(1, "a.pdf")
+            self.assertEqual(appended, ["a.pdf"])   # c still waits for pages 11-20
+            merger.add(11, "b.pdf")
+        self.assertEqual(appended, ["a.pdf", "b.pdf", "c.pdf"])
+        self.assertIsNone(merger.missing)
+
+    def test_finish_refuses_a_gap(self):
+        from document_ocr.merge import IncrementalMerger
+
+        with mock.patch.object(IncrementalMerger, "_append", lambda self, path: 10):
+            merger = IncrementalMerger("out.pdf")
+            merger.add(11, "b.pdf")
+            with self.assertRaises(ValueError):
+                merger.finish()
+
+    def test_each_part_is_appended_to_the_merged_file_without_rewriting_it(self):
+        import os
+        import tempfile
+        import fitz
+        from document_ocr.merge import append_part, finalize
+
+        with tempfile.TemporaryDirectory() as tmp:
+            parts = []
+            for n, pages in enumerate((3, 2)):
+                doc = fitz.open()
+                for _ in range(pages):
+                    doc.new_page()
+                parts.append(os.path.join(tmp, f"part-{n}.pdf"))
+                doc.save(parts[-1])
+                doc.close()
+
+            merged = os.path.join(tmp, "merged.pdf")
+            self.assertEqual(append_part(merged, parts[0]), 3)
+            with open(merged, "rb") as fh:
+                before = fh.read()
+            self.assertEqual(append_part(merged, parts[1]), 2)
+            with open(merged, "rb") as fh:
+                self.assertTrue(fh.read().startswith(before))    # incremental update, earlier bytes untouched
+
+            output = finalize(merged, os.path.join(tmp, "out.pdf"), [[1, "Second part", 4]])
+            self.assertFalse(os.path.exists(merged))
+            with fitz.open(output) as doc:
+                self.assertEqual(doc.page_count, 5)
+                self.assertEqual(doc.get_toc(), [[1, "Second part", 4]])
+
+    def test_outline_is_plain_data(self):
+        import json
+        from document_ocr.merge import clamp_outline, outline_from_records
+
+        legacy = [{"line": 1, "bookmark": "Exhibit A", "page": 0}, {"line": 2, "bookmark": "Schedule 1", "page": 4}]
+        outline = outline_from_records(legacy)
+        self.assertEqual(outline, [[1, "Exhibit A", 1], [2, "Schedule 1", 5]])
+        self.assertEqual(json.loads(json.dumps(outline)), outline)
+        # entries past the merged document's end are dropped, levels stay valid
+        self.assertEqual(clamp_outline([[2, "x", 1], [1, "y", 3], [1, "z", 99]], 5), [[1, "x", 1], [1, "y", 3]])
+
+
+# ───────────────────────────── Page OCR cache ──────────────────────────────
+class OCRPageCacheTests(SimpleTestCase):
+    def setUp(self):
+        import tempfile
+        from django.core.cache import cache
+
+        self.tmp = tempfile.TemporaryDirectory()
+        patcher = mock.patch("core.ocr_cache.OCR_PAGE_CACHE_DIR", self.tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+        cache.delete_many([f"ocrpage:{o}:{k}" for k in ("pdf", "hocr", "txt") for o in ("hit", "miss")])
+
+    def test_same_page_in_another_file_is_served_from_cache(self):
+        from core.ocr_cache import cached_page, ocr_cache_stats
+
+        options = {"engine": "tesseract", "dpi": 300, "fmt": "pdf"}
+        calls = []
+
+        def ocr(image):
+            calls.append(image)
+            return b"%PDF " + image
+
+        exhibit, cover = b"\x89PNG exhibit-page", b"\x89PNG cover-page"
+        bundle_a = [cover, exhibit]
+        bundle_b = [exhibit, exhibit, cover]          # clone / re-upload / shared exhibit
+
+        first = [cached_page(img, "pdf", options, lambda img=img: ocr(img)) for img in bundle_a]
+        second = [cached_page(img, "pdf", options, lambda img=img: ocr(img)) for img in bundle_b]
+
+        self.assertEqual(calls, bundle_a)               # nothing in bundle B was OCR'd
+        self.assertEqual(second, [first[1], first[1], first[0]])
+        self.assertEqual(ocr_cache_stats()["pdf"], {"hits": 3, "misses": 2, "hit_rate": 0.6})
+
+    def test_sweep_expires_unused_entries_then_evicts_least_recently_used(self):
+        import os
+        from core import ocr_cache
+
+        stale, old, recent = (f"\x89PNG {n}".encode() for n in ("stale", "old", "recent"))
+        for image in (stale, old, recent):
+            ocr_cache.cached_page(image, "pdf", {}, lambda: b"x" * 100)
+        paths = {image: ocr_cache._entry_path(ocr_cache.page_key(image, {}), "pdf") for image in (stale, old, recent)}
+        now = time.time()
+        os.utime(paths[stale], (now - 40 * 86400,) * 2)
+        os.utime(paths[old], (now - 3600,) * 2)
+        os.utime(paths[recent], (now - 7200,) * 2)
+        crashed = os.path.join(os.path.dirname(paths[old]), "crashed.tmp")
+        open(crashed, "wb").close()
+        os.utime(crashed, (now - 2 * 3600,) * 2)
+        # a hit makes "recent" the most recently used entry again
+        ocr_cache.cached_page(recent, "pdf", {}, lambda: self.fail("served from cache"))
+
+        result = ocr_cache.sweep(max_age_days=30, max_bytes=150)
+
+        self.assertEqual((result["expired"], result["evicted"], result["kept_bytes"]), (2, 1, 100))
+        self.assertEqual([image for image, p in paths.items() if os.path.exists(p)], [recent])
+        self.assertFalse(os.path.exists(crashed))
+
+    def test_basic_mode_runs_ocrmypdf_only_on_pages_it_has_not_seen(self):
+        import os
+        import shutil
+        import fitz
+        from document_ocr import engine
+
+        def make(path, labels):
+            doc = fitz.open()
+            for label in labels:
+                doc.new_page(width=200, height=200).insert_text((20, 100), label)
+            doc.save(path)
+            doc.close()
+
+        def fake_ocrmypdf(cmd, **kwargs):
+            runs.append(cmd[cmd.index("--pages") + 1])
+            shutil.copyfile(cmd[-2], cmd[-1])
+
+        runs = []
+        tmp = self.tmp.name
+        make(os.path.join(tmp, "a.pdf"), ["cover", "exhibit"])
+        make(os.path.join(tmp, "b.pdf"), ["exhibit", "schedule", "cover"])
+        with mock.patch("document_ocr.engine.subprocess.run", side_effect=fake_ocrmypdf):
+            engine.ocrmypdf_pdf(os.path.join(tmp, "a.pdf"), os.path.join(tmp, "a-ocr.pdf"))
+            engine.ocrmypdf_pdf(os.path.join(tmp, "b.pdf"), os.path.join(tmp, "b-ocr.pdf"))
+
+        self.assertEqual(runs, ["1,2", "2"])            # only "schedule" was new in b.pdf
+        with fitz.open(os.path.join(tmp, "b-ocr.pdf")) as doc:
+            self.assertEqual([p.get_text().strip() for p in doc], ["exhibit", "schedule", "cover"])
+
+    def test_options_are_part_of_the_key_and_failures_are_not_cached(self):
+        from core.ocr_cache import cached_page, cached_page_text
+
+        image = b"\x89PNG page"
+        cached_page(image, "pdf", {"dpi": 300}, lambda: b"300")
+        self.assertEqual(cached_page(image, "pdf", {"dpi": 150}, lambda: b"150"), b"150")
+        self.assertEqual(cached_page_text(image, {"dpi": 96}, lambda: ""), "")
+        self.assertEqual(cached_page_text(image, {"dpi": 96}, lambda: "recognised"), "recognised")
@@ -0,0 +1,118 @@
+"""
+document_ocr.triage
+~~~~~~~~~~~~~~~~~~~
+
+Per-page pre-pass that decides which pages need OCR, and work-sized batches.
+
+• Each page is profiled with PyMuPDF: characters in its text layer, whether
+  that text looks like real text (not a broken or garbage layer), and how
+  much of the page is covered by images.
+• Born-digital pages (and scans that already carry a good OCR layer) are
+  passed through untouched; blank pages too. Only pages without usable text
+  go to OCR – `ocrmypdf --pages` / `PageOCREngine(pages=...)`.
+• Batches are contiguous page runs sized by estimated work rather than a
+  fixed 10 pages: the total work is spread over OCR_PARALLEL_BATCHES workers
+  (×2 so stragglers even out), capped at OCR_MAX_BATCH_PAGES pages.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import List, Sequence, Tuple
+
+import fitz  # PyMuPDF
+from django.conf import settings
+
+OCR_MIN_TEXT_CHARS = getattr(settings, "OCR_MIN_TEXT_CHARS", 50)
+OCR_MIN_TEXT_QUALITY = getattr(settings, "OCR_MIN_TEXT_QUALITY", 0.6)
+OCR_PARALLEL_BATCHES = getattr(settings, "OCR_PARALLEL_BATCHES", 4)
+OCR_MAX_BATCH_PAGES = getattr(settings, "OCR_MAX_BATCH_PAGES", 50)
+
+# Relative cost of a page: OCR vs. copying a page through
+OCR_PAGE_COST = 1.0
+PASSTHROUGH_PAGE_COST = 0.02
+
+DIGITAL, SCANNED, BLANK = "digital", "scanned", "blank"
+
+
+@dataclass(frozen=True)
+class PageProfile:
+    index: int
+    text_chars: int
+    text_quality: float
+    image_coverage: float
+    kind: str
+
+    @property
+    def needs_ocr(self) -> bool:
+        return self.kind == SCANNED
+
+    @property
+    def cost(self) -> float:
+        return OCR_PAGE_COST if self.needs_ocr else PASSTHROUGH_PAGE_COST
+
+
+def text_quality(text: str) -> float:
+    """Share of letters, digits, whitespace and common punctuation (garbage layers score low)."""
+    if not text:
+        return 0.0
+    good = sum(1 for ch in text if ch.isalnum() or ch.isspace() or ch in ".,;:!?'\"()-/%&$€£§")
+    return good / len(text)
+
+
+def classify(text_chars: int, quality: float, image_coverage: float) -> str:
+    if text_chars >= OCR_MIN_TEXT_CHARS and quality >= OCR_MIN_TEXT_QUALITY:
+        return DIGITAL
+    if text_chars == 0 and image_coverage == 0:
+        return BLANK
+    return SCANNED
+
+
+def profile_page(page) -> PageProfile:
+    text = page.get_text("text").strip()
+    area = abs(page.rect) or 1.0
+    covered = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+    coverage = min(1.0, covered / area)
+    quality = text_quality(text)
+    return PageProfile(
+        index=page.number,
+        text_chars=len(text),
+        text_quality=round(quality, 3),
+        image_coverage=round(coverage, 3),
+        kind=classify(len(text), quality, coverage),
+    )
+
+
+def profile_pdf(path: str) -> List[PageProfile]:
+    with fitz.open(path) as doc:
+        return [profile_page(page) for page in doc]
+
+
+def plan_batches(
+    profiles: Sequence[PageProfile],
+    workers: int = OCR_PARALLEL_BATCHES,
+    max_pages: int = OCR_MAX_BATCH_PAGES,
+) -> List[Tuple[int, int, List[int]]]:
+    """
+    Contiguous batches as (start, end, ocr_pages): 0-based `start`, exclusive
+    `end`, and the batch-relative indexes of the pages that need OCR.
+    """
+    if not profiles:
+        return []
+    total = sum(p.cost for p in profiles)
+    target = max(OCR_PAGE_COST, total / (max(1, workers) * 2))
+
+    batches = []
+    start, weight = 0, 0.0
+    for i, profile in enumerate(profiles):
+        weight += profile.cost
+        if weight >= target or i + 1 - start >= max_pages:
+            batches.append((start, i + 1))
+            start, weight = i + 1, 0.0
+    if start < len(profiles):
+        batches.append((start, len(profiles)))
+
+    return [
+        (s, e, [i - s for i in range(s, e) if profiles[i].needs_ocr])
+        for s, e in batches
+    ]
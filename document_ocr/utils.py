@@ -4,18 +4,19 @@ import logging
 import shutil
 import uuid
 import hashlib
-import fitz  # PyMuPDF
-import pandas as pd
 from datetime import datetime
-from PyPDF2 import PdfReader, PdfWriter, PdfMerger
+from PyPDF2 import PdfReader, PdfWriter
 from django.conf import settings
 from django.utils.timezone import now
 from django.db import transaction
 from django.shortcuts import get_object_or_404
 from docx import Document
+from core import blobstore
 from core.models import File
 from document_ocr.models import OCRFile, OCRRun
-import glob
+from document_ocr.engine import PageOCREngine, ocrmypdf_pdf, page_count
+from document_ocr.merge import extract_outline, merge_parts
+from document_ocr.triage import OCR_PARALLEL_BATCHES, plan_batches, profile_pdf
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -76,19 +77,36 @@ class OCRService:
                 hash_md5.update(chunk)
         return hash_md5.hexdigest()
 
-    def burst_pdf(self, file_path, batch_size=10, ocr_option="Basic-ocr"):
-        """Splits a PDF into smaller batches for OCR processing."""
+    def burst_pdf(self, file_path, batch_size=None, ocr_option="Basic-ocr", workers=None):
+        """
+        Splits a PDF into batches for OCR processing.
+
+        Returns (first_page, last_page, batch_path, ocr_pages) per batch – pages
+        1-based and inclusive, `ocr_pages` the batch-relative indexes that need
+        OCR (None = all). Without `batch_size`, pages are triaged first and
+        batches sized by estimated work (see document_ocr.triage).
+        """
         pdf_reader = PdfReader(file_path)
         total_pages = len(pdf_reader.pages)
 
+        if batch_size:
+            plan = [(s, min(s + batch_size, total_pages), None) for s in range(0, total_pages, batch_size)]
+        else:
+            profiles = profile_pdf(file_path)
+            plan = plan_batches(profiles, workers or OCR_PARALLEL_BATCHES)
+            needed = sum(1 for p in profiles if p.needs_ocr)
+            logger.info(
+                f"🔍 Triage {os.path.basename(file_path)}: {needed}/{total_pages} pages need OCR, "
+                f"{len(plan)} batches"
+            )
+
         # Ensure tmp_dir is under ocr/{ocr_option}/tmp/
         ocr_dir = os.path.join(os.path.dirname(file_path), "ocr", ocr_option.lower())  # Corrected path for OCR option
         tmp_dir = os.path.join(ocr_dir, "tmp")  # Ensure tmp is under the OCR option directory
         os.makedirs(tmp_dir, exist_ok=True)
 
         burst_files = []
-        for start_page in range(0, total_pages, batch_size):
-            end_page = min(start_page + batch_size, total_pages)
+        for start_page, end_page, ocr_pages in plan:
             pdf_writer = PdfWriter()
 
             for page in range(start_page, end_page):
@@ -98,13 +116,17 @@ class OCRService:
             with open(burst_filepath, "wb") as batch_file:
                 pdf_writer.write(batch_file)
 
-            burst_files.append((start_page + 1, end_page, burst_filepath))
+            burst_files.append((start_page + 1, end_page, burst_filepath, ocr_pages))
 
         return burst_files
 
 
-    def apply_ocr(self, file_id, file_path, ocr_option="Basic-ocr"):
-        """Applies OCR to a given PDF file and saves the OCRed file."""
+    def apply_ocr(self, file_id, file_path, ocr_option="Basic-ocr", ocr_pages=None):
+        """
+        Applies OCR to a given PDF file and saves the OCRed file.
+        `ocr_pages` (0-based) limits OCR to those pages; the rest pass through
+        untouched, and an empty list copies the file without running OCR.
+        """
         if not file_path or not self.is_pdf(file_path):
             logger.info(f"🔹 Skipping OCR: File {file_path} is not a PDF.")
             return None
@@ -118,46 +140,22 @@ class OCRService:
         ocr_output_path = os.path.join(tmp_dir, f"ocr-{uuid.uuid4()}.pdf")  # Save OCR output directly in tmp/
 
         try:
+            if ocr_pages is not None and not ocr_pages:
+                # Born-digital batch: nothing to recognise
+                shutil.copyfile(file_path, ocr_output_path)
+                logger.info(f"⏭️ Skipping OCR for {file_path}: all pages have a text layer")
+                return ocr_output_path
+
             logger.info(f"🔄 Applying OCR to {file_path}")
 
             if ocr_option.lower() == "basic-ocr":
-                cmd = [
-                    "ocrmypdf",
-                    "--optimize", "1",
-                    "--force-ocr",
-                    "--rotate-pages",
-                    file_path,
-                    ocr_output_path
-                ]
-                process = subprocess.run(cmd, capture_output=True, text=True)
+                # Basic OCR: ocrmypdf, run only on pages the page cache has not seen
+                ocrmypdf_pdf(file_path, ocr_output_path, pages=ocr_pages)
 
             elif ocr_option.lower() == "advanced-ocr":
-                # Advanced OCR using Tesseract via ImageMagick and PyPDF2
-                output_image_pattern = file_path.replace('.pdf', '_page_%d.png')
-                cmd_convert = [
-                    'magick',
-                    '-density', '300',  # High DPI for better OCR accuracy
-                    file_path,
-                    output_image_pattern
-                ]
-                subprocess.run(cmd_convert, check=True)
-
-                ocr_output_files = []
-                for image_file in sorted(glob.glob(output_image_pattern.replace('%d', '*'))):
-                    ocr_output_pdf = image_file.replace('.png', '.pdf')
-                    cmd_ocr = [
-                        'tesseract',
-                        image_file,
-                        ocr_output_pdf.replace('.pdf', ''),
-                        '--oem', '1',
-                        '--psm', '3',
-                        'pdf'
-                    ]
-                    subprocess.run(cmd_ocr, check=True)
-                    ocr_output_files.append(ocr_output_pdf)
-
-                if ocr_output_files:
-                    self.merge_pdf(ocr_output_files, ocr_output_path, ocr_option)
+                # Advanced OCR: in-memory PyMuPDF rasterisation, pages fanned out
+                # to a pool (one tesseract per core), assembled in page order
+                PageOCREngine().ocr_pdf(file_path, ocr_output_path, pages=ocr_pages)
 
             else:
                 raise ValueError("Invalid OCR option provided.")
@@ -171,111 +169,26 @@ class OCRService:
 
 
 
-    def merge_pdf(self, ocr_output_files, output_path, ocr_option):
-        """Merges all PDFs found under the ocr/{ocr_option} directory into a single file."""
+    def merge_pdf(self, ocr_output_files, output_path, ocr_option=None, outline=None):
+        """
+        Merges OCR'd PDFs (in the order given) into `output_path` in one write,
+        optionally with a bookmark outline (see document_ocr.merge).
+        """
+        if not ocr_output_files:
+            logger.error(f"❌ No OCR batches given to merge into {output_path}.")
+            return None
         try:
-            # Ensure the OCR directories exist
-            ocr_dir = os.path.join(os.path.dirname(output_path), "ocr", ocr_option.lower())  # Define base OCR directory
-            os.makedirs(ocr_dir, exist_ok=True)
-
-            # If files were passed explicitly, use them; otherwise, search the OCR directory for PDF files
-            if not ocr_output_files:
-                # Find all PDF files under the OCR directory (recursively)
-                ocr_files = glob.glob(os.path.join(ocr_dir, '**', '*.pdf'), recursive=True)
-                if not ocr_files:
-                    logger.error(f"❌ No OCR batches found to merge in {ocr_dir}.")
-                    return None
-                ocr_output_files = ocr_files
-
-            logger.info(f"🔄 Found {len(ocr_output_files)} PDFs to merge.")
-
-            # Merge PDFs using PdfMerger
-            merger = PdfMerger()
+            parts, first_page = [], 1
             for pdf in ocr_output_files:
-                logger.info(f"🔹 Adding {pdf} to the merger.")
-                merger.append(pdf)
-
-            # Write the merged PDF to the final output path
-            with open(output_path, "wb") as output_file:
-                merger.write(output_file)
-
-            logger.info(f"✅ Merged PDF saved to: {output_path}")
-
-            # Move the merged file to the desired location (above the tmp directory)
-            final_pdf_dir = os.path.join(ocr_dir, "final")
-            os.makedirs(final_pdf_dir, exist_ok=True)
-            final_pdf_path = os.path.join(final_pdf_dir, "final_merged_ocr_file.pdf")
-            shutil.move(output_path, final_pdf_path)
-
-            logger.info(f"✅ Final merged PDF moved to: {final_pdf_path}")
-
-            # Clean up the temporary files (everything under tmp/)
-            tmp_dir = os.path.join(ocr_dir, "tmp")
-
-            try:
-                # Clean up the temporary files (everything under tmp/)
-                shutil.rmtree(tmp_dir)
-                logger.info(f"✅ Removed temp directory: {tmp_dir}")
-            except Exception as e:
-                # If tmp directory doesn't exist, handle final merged file logic for nested tmp directories
-                logger.error(f"Error during temp directory cleanup: {e}")
-
-                # Handle cleanup for Advanced-OCR with nested tmp directories
-                # Dynamically find and remove nested tmp directories
-                if ocr_option.lower() == "advanced-ocr":
-                    # Find nested tmp directories
-                    nested_tmp_dirs = glob.glob(os.path.join(ocr_dir, '**', 'tmp'), recursive=True)
-                    for nested_tmp in nested_tmp_dirs:
-                        if os.path.exists(nested_tmp):
-                            shutil.rmtree(nested_tmp)
-                            logger.info(f"✅ Removed nested temp directory: {nested_tmp}")
-                        else:
-                            logger.warning(f"❌ Could not trace directory: {nested_tmp}")
-
-            # Handle cleanup for final merged file and tmp dir logic
-            final_dir = os.path.join(ocr_dir, "final")
-            final_position_of_merged_file = final_dir.rsplit('/tmp', 1)[0]
-            dir_to_delete = os.path.join(final_position_of_merged_file, "tmp")
-
-            if os.path.exists(final_dir):
-                final_merged_file = os.path.join(final_dir, "final_merged_ocr_file.pdf")
-
-                if os.path.exists(final_merged_file):
-                    logger.info(f"✅ Final merged file found: {final_merged_file}")
-
-                    # Ensure final destination exists
-                    if not os.path.exists(final_position_of_merged_file):
-                        os.makedirs(final_position_of_merged_file)
-                        logger.info(f"✅ Created directory: {final_position_of_merged_file}")
-
-                    # Move the final merged file
-                    shutil.move(final_merged_file, final_position_of_merged_file)
-                    logger.info(f"✅ Moved final merged file to: {final_position_of_merged_file}")
-
-                    # Remove the tmp directory
-                    if os.path.exists(dir_to_delete):
-                        shutil.rmtree(dir_to_delete)
-                        logger.info(f"✅ Removed temp directory: {dir_to_delete}")
-                    else:
-                        logger.warning(f"❌ Could not trace directory: {dir_to_delete}")
-                else:
-                    logger.warning(f"❌ Final merged file not found in: {final_dir}")
-
-                return final_merged_file
-            else:
-                logger.warning(f"❌ Final directory not found: {final_dir}")
-                return final_pdf_path
-
-            return final_pdf_path
-
+                parts.append((first_page, pdf))
+                first_page += page_count(pdf)
+            return merge_parts(parts, output_path, outline=outline, delete_parts=False)
         except Exception as e:
             logger.error(f"❌ Error during PDF merging: {str(e)}")
             return None
 
 
 
-
-
     '''
     def merge_pdf(self, ocr_output_files, output_path, ocr_option):
         """Merges all PDFs found under the ocr/{ocr_option} directory into a single file."""
@@ -406,7 +319,7 @@ class OCRService:
             result_asset = pdf_services_response.get_result().get_asset()
             stream_asset = pdf_services.get_content(result_asset)
 
-            with open(output_path, "wb") as docx_file:
+            with blobstore.replacing(output_path) as tmp, open(tmp, "wb") as docx_file:
                 docx_file.write(stream_asset.get_input_stream())
 
             return output_path
@@ -425,49 +338,9 @@ class OCRService:
             logger.error(f"❌ Raw DOCX conversion failed: {e.stderr.decode()}")
             return None
 
-    def extract_bookmarks_to_dataframe(self, input_pdf):
-        """
-        Extract bookmarks from the input PDF and store them in a pandas DataFrame.
-        """
-        bookmarks = []
-        pdf_document = fitz.open(input_pdf)
-        outlines = pdf_document.get_toc()
-
-        for outline in outlines:
-            level, title, page_num = outline
-            bookmarks.append({"bookmark": title, "line": level, "page": page_num - 1})
-
-        df_bookmarks = pd.DataFrame(bookmarks)
-        pdf_document.close()
-        return df_bookmarks
-
-
-    def reattach_bookmarks_from_dataframe(self, final_ocr_pdf, df_bookmarks, start_page, end_page):
-        """
-        Reattaches bookmarks to the extracted pages using the pandas DataFrame.
-        """
-        pdf_document = fitz.open(final_ocr_pdf)
-        toc = []  # This will hold the new Table of Contents (TOC) items
-
-        # Iterate over the bookmarks and add them back if they are within the page range
-        for _, row in df_bookmarks.iterrows():
-            if start_page <= row['page'] < end_page:
-                # Adjust the page number for the new document
-                adjusted_page_num = row['page'] - (start_page) + 1
-                # Append the bookmark to the new TOC list
-                toc.append([row['line'], row['bookmark'], adjusted_page_num])
-                logger.info(f"Reattached Bookmark: '{row['bookmark']}' on New Page: {adjusted_page_num}")
-
-        # Set the TOC back to the new document
-        pdf_document.set_toc(toc)
-
-        # Save the updated PDF without incremental saving (overwrite the original file)
-        final_ocr_pdf_with_bookmarks = final_ocr_pdf.replace(".pdf", "_with_bookmarks.pdf")
-        pdf_document.save(final_ocr_pdf_with_bookmarks, incremental=False)
-        pdf_document.close()
-        logger.info(f"✅ Final PDF with bookmarks saved to {final_ocr_pdf_with_bookmarks}")
-
-        return final_ocr_pdf_with_bookmarks
+    def extract_bookmarks(self, input_pdf):
+        """Bookmark outline as plain data: [[level, title, page (1-based)], ...]."""
+        return extract_outline(input_pdf)
 
 
     def cleanup_tmp_dir(self, ocr_dir):
@@ -0,0 +1,103 @@
+"""
+document_operations.access_cache
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Cached, versioned "which files can this user read" sets.
+
+Every search resolves the caller's accessible file ids first; computing them
+means two queries materialised into Python sets. Here the result is kept in
+the shared cache (Redis) as a sorted, packed int64 array, one entry per user:
+
+    acl:ver:<user_id>  → int, bumped on every relevant change (signals.py)
+    acl:ids:<user_id>  → (version, packed ids)
+
+A cached entry is valid only while its version matches the current one, so
+invalidation is one INCR and both keys are read in a single round trip.
+Time-limited grants (`FileAccessEntry.expires_at`) cap the TTL so an entry
+never outlives the earliest grant it contains.
+"""
+
+from __future__ import annotations
+
+import logging
+from array import array
+from datetime import timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from core.models import File
+from .models import FileAccessEntry
+
+logger = logging.getLogger(__name__)
+
+ACCESS_CACHE_TTL = getattr(settings, "ACCESS_CACHE_TTL", 600)   # seconds
+
+
+def _ver_key(user_id: int) -> str:
+    return f"acl:ver:{user_id}"
+
+
+def _ids_key(user_id: int) -> str:
+    return f"acl:ids:{user_id}"
+
+
+def pack_ids(ids: Iterable[int]) -> bytes:
+    return array("q", sorted(set(ids))).tobytes()
+
+
+def unpack_ids(raw: bytes) -> List[int]:
+    arr = array("q")
+    arr.frombytes(raw)
+    return arr.tolist()
+
+
+def invalidate_user_access(*user_ids: Optional[int]) -> None:
+    """Bump the access version of each user so cached sets are ignored."""
+    for user_id in {u for u in user_ids if u}:
+        key = _ver_key(user_id)
+        if not cache.add(key, 1, timeout=None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, timeout=None)
+
+
+def compute_accessible_file_ids(user) -> Tuple[List[int], Optional[timedelta]]:
+    """
+    Uncached computation: owned files plus files shared through unexpired
+    FileAccessEntry grants. Returns (ids, time until the next grant expires).
+    """
+    now = timezone.now()
+    owned = File.objects.filter(user=user).values_list("id", flat=True)
+
+    entries = FileAccessEntry.objects.filter(user=user).filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now)
+    )
+    shared = entries.values_list("file_link__file_id", flat=True)
+    next_expiry = entries.filter(expires_at__isnull=False).aggregate(m=Min("expires_at"))["m"]
+
+    ids = set(owned)
+    ids.update(fid for fid in shared if fid is not None)
+    return sorted(ids), (next_expiry - now) if next_expiry else None
+
+
+def cached_accessible_file_ids(user) -> List[int]:
+    """Sorted accessible file ids for `user`, served from cache when current."""
+    found = cache.get_many([_ver_key(user.pk), _ids_key(user.pk)])
+    version = found.get(_ver_key(user.pk), 0)
+    entry = found.get(_ids_key(user.pk))
+    if entry and entry[0] == version:
+        return unpack_ids(entry[1])
+
+    ids, until_expiry = compute_accessible_file_ids(user)
+
+    ttl = ACCESS_CACHE_TTL
+    if until_expiry is not None:
+        ttl = max(1, min(ttl, int(until_expiry.total_seconds())))
+    cache.set(_ids_key(user.pk), (version, pack_ids(ids)), timeout=ttl)
+    logger.debug("ACL cache miss for user %s: %s ids (ttl %ss)", user.pk, len(ids), ttl)
+    return ids
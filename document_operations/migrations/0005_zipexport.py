@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-16 14:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_operations', '0004_alter_filefolderlink_file'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZipExport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('link_ids', models.JSONField(default=list)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Running', 'Running'), ('Completed', 'Completed'), ('Failed', 'Failed')], db_index=True, default='Pending', max_length=20)),
+                ('files_total', models.PositiveIntegerField(default=0)),
+                ('files_done', models.PositiveIntegerField(default=0)),
+                ('files_skipped', models.PositiveIntegerField(default=0)),
+                ('zip_path', models.CharField(blank=True, max_length=1024, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zip_exports', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
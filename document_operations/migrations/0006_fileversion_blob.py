@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-16 15:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_blob_file_blob'),
+        ('document_operations', '0005_zipexport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fileversion',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='versions', to='core.blob'),
+        ),
+    ]
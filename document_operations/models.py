@@ -62,6 +62,7 @@ class FileVersion(models.Model):
     file = models.ForeignKey(File, on_delete=models.CASCADE, related_name='versions')
     version_number = models.PositiveIntegerField()
     file_path = models.TextField()  # absolute or relative path
+    blob = models.ForeignKey("core.Blob", null=True, blank=True, on_delete=models.PROTECT, related_name="versions")
     uploaded_at = models.DateTimeField(auto_now_add=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
 
@@ -187,3 +188,31 @@ class FileAccessEntry(models.Model):
         target = self.user.email if self.user else f"[Group] {self.group.name}"
         return f"{target} -> {self.file_link.file.filename} (R:{self.can_read}, W:{self.can_write})"
 
+
+
+class ZipExport(models.Model):
+    """
+    Background ZIP export of FileFolderLinks (document_operations/zipstream.py).
+    The archive is written resumably; a retried task continues where it stopped.
+    """
+    STATUS_CHOICES = [
+        ("Pending", "Pending"),
+        ("Running", "Running"),
+        ("Completed", "Completed"),
+        ("Failed", "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="zip_exports")
+    link_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="Pending", db_index=True)
+    files_total = models.PositiveIntegerField(default=0)
+    files_done = models.PositiveIntegerField(default=0)
+    files_skipped = models.PositiveIntegerField(default=0)
+    zip_path = models.CharField(max_length=1024, blank=True, null=True)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"ZipExport {self.id} - {self.status} ({self.files_done}/{self.files_total})"
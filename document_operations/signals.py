@@ -1,9 +1,11 @@
 # document_operations/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
+from core import blobstore
 from core.models import File
-from .models import EffectiveAccess, Folder
+from .access_cache import invalidate_user_access
+from .models import EffectiveAccess, FileAccessEntry, FileFolderLink, FileVersion, Folder
 
 DEFAULT_PERMISSIONS = {
     "can_download": True,
@@ -36,3 +38,85 @@ def create_effective_access_for_folder(sender, instance, created, **kwargs):
             defaults=DEFAULT_PERMISSIONS
         )
 
+
+
+# ───────────── Accessible-file-id cache invalidation (access_cache.py) ─────────────
+# Only changes that can alter "which files can user X read" bump a version;
+# routine saves (status, content, …) leave the cache alone.
+
+# post_init reads __dict__ directly: touching a deferred field (e.g. after
+# .only("id")) would cost one query per loaded row.
+
+@receiver(post_init, sender=File)
+def remember_file_owner(sender, instance, **kwargs):
+    instance._acl_user_id = instance.__dict__.get("user_id")
+    instance._blob_id = instance.__dict__.get("blob_id")
+
+
+@receiver(post_save, sender=File)
+def invalidate_access_on_file_save(sender, instance, created, update_fields=None, **kwargs):
+    previous = getattr(instance, "_acl_user_id", None)
+    if update_fields is not None and not created and not {"user", "user_id"} & set(update_fields):
+        return
+    if created or previous != instance.user_id:
+        invalidate_user_access(instance.user_id, previous)
+    instance._acl_user_id = instance.user_id
+
+
+@receiver(post_delete, sender=File)
+def invalidate_access_on_file_delete(sender, instance, **kwargs):
+    invalidate_user_access(instance.user_id)
+
+
+@receiver(post_init, sender=FileAccessEntry)
+def remember_grantee(sender, instance, **kwargs):
+    instance._acl_user_id = instance.__dict__.get("user_id")
+
+
+@receiver(post_save, sender=FileAccessEntry)
+@receiver(post_delete, sender=FileAccessEntry)
+def invalidate_access_on_grant_change(sender, instance, **kwargs):
+    # A grant moved to another user also changes what the previous grantee can read
+    invalidate_user_access(instance.user_id, getattr(instance, "_acl_user_id", None))
+    instance._acl_user_id = instance.user_id
+
+
+@receiver(post_init, sender=FileFolderLink)
+def remember_link_file(sender, instance, **kwargs):
+    instance._acl_file_id = instance.__dict__.get("file_id")
+
+
+@receiver(post_save, sender=FileFolderLink)
+def invalidate_access_on_link_retarget(sender, instance, created, **kwargs):
+    # Grants hang off the link, so pointing it at another file changes
+    # what every grantee can read.
+    if not created and getattr(instance, "_acl_file_id", None) != instance.file_id:
+        grantees = instance.access_entries.exclude(user__isnull=True).values_list("user_id", flat=True)
+        invalidate_user_access(*grantees)
+    instance._acl_file_id = instance.file_id
+
+
+# ───────────── Blob reference counts (core/blobstore.py) ─────────────
+# Rows created with bulk_create send no signals; callers acquire for those.
+
+@receiver(post_init, sender=FileVersion)
+def remember_version_blob(sender, instance, **kwargs):
+    instance._blob_id = instance.__dict__.get("blob_id")
+
+
+@receiver(post_save, sender=File)
+@receiver(post_save, sender=FileVersion)
+def count_blob_reference(sender, instance, created, **kwargs):
+    if "blob_id" not in instance.__dict__:
+        return
+    previous = None if created else getattr(instance, "_blob_id", None)
+    if instance.blob_id != previous:
+        blobstore.release(previous)
+        blobstore.acquire(instance.blob_id)
+    instance._blob_id = instance.blob_id
+
+
+@receiver(post_delete, sender=File)
+@receiver(post_delete, sender=FileVersion)
+def drop_blob_reference(sender, instance, **kwargs):
+    blobstore.release(instance.__dict__.get("blob_id"))
@@ -1,7 +1,7 @@
 # tasks.py
 from celery import shared_task
 from core.models import File
-from .models import Folder, FileVersion, FileAuditLog, FileFolderLink
+from .models import Folder, FileVersion, FileAuditLog, FileFolderLink, ZipExport
 from django.contrib.auth import get_user_model
 from django.db import models
 from .utils import (
@@ -22,8 +22,15 @@ from .utils import (
     has_file_access
 )
 
+import logging
 import os
+import time
+from datetime import timedelta
+from django.conf import settings
+from .access_cache import cached_accessible_file_ids
 from .models import FileAccessEntry
+from .zipstream import entries_for, links_for_export, write_zip
+from core import blobstore
 from django.contrib.auth.models import Group
 from django.utils import timezone
 from .models import FileFolderLink
@@ -33,6 +40,7 @@ from document_operations.utils import set_password_protection
 import secrets
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
 
 # 📁 Utility logger
 def log_permission_denied(actor, obj_type, obj_id, action):
@@ -133,6 +141,61 @@ def async_copy_file(file_id, destination_folder_id, actor_user_id=None):
 def async_zip_files(file_ids):
     return zip_files(file_ids)
 
+
+@shared_task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=3, default_retry_delay=30)
+def build_zip_export_task(self, export_id):
+    """
+    Write a ZipExport archive to MEDIA_ROOT/zips/<export_id>.zip. A retry (or a
+    redelivery after a worker crash) resumes from the last finished entry.
+    """
+    export = ZipExport.objects.select_related("user").get(id=export_id)
+    if export.status == "Completed":
+        return {"export_id": str(export.id), "zip_path": export.zip_path}
+
+    file_ids = None if export.user.is_superuser else cached_accessible_file_ids(export.user)
+    entries = entries_for(links_for_export(export.link_ids, file_ids))
+    target_dir = os.path.join(settings.MEDIA_ROOT, "zips")
+    os.makedirs(target_dir, exist_ok=True)
+    zip_path = os.path.join(target_dir, f"{export.id}.zip")
+    ZipExport.objects.filter(id=export.id).update(status="Running", files_total=len(entries), updated_at=timezone.now())
+
+    last_report = [0.0]
+
+    def on_entry(done, skipped):
+        # one UPDATE per second at most, however many small files there are
+        if time.monotonic() - last_report[0] >= 1 or done + skipped == len(entries):
+            last_report[0] = time.monotonic()
+            ZipExport.objects.filter(id=export.id).update(
+                files_done=done, files_skipped=skipped, updated_at=timezone.now()
+            )
+
+    try:
+        write_zip(entries, zip_path, on_entry=on_entry)
+    except Exception as e:
+        if self.request.retries >= self.max_retries:
+            logger.error(f"❌ ZIP export {export.id} failed: {e}")
+            ZipExport.objects.filter(id=export.id).update(status="Failed", error_message=str(e), updated_at=timezone.now())
+            raise
+        logger.warning(f"⚠️ ZIP export {export.id} interrupted, will resume: {e}")
+        raise self.retry(exc=e)
+
+    ZipExport.objects.filter(id=export.id).update(status="Completed", zip_path=zip_path, updated_at=timezone.now())
+    return {"export_id": str(export.id), "zip_path": zip_path}
+
+
+@shared_task
+def cleanup_zip_exports_task():
+    """Delete exports (and their archives) older than ZIP_EXPORT_TTL_HOURS."""
+    cutoff = timezone.now() - timedelta(hours=getattr(settings, "ZIP_EXPORT_TTL_HOURS", 24))
+    expired = ZipExport.objects.filter(created_at__lt=cutoff)
+    for export in expired:
+        path = os.path.join(settings.MEDIA_ROOT, "zips", f"{export.id}.zip")
+        for leftover in (path, f"{path}.part", f"{path}.progress.json"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    count, _ = expired.delete()
+    return {"message": "Expired ZIP exports deleted", "count": count}
+
 @shared_task
 def async_password_protect_file(file_link_id, password_hint, actor_user_id=None):
     link = FileFolderLink.objects.get(id=file_link_id)
@@ -168,6 +231,7 @@ def async_create_file_version(file_id, new_path, user_id):
         file=file,
         version_number=latest_version + 1,
         file_path=new_path,
+        blob=blobstore.adopt(new_path),
         uploaded_by=user
     )
     FileAuditLog.objects.create(file=file, user=user, action="updated", notes=f"Version {latest_version + 1} saved")
@@ -1,3 +1,292 @@
-from django.test import TestCase
+import io
+import os
+import tempfile
+import zipfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from document_operations import access_cache, zipstream
+
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class AccessibleFileIdCacheTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = SimpleNamespace(pk=7)
+
+    def _patch_compute(self, *results):
+        return mock.patch.object(access_cache, "compute_accessible_file_ids", side_effect=list(results))
+
+    def test_second_call_is_served_from_cache(self):
+        with self._patch_compute(([3, 1, 2], None)) as compute:
+            self.assertEqual(access_cache.cached_accessible_file_ids(self.user), [3, 1, 2])
+            self.assertEqual(access_cache.cached_accessible_file_ids(self.user), [1, 2, 3])
+        self.assertEqual(compute.call_count, 1)
+
+    def test_invalidation_forces_recompute(self):
+        with self._patch_compute(([1], None), ([1, 5], None)) as compute:
+            access_cache.cached_accessible_file_ids(self.user)
+            access_cache.invalidate_user_access(self.user.pk)
+            self.assertEqual(access_cache.cached_accessible_file_ids(self.user), [1, 5])
+        self.assertEqual(compute.call_count, 2)
+
+    def test_ttl_is_capped_by_next_grant_expiry(self):
+        with self._patch_compute(([1, 2], timedelta(seconds=30))), \
+                mock.patch.object(access_cache.cache, "set") as cache_set:
+            access_cache.cached_accessible_file_ids(self.user)
+        self.assertEqual(cache_set.call_args.kwargs["timeout"], 30)
+
+    def test_packing_round_trip(self):
+        ids = [2 ** 40, 5, 5, 1]
+        self.assertEqual(access_cache.unpack_ids(access_cache.pack_ids(ids)), [1, 5, 2 ** 40])
+
+
+# ───────────────────────────── ZIP export ──────────────────────────────────
+class ZipStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.entries = []
+        for name, size in [("scan.pdf", 300_000), ("notes.txt", 200_000), ("deck.pptx", 50_000)]:
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "wb") as fh:
+                fh.write((b"%PDF " if name.endswith(".pdf") else b"clause ") * (size // 6))
+            self.entries.append((name, path))
+
+    def test_stream_is_a_valid_archive_in_bounded_chunks(self):
+        chunks = list(zipstream.stream_zip(self.entries, chunk_size=64 * 1024))
+        self.assertLess(max(len(c) for c in chunks), 2 * 64 * 1024)
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), ["scan.pdf", "notes.txt", "deck.pptx"])
+            self.assertEqual(zf.getinfo("scan.pdf").compress_type, zipfile.ZIP_STORED)
+            self.assertEqual(zf.getinfo("notes.txt").compress_type, zipfile.ZIP_DEFLATED)
+            with open(self.entries[1][1], "rb") as fh:
+                self.assertEqual(zf.read("notes.txt"), fh.read())
+
+    def test_duplicate_names_and_missing_files(self):
+        link = lambda name, path: SimpleNamespace(file=SimpleNamespace(filename=name, filepath=path))   # noqa: E731
+        entries = zipstream.entries_for([link("a.txt", "/x/1"), link("A.txt", "/x/2"), link("a.txt", "/x/3")])
+        self.assertEqual([e[0] for e in entries], ["a.txt", "A (2).txt", "a (3).txt"])
+
+        data = b"".join(zipstream.stream_zip([("gone.txt", "/nonexistent/gone.txt")] + self.entries[1:2]))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertEqual(zf.namelist(), ["notes.txt"])
+
+    def test_interrupted_write_resumes_after_last_finished_entry(self):
+        zip_path = os.path.join(self.tmp.name, "export.zip")
+
+        def crashing():
+            yield from self.entries[:2]
+            raise OSError("worker lost")
+
+        with self.assertRaises(OSError):
+            zipstream.write_zip(crashing(), zip_path, chunk_size=64 * 1024)
+        self.assertEqual(len(zipstream.load_progress(zip_path)["entries"]), 2)
+
+        written = []
+        with mock.patch.object(zipstream, "_write_entry", wraps=zipstream._write_entry) as write_entry:
+            zipstream.write_zip(self.entries, zip_path, chunk_size=64 * 1024, on_entry=lambda d, s: written.append(d))
+        self.assertEqual([c.args[1] for c in write_entry.call_args_list], ["deck.pptx"])
+        self.assertEqual(written, [3])
+        self.assertFalse(os.path.exists(f"{zip_path}.part"))
+
+        with zipfile.ZipFile(zip_path) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), ["scan.pdf", "notes.txt", "deck.pptx"])
+
+    def test_large_entries_use_zip64(self):
+        with mock.patch.object(zipfile, "ZIP64_LIMIT", 100_000):
+            data = b"".join(zipstream.stream_zip(self.entries))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.getinfo("scan.pdf").file_size, os.path.getsize(self.entries[0][1]))
+            self.assertEqual(zf.getinfo("scan.pdf").extra[:2], b"\x01\x00")     # ZIP64 extended information
+
+
+# ───────────────────────────── Blob store ──────────────────────────────────
+class BlobStoreTests(SimpleTestCase):
+    def setUp(self):
+        from core import blobstore
+
+        self.blobstore = blobstore
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        root = os.path.join(self.tmp.name, "blobs")
+        blobs = mock.MagicMock()
+        blobs.objects.select_for_update.return_value = blobs.objects
+        blobs.objects.get_or_create.side_effect = lambda digest, defaults: (SimpleNamespace(digest=digest, **defaults), True)
+        no_db = mock.patch.object(blobstore.transaction, "atomic", mock.MagicMock())
+        for patch in (mock.patch.object(blobstore, "BLOB_STORE_ROOT", root), mock.patch.object(blobstore, "Blob", blobs), no_db):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _write(self, name, data):
+        path = os.path.join(self.tmp.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(data)
+        return path
+
+    def test_identical_uploads_share_one_object(self):
+        data = os.urandom(256 * 1024)
+        first, stored = self.blobstore.ingest(self._write("temp/a.pdf", data), move=True)
+        self.assertTrue(stored)
+        again, stored = self.blobstore.ingest(self._write("temp/b.pdf", data), move=True)
+        self.assertFalse(stored)
+        self.assertEqual(os.listdir(os.path.join(self.tmp.name, "temp")), [])
+
+        paths = [
+            self.blobstore.materialize(first.digest, os.path.join(self.tmp.name, "uploads", f"user{i}", "contract.pdf"))
+            for i in range(3)
+        ]
+        obj = self.blobstore.object_path(first.digest)
+        self.assertEqual({os.stat(p).st_ino for p in paths}, {os.stat(obj).st_ino})
+        self.assertEqual(os.stat(obj).st_nlink, 4)
+        self.assertEqual(os.stat(obj).st_mode & 0o777, 0o444)
+        with open(paths[2], "rb") as fh:
+            self.assertEqual(fh.read(), data)
+
+    def test_unchanged_versions_cost_no_bytes(self):
+        current = self._write("uploads/matter.docx", os.urandom(128 * 1024))
+        versions = []
+        for v in range(1, 11):
+            blob, _ = self.blobstore.ingest(current)
+            versions.append(self.blobstore.materialize(blob.digest, os.path.join(self.tmp.name, "versions", f"v{v}")))
+        self.assertEqual(len({os.stat(p).st_ino for p in versions + [current]}), 1)
+
+        # an edit replaces the path (tmp + os.replace); stored versions keep the old content
+        edited = self._write("uploads/matter.docx.tmp", b"edited")
+        os.replace(edited, current)
+        self.assertEqual(self.blobstore.adopt(current).size, 6)
+        self.assertEqual(os.path.getsize(versions[0]), 128 * 1024)
+
+    def test_gc_removes_orphans_but_keeps_linked_objects(self):
+        linked, _ = self.blobstore.ingest(self._write("a.txt", b"still linked"))
+        orphan, _ = self.blobstore.ingest(self._write("b.txt", b"orphan"), move=True)
+        for blob in (linked, orphan):
+            os.utime(self.blobstore.object_path(blob.digest), (0, 0))
+        self.blobstore.Blob.objects.filter.return_value.values_list.return_value = []
+
+        result = self.blobstore.collect_garbage(grace_hours=1)
+        self.assertEqual(result["orphans"], 1)
+        self.assertFalse(os.path.exists(self.blobstore.object_path(orphan.digest)))
+        self.assertTrue(os.path.exists(self.blobstore.object_path(linked.digest)))
+
+    def test_gc_spares_a_blob_an_upload_touched_after_the_scan(self):
+        blob, _ = self.blobstore.ingest(self._write("a.txt", b"found by an upload"), move=True)
+        os.utime(self.blobstore.object_path(blob.digest), (0, 0))
+        self.blobstore.Blob.objects.filter.return_value.values_list.return_value = [blob.digest]
+        self.blobstore.Blob.objects.filter.return_value.first.return_value = None     # re-check under the lock
+
+        result = self.blobstore.collect_garbage(grace_hours=1)
+        self.assertEqual(result["deleted"], 0)
+        self.assertTrue(os.path.exists(self.blobstore.object_path(blob.digest)))
+        self.assertIn(
+            mock.call(digest=blob.digest, ref_count__lte=0, updated_at__lt=mock.ANY),
+            self.blobstore.Blob.objects.filter.call_args_list,
+        )
+
+    def test_known_upload_content_is_never_written(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from core import utils as core_utils
+
+        data = os.urandom(300 * 1024)
+        md5, sha256 = core_utils.hash_upload(SimpleUploadedFile("a.pdf", data))
+        blob, stored = core_utils.store_upload(SimpleUploadedFile("a.pdf", data), sha256)
+        self.assertTrue(stored)
+
+        self.blobstore.Blob.objects.filter.return_value.first.return_value = blob
+        with mock.patch("builtins.open", side_effect=AssertionError("body written")):
+            again, stored = core_utils.store_upload(SimpleUploadedFile("b.pdf", data), sha256)
+        self.assertFalse(stored)
+        self.assertEqual(again.digest, sha256)
+        self.blobstore.Blob.objects.filter.return_value.update.assert_called_with(updated_at=mock.ANY)   # GC grace restarts
+
+    def test_spooled_upload_is_moved_into_the_store(self):
+        from django.core.files.uploadedfile import TemporaryUploadedFile
+        from core import utils as core_utils
+
+        upload = TemporaryUploadedFile("scan.pdf", "application/pdf", 0, None)
+        upload.write(os.urandom(200 * 1024))
+        upload.flush()
+        spooled = upload.temporary_file_path()
+        inode = os.stat(spooled).st_ino
+        self.blobstore.Blob.objects.filter.return_value.first.return_value = None
+
+        _, sha256 = core_utils.hash_upload(upload)
+        blob, stored = core_utils.store_upload(upload, sha256)
+        self.assertTrue(stored)
+        self.assertFalse(os.path.exists(spooled))
+        self.assertEqual(os.stat(self.blobstore.object_path(sha256)).st_ino, inode)
+        upload.close()
+
+
+class IngestBatchTests(SimpleTestCase):
+    def test_duplicates_are_resolved_with_one_query_per_batch(self):
+        import hashlib
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from core import ingest
+
+        own = SimpleNamespace(id=1, md5_hash=hashlib.md5(b"signed NDA").hexdigest(), blob_id=None)
+        # a clone carries no md5_hash; a declared sha256 still finds it by its blob
+        clone = SimpleNamespace(id=2, md5_hash=None, blob_id=hashlib.sha256(b"schedule").hexdigest())
+        items = [
+            ingest.IngestItem(SimpleUploadedFile("nda.pdf", b"signed NDA")),
+            ingest.IngestItem(SimpleUploadedFile("msa.pdf", b"master agreement")),
+            ingest.IngestItem(SimpleUploadedFile("msa copy.pdf", b"master agreement")),
+            ingest.IngestItem(SimpleUploadedFile("tool.exe", b"MZ")),
+            ingest.IngestItem(SimpleUploadedFile("sow.pdf", b"statement of work"), declared_sha256="0" * 64),
+            ingest.IngestItem(SimpleUploadedFile("schedule.pdf", b"schedule"), declared_sha256=clone.blob_id),
+        ]
+        with mock.patch.object(ingest, "File") as files:
+            files.objects.filter.return_value.filter.return_value.order_by.return_value = [own, clone]
+            ingest._prepare(items)
+            ingest._resolve_duplicates(items, user=SimpleNamespace(id=7))
+
+        files.objects.filter.assert_called_once()
+        self.assertIs(items[0].duplicate_of, own)
+        self.assertIsNone(items[1].duplicate_of)
+        self.assertIs(items[2].repeat_of, items[1])
+        self.assertIn("Unsupported file type", items[3].error)
+        self.assertIn("does not match", items[4].error)
+        self.assertIs(items[5].duplicate_of, clone)
+
+    def test_links_are_removed_when_the_rows_cannot_be_written(self):
+        import contextlib
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.db import DatabaseError
+        from core import ingest
+
+        items = [ingest.IngestItem(SimpleUploadedFile(f"{n}.pdf", n.encode())) for n in ("nda", "msa")]
+        ingest._prepare(items)
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch.object(ingest, "ContentType"), mock.patch.object(ingest, "Storage"), \
+                mock.patch.object(ingest, "File") as files, \
+                mock.patch.object(ingest, "store_upload", return_value=(SimpleNamespace(digest="d" * 64), True)), \
+                mock.patch.object(ingest.blobstore, "materialize", side_effect=lambda digest, path: open(path, "w").close()), \
+                mock.patch.object(ingest.transaction, "atomic", contextlib.nullcontext):
+            files.objects.bulk_create.side_effect = DatabaseError("insert failed")
+            with self.assertRaises(DatabaseError):
+                ingest._create_rows(
+                    items, user=SimpleNamespace(id=7), run=None, project_id="p", service_id="s",
+                    base_dir=tmp, prefix="", clone=False,
+                )
+            self.assertEqual(os.listdir(tmp), [])
+
+    def test_paths_in_one_batch_never_collide(self):
+        from core import ingest
+
+        with tempfile.TemporaryDirectory() as tmp:
+            taken = set()
+            open(os.path.join(tmp, "contract.pdf"), "w").close()
+            paths = [ingest._unique_path(tmp, "contract.pdf", taken) for _ in range(2)]
+        self.assertEqual([os.path.basename(p) for p in paths], ["contract_2.pdf", "contract_3.pdf"])
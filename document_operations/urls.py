@@ -5,7 +5,7 @@ from .views import (
     TrashFilesView, MoveFilesView,
     DeleteFileView, DeleteFolderView,
     DuplicateFileView, CopyFileView,
-    ZipFilesView, ProtectFileView,
+    ZipFilesView, ZipExportView, ProtectFileView,
     RestoreFileView, RestoreFolderView,
     ListFileVersionsView, RestoreFileVersionView,
     ShareFileView, UnshareFileView, SharedFilesView,
@@ -39,6 +39,7 @@ urlpatterns = [
     path("files/trash/", TrashFilesView.as_view(), name="file_bulk_trash"),
     path("files/move/", MoveFilesView.as_view(), name="file_bulk_move"),
     path("files/zip/", ZipFilesView.as_view(), name="file_zip"),
+    path("files/zip/<uuid:export_id>/", ZipExportView.as_view(), name="file_zip_export"),
 
     # 📜 FILE VERSIONING
     path("files/<int:pk>/versions/", ListFileVersionsView.as_view(), name="file_versions_list"),
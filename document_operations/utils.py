@@ -1,6 +1,4 @@
 import os
-import shutil
-import zipfile
 from django.conf import settings
 from core.models import File
 from .models import Folder, FileFolderLink, FileVersion, FileAuditLog
@@ -10,6 +8,9 @@ from django.db import transaction
 import uuid
 import secrets
 from .models import FileAccessEntry
+from .access_cache import cached_accessible_file_ids
+from .zipstream import entries_for, links_for_export, write_zip
+from core import blobstore
 from django.shortcuts import get_object_or_404
 from .models import FileAccessEntry
 from document_operations.models import FileFolderLink, Folder
@@ -148,14 +149,12 @@ def duplicate_file(file_link_id):
 
 
 def zip_files(file_link_ids):
+    """Archive the links into MEDIA_ROOT/zips, streaming each file (see zipstream.py)."""
     zip_name = f"archive_{uuid.uuid4()}.zip"
     target_dir = os.path.join(settings.MEDIA_ROOT, "zips")
     os.makedirs(target_dir, exist_ok=True)
     zip_path = os.path.join(target_dir, zip_name)
-    with zipfile.ZipFile(zip_path, 'w') as zf:
-        for link_id in file_link_ids:
-            link = FileFolderLink.objects.get(id=link_id)
-            zf.write(link.file.filepath, arcname=link.file.filename)
+    write_zip(entries_for(links_for_export(file_link_ids)), zip_path)
     return {"zip_path": zip_path, "zip_name": zip_name}
 
 
@@ -170,7 +169,12 @@ def protect_file_with_password(file_link_id, password_hint):
 def get_user_accessible_file_ids(user, min_level="read"):
     """
     Returns a list of file IDs the user has access to based on access level.
+    Read access (the search hot path) comes from the versioned per-user
+    cache in access_cache.py and skips expired grants.
     """
+    if min_level == "read":
+        return cached_accessible_file_ids(user)
+
     owned = File.objects.filter(user=user).values_list("id", flat=True)
 
     access_entries = FileAccessEntry.objects.filter(user=user)
@@ -345,17 +349,19 @@ def reassign_folder_for_files(file_link_ids, new_folder):
 
 # 📜 File Versioning
 def create_file_version(file: File, uploaded_by=None):
+    """Snapshot the current content; an unchanged file costs no extra bytes (core/blobstore.py)."""
     latest_version = file.versions.first()
     new_version = (latest_version.version_number + 1) if latest_version else 1
 
     version_path = os.path.join(settings.MEDIA_ROOT, "versions", str(file.id), f"v{new_version}")
-    os.makedirs(os.path.dirname(version_path), exist_ok=True)
-    shutil.copy(file.file.path, version_path)
+    blob, _ = blobstore.ingest(file.filepath)
+    blobstore.materialize(blob.digest, version_path)
 
     return FileVersion.objects.create(
         file=file,
         version_number=new_version,
         file_path=version_path,
+        blob=blob,
         uploaded_by=uploaded_by
     )
 
@@ -21,14 +21,12 @@ from .tasks import (
     async_delete_folder,
     async_duplicate_file,
     async_copy_file,
-    async_zip_files,
     async_password_protect_file,
     async_restore_file,
     async_restore_folder,
 )
 
 import os
-import shutil
 from document_operations.models import FileVersion
 from django.conf import settings
 from rest_framework.generics import RetrieveAPIView
@@ -42,9 +40,16 @@ from .tasks import async_grant_public_link
 from .utils import update_access_level_for_user
 from .models import FileAccessEntry
 from django.contrib.auth import get_user_model
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
 from document_operations.utils import set_password_protection
 from document_operations.models import FileAuditLog
 from rest_framework.parsers import JSONParser  # 🔁 Import this at the top
+from .access_cache import cached_accessible_file_ids
+from .models import ZipExport
+from .tasks import build_zip_export_task
+from .zipstream import entries_for, links_for_export, stream_zip
+from core import blobstore
 
 User = get_user_model()
 
@@ -218,6 +223,14 @@ class CopyFileView(APIView):
 
 
 class ZipFilesView(APIView):
+    """
+    POST /files/zip/  {"file_ids": [<link id>, ...], "async": false}
+
+    Streams the archive back as it is built. Selections over
+    ZIP_ASYNC_THRESHOLD_BYTES (or "async": true) are written in the
+    background instead: 202 with an export_id for ZipExportView.
+    Only links to files the caller can read are included.
+    """
     authentication_classes = [OAuth2Authentication]
     permission_classes = [IsAuthenticated, IsClientOrAdminOrSuperUser]
 
@@ -226,8 +239,51 @@ class ZipFilesView(APIView):
         if not file_ids:
             return Response({"error": "Missing file_ids"}, status=400)
 
-        async_zip_files.delay(file_ids)
-        return Response({"message": "Zip operation initiated."}, status=202)
+        readable = None if request.user.is_superuser else cached_accessible_file_ids(request.user)
+        links = list(links_for_export(file_ids, readable))
+        if not links:
+            return Response({"error": "No accessible files to zip."}, status=404)
+
+        total_bytes = sum(link.file.file_size or 0 for link in links)
+        threshold = getattr(settings, "ZIP_ASYNC_THRESHOLD_BYTES", 2 * 1024 ** 3)
+        if str(request.data.get("async", "")).lower() in ("1", "true") or total_bytes > threshold:
+            export = ZipExport.objects.create(user=request.user, link_ids=[str(link.id) for link in links])
+            build_zip_export_task.delay(str(export.id))
+            return Response({"message": "Zip operation initiated.", "export_id": str(export.id)}, status=202)
+
+        response = StreamingHttpResponse(stream_zip(entries_for(links)), content_type="application/zip")
+        response["Content-Disposition"] = f'attachment; filename="archive_{timezone.now():%Y%m%d_%H%M%S}.zip"'
+        return response
+
+
+class ZipExportView(APIView):
+    """
+    GET /files/zip/<export_id>/
+
+    Progress of a background ZIP export; the archive itself once completed.
+    """
+    authentication_classes = [OAuth2Authentication]
+    permission_classes = [IsAuthenticated, IsClientOrAdminOrSuperUser]
+
+    def get(self, request, export_id):
+        export = get_object_or_404(ZipExport, id=export_id)
+        if export.user_id != request.user.id and not request.user.is_superuser:
+            return Response({"error": "Permission denied."}, status=403)
+
+        if export.status == "Completed" and export.zip_path and os.path.exists(export.zip_path):
+            return FileResponse(
+                open(export.zip_path, "rb"), as_attachment=True,
+                filename=f"archive_{export.id}.zip", content_type="application/zip",
+            )
+
+        return Response({
+            "export_id": str(export.id),
+            "status": export.status,
+            "files_total": export.files_total,
+            "files_done": export.files_done,
+            "files_skipped": export.files_skipped,
+            "error_message": export.error_message,
+        })
 
 
 class ProtectFileView(APIView):
@@ -311,17 +367,18 @@ class RestoreFileVersionView(APIView):
         if not os.path.exists(version.file_path):
             return Response({"error": "Version file is missing on disk."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Create a backup of the current file (optional)
+        # Create a backup of the current file (optional); both steps are hard links (core/blobstore.py)
         backup_dir = os.path.join(settings.MEDIA_ROOT, "backups", str(file.id))
-        os.makedirs(backup_dir, exist_ok=True)
-
         backup_path = os.path.join(backup_dir, f"backup_{file.filename}")
-        if os.path.exists(file.file.path):
-            shutil.copy(file.file.path, backup_path)
 
         try:
-            # Restore the selected version (overwrite the current file)
-            shutil.copy(version.file_path, file.file.path)
+            if os.path.exists(file.filepath):
+                blobstore.materialize(blobstore.adopt(file.filepath).digest, backup_path)
+            # Restore the selected version (replaces the current file, never rewrites it in place)
+            file.blob = version.blob or blobstore.adopt(version.file_path)
+            blobstore.materialize(file.blob.digest, file.filepath)
+            file.file_size = file.blob.size
+            file.save(update_fields=["blob", "file_size", "updated_at"])
         except Exception as e:
             return Response({"error": f"Restore failed: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
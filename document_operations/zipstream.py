@@ -0,0 +1,222 @@
+"""
+document_operations.zipstream
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+ZIP archives of FileFolderLinks, streamed or written resumably.
+
+    links (one query, select_related file) ─▶ unique arcnames
+        ├─ stream_zip(entries)  → bytes chunks for StreamingHttpResponse
+        └─ write_zip(entries)   → <path>.part + progress sidecar → <path>
+
+• Files are read and emitted in ZIP_STREAM_CHUNK pieces, so memory stays
+  bounded by one chunk however large the export; the first bytes go out
+  before the second file is opened.
+• Already-compressed formats (PDF, Office OOXML, images, archives, media)
+  are STORED; everything else is DEFLATED.
+• ZIP64 is used per entry when a file is large enough to need it and for
+  the end record when the archive is (zipfile decides from the sizes).
+• `write_zip` records each finished entry (its ZipInfo and the end offset)
+  in `<path>.progress.json`. A rerun after a crash truncates the part file
+  to the last finished entry and continues from there.
+"""
+
+from __future__ import annotations
+
+import io
+import json
+import logging
+import os
+import time
+import zipfile
+from typing import Iterable, Iterator, List, Tuple
+
+from django.conf import settings
+
+from .models import FileFolderLink
+
+logger = logging.getLogger(__name__)
+
+ZIP_STREAM_CHUNK = getattr(settings, "ZIP_STREAM_CHUNK", 1024 * 1024)
+
+STORED_EXTENSIONS = {
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".mp4", ".m4a", ".mov", ".avi", ".mkv",
+}
+
+Entry = Tuple[str, str]     # (arcname, filesystem path)
+
+# ZipInfo fields the central directory is written from (see write_zip)
+_INFO_FIELDS = (
+    "date_time", "compress_type", "create_system", "create_version", "extract_version",
+    "reserved", "flag_bits", "volume", "internal_attr", "external_attr",
+    "header_offset", "CRC", "compress_size", "file_size",
+)
+
+
+def compression_for(name: str) -> int:
+    return zipfile.ZIP_STORED if os.path.splitext(name)[1].lower() in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def links_for_export(link_ids, file_ids=None):
+    """Links to archive in one query; `file_ids` restricts them to files the caller may read."""
+    links = FileFolderLink.objects.filter(id__in=link_ids).select_related("file")
+    if file_ids is not None:
+        links = links.filter(file_id__in=file_ids)
+    return links.order_by("id")
+
+
+def entries_for(links) -> List[Entry]:
+    """(arcname, path) per link; duplicate names become "name (2).ext"."""
+    entries, seen = [], set()
+    for link in links:
+        name = os.path.basename((link.file.filename or os.path.basename(link.file.filepath)).replace("\\", "/"))
+        stem, ext = os.path.splitext(name)
+        arcname, n = name, 1
+        while arcname.lower() in seen:
+            n += 1
+            arcname = f"{stem} ({n}){ext}"
+        seen.add(arcname.lower())
+        entries.append((arcname, link.file.filepath))
+    return entries
+
+
+def _zipinfo(arcname: str, path: str) -> zipfile.ZipInfo:
+    st = os.stat(path)
+    info = zipfile.ZipInfo(arcname, date_time=time.localtime(max(st.st_mtime, 315532800))[:6])   # ZIP epoch: 1980
+    info.compress_type = compression_for(arcname)
+    info.file_size = st.st_size      # lets zipfile pick ZIP64 for this entry up front
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _write_entry(zf: zipfile.ZipFile, arcname: str, path: str, chunk_size: int) -> Iterator[None]:
+    """Copy one file into the archive, yielding after every chunk."""
+    with open(path, "rb") as src:
+        info = _zipinfo(arcname, path)
+        with zf.open(info, "w") as dest:
+            while chunk := src.read(chunk_size):
+                dest.write(chunk)
+                yield
+
+
+# ───────────────────────────── Streaming ────────────────────────────────────
+class _Sink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile writes into and the generator drains."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(entries: Iterable[Entry], chunk_size: int = ZIP_STREAM_CHUNK) -> Iterator[bytes]:
+    """The archive as a sequence of byte chunks (data descriptors, no seeking)."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for arcname, path in entries:
+            if not os.path.exists(path):
+                logger.warning(f"⚠️ Skipping missing file in ZIP export: {path}")
+                continue
+            for _ in _write_entry(zf, arcname, path, chunk_size):
+                data = sink.drain()
+                if data:
+                    yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+# ───────────────────────────── Resumable file ───────────────────────────────
+def _progress_path(zip_path: str) -> str:
+    return f"{zip_path}.progress.json"
+
+
+def load_progress(zip_path: str) -> dict:
+    try:
+        with open(_progress_path(zip_path), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (FileNotFoundError, ValueError):
+        return {"offset": 0, "entries": [], "skipped": []}
+
+
+def _save_progress(zip_path: str, progress: dict) -> None:
+    tmp = f"{_progress_path(zip_path)}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(progress, fh)
+    os.replace(tmp, _progress_path(zip_path))
+
+
+def _info_to_dict(info: zipfile.ZipInfo) -> dict:
+    data = {field: getattr(info, field) for field in _INFO_FIELDS}
+    data["filename"] = info.filename
+    data["extra"] = info.extra.hex()
+    return data
+
+
+def _info_from_dict(data: dict) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(data["filename"], date_time=tuple(data["date_time"]))
+    for field in _INFO_FIELDS[1:]:
+        setattr(info, field, data[field])
+    info.extra = bytes.fromhex(data["extra"])
+    return info
+
+
+def write_zip(entries: Iterable[Entry], zip_path: str, chunk_size: int = ZIP_STREAM_CHUNK, on_entry=None) -> str:
+    """
+    Write the archive to `zip_path`, resuming a previous partial run if its
+    part file and progress sidecar exist. `on_entry(done, skipped)` is called
+    after each entry (progress reporting).
+    """
+    part = f"{zip_path}.part"
+    progress = load_progress(zip_path) if os.path.exists(part) else {"offset": 0, "entries": [], "skipped": []}
+    finished = {e["filename"] for e in progress["entries"]} | set(progress["skipped"])
+    if finished:
+        logger.info(f"🔁 Resuming {os.path.basename(zip_path)} after {len(finished)} entries")
+
+    with open(part, "r+b" if os.path.exists(part) else "wb") as fh:
+        fh.seek(progress["offset"])
+        fh.truncate()
+        with zipfile.ZipFile(fh, "w", allowZip64=True) as zf:
+            for data in progress["entries"]:
+                info = _info_from_dict(data)
+                zf.filelist.append(info)
+                zf.NameToInfo[info.filename] = info
+
+            for arcname, path in entries:
+                if arcname in finished:
+                    continue
+                if not os.path.exists(path):
+                    logger.warning(f"⚠️ Skipping missing file in ZIP export: {path}")
+                    progress["skipped"].append(arcname)
+                else:
+                    for _ in _write_entry(zf, arcname, path, chunk_size):
+                        pass
+                    fh.flush()
+                    progress["entries"].append(_info_to_dict(zf.NameToInfo[arcname]))
+                    progress["offset"] = fh.tell()
+                _save_progress(zip_path, progress)
+                if on_entry:
+                    on_entry(len(progress["entries"]), len(progress["skipped"]))
+
+    os.replace(part, zip_path)
+    os.remove(_progress_path(zip_path))
+    logger.info(f"✅ Wrote {os.path.basename(zip_path)} ({len(progress['entries'])} files)")
+    return zip_path
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DocumentSearchConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'document_search'
+
+    def ready(self):
+        import document_search.signals  # Removes Milvus rows of deleted / transferred files
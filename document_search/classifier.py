@@ -0,0 +1,218 @@
+"""
+document_search.classifier
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Zero-shot document-type classification against a fixed label set.
+
+The label descriptions are embedded ONCE per (model, label-set) version,
+L2-normalised and saved as a `.npy` matrix that every worker memory-maps.
+Classifying N documents is then a single (N × d) · (d × L) matrix multiply
+instead of re-encoding ~100 label texts per file.
+
+Public API:
+- DOCUMENT_TYPE_LABELS                        → dict[label, description]
+- get_document_classifier()                   → DocumentTypeClassifier
+- DocumentTypeClassifier.classify_vectors(X)  → list[str]
+- DocumentTypeClassifier.classify_texts(T)    → list[str]
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+from typing import List, Sequence
+
+import numpy as np
+
+from document_search.utils import MODEL_NAME, _get_model
+
+try:
+    from document_search import config
+    LABEL_CACHE_DIR = getattr(config, "LABEL_CACHE_DIR", "/tmp/document_search/labels")
+except ImportError:
+    LABEL_CACHE_DIR = "/tmp/document_search/labels"
+
+LOGGER = logging.getLogger(__name__)
+
+UNKNOWN_LABEL = "Unknown"
+
+# Expanded label set (grouped; keep strings concise)
+DOCUMENT_TYPE_LABELS = {
+    # Legal & Compliance
+    "Contract": "Legal contract between parties with terms and signatures.",
+    "Legal Agreement": "Legal obligations, rights, or terms between parties.",
+    "NDA": "Non-disclosure agreement restricting sharing confidential information.",
+    "SLA": "Service level agreement with performance standards and responsibilities.",
+    "Court Order": "Orders or judgments issued by a court.",
+    "Legal Complaint": "Formal legal complaint filed in court.",
+    "Terms and Conditions": "Rules and legal agreements for using products or services.",
+    "Privacy Policy": "Explains how personal data is collected and used.",
+    "Policy Document": "Official rules or guidelines that must be followed.",
+    "Permit": "Legal permission granted for specific activities.",
+    "License": "Authorization document granting legal permission.",
+    "Certificate": "Official document verifying a fact or achievement.",
+    "Will": "Estate distribution instructions after death.",
+    # Finance & Accounting
+    "Financial Report": "Financial results, performance, or analysis.",
+    "Income Statement": "Revenue and expenses over a period.",
+    "Balance Sheet": "Assets, liabilities, and equity snapshot.",
+    "Cash Flow Statement": "Cash inflows and outflows over a period.",
+    "Budget": "Planned income and expenses for a period.",
+    "Invoice": "Bill for payment with items and totals.",
+    "Receipt": "Acknowledgment of payment received.",
+    "Bank Statement": "Account transactions and balances.",
+    "Audit Report": "Independent financial audit opinion.",
+    "Payroll Report": "Employee wages and deductions summary.",
+    "Purchase Order": "Authorization to buy goods or services.",
+    "Bill of Lading": "Receipt of goods for shipment.",
+    "Statement of Work": "Project deliverables, scope, and responsibilities.",
+    # Business & Operations
+    "Business Proposal": "Proposes plans, services, or products to a client.",
+    "Business Plan": "Business strategies, objectives, and forecasts.",
+    "RFP Response": "Response to a request for proposal.",
+    "SOP": "Standard operating procedure with step-by-step instructions.",
+    "Project Report": "Project progress, findings, or results.",
+    "Meeting Minutes": "Discussion points and decisions from meetings.",
+    "Memo": "Formal internal communication message.",
+    "Agenda": "List of topics to be discussed in a meeting.",
+    "Checklist": "Tasks or items to complete or verify.",
+    "Schedule": "Timeline or plan with dates and times.",
+    "Log File": "System, server, or application log entries.",
+    "User Manual": "Instructions for using a product or system.",
+    "Technical Specification": "Detailed technical requirements and designs.",
+    "Runbook": "Operational procedures for incidents or maintenance.",
+    "Architecture Diagram": "System architecture documentation overview.",
+    # Sales & Marketing
+    "Press Release": "Public announcement of news or events.",
+    "Brochure": "Marketing or informational pamphlet.",
+    "Advertisement": "Promotes products, services, or events.",
+    "Price List": "Catalog of products or services with prices.",
+    "Statement of Capabilities": "Company capabilities and differentiators.",
+    # HR & Talent
+    "Resume": "Work experience and skills summary.",
+    "Cover Letter": "Letter expressing job interest accompanying a resume.",
+    "Offer Letter": "Employment offer details and terms.",
+    "Job Description": "Role responsibilities and required qualifications.",
+    "Performance Review": "Employee performance evaluation.",
+    # Medical & Insurance
+    "Medical Report": "Medical or health record details and assessments.",
+    "Prescription": "Medication or treatment directive by a clinician.",
+    "Lab Result": "Medical or laboratory test outcomes.",
+    "Patient Summary": "Patient medical history and conditions.",
+    "Insurance Claim": "Request to insurer for reimbursement.",
+    "EOB": "Explanation of benefits document from insurer.",
+    # Research & Education
+    "Research Paper": "Academic research findings and analysis.",
+    "White Paper": "Authoritative information or solution on a topic.",
+    "Case Study": "Detailed analysis of a specific example.",
+    "Thesis": "Lengthy academic dissertation.",
+    "Lecture Notes": "Notes from educational lectures.",
+    "Transcript": "Verbatim record of spoken words or courses.",
+    "Dataset Description": "Metadata and description for datasets.",
+    # IT & Security
+    "Security Policy": "Information security rules and standards.",
+    "Vulnerability Report": "Security weaknesses and remediation.",
+    "Penetration Test Report": "Results of simulated attacks and fixes.",
+    "Incident Report": "Security incident details and timeline.",
+    "Change Request": "Proposed system change and approvals.",
+    "Release Notes": "Software release changes and fixes.",
+    # Government & Public
+    "Notice": "Official information or updates to the public.",
+    "Regulatory Filing": "Submission to a regulator or exchange.",
+    # Misc
+    "FAQ": "Frequently asked questions and answers.",
+    "Summary": "Condensed version of longer content.",
+    "Newsletter": "Periodic news or updates for readers.",
+    "Unclassified": "Document type cannot be determined.",
+}
+
+
+def _normalize(mat: np.ndarray) -> np.ndarray:
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+class DocumentTypeClassifier:
+    """
+    Cosine-similarity classifier over a precomputed label matrix.
+
+    The matrix file name embeds a digest of the model name and the label
+    texts, so editing a description or switching models re-encodes once and
+    never serves a stale matrix.
+    """
+
+    def __init__(
+        self,
+        labels: dict = DOCUMENT_TYPE_LABELS,
+        model_name: str = MODEL_NAME,
+        cache_dir: str = LABEL_CACHE_DIR,
+    ) -> None:
+        self.label_names: List[str] = list(labels.keys())
+        self._label_texts: List[str] = list(labels.values())
+        self.model_name = model_name
+        self.version = hashlib.sha1(
+            json.dumps([model_name, labels], sort_keys=True).encode()
+        ).hexdigest()[:16]
+        self.cache_path = os.path.join(cache_dir, f"labels_{self.version}.npy")
+        self._matrix: np.ndarray | None = None
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """(L × d) float32, row-normalised, memory-mapped from disk."""
+        if self._matrix is None:
+            self._matrix = self._load_or_build()
+        return self._matrix
+
+    def _load_or_build(self) -> np.ndarray:
+        if os.path.exists(self.cache_path):
+            try:
+                return np.load(self.cache_path, mmap_mode="r")
+            except Exception as exc:
+                LOGGER.warning("Label matrix %s unreadable (%s); rebuilding.", self.cache_path, exc)
+
+        LOGGER.info("🏷️ Encoding %s document-type labels (version %s)…", len(self._label_texts), self.version)
+        mat = _normalize(_get_model().encode(self._label_texts, show_progress_bar=False))
+
+        # Write-then-rename so concurrent workers never read a partial file.
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            np.save(fh, mat)
+        os.replace(tmp_path, self.cache_path)
+        return np.load(self.cache_path, mmap_mode="r")
+
+    def classify_vectors(self, vectors) -> List[str]:
+        """Label for each row of an (N × d) matrix of document embeddings."""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if vectors.size == 0:
+            return []
+        scores = _normalize(vectors) @ self.matrix.T
+        return [self.label_names[i] for i in scores.argmax(axis=1)]
+
+    def classify_texts(self, texts: Sequence[str], batch_size: int = 64) -> List[str]:
+        """
+        Encode `texts` in batches and classify them in one pass. Blank texts
+        come back as UNKNOWN_LABEL without touching the model.
+        """
+        out = [UNKNOWN_LABEL] * len(texts)
+        idx = [i for i, t in enumerate(texts) if t and t.strip()]
+        if not idx:
+            return out
+
+        vectors = _get_model().encode(
+            [texts[i] for i in idx], batch_size=batch_size, show_progress_bar=False
+        )
+        for i, label in zip(idx, self.classify_vectors(vectors)):
+            out[i] = label
+        return out
+
+
+@lru_cache(maxsize=1)
+def get_document_classifier() -> DocumentTypeClassifier:
+    """Per-process classifier for the default label set and embedding model."""
+    return DocumentTypeClassifier()
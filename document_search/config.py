@@ -5,3 +5,38 @@ MILVUS_PORT = int(os.getenv("MILVUS_PORT", "19530"))
 COLLECTION_NAME = "doc_embeddings"
 PARTITION_PREFIX = "user_"
 
+
+# Partition residency (see residency.py) – keep hot tenants loaded in Milvus
+RESIDENCY_MAX_BYTES = int(os.getenv("MILVUS_RESIDENCY_MAX_BYTES", str(4 * 1024 ** 3)))
+RESIDENCY_MAX_PARTITIONS = int(os.getenv("MILVUS_RESIDENCY_MAX_PARTITIONS", "256"))
+RESIDENCY_IDLE_SECONDS = int(os.getenv("MILVUS_RESIDENCY_IDLE_SECONDS", "1800"))
+RESIDENCY_BYTES_PER_ENTITY = int(os.getenv("MILVUS_RESIDENCY_BYTES_PER_ENTITY", "4096"))
+
+# Zero-shot document-type classifier (see classifier.py)
+LABEL_CACHE_DIR = os.getenv("DOC_TYPE_LABEL_CACHE_DIR", "/tmp/document_search/labels")
+
+# Batched indexing pipeline (see pipeline.py / tasks.index_files_batch)
+INDEX_BATCH_FILES = int(os.getenv("INDEX_BATCH_FILES", "200"))
+INDEX_EXTRACT_WORKERS = int(os.getenv("INDEX_EXTRACT_WORKERS", str(os.cpu_count() or 2)))
+INDEX_EMBED_BATCH = int(os.getenv("INDEX_EMBED_BATCH", "256"))
+
+# Global chunk-embedding cache, keyed on (model, content hash)
+EMBED_CACHE_TTL = int(os.getenv("EMBED_CACHE_TTL", str(30 * 24 * 3600)))
+
+# Hybrid (BM25 + vector) search, see hybrid.py
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+
+# Tenancy: an owner who shared at least this many files with a user – and all
+# of them – is searched as a whole partition instead of by file_id list
+FULL_PARTITION_MIN_SHARED = int(os.getenv("MILVUS_FULL_PARTITION_MIN_SHARED", "50"))
+
+# Cross-encoder reranking (rerank.py): Milvus over-fetch factor, p95 latency
+# budget for the rerank stage and its depth bounds
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_OVERFETCH = int(os.getenv("RERANK_OVERFETCH", "4"))
+RERANK_BUDGET_MS = int(os.getenv("RERANK_BUDGET_MS", "300"))
+RERANK_MIN_DEPTH = int(os.getenv("RERANK_MIN_DEPTH", "10"))
+RERANK_MAX_DEPTH = int(os.getenv("RERANK_MAX_DEPTH", "200"))
+RERANK_BATCH = int(os.getenv("RERANK_BATCH", "32"))
+RERANK_CACHE_TTL = int(os.getenv("RERANK_CACHE_TTL", str(24 * 3600)))
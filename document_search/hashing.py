@@ -0,0 +1,21 @@
+"""
+document_search.hashing
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Stable content hashes for chunks and queries.
+
+Python's built-in `hash()` is salted per process (PYTHONHASHSEED), so it
+can't be stored or compared across Celery workers. `content_hash` is a
+truncated BLAKE2b digest: identical text → identical value everywhere,
+forever. It fits Milvus' INT64 `chunk_hash` field and VectorChunk.chunk_hash.
+"""
+
+from __future__ import annotations
+
+import hashlib
+
+
+def content_hash(text: str) -> int:
+    """Signed 64-bit BLAKE2b digest of `text` (UTF-8)."""
+    digest = hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
@@ -0,0 +1,221 @@
+"""
+document_search.hybrid
+~~~~~~~~~~~~~~~~~~~~~~
+
+Hybrid search: Elasticsearch BM25 (whole file) + Milvus ANN (chunks),
+fused with reciprocal-rank fusion.
+
+    score(d) = Σ_backend  weight_b / (k + rank_b(d))
+
+• Both backends are queried concurrently on a shared thread pool, so the
+  request costs max(lexical, dense) rather than their sum.
+• Tenancy is resolved ONCE: the accessible id set for ES (`_tenant_q`) and
+  the post-filter, a `TenancyScope` (partitions + shared ids) for Milvus.
+• If one backend fails the other's ranking is returned on its own.
+
+Granularity
+-----------
+"file"  – one row per file; the best dense chunk supplies the snippet.
+"chunk" – one row per dense chunk; a chunk inherits its file's BM25 rank.
+          Files only ES found are kept as file-level rows (chunk_hash=None).
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+from document_search.hashing import content_hash
+
+LOGGER = logging.getLogger(__name__)
+
+try:
+    from document_search import config
+    RRF_K = getattr(config, "HYBRID_RRF_K", 60)
+    CANDIDATES = getattr(config, "HYBRID_CANDIDATES", 50)
+except ImportError:
+    RRF_K = 60
+    CANDIDATES = 50
+
+_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-search")
+
+
+# ───────────────────────────── Fan-out ──────────────────────────────────────
+def run_concurrently(calls: Dict[str, Callable[[], Any]]) -> tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Run zero-arg callables in parallel. Returns (results, timings_ms); a
+    call that raised yields None and is logged.
+    """
+    def _timed(fn):
+        t0 = time.perf_counter()
+        try:
+            return fn(), time.perf_counter() - t0
+        except Exception as exc:
+            LOGGER.warning("Hybrid backend failed: %s", exc)
+            return None, time.perf_counter() - t0
+
+    futures = {name: _POOL.submit(_timed, fn) for name, fn in calls.items()}
+    results, timings = {}, {}
+    for name, fut in futures.items():
+        results[name], elapsed = fut.result()
+        timings[name] = int(elapsed * 1000)
+    return results, timings
+
+
+# ───────────────────────────── Fusion ───────────────────────────────────────
+def ranks(keys: Sequence[Hashable]) -> Dict[Hashable, int]:
+    """1-based rank of each key's first occurrence."""
+    out: Dict[Hashable, int] = {}
+    for key in keys:
+        if key not in out:
+            out[key] = len(out) + 1
+    return out
+
+
+def reciprocal_rank_fusion(
+    rank_maps: Dict[str, Dict[Hashable, int]],
+    k: int = RRF_K,
+    weights: Optional[Dict[str, float]] = None,
+) -> List[tuple]:
+    """[(key, score)] sorted by fused score, best first."""
+    weights = weights or {}
+    scores: Dict[Hashable, float] = {}
+    for backend, ranking in rank_maps.items():
+        w = weights.get(backend, 1.0)
+        for key, rank in ranking.items():
+            scores[key] = scores.get(key, 0.0) + w / (k + rank)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+
+
+def _snippet_md(text: str) -> str:
+    snippet = (text[:297] + "…") if len(text) > 300 else text
+    return snippet.replace("\n", "  \n")
+
+
+def fuse(
+    lexical_ids: Sequence[int],
+    dense_hits: Sequence[dict],
+    granularity: str = "file",
+    top_k: int = 10,
+    k: int = RRF_K,
+) -> List[dict]:
+    """
+    lexical_ids : file ids in BM25 order.
+    dense_hits  : [{"file_id", "chunk_text", "score"}] in ANN order.
+    """
+    lex_rank = ranks(lexical_ids)
+
+    if granularity == "chunk":
+        chunks: Dict[tuple, dict] = {}
+        for hit in dense_hits:
+            chunks.setdefault((hit["file_id"], content_hash(hit["chunk_text"])), hit)
+        dense_rank = ranks(list(chunks))
+        covered = {fid for fid, _ in chunks}
+        lexical_keys = {key: lex_rank[key[0]] for key in chunks if key[0] in lex_rank}
+        lexical_keys.update({(fid, None): r for fid, r in lex_rank.items() if fid not in covered})
+        fused = reciprocal_rank_fusion({"lexical": lexical_keys, "dense": dense_rank}, k=k)
+
+        out = []
+        for (fid, chash), score in fused[:top_k]:
+            hit = chunks.get((fid, chash))
+            out.append({
+                "file_id": fid,
+                "chunk_hash": chash,
+                "score": score,
+                "lexical_rank": lex_rank.get(fid),
+                "vector_rank": dense_rank.get((fid, chash)),
+                "vector_score": float(hit["score"]) if hit else None,
+                "snippet_md": _snippet_md(hit["chunk_text"]) if hit else "",
+            })
+        return out
+
+    best: Dict[int, dict] = {}
+    for hit in dense_hits:
+        best.setdefault(hit["file_id"], hit)
+    dense_rank = ranks(list(best))
+    fused = reciprocal_rank_fusion({"lexical": lex_rank, "dense": dense_rank}, k=k)
+
+    out = []
+    for fid, score in fused[:top_k]:
+        hit = best.get(fid)
+        out.append({
+            "file_id": fid,
+            "score": score,
+            "lexical_rank": lex_rank.get(fid),
+            "vector_rank": dense_rank.get(fid),
+            "vector_score": float(hit["score"]) if hit else None,
+            "snippet_md": _snippet_md(hit["chunk_text"]) if hit else "",
+        })
+    return out
+
+
+# ───────────────────────────── Backends ─────────────────────────────────────
+def _lexical_search(user, query: str, accessible_ids: set, size: int) -> List[int]:
+    from file_elasticsearch.utils import basic_search
+
+    res = basic_search(
+        query=query, scope="both", user=user, accessible_ids=accessible_ids,
+        size=size, with_content=False,
+    )
+    return [int(hit.meta.id) for hit in res]
+
+
+def _dense_search(query: str, scope, size: int) -> List[dict]:
+    from document_search.tasks import _dense_search as milvus_search
+    from document_search.utils import embed_text
+
+    hits = milvus_search(embed_text(query), scope, size)
+    return [
+        {
+            "file_id": int(h.entity.get("file_id")),
+            "chunk_text": h.entity.get("chunk_text", ""),
+            "score": float(h.score),
+        }
+        for h in hits
+    ]
+
+
+# ───────────────────────────── Entry point ──────────────────────────────────
+def hybrid_search(
+    user,
+    query: str,
+    top_k: int = 10,
+    granularity: str = "file",
+    accessible_ids: Optional[Sequence[int]] = None,
+    candidates: int = CANDIDATES,
+    lexical: Optional[Callable[[], List[int]]] = None,
+    dense: Optional[Callable[[], List[dict]]] = None,
+) -> dict:
+    """
+    Returns {"results": [...], "timings_ms": {"lexical", "dense", "total"}}.
+
+    `lexical` / `dense` override the backends (zero-arg callables); they
+    default to Elasticsearch and Milvus scoped to `accessible_ids`.
+    """
+    t0 = time.perf_counter()
+    if accessible_ids is None:
+        from document_operations.utils import get_user_accessible_file_ids
+        accessible_ids = get_user_accessible_file_ids(user)
+    allowed = set(accessible_ids)
+    if not query or not allowed:
+        return {"results": [], "timings_ms": {"total": 0}}
+
+    candidates = max(candidates, top_k)
+    if lexical is None:
+        lexical = partial(_lexical_search, user, query, allowed, candidates)
+    if dense is None:
+        # DB lookup stays on the request thread; workers only talk to ES / Milvus
+        from document_search.tenancy import build_scope
+        dense = partial(_dense_search, query, build_scope(user), candidates)
+
+    raw, timings = run_concurrently({"lexical": lexical, "dense": dense})
+
+    lexical_ids = [fid for fid in (raw["lexical"] or []) if fid in allowed]
+    dense_hits = [h for h in (raw["dense"] or []) if h["file_id"] in allowed]
+    results = fuse(lexical_ids, dense_hits, granularity=granularity, top_k=top_k)
+
+    timings["total"] = int((time.perf_counter() - t0) * 1000)
+    return {"results": results, "timings_ms": timings}
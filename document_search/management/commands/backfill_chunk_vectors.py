@@ -0,0 +1,76 @@
+"""
+Convert VectorChunk.embedding (JSON list) into VectorChunk.vector (float32 bytes).
+
+Rows are processed in id order, in fixed-size batches (keyset pagination),
+so the command streams through tables of any size with bounded memory and
+can be interrupted and re-run safely: converted rows are skipped.
+
+Usage
+-----
+
+python manage.py backfill_chunk_vectors
+python manage.py backfill_chunk_vectors --batch-size 5000 --keep-json
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from document_search.models import VectorChunk
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Backfill VectorChunk.vector from the legacy JSON embedding column"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--keep-json",
+            action="store_true",
+            help="Leave the JSON embedding in place (default: clear it to reclaim space).",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        keep_json = options["keep_json"]
+        fields = ["vector"] if keep_json else ["vector", "embedding"]
+
+        todo = VectorChunk.objects.filter(vector__isnull=True, embedding__isnull=False)
+        total = todo.count()
+        self.stdout.write(f"🔄  {total} chunks to convert (batch size {batch_size})")
+
+        last_id = 0
+        done = 0
+        t0 = time.perf_counter()
+        while True:
+            rows = list(
+                todo.filter(id__gt=last_id)
+                .order_by("id")
+                .only("id", "embedding")[:batch_size]
+            )
+            if not rows:
+                break
+
+            for row in rows:
+                row.vector = row.embedding
+                if not keep_json:
+                    row.embedding = None
+
+            with transaction.atomic():
+                VectorChunk.objects.bulk_update(rows, fields, batch_size=batch_size)
+
+            last_id = rows[-1].id
+            done += len(rows)
+            LOGGER.info("… %s/%s chunks converted (last id %s)", done, total, last_id)
+
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(
+            self.style.SUCCESS(f"✅  Converted {done} chunks in {elapsed:.1f}s")
+        )
+        if not keep_json and done:
+            self.stdout.write("ℹ️  Run VACUUM (FULL) on document_search_vectorchunk to return the space to the OS.")
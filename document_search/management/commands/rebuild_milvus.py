@@ -0,0 +1,50 @@
+"""
+Rebuild the Milvus collection from embeddings cached in VectorChunk.
+
+No re-extraction, no model inference: use this after losing the Milvus
+volume or to re-create the collection with a new index. Searches keep
+hitting the old collection until the alias swap at the very end.
+
+Usage
+-----
+
+# inside the web container, synchronously
+python manage.py rebuild_milvus
+
+# hand it to a Celery worker instead
+python manage.py rebuild_milvus --async
+
+# bigger cursor fetches and drop the superseded collection afterwards
+python manage.py rebuild_milvus --chunk-size 20000 --drop-old
+"""
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from document_search.tasks import REBUILD_CHUNK_SIZE, rebuild_milvus
+
+
+class Command(BaseCommand):
+    help = "Rebuild Milvus from VectorChunk (streaming, atomic alias swap)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=REBUILD_CHUNK_SIZE)
+        parser.add_argument("--drop-old", action="store_true", help="Drop the previous collection after the swap.")
+        parser.add_argument("--async", dest="run_async", action="store_true", help="Queue as a Celery task.")
+
+    def handle(self, *args, **options):
+        kwargs = {"chunk_size": options["chunk_size"], "drop_old": options["drop_old"]}
+
+        if options["run_async"]:
+            task = rebuild_milvus.delay(**kwargs)
+            self.stdout.write(self.style.SUCCESS(f"📤  Rebuild queued: task {task.id}"))
+            return
+
+        result = rebuild_milvus(**kwargs)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅  {result['rows']} rows / {result['partitions']} partitions → "
+                f"{result['collection']} in {result['seconds']}s "
+                f"(previous: {result['previous'] or 'none'})"
+            )
+        )
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-16 09:12
+
+import core.fields.vector
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_search', '0003_vectorchunk_chunk_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vectorchunk',
+            name='vector',
+            field=core.fields.vector.VectorField(dim=384, dtype='float32', help_text='Dense vector as packed little-endian float32.', null=True),
+        ),
+        migrations.AlterField(
+            model_name='vectorchunk',
+            name='embedding',
+            field=models.JSONField(blank=True, help_text='Legacy dense vector (list[float]); superseded by `vector`, emptied by `manage.py backfill_chunk_vectors`.', null=True),
+        ),
+    ]
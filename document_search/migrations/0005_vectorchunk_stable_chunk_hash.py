@@ -0,0 +1,47 @@
+# Generated by Django 5.2.3 on 2026-10-16 11:40
+
+from django.db import migrations, models
+
+from document_search.hashing import content_hash
+
+BATCH = 5000
+
+
+def backfill_chunk_hash(apps, schema_editor):
+    """Hash existing chunk_text in id-ordered batches (keyset pagination)."""
+    VectorChunk = apps.get_model("document_search", "VectorChunk")
+    last_id = 0
+    while True:
+        rows = list(
+            VectorChunk.objects.filter(id__gt=last_id)
+            .order_by("id")
+            .only("id", "chunk_text")[:BATCH]
+        )
+        if not rows:
+            break
+        for row in rows:
+            row.chunk_hash = content_hash(row.chunk_text or "")
+        VectorChunk.objects.bulk_update(rows, ["chunk_hash"], batch_size=BATCH)
+        last_id = rows[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_search', '0004_vectorchunk_vector_alter_vectorchunk_embedding'),
+    ]
+
+    operations = [
+        # Old values were SHA-256 hex (or blank for bulk-created rows) and
+        # can't be cast to bigint, so the column is recreated and refilled.
+        migrations.RemoveField(
+            model_name='vectorchunk',
+            name='chunk_hash',
+        ),
+        migrations.AddField(
+            model_name='vectorchunk',
+            name='chunk_hash',
+            field=models.BigIntegerField(db_index=True, help_text='Stable 64-bit BLAKE2b hash of chunk_text (same value as in Milvus).', null=True),
+        ),
+        migrations.RunPython(backfill_chunk_hash, migrations.RunPython.noop),
+    ]
@@ -9,8 +9,9 @@ Key Entities
 VectorChunk
     • One row per embedded text chunk.
     • Links back to core.File for permissions / billing / analytics.
-    • Stores the raw embedding so you can rebuild Milvus or move
-      to a different vector DB without re-embedding.
+    • Stores the raw embedding (float32 bytes, see core.fields.vector)
+      so you can rebuild Milvus or move to a different vector DB
+      without re-embedding.
 
 SearchQueryLog
     • Optional audit trail of user search activity.
@@ -27,7 +28,10 @@ from core.models import File
 
 from django.db.models.functions import Length
 
-import hashlib
+import numpy as np
+
+from core.fields.vector import VectorField
+from document_search.hashing import content_hash
 
 User = get_user_model()
 
@@ -38,7 +42,7 @@ class VectorChunk(models.Model):
     A single semantic chunk derived from an uploaded File.
 
     Milvus stores the actual vector for ANN search, but we keep a
-    copy of the float list here (JSON) so we can:
+    copy here (`vector`, packed float32) so we can:
       • rebuild / reseed the vector DB
       • perform local diagnostics without hitting Milvus
       • ensure deterministic re-indexing (no duplicate work)
@@ -64,7 +68,18 @@ class VectorChunk(models.Model):
         help_text="Position of chunk in original text (0-based)."
     )
     chunk_text = models.TextField()
-    embedding = models.JSONField(help_text="Dense vector (list[float])")
+    vector = VectorField(
+        dtype="float32",
+        dim=384,
+        null=True,
+        help_text="Dense vector as packed little-endian float32.",
+    )
+    embedding = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Legacy dense vector (list[float]); superseded by `vector`, "
+                  "emptied by `manage.py backfill_chunk_vectors`.",
+    )
 
     # House-keeping
     created_at = models.DateTimeField(auto_now_add=True)
@@ -77,11 +92,11 @@ class VectorChunk(models.Model):
         ]
         ordering = ["file_id", "chunk_index"]
 
-    chunk_hash = models.CharField(
-        max_length=64,
+    chunk_hash = models.BigIntegerField(
+        null=True,
         unique=False,  # not globally unique, only dedup by file/user if needed
         db_index=True,
-        help_text="SHA256 hash of chunk_text for deduplication.",
+        help_text="Stable 64-bit BLAKE2b hash of chunk_text (same value as in Milvus).",
     )
 
     # --------------------------------------------------------------------- #
@@ -90,8 +105,8 @@ class VectorChunk(models.Model):
     def save(self, *args, **kwargs):
         if not self.user_id:
             self.user_id = self.file.user_id
-        if self.chunk_text and not self.chunk_hash:
-            self.chunk_hash = hashlib.sha256(self.chunk_text.encode()).hexdigest()
+        if self.chunk_text and self.chunk_hash is None:
+            self.chunk_hash = content_hash(self.chunk_text)
         super().save(*args, **kwargs)
 
     #def save(self, *args, **kwargs):
@@ -100,6 +115,15 @@ class VectorChunk(models.Model):
     #        self.user_id = self.file.user_id
     #    super().save(*args, **kwargs)
 
+    @property
+    def embedding_array(self) -> np.ndarray | None:
+        """Embedding as float32 array, whichever column currently holds it."""
+        if self.vector is not None:
+            return self.vector
+        if self.embedding is not None:
+            return np.asarray(self.embedding, dtype=np.float32)
+        return None
+
     @property
     def partition_name(self) -> str:
         """
@@ -0,0 +1,251 @@
+"""
+document_search.pipeline
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Streaming multi-file indexing: extract → chunk → embed → persist.
+
+    extract (process pool) ─▶ [queue] ─▶ chunk + embed (cross-file batches)
+                                              └─▶ [queue] ─▶ persist (per batch)
+
+• Extraction is CPU/IO heavy (unstructured, PyMuPDF) → runs on a pool.
+• Chunks from many files are embedded together in large batches, so the
+  model call overhead is paid per batch, not per file.
+• The persist stage gets whole groups of files, so Django and Milvus see
+  one bulk write (and one flush per partition) per group.
+• Queues are bounded: a slow stage blocks the upstream ones instead of
+  letting extracted text pile up in memory.
+
+The stage callables are injected, so this module has no Django / model
+dependencies of its own; see `document_search.tasks.index_files_batch`.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class IndexJob:
+    file_id: int
+    user_id: int
+    filename: str
+    path: str
+    md5: Optional[str] = None       # lets extract() hit core.extraction without re-hashing the file
+    text: str = ""
+    chunks: List[str] = field(default_factory=list)
+    vectors: List[List[float]] = field(default_factory=list)
+    doc_vector: Optional[List[float]] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class PipelineStats:
+    files: int = 0
+    chunks: int = 0
+    embed_calls: int = 0
+    persist_calls: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    @property
+    def files_per_sec(self) -> float:
+        return self.files / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "files": self.files,
+            "chunks": self.chunks,
+            "embed_calls": self.embed_calls,
+            "persist_calls": self.persist_calls,
+            "errors": self.errors,
+            "seconds": round(self.seconds, 3),
+            "files_per_sec": round(self.files_per_sec, 2),
+        }
+
+
+def _make_executor(workers: int, use_processes: bool):
+    # Celery prefork children are daemonic and may not fork their own pool.
+    if use_processes and not multiprocessing.current_process().daemon:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+class IndexingPipeline:
+    """
+    Parameters
+    ----------
+    extract         : (path, md5) → text (must be picklable for the process pool).
+    chunk           : text → list[str]
+    embed           : list[str] → list[vector]; called once per embed batch.
+    persist         : list[IndexJob] → None; called once per persist batch.
+    extract_workers : size of the extraction pool.
+    embed_batch     : target number of texts per embed() call.
+    persist_batch   : files handed to persist() at once.
+    queue_size      : capacity of the inter-stage queues (in files).
+    classify        : also embed the whole-document text (doc_vector) in
+                      the same batch, for document-type classification.
+    """
+
+    def __init__(
+        self,
+        extract: Callable[[str, Optional[str]], str],
+        chunk: Callable[[str], List[str]],
+        embed: Callable[[List[str]], List[List[float]]],
+        persist: Callable[[List[IndexJob]], None],
+        extract_workers: int = 4,
+        embed_batch: int = 256,
+        persist_batch: int = 50,
+        queue_size: int = 32,
+        classify: bool = True,
+        use_processes: bool = True,
+    ) -> None:
+        self.extract = extract
+        self.chunk = chunk
+        self.embed = embed
+        self.persist = persist
+        self.extract_workers = max(1, extract_workers)
+        self.embed_batch = max(1, embed_batch)
+        self.persist_batch = max(1, persist_batch)
+        self.queue_size = max(1, queue_size)
+        self.classify = classify
+        self.use_processes = use_processes
+        self.stats = PipelineStats()
+        self._failure: Optional[BaseException] = None
+
+    # ------------------------------------------------------------------ #
+    def run(self, jobs: List[IndexJob]) -> PipelineStats:
+        t0 = time.perf_counter()
+        extracted: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        embedded: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+
+        stages = [
+            threading.Thread(target=self._guard, args=(self._extract_stage, jobs, extracted), daemon=True),
+            threading.Thread(target=self._guard, args=(self._embed_stage, extracted, embedded), daemon=True),
+        ]
+        for t in stages:
+            t.start()
+        try:
+            self._persist_stage(embedded)
+        except BaseException as exc:
+            self._failure = exc
+            self._drain(embedded)
+        finally:
+            for t in stages:
+                t.join()
+
+        self.stats.seconds = time.perf_counter() - t0
+        if self._failure is not None:
+            raise self._failure
+        return self.stats
+
+    def _guard(self, stage, source, sink: "queue.Queue") -> None:
+        try:
+            stage(source, sink)
+        except BaseException as exc:    # surface in run(), but always unblock both neighbours
+            LOGGER.exception("Indexing pipeline stage %s failed", stage.__name__)
+            self._failure = exc
+            if isinstance(source, queue.Queue):
+                self._drain(source)
+        finally:
+            sink.put(_DONE)
+
+    @staticmethod
+    def _drain(source: "queue.Queue") -> None:
+        while source.get() is not _DONE:
+            pass
+
+    # ------------------------------------------------------------------ #
+    # Stages
+    # ------------------------------------------------------------------ #
+    def _extract_stage(self, jobs: List[IndexJob], out: "queue.Queue") -> None:
+        window = self.extract_workers * 2
+        pending: deque = deque()
+        with _make_executor(self.extract_workers, self.use_processes) as pool:
+            for job in jobs:
+                pending.append((job, pool.submit(self.extract, job.path, job.md5)))
+                if len(pending) >= window:
+                    self._emit_extracted(pending.popleft(), out)
+                if self._failure is not None:
+                    return
+            while pending:
+                self._emit_extracted(pending.popleft(), out)
+
+    @staticmethod
+    def _emit_extracted(item, out: "queue.Queue") -> None:
+        job, fut = item
+        try:
+            job.text = fut.result() or ""
+        except Exception as exc:
+            job.error = f"extract: {exc}"
+        out.put(job)          # blocks when downstream is behind → back-pressure
+
+    def _embed_stage(self, source: "queue.Queue", out: "queue.Queue") -> None:
+        batch: List[IndexJob] = []
+        texts = 0
+        while True:
+            job = source.get()
+            if job is _DONE:
+                break
+            if self._failure is not None:
+                continue        # keep consuming so the extract stage can finish
+            if not job.error and job.text.strip():
+                job.chunks = self.chunk(job.text)
+            batch.append(job)
+            texts += len(job.chunks) + (1 if self.classify else 0)
+            if texts >= self.embed_batch:
+                self._embed_batch(batch, out)
+                batch, texts = [], 0
+        if batch and self._failure is None:
+            self._embed_batch(batch, out)
+
+    def _embed_batch(self, batch: List[IndexJob], out: "queue.Queue") -> None:
+        texts: List[str] = []
+        for job in batch:
+            texts.extend(job.chunks)
+            if self.classify and job.chunks:
+                texts.append(" ".join(job.chunks))
+
+        vectors = list(self.embed(texts)) if texts else []
+        self.stats.embed_calls += 1 if texts else 0
+
+        pos = 0
+        for job in batch:
+            n = len(job.chunks)
+            job.vectors = vectors[pos: pos + n]
+            pos += n
+            if self.classify and n:
+                job.doc_vector = vectors[pos]
+                pos += 1
+            out.put(job)
+
+    def _persist_stage(self, source: "queue.Queue") -> None:
+        batch: List[IndexJob] = []
+        while True:
+            job = source.get()
+            if job is _DONE:
+                break
+            batch.append(job)
+            if len(batch) >= self.persist_batch:
+                self._flush(batch)
+                batch = []
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, batch: List[IndexJob]) -> None:
+        self.persist(batch)
+        self.stats.persist_calls += 1
+        self.stats.files += len(batch)
+        self.stats.chunks += sum(len(j.chunks) for j in batch)
+        self.stats.errors += sum(1 for j in batch if j.error)
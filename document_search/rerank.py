@@ -0,0 +1,151 @@
+"""
+document_search.rerank
+~~~~~~~~~~~~~~~~~~~~~~
+
+Optional cross-encoder reranking of ANN candidates.
+
+    Milvus (over-fetch) ─▶ cached scores ─▶ cross-encoder (batched) ─▶ top_k
+
+• Scores are memoised in the shared cache under
+  `rerank:<model>:<query_hash>:<chunk_hash>`, so repeated and paginated
+  queries only score chunks they have not seen before.
+• Rerank depth adapts to a latency budget: the per-pair cost is measured on
+  every call and the depth is chosen so the p95 cost of a rerank stays under
+  RERANK_BUDGET_MS. Candidates beyond the depth keep their ANN order, after
+  the reranked ones.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import numpy as np
+from django.core.cache import cache
+
+from document_search.hashing import content_hash
+
+LOGGER = logging.getLogger(__name__)
+
+try:
+    from document_search import config
+    RERANK_MODEL = getattr(config, "RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+    RERANK_BUDGET_MS = getattr(config, "RERANK_BUDGET_MS", 300)
+    RERANK_MIN_DEPTH = getattr(config, "RERANK_MIN_DEPTH", 10)
+    RERANK_MAX_DEPTH = getattr(config, "RERANK_MAX_DEPTH", 200)
+    RERANK_BATCH = getattr(config, "RERANK_BATCH", 32)
+    RERANK_CACHE_TTL = getattr(config, "RERANK_CACHE_TTL", 24 * 3600)
+except ImportError:
+    RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_BUDGET_MS = 300
+    RERANK_MIN_DEPTH = 10
+    RERANK_MAX_DEPTH = 200
+    RERANK_BATCH = 32
+    RERANK_CACHE_TTL = 24 * 3600
+
+
+class LatencyBudget:
+    """
+    Rolling per-pair cost → how many pairs fit in `budget_ms` at p95.
+
+    Until `warmup` samples exist the maximum depth is used, so the first
+    calls measure the model rather than guess.
+    """
+
+    def __init__(
+        self,
+        budget_ms: float = RERANK_BUDGET_MS,
+        min_depth: int = RERANK_MIN_DEPTH,
+        max_depth: int = RERANK_MAX_DEPTH,
+        window: int = 200,
+        warmup: int = 5,
+    ):
+        self.budget_ms = budget_ms
+        self.min_depth = min_depth
+        self.max_depth = max_depth
+        self.warmup = warmup
+        self._samples: deque = deque(maxlen=window)     # ms per pair
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_s: float, pairs: int) -> None:
+        if pairs:
+            with self._lock:
+                self._samples.append(elapsed_s * 1000 / pairs)
+
+    def p95_pair_ms(self) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.warmup:
+                return None
+            return float(np.percentile(self._samples, 95))
+
+    def depth(self) -> int:
+        cost = self.p95_pair_ms()
+        if not cost:
+            return self.max_depth
+        return max(self.min_depth, min(self.max_depth, int(self.budget_ms / cost)))
+
+
+class CrossEncoderReranker:
+    def __init__(self, model=None, model_name: str = RERANK_MODEL, budget: Optional[LatencyBudget] = None):
+        self._model = model
+        self.model_name = model_name
+        self.budget = budget or LatencyBudget()
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def _key(self, qh: int, ch: int) -> str:
+        return f"rerank:{self.model_name}:{qh}:{ch}"
+
+    def scores(self, query: str, texts: Sequence[str]) -> List[float]:
+        """Cross-encoder score per text; cached pairs skip the model."""
+        qh = content_hash(query)
+        hashes = [content_hash(t) for t in texts]
+        unique = dict(zip(hashes, texts))
+        found = cache.get_many([self._key(qh, h) for h in unique])
+        scored = {h: found[self._key(qh, h)] for h in unique if self._key(qh, h) in found}
+
+        missing = [h for h in unique if h not in scored]
+        if missing:
+            t0 = time.perf_counter()
+            fresh = self.model.predict(
+                [(query, unique[h]) for h in missing],
+                batch_size=RERANK_BATCH,
+                show_progress_bar=False,
+            )
+            self.budget.record(time.perf_counter() - t0, len(missing))
+            fresh = [float(s) for s in fresh]
+            cache.set_many({self._key(qh, h): s for h, s in zip(missing, fresh)}, timeout=RERANK_CACHE_TTL)
+            scored.update(zip(missing, fresh))
+
+        LOGGER.debug("Rerank: %s texts, %s cached, %s scored", len(texts), len(unique) - len(missing), len(missing))
+        return [scored[h] for h in hashes]
+
+    def rerank(self, query: str, hits: List[dict], top_k: int, text_key: str = "chunk_text") -> List[dict]:
+        """
+        Reorder `hits` (ANN order) by cross-encoder score and return `top_k`.
+        Each reranked hit gains `rerank_score`; hits beyond the budgeted
+        depth follow in their original order.
+        """
+        if not hits:
+            return []
+        depth = max(top_k, self.budget.depth())
+        head, tail = hits[:depth], hits[depth:]
+        for hit, score in zip(head, self.scores(query, [h[text_key] for h in head])):
+            hit["rerank_score"] = score
+        head.sort(key=lambda h: h["rerank_score"], reverse=True)
+        return (head + tail)[:top_k]
+
+
+@lru_cache(maxsize=1)
+def get_reranker() -> CrossEncoderReranker:
+    """Process-wide reranker (model loads on first use)."""
+    return CrossEncoderReranker()
@@ -0,0 +1,326 @@
+"""
+document_search.residency
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Cluster-wide residency of `user_<id>` partitions loaded in Milvus.
+
+Loading a partition pulls its segments from object storage into the query
+nodes, which takes seconds; searching a loaded partition takes milliseconds.
+Instead of `load()` / `release()` around every call, callers borrow the
+partitions they need:
+
+    with get_residency_manager().acquire(coll, ["user_7", "user_9"]):
+        coll.search(..., partition_names=["user_7", "user_9"])
+
+Rules
+-----
+• Milvus load state is global, so residency is too: the registry of
+  resident partitions (name → estimated bytes), their last-used times and
+  the in-flight counters all live in the shared Django cache. Every worker
+  sees the same set, and the budget applies to the cluster, not per process.
+• LRU over resident partitions, bounded by a byte budget and a count cap.
+• A partition with an in-flight search (any worker) is never released.
+• Idle partitions are released after `RESIDENCY_IDLE_SECONDS` – by any
+  worker, including the beat sweep that never searched them.
+• Load and release of one partition are serialised by a short cache lock,
+  and a release takes the partition out of the registry *before* checking
+  the in-flight counter, so a search that found it registered is always
+  seen by the releasing worker.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, Iterator, List
+
+from django.core.cache import cache
+
+LOGGER = logging.getLogger(__name__)
+
+try:
+    from document_search import config
+    MAX_BYTES = getattr(config, "RESIDENCY_MAX_BYTES", 4 * 1024 ** 3)
+    MAX_PARTITIONS = getattr(config, "RESIDENCY_MAX_PARTITIONS", 256)
+    IDLE_SECONDS = getattr(config, "RESIDENCY_IDLE_SECONDS", 1800)
+    BYTES_PER_ENTITY = getattr(config, "RESIDENCY_BYTES_PER_ENTITY", 4096)
+except ImportError:
+    MAX_BYTES = 4 * 1024 ** 3
+    MAX_PARTITIONS = 256
+    IDLE_SECONDS = 1800
+    BYTES_PER_ENTITY = 4096
+
+INFLIGHT_TTL = 300        # seconds; bounds a leaked counter if a worker dies mid-search
+REGISTRY_KEY = "milvus:residency"
+REGISTRY_LOCK_TTL = 10    # registry updates are a get + set
+LOAD_LOCK_TTL = 120       # bounds a lock held by a worker that died mid-load
+
+
+@contextmanager
+def _cache_lock(key: str, ttl: int) -> Iterator[None]:
+    """Mutex across worker processes on cache.add(); the TTL frees it if the holder dies."""
+    token = uuid.uuid4().hex
+    while not cache.add(key, token, timeout=ttl):
+        time.sleep(0.02)
+    try:
+        yield
+    finally:
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+class PartitionResidencyManager:
+    """
+    Keeps Milvus partitions loaded between calls and releases them under
+    memory pressure or when idle. All residency state is shared through the
+    cache; instances only keep their own pin counts and statistics.
+
+    Parameters
+    ----------
+    max_bytes        : estimated memory budget for resident partitions (cluster-wide).
+    max_partitions   : hard cap on the number of resident partitions (cluster-wide).
+    idle_seconds     : release partitions unused for this long.
+    bytes_per_entity : memory estimate per row (vector + scalar fields).
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = MAX_BYTES,
+        max_partitions: int = MAX_PARTITIONS,
+        idle_seconds: int = IDLE_SECONDS,
+        bytes_per_entity: int = BYTES_PER_ENTITY,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.max_partitions = max_partitions
+        self.idle_seconds = idle_seconds
+        self.bytes_per_entity = bytes_per_entity
+
+        self._lock = threading.RLock()
+        self._refs: Dict[str, int] = {}
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+
+    # ------------------------------------------------------------------ #
+    # Shared (cross-process) keys
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _resident_key(name: str) -> str:
+        return f"milvus:resident:{name}"       # last-used timestamp
+
+    @staticmethod
+    def _inflight_key(name: str) -> str:
+        return f"milvus:inflight:{name}"
+
+    @staticmethod
+    def _load_lock_key(name: str) -> str:
+        return f"milvus:loadlock:{name}"
+
+    def _incr_inflight(self, names: Iterable[str]) -> None:
+        for n in names:
+            key = self._inflight_key(n)
+            cache.add(key, 0, timeout=INFLIGHT_TTL)
+            try:
+                cache.incr(key)
+            except ValueError:          # expired between add() and incr()
+                cache.set(key, 1, timeout=INFLIGHT_TTL)
+
+    def _decr_inflight(self, names: Iterable[str]) -> None:
+        for n in names:
+            try:
+                cache.decr(self._inflight_key(n))
+            except ValueError:
+                pass
+
+    @staticmethod
+    def _registry() -> Dict[str, int]:
+        return cache.get(REGISTRY_KEY) or {}
+
+    @staticmethod
+    def _update_registry(add: Dict[str, int] = None, remove: Iterable[str] = ()) -> Dict[str, int]:
+        """Apply `add` / `remove` to the shared registry; returns the removed entries."""
+        with _cache_lock(f"{REGISTRY_KEY}:lock", REGISTRY_LOCK_TTL):
+            registry = cache.get(REGISTRY_KEY) or {}
+            removed = {n: registry.pop(n) for n in remove if n in registry}
+            registry.update(add or {})
+            cache.set(REGISTRY_KEY, registry, timeout=None)
+        return removed
+
+    @contextmanager
+    def _load_locks(self, names: List[str]) -> Iterator[None]:
+        with ExitStack() as stack:
+            for n in sorted(names):     # fixed order → no deadlock between workers
+                stack.enter_context(_cache_lock(self._load_lock_key(n), LOAD_LOCK_TTL))
+            yield
+
+    # ------------------------------------------------------------------ #
+    # Public API
+    # ------------------------------------------------------------------ #
+    @contextmanager
+    def acquire(self, coll, partitions: Iterable[str]) -> Iterator:
+        """
+        Ensure `partitions` are loaded and pin them for the duration of the
+        `with` block.
+        """
+        names = sorted(set(partitions))
+        with self._lock:
+            for n in names:
+                self._refs[n] = self._refs.get(n, 0) + 1
+        self._incr_inflight(names)
+        try:
+            self._ensure_loaded(coll, names)
+            yield coll
+        finally:
+            self._decr_inflight(names)
+            with self._lock:
+                for n in names:
+                    left = self._refs.get(n, 0) - 1
+                    if left > 0:
+                        self._refs[n] = left
+                    else:
+                        self._refs.pop(n, None)
+            self.evict(coll)
+
+    def evict(self, coll, idle_only: bool = False) -> List[str]:
+        """
+        Release unpinned partitions that are idle, or (unless `idle_only`)
+        that push the cluster over its byte / count budget. Oldest first.
+        Works on the shared registry, so any worker can release any partition.
+        """
+        registry = self._registry()
+        if not registry:
+            return []
+        now = time.time()
+        last_used = self._last_used(registry)
+        total = sum(registry.values())
+        count = len(registry)
+
+        released = []
+        for name in sorted(registry, key=lambda n: last_used.get(n, 0)):
+            over = not idle_only and (total > self.max_bytes or count > self.max_partitions)
+            idle = now - last_used.get(name, 0) >= self.idle_seconds
+            if not (over or idle):
+                break           # LRU order: everything after this is newer
+            if self._release(coll, name, over):
+                released.append(name)
+                total -= registry[name]
+                count -= 1
+
+        if released:
+            with self._lock:
+                self.evictions += len(released)
+            LOGGER.info("♻️ Released %s idle/over-budget partitions: %s", len(released), released)
+        return released
+
+    def adopt(self, coll, names: Iterable[str]) -> None:
+        """
+        Register partitions Milvus reports as loaded but the registry does not
+        know (e.g. the cache was flushed). They carry no last-used time, so the
+        next sweep treats them as idle.
+        """
+        names = [n for n in names if n not in self._registry()]
+        if names:
+            self._update_registry(add={n: self._estimate_bytes(coll, n) for n in names})
+            LOGGER.info("🔎 Adopted %s untracked loaded partitions: %s", len(names), names)
+
+    def reset(self) -> None:
+        """Forget every resident partition, e.g. after the alias moved to a new collection."""
+        with _cache_lock(f"{REGISTRY_KEY}:lock", REGISTRY_LOCK_TTL):
+            names = list(self._registry())
+            cache.delete(REGISTRY_KEY)
+        cache.delete_many([self._resident_key(n) for n in names])
+
+    def stats(self) -> dict:
+        registry = self._registry()
+        last_used = self._last_used(registry)
+        with self._lock:
+            return {
+                "resident": sorted(registry, key=lambda n: last_used.get(n, 0)),
+                "resident_bytes": sum(registry.values()),
+                "pinned": dict(self._refs),
+                "loads": self.loads,
+                "hits": self.hits,
+                "evictions": self.evictions,
+            }
+
+    # ------------------------------------------------------------------ #
+    # Internals
+    # ------------------------------------------------------------------ #
+    def _ensure_loaded(self, coll, names: List[str]) -> None:
+        missing = [n for n in names if n not in self._registry()]
+        if missing:
+            with self._load_locks(missing):
+                registry = self._registry()          # another worker may have loaded them meanwhile
+                missing = [n for n in missing if n not in registry]
+                if missing:
+                    t0 = time.perf_counter()
+                    coll.load(partition_names=missing)
+                    LOGGER.info(
+                        "📥 Loaded partitions %s in %.0f ms",
+                        missing, (time.perf_counter() - t0) * 1000,
+                    )
+                    self._update_registry(add={n: self._estimate_bytes(coll, n) for n in missing})
+            with self._lock:
+                self.loads += len(missing)
+
+        with self._lock:
+            self.hits += len(names) - len(missing)
+        self._touch(names)
+
+    def _release(self, coll, name: str, over: bool) -> bool:
+        with self._load_locks([name]):
+            removed = self._update_registry(remove=[name])
+            if not removed:
+                return False    # another worker released it already
+            busy = (cache.get(self._inflight_key(name)) or 0) > 0
+            recent = not over and time.time() - (cache.get(self._resident_key(name)) or 0) < self.idle_seconds
+            if busy or recent:
+                self._update_registry(add=removed)
+                return False
+            try:
+                part = coll.partition(name)
+                if part is not None:
+                    part.release()
+            except Exception as exc:
+                LOGGER.warning("Milvus release of %s failed: %s", name, exc)
+                self._update_registry(add=removed)
+                return False
+            cache.delete(self._resident_key(name))
+        return True
+
+    def _last_used(self, names: Iterable[str]) -> Dict[str, float]:
+        stamps = cache.get_many([self._resident_key(n) for n in names])
+        return {n: stamps.get(self._resident_key(n), 0) for n in names}
+
+    def _touch(self, names: List[str]) -> None:
+        now = time.time()
+        cache.set_many(
+            {self._resident_key(n): now for n in names},
+            timeout=max(self.idle_seconds * 2, 60),
+        )
+
+    def _estimate_bytes(self, coll, name: str) -> int:
+        try:
+            part = coll.partition(name)
+            rows = part.num_entities if part is not None else 0
+        except Exception:
+            rows = 0
+        return max(rows, 1) * self.bytes_per_entity
+
+
+# ───────────────────────────── Process singleton ────────────────────────────
+_MANAGER: PartitionResidencyManager | None = None
+_MANAGER_LOCK = threading.Lock()
+
+
+def get_residency_manager() -> PartitionResidencyManager:
+    """Return the per-process residency manager (created on first use; its state is shared)."""
+    global _MANAGER
+    if _MANAGER is None:
+        with _MANAGER_LOCK:
+            if _MANAGER is None:
+                _MANAGER = PartitionResidencyManager()
+    return _MANAGER
@@ -32,6 +32,12 @@ class SearchRequestSerializer(serializers.Serializer):
     top_k = serializers.IntegerField(default=5, min_value=1, max_value=50)
 
 
+class HybridSearchRequestSerializer(serializers.Serializer):
+    query = serializers.CharField(max_length=1000)
+    top_k = serializers.IntegerField(default=10, min_value=1, max_value=50)
+    granularity = serializers.ChoiceField(choices=["file", "chunk"], default="file")
+
+
 class SearchResultSerializer(serializers.Serializer):
     file_id = serializers.IntegerField()
     file_name = serializers.CharField()
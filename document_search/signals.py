@@ -0,0 +1,38 @@
+# document_search/signals.py
+#
+# Keep Milvus in step with File rows. Chunks live in the owner's partition
+# and those partitions are searched without a file_id filter (tenancy.py),
+# so rows of deleted or transferred files must not linger there.
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from core.models import File
+
+
+@receiver(post_init, sender=File)
+def remember_vector_owner(sender, instance, **kwargs):
+    instance._vector_owner_id = instance.__dict__.get("user_id")
+
+
+@receiver(post_delete, sender=File)
+def delete_vectors_of_deleted_file(sender, instance, **kwargs):
+    from document_search.tasks import delete_file_vectors
+
+    file_id = instance.id
+    transaction.on_commit(lambda: delete_file_vectors.delay([file_id]))
+
+
+@receiver(post_save, sender=File)
+def move_vectors_on_owner_change(sender, instance, created, **kwargs):
+    previous = getattr(instance, "_vector_owner_id", None)
+    instance._vector_owner_id = instance.user_id
+    if created or previous is None or previous == instance.user_id:
+        return
+    if instance.vector_chunks.exists():
+        from document_search.tasks import index_file
+
+        # a forced re-index drops the rows in the old partition and writes the new one
+        file_id = instance.id
+        transaction.on_commit(lambda: index_file.delay(file_id, force=True, classify=False))
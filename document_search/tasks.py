@@ -21,24 +21,41 @@ Adjust MILVUS_* or PARTITION_PREFIX in `config.py` if needed.
 from __future__ import annotations
 
 import logging
-from typing import Iterable, List, Tuple
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import partial
+from typing import Iterable, Iterator, List, Tuple
 
 from celery import shared_task
 from django.db import transaction
 from django.core.cache import cache
 from django.db.models import Q
 from django.contrib.auth import get_user_model
-from datetime import datetime
+from django.utils import timezone
+from datetime import datetime, timedelta
 
 from core.models import File
 from document_search.models import VectorChunk, SearchQueryLog
 from document_search.utils import (
+    CHUNK_OVERLAP,
+    CHUNK_SIZE,
     compute_chunks,
+    embed_texts_cached,
+    extract_text,
     preview_for_file,
+    split_text,
     _get_model,
     embed_text,   # used in exec_search
 )
 
+from document_search.hashing import content_hash
+from document_search.residency import get_residency_manager
+from document_search.tenancy import TenancyScope, build_scope
+from document_search.rerank import RERANK_MAX_DEPTH, get_reranker
+from document_search.classifier import UNKNOWN_LABEL, get_document_classifier
+from document_search.pipeline import IndexJob, IndexingPipeline
+
 # Use the same access helper the views rely on
 from document_operations.utils import get_user_accessible_file_ids
 
@@ -49,14 +66,31 @@ try:
     MILVUS_PORT = getattr(config, "MILVUS_PORT", "19530")
     COLLECTION_NAME = getattr(config, "COLLECTION_NAME", "doc_embeddings")
     PARTITION_PREFIX = getattr(config, "PARTITION_PREFIX", "user_")
+    INDEX_BATCH_FILES = getattr(config, "INDEX_BATCH_FILES", 200)
+    INDEX_EXTRACT_WORKERS = getattr(config, "INDEX_EXTRACT_WORKERS", 2)
+    INDEX_EMBED_BATCH = getattr(config, "INDEX_EMBED_BATCH", 256)
+    RERANK_OVERFETCH = getattr(config, "RERANK_OVERFETCH", 4)
 except ImportError:
     MILVUS_HOST = "localhost"
     MILVUS_PORT = "19530"
     COLLECTION_NAME = "doc_embeddings"
     PARTITION_PREFIX = "user_"
+    INDEX_BATCH_FILES = 200
+    INDEX_EXTRACT_WORKERS = 2
+    INDEX_EMBED_BATCH = 256
+    RERANK_OVERFETCH = 4
 
 VECTOR_DIM = 384          # MiniLM / BGE-small default, stay in sync with utils.py
 BATCH_SZ   = 100          # Milvus insert batch size
+REBUILD_CHUNK_SIZE = 5000     # VectorChunk rows per server-side cursor fetch
+REBUILD_INSERT_BATCH = 5000   # Milvus rows per insert during rebuild
+REBUILD_CATCHUP_MARGIN = timedelta(minutes=5)   # covers indexing transactions still open at a pass
+
+# Shared keys coordinating rebuild_milvus with indexing workers
+REBUILD_KEY = "milvus:rebuild"      # target collection while a rebuild runs
+SWAP_KEY = "milvus:swap"            # set while the alias flips; writers wait
+WRITERS_KEY = "milvus:writers"      # indexing writes in progress, all workers
+SWAP_TTL = 600                      # bounds a flag left by a rebuild that died mid-swap
 
 LOGGER = logging.getLogger(__name__)
 
@@ -68,37 +102,56 @@ from pymilvus import (
     CollectionSchema,
     DataType,
     Collection,
+    LoadState,
 )
 
-def _ensure_collection() -> Collection:
-    """Connect and create the single global collection if absent."""
+def _connect() -> None:
     if not connections.has_connection("default"):
         connections.connect(alias="default", host=MILVUS_HOST, port=MILVUS_PORT)
 
-    if not utility.has_collection(COLLECTION_NAME):
-        LOGGER.info("Creating Milvus collection '%s' …", COLLECTION_NAME)
-
-        schema = CollectionSchema(
-            [
-                FieldSchema("pk",         DataType.INT64, is_primary=True, auto_id=True),
-                FieldSchema("file_id",    DataType.INT64),
-                FieldSchema("chunk_hash", DataType.INT64),                    # for dedup
-                FieldSchema("source",     DataType.VARCHAR, max_length=100),  # filename
-                FieldSchema("chunk_text", DataType.VARCHAR, max_length=2000),
-                FieldSchema("vector",     DataType.FLOAT_VECTOR, dim=VECTOR_DIM),
-            ],
-            description="Chunked document embeddings (multi-tenant)",
-        )
 
-        coll = Collection(name=COLLECTION_NAME, schema=schema)
-        coll.create_index(
-            field_name="vector",
-            index_params={
-                "index_type": "IVF_FLAT",
-                "metric_type": "COSINE",
-                "params": {"nlist": 128},
-            },
-        )
+def _create_collection(name: str) -> Collection:
+    """Create a collection with the document-chunk schema and vector index."""
+    LOGGER.info("Creating Milvus collection '%s' …", name)
+
+    schema = CollectionSchema(
+        [
+            FieldSchema("pk",         DataType.INT64, is_primary=True, auto_id=True),
+            FieldSchema("file_id",    DataType.INT64),
+            FieldSchema("chunk_hash", DataType.INT64),                    # for dedup
+            FieldSchema("source",     DataType.VARCHAR, max_length=100),  # filename
+            FieldSchema("chunk_text", DataType.VARCHAR, max_length=2000),
+            FieldSchema("vector",     DataType.FLOAT_VECTOR, dim=VECTOR_DIM),
+        ],
+        description="Chunked document embeddings (multi-tenant)",
+    )
+
+    coll = Collection(name=name, schema=schema)
+    coll.create_index(
+        field_name="vector",
+        index_params={
+            "index_type": "IVF_FLAT",
+            "metric_type": "COSINE",
+            "params": {"nlist": 128},
+        },
+    )
+    # Scalar index: shared-file filters (`file_id in [...]`) skip the scan
+    coll.create_index(field_name="file_id", index_name="file_id_idx", index_params={"index_type": "STL_SORT"})
+    return coll
+
+
+def _ensure_collection() -> Collection:
+    """
+    Connect and create the single global collection if absent.
+
+    COLLECTION_NAME may be a real collection or (after `rebuild_milvus`) an
+    alias pointing at one; Milvus resolves both transparently.
+    """
+    _connect()
+    if not utility.has_collection(COLLECTION_NAME):
+        _wait_for_swap()    # the first rebuild renames the collection just before creating the alias
+        if not utility.has_collection(COLLECTION_NAME):
+            _create_collection(COLLECTION_NAME)
     return Collection(COLLECTION_NAME)
 
 
@@ -108,13 +161,47 @@ def _ensure_partition(coll: Collection, name: str) -> None:
         coll.create_partition(name)
 
 
+def _wait_for_swap() -> None:
+    while cache.get(SWAP_KEY):
+        time.sleep(0.1)
+
+
+def _decr_writers() -> None:
+    try:
+        cache.decr(WRITERS_KEY)
+    except ValueError:
+        pass
+
+
+@contextmanager
+def _milvus_writes() -> Iterator[None]:
+    """
+    Bracket an indexing write (VectorChunk rows + their Milvus rows). While
+    rebuild_milvus flips the alias, new writes wait and the flip waits for
+    the running ones, so every committed chunk is either in the copy's last
+    catch-up pass or written after the flip.
+    """
+    while True:
+        _wait_for_swap()
+        cache.add(WRITERS_KEY, 0, timeout=None)
+        cache.incr(WRITERS_KEY)
+        if not cache.get(SWAP_KEY):
+            break
+        _decr_writers()     # the swap started between the check and the increment
+    try:
+        yield
+    finally:
+        _decr_writers()
+
+
 def _insert_batches(
     coll: Collection,
     rows: List[Tuple[int, int, str, str, List[float]]],   # (file_id, chunk_hash, source, chunk_text, vector)
     partition: str,
     batch: int = BATCH_SZ,
+    strict: bool = False,
 ) -> None:
-    """Safe batched insert to Milvus."""
+    """Safe batched insert to Milvus (`strict` re-raises instead of logging)."""
     for i in range(0, len(rows), batch):
         slice_ = rows[i: i + batch]
         try:
@@ -130,22 +217,89 @@ def _insert_batches(
             )
         except Exception as exc:
             LOGGER.error("Milvus insert error @batch %s: %s", i // batch, exc)
+            if strict:
+                raise
+
+
+def _delete_file_rows(coll: Collection, file_ids: Iterable[int]) -> None:
+    """
+    Drop the Milvus rows of `file_ids` in every partition. Own and fully shared
+    partitions are searched without a filter, so stale rows (deleted or
+    transferred files, earlier copies of a re-indexed file) would crowd real
+    hits out of the `limit`.
+    """
+    ids = sorted({int(i) for i in file_ids})
+    if ids:
+        coll.delete(expr=f"file_id in [{','.join(map(str, ids))}]")
 
 
 def _partition_name(user_id: int) -> str:
     return f"{PARTITION_PREFIX}{user_id}"
 
 
+def _milvus_rows(
+    file_id: int,
+    filename: str,
+    chunks: List[str],
+    vectors: List[List[float]],
+) -> List[Tuple[int, int, str, str, List[float]]]:
+    """
+    Milvus rows for one file, skipping repeated chunks within the file.
+    `chunk_hash` is the stable content hash, same as VectorChunk.chunk_hash.
+    """
+    seen = set()
+    rows = []
+    for txt, vec in zip(chunks, vectors):
+        h = content_hash(txt)
+        if h in seen:
+            continue
+        seen.add(h)
+        rows.append((file_id, h, filename, txt, vec))
+    return rows
+
+
+def _dense_search(q_vec: List[float], scope: TenancyScope, limit: int) -> list:
+    """
+    ANN search within a tenancy scope; returns the hits for the single query
+    vector, best first (entities carry file_id, chunk_text).
+
+    At most two searches: the fully visible partitions without any expr, the
+    partitions holding individually shared files with `file_id in [...]`.
+    """
+    coll = _ensure_collection()
+    for p in scope.partitions:
+        _ensure_partition(coll, p)
+
+    search = partial(
+        coll.search,
+        data=[q_vec],
+        anns_field="vector",
+        param={"metric_type": "COSINE", "params": {"nprobe": 10}},
+        limit=limit,
+        output_fields=["file_id", "chunk_text"],
+    )
+    hits = []
+    with get_residency_manager().acquire(coll, scope.partitions):
+        if scope.full:
+            hits.extend(search(expr="", partition_names=sorted(scope.full))[0])
+        if scope.ids:
+            hits.extend(search(expr=scope.expr, partition_names=sorted(scope.restricted))[0])
+
+    hits.sort(key=lambda h: h.score, reverse=True)   # COSINE: higher is closer
+    return hits[:limit]
+
+
 # ───────────────────────────── Celery tasks ─────────────────────────────────
 @shared_task(name="document_search.index_file")
-def index_file(file_id: int, force: bool = False) -> dict:
+def index_file(file_id: int, force: bool = False, classify: bool = True) -> dict:
     """
     Index a single File into Milvus + VectorChunk.
 
     Parameters
     ----------
-    file_id : PK of core.File
-    force   : Re-index even if chunks already exist.
+    file_id  : PK of core.File
+    force    : Re-index even if chunks already exist.
+    classify : Set document_type (False when the caller already did it in bulk).
     """
     try:
         file = File.objects.select_related("user").get(pk=file_id)
@@ -158,184 +312,186 @@ def index_file(file_id: int, force: bool = False) -> dict:
         return {"status": "skipped"}
 
     # 1️⃣ Extract ▸ Chunk ▸ Embed
-    chunks, vectors = compute_chunks(file.filepath)
+    chunks, vectors = compute_chunks(file.filepath, md5=file.md5_hash)
 
     # ── Lightweight whole-doc type classification (single embed) ─────────
-    all_text = " ".join(chunks) if chunks else ""
-    if all_text.strip():
-        embed_model = _get_model()
-        doc_embedding = embed_model.encode([all_text])[0]
-
-        # Expanded label set (grouped; keep strings concise)
-        labels = {
-            # Legal & Compliance
-            "Contract": "Legal contract between parties with terms and signatures.",
-            "Legal Agreement": "Legal obligations, rights, or terms between parties.",
-            "NDA": "Non-disclosure agreement restricting sharing confidential information.",
-            "SLA": "Service level agreement with performance standards and responsibilities.",
-            "Court Order": "Orders or judgments issued by a court.",
-            "Legal Complaint": "Formal legal complaint filed in court.",
-            "Terms and Conditions": "Rules and legal agreements for using products or services.",
-            "Privacy Policy": "Explains how personal data is collected and used.",
-            "Policy Document": "Official rules or guidelines that must be followed.",
-            "Permit": "Legal permission granted for specific activities.",
-            "License": "Authorization document granting legal permission.",
-            "Certificate": "Official document verifying a fact or achievement.",
-            "Will": "Estate distribution instructions after death.",
-            # Finance & Accounting
-            "Financial Report": "Financial results, performance, or analysis.",
-            "Income Statement": "Revenue and expenses over a period.",
-            "Balance Sheet": "Assets, liabilities, and equity snapshot.",
-            "Cash Flow Statement": "Cash inflows and outflows over a period.",
-            "Budget": "Planned income and expenses for a period.",
-            "Invoice": "Bill for payment with items and totals.",
-            "Receipt": "Acknowledgment of payment received.",
-            "Bank Statement": "Account transactions and balances.",
-            "Audit Report": "Independent financial audit opinion.",
-            "Payroll Report": "Employee wages and deductions summary.",
-            "Purchase Order": "Authorization to buy goods or services.",
-            "Bill of Lading": "Receipt of goods for shipment.",
-            "Statement of Work": "Project deliverables, scope, and responsibilities.",
-            # Business & Operations
-            "Business Proposal": "Proposes plans, services, or products to a client.",
-            "Business Plan": "Business strategies, objectives, and forecasts.",
-            "RFP Response": "Response to a request for proposal.",
-            "SOP": "Standard operating procedure with step-by-step instructions.",
-            "Project Report": "Project progress, findings, or results.",
-            "Meeting Minutes": "Discussion points and decisions from meetings.",
-            "Memo": "Formal internal communication message.",
-            "Agenda": "List of topics to be discussed in a meeting.",
-            "Checklist": "Tasks or items to complete or verify.",
-            "Schedule": "Timeline or plan with dates and times.",
-            "Log File": "System, server, or application log entries.",
-            "User Manual": "Instructions for using a product or system.",
-            "Technical Specification": "Detailed technical requirements and designs.",
-            "Runbook": "Operational procedures for incidents or maintenance.",
-            "Architecture Diagram": "System architecture documentation overview.",
-            # Sales & Marketing
-            "Press Release": "Public announcement of news or events.",
-            "Brochure": "Marketing or informational pamphlet.",
-            "Advertisement": "Promotes products, services, or events.",
-            "Price List": "Catalog of products or services with prices.",
-            "Statement of Capabilities": "Company capabilities and differentiators.",
-            # HR & Talent
-            "Resume": "Work experience and skills summary.",
-            "Cover Letter": "Letter expressing job interest accompanying a resume.",
-            "Offer Letter": "Employment offer details and terms.",
-            "Job Description": "Role responsibilities and required qualifications.",
-            "Performance Review": "Employee performance evaluation.",
-            # Medical & Insurance
-            "Medical Report": "Medical or health record details and assessments.",
-            "Prescription": "Medication or treatment directive by a clinician.",
-            "Lab Result": "Medical or laboratory test outcomes.",
-            "Patient Summary": "Patient medical history and conditions.",
-            "Insurance Claim": "Request to insurer for reimbursement.",
-            "EOB": "Explanation of benefits document from insurer.",
-            # Research & Education
-            "Research Paper": "Academic research findings and analysis.",
-            "White Paper": "Authoritative information or solution on a topic.",
-            "Case Study": "Detailed analysis of a specific example.",
-            "Thesis": "Lengthy academic dissertation.",
-            "Lecture Notes": "Notes from educational lectures.",
-            "Transcript": "Verbatim record of spoken words or courses.",
-            "Dataset Description": "Metadata and description for datasets.",
-            # IT & Security
-            "Security Policy": "Information security rules and standards.",
-            "Vulnerability Report": "Security weaknesses and remediation.",
-            "Penetration Test Report": "Results of simulated attacks and fixes.",
-            "Incident Report": "Security incident details and timeline.",
-            "Change Request": "Proposed system change and approvals.",
-            "Release Notes": "Software release changes and fixes.",
-            # Government & Public
-            "Notice": "Official information or updates to the public.",
-            "Regulatory Filing": "Submission to a regulator or exchange.",
-            # Misc
-            "FAQ": "Frequently asked questions and answers.",
-            "Summary": "Condensed version of longer content.",
-            "Newsletter": "Periodic news or updates for readers.",
-            "Unclassified": "Document type cannot be determined.",
-        }
-
-        label_texts = list(labels.values())
-        label_names = list(labels.keys())
-        label_embeddings = embed_model.encode(label_texts)
-
-        from sklearn.metrics.pairwise import cosine_similarity
-        scores = cosine_similarity([doc_embedding], label_embeddings)
-        best_idx = scores.argmax()
-        best_label = label_names[best_idx]
-
+    if classify:
+        all_text = " ".join(chunks) if chunks else ""
+        best_label = get_document_classifier().classify_texts([all_text])[0]
         file.document_type = best_label
         file.save(update_fields=["document_type"])
         LOGGER.info("→ File %s classified as: %s", file_id, best_label)
-    else:
-        file.document_type = "Unknown"
-        file.save(update_fields=["document_type"])
-        LOGGER.info("→ File %s classified as: Unknown", file_id)
 
     if not chunks:
         LOGGER.warning("No extractable text for %s.", file.filename)
         return {"status": "empty"}
 
-    # 2️⃣ Persist to Django (atomic)
-    with transaction.atomic():
-        if force:
-            file.vector_chunks.all().delete()
-        VectorChunk.objects.bulk_create(
-            [
-                VectorChunk(
-                    file=file,
-                    user_id=file.user_id,
-                    chunk_index=i,
-                    chunk_text=txt,
-                    embedding=vec,
-                )
-                for i, (txt, vec) in enumerate(zip(chunks, vectors))
-            ],
-            batch_size=500,
-        )
-
-    # 3️⃣ Insert into Milvus (partitioned by user)
-    coll = _ensure_collection()
-    part = _partition_name(file.user_id)
-    _ensure_partition(coll, part)
-    coll.load(partition_names=[part])
+    with _milvus_writes():
+        # 2️⃣ Persist to Django (atomic)
+        with transaction.atomic():
+            if force:
+                file.vector_chunks.all().delete()
+            VectorChunk.objects.bulk_create(
+                [
+                    VectorChunk(
+                        file=file,
+                        user_id=file.user_id,
+                        chunk_index=i,
+                        chunk_text=txt,
+                        chunk_hash=content_hash(txt),
+                        vector=vec,
+                    )
+                    for i, (txt, vec) in enumerate(zip(chunks, vectors))
+                ],
+                batch_size=500,
+            )
 
-    seen = set()
-    rows = []
-    for txt, vec in zip(chunks, vectors):
-        h = hash(txt)
-        if h in seen:
-            continue
-        seen.add(h)
-        rows.append((file.id, h, file.filename, txt, vec))
+        # 3️⃣ Insert into Milvus (partitioned by user)
+        # Inserts don't need the partition loaded; if it is resident (see
+        # residency.py) the new segment becomes searchable after flush().
+        coll = _ensure_collection()
+        part = _partition_name(file.user_id)
+        _ensure_partition(coll, part)
 
-    _insert_batches(coll, rows, partition=part)
+        if force:
+            _delete_file_rows(coll, [file.id])
+        rows = _milvus_rows(file.id, file.filename, chunks, vectors)
+        _insert_batches(coll, rows, partition=part)
 
-    coll.flush()
-    coll.release()
+        coll.flush()
 
     LOGGER.info("✅ Indexed %s chunks for file %s → partition %s", len(chunks), file_id, part)
     return {"status": "ok", "chunks": len(chunks)}
 
 
+@shared_task(name="document_search.index_files_batch")
+def index_files_batch(file_ids: List[int], force: bool = False) -> dict:
+    """
+    Index many Files through the streaming pipeline (see pipeline.py):
+    extraction on a pool, cross-file embedding batches, and one Django bulk
+    write + one Milvus flush per persist batch instead of per file.
+    """
+    files = File.objects.filter(id__in=file_ids).only("id", "user_id", "filename", "filepath", "md5_hash")
+    if not force:
+        files = files.filter(vector_chunks__isnull=True).distinct()
+
+    jobs = [
+        IndexJob(file_id=f.id, user_id=f.user_id, filename=f.filename, path=f.filepath, md5=f.md5_hash)
+        for f in files.order_by("id")
+    ]
+    if not jobs:
+        return {"status": "skipped", "files": 0}
+
+    coll = _ensure_collection()
+    pipeline = IndexingPipeline(
+        extract=extract_text,
+        chunk=partial(split_text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP),
+        embed=embed_texts_cached,
+        persist=partial(_persist_index_jobs, coll, force=force),
+        extract_workers=INDEX_EXTRACT_WORKERS,
+        embed_batch=INDEX_EMBED_BATCH,
+    )
+    stats = pipeline.run(jobs)
+
+    LOGGER.info("✅ Batch-indexed %s", stats.as_dict())
+    return {"status": "ok", **stats.as_dict()}
+
+
+def _persist_index_jobs(coll: Collection, jobs: List[IndexJob], force: bool = False) -> None:
+    """Persist one pipeline batch: document types, VectorChunks, Milvus rows."""
+    # Document type: one matrix multiply for the whole batch
+    classified = [j for j in jobs if j.doc_vector is not None]
+    labels = get_document_classifier().classify_vectors([j.doc_vector for j in classified])
+    doc_types = {j.file_id: UNKNOWN_LABEL for j in jobs}
+    doc_types.update(zip((j.file_id for j in classified), labels))
+
+    files = File.objects.in_bulk(list(doc_types)).values()
+    for f in files:
+        f.document_type = doc_types[f.id]
+    File.objects.bulk_update(files, ["document_type"], batch_size=500)
+
+    indexed = [j for j in jobs if j.chunks]
+    if not indexed:
+        return
+
+    with _milvus_writes():
+        with transaction.atomic():
+            if force:
+                VectorChunk.objects.filter(file_id__in=[j.file_id for j in indexed]).delete()
+            VectorChunk.objects.bulk_create(
+                [
+                    VectorChunk(
+                        file_id=j.file_id,
+                        user_id=j.user_id,
+                        chunk_index=i,
+                        chunk_text=txt,
+                        chunk_hash=content_hash(txt),
+                        vector=vec,
+                    )
+                    for j in indexed
+                    for i, (txt, vec) in enumerate(zip(j.chunks, j.vectors))
+                ],
+                batch_size=500,
+            )
+
+        if force:
+            _delete_file_rows(coll, [j.file_id for j in indexed])
+        by_partition = defaultdict(list)
+        for j in indexed:
+            by_partition[_partition_name(j.user_id)].extend(
+                _milvus_rows(j.file_id, j.filename, j.chunks, j.vectors)
+            )
+        for part, rows in by_partition.items():
+            _ensure_partition(coll, part)
+            _insert_batches(coll, rows, partition=part)
+        coll.flush()
+
+
+@shared_task(name="document_search.delete_file_vectors")
+def delete_file_vectors(file_ids: List[int]) -> dict:
+    """Remove deleted files from Milvus (queued by document_search.signals)."""
+    coll = _ensure_collection()
+    with _milvus_writes():
+        _delete_file_rows(coll, file_ids)
+        coll.flush()
+        target = cache.get(REBUILD_KEY)
+        if target:      # rows the rebuild already copied
+            try:
+                _delete_file_rows(Collection(target), file_ids)
+            except Exception as exc:
+                LOGGER.warning("Could not remove rows from rebuild target %s: %s", target, exc)
+    LOGGER.info("🗑️ Removed Milvus rows of %s files", len(file_ids))
+    return {"status": "ok", "files": len(file_ids)}
+
+
 @shared_task(name="document_search.bulk_reindex")
 def bulk_reindex() -> dict:
     """
-    Queue indexing for all Files missing VectorChunks.
+    Queue batch indexing (index_files_batch) for all Files missing VectorChunks.
     """
-    unindexed: Iterable[File] = (
+    unindexed: Iterable[int] = (
         File.objects.filter(vector_chunks__isnull=True)
         .order_by("id")
         .distinct()
+        .values_list("id", flat=True)
     )
     count = 0
-    for f in unindexed:
-        index_file.delay(f.id)
-        count += 1
-
-    LOGGER.info("📥 Enqueued %s files for indexing.", count)
-    return {"queued": count}
+    batches = 0
+    batch: List[int] = []
+    for fid in unindexed.iterator(chunk_size=INDEX_BATCH_FILES):
+        batch.append(fid)
+        if len(batch) >= INDEX_BATCH_FILES:
+            index_files_batch.delay(batch)
+            count += len(batch)
+            batches += 1
+            batch = []
+    if batch:
+        index_files_batch.delay(batch)
+        count += len(batch)
+        batches += 1
+
+    LOGGER.info("📥 Enqueued %s files for indexing in %s batches.", count, batches)
+    return {"queued": count, "batches": batches}
 
 '''
 @shared_task(name="document_search.exec_search")
@@ -421,8 +577,8 @@ def exec_search(user_id: int, query: str, file_id: int | None, top_k: int) -> li
 '''
 
 @shared_task(name="document_search.exec_search")
-def exec_search(user_id: int, query: str, file_id: int | None, top_k: int) -> list[dict]:
-    cache_key = f"search:v2:{user_id}:{file_id}:{top_k}:{hash(query)}"
+def exec_search(user_id: int, query: str, file_id: int | None, top_k: int, rerank: bool = False) -> list[dict]:
+    cache_key = f"search:v2:{user_id}:{file_id}:{top_k}:{int(rerank)}:{content_hash(query)}"
     cached = cache.get(cache_key)
     if cached:
         return cached
@@ -433,7 +589,6 @@ def exec_search(user_id: int, query: str, file_id: int | None, top_k: int) -> li
     if not user:
         return []
 
-    from django.db.models import F
     accessible_ids = set(get_user_accessible_file_ids(user))
 
     # If caller passed file_id, tighten scope
@@ -442,58 +597,44 @@ def exec_search(user_id: int, query: str, file_id: int | None, top_k: int) -> li
     if not accessible_ids:
         return []
 
-    # 2) Determine which partitions to load (owners of accessible files)
-    owner_rows = (
-        File.objects
-        .filter(id__in=accessible_ids)
-        .values("id", "user_id")  # or "user_id" if that's your canonical owner field
-    )
-    owner_partitions = {f"user_{row['user_id']}" for row in owner_rows}
-
-    # 3) Embed query
+    # 2) Embed query
     q_vec = embed_text(query)
 
-    # 4) Milvus search over only needed partitions + file_id expr
-    coll = _ensure_collection()
-    for p in owner_partitions:
-        _ensure_partition(coll, p)
-    coll.load(partition_names=list(owner_partitions))
-
-    id_list = ",".join(map(str, sorted(accessible_ids)))
-    expr = f"file_id in [{id_list}]"
+    # 3) Milvus search: own / fully shared partitions unfiltered, the rest by id.
+    #    Reranking over-fetches so the cross-encoder has candidates to promote.
+    limit = max(top_k, min(top_k * RERANK_OVERFETCH, RERANK_MAX_DEPTH)) if rerank else top_k
+    res = _dense_search(q_vec, build_scope(user, file_id), limit)
 
-    res = coll.search(
-        data=[q_vec],
-        anns_field="vector",
-        param={"metric_type": "COSINE", "params": {"nprobe": 10}},
-        limit=top_k,
-        expr=expr,
-        output_fields=["file_id", "chunk_text"],
-    )
-    coll.release()
-
-    # 5) Dedup + shape
+    # 4) Dedup
     seen = set()
-    hits = []
-    for hit in res[0]:
+    candidates = []
+    for hit in res:
         fid = int(hit.entity.get("file_id"))
+        if fid not in accessible_ids:
+            continue
         ctext = hit.entity.get("chunk_text", "")
-        ch = hash(ctext)
+        ch = content_hash(ctext)
         if ch in seen:
             continue
         seen.add(ch)
+        candidates.append({"file_id": fid, "chunk_text": ctext, "score": float(hit.score)})
 
-        snippet = (ctext[:297] + "…") if len(ctext) > 300 else ctext
-        snippet = snippet.replace("\n", "  \n")
+    # 5) Optional cross-encoder rerank (depth bounded by RERANK_BUDGET_MS)
+    if rerank:
+        try:
+            candidates = get_reranker().rerank(query, candidates, top_k)
+        except Exception as exc:
+            LOGGER.warning("Rerank failed, keeping ANN order: %s", exc)
+    candidates = candidates[:top_k]
 
-        hits.append({
-            "file_id": fid,
-            "snippet_md": snippet,
-            "score": float(hit.score),
-            "preview": preview_for_file(fid),
-        })
-        if len(hits) >= top_k:
-            break
+    # 6) Shape
+    hits = []
+    for c in candidates:
+        ctext = c.pop("chunk_text")
+        snippet = (ctext[:297] + "…") if len(ctext) > 300 else ctext
+        c["snippet_md"] = snippet.replace("\n", "  \n")
+        c["preview"] = preview_for_file(c["file_id"])
+        hits.append(c)
 
     cache.set(cache_key, hits, timeout=60 * 60 * 6)
     SearchQueryLog.objects.create(
@@ -638,42 +779,19 @@ def semantic_search_task(user_id: int, query: str, top_k: int, file_id: int | No
         if not accessible_ids:
             return []
 
-        # 2) Owner partitions to load
-        owner_rows = (
-            File.objects
-            .filter(id__in=accessible_ids)
-            .values("id", "user_id")  # or "user_id"
-        )
-        owner_partitions = {f"user_{row['user_id']}" for row in owner_rows}
-
-        # 3) Embed
+        # 2) Embed
         embed_model = _get_model()
         qvec = embed_model.encode([query])[0]
 
-        # 4) Search only allowed partitions + ids
-        coll = _ensure_collection()
-        for p in owner_partitions:
-            _ensure_partition(coll, p)
-        coll.load(partition_names=list(owner_partitions))
-
-        id_list = ",".join(map(str, sorted(accessible_ids)))
-        expr = f"file_id in [{id_list}]"
-
-        results = coll.search(
-            data=[qvec],
-            anns_field="vector",
-            param={"metric_type": "COSINE", "params": {"nprobe": 10}},
-            limit=top_k,
-            expr=expr,
-            output_fields=["file_id", "chunk_text"],
-        )
+        # 3) Search the user's tenancy scope
+        results = [_dense_search(qvec, build_scope(user, file_id), top_k)]
 
         vector_file_ids = {int(hit.entity.get("file_id")) for hit in results[0]}
         allowed_ids = vector_file_ids & accessible_ids
         if not allowed_ids:
             return []
 
-        # 5) Apply optional metadata filters in Django
+        # 4) Apply optional metadata filters in Django
         q = Q(id__in=allowed_ids)
         if filters.get("created_from"):
             q &= Q(created_at__gte=datetime.fromisoformat(filters["created_from"]))
@@ -722,6 +840,195 @@ def semantic_search_task(user_id: int, query: str, top_k: int, file_id: int | No
         return {"error": str(e)}
 
 
+@shared_task(name="document_search.rebuild_milvus")
+def rebuild_milvus(chunk_size: int = REBUILD_CHUNK_SIZE, drop_old: bool = False) -> dict:
+    """
+    Rebuild the Milvus collection from the embeddings cached in VectorChunk.
+
+    No extraction and no model inference: rows are streamed with a
+    server-side cursor, grouped by owner partition and bulk-inserted into a
+    fresh `<COLLECTION_NAME>_<timestamp>` collection. Files indexed while the
+    copy runs are re-copied in catch-up passes – the last one with indexing
+    writes held (see `_milvus_writes`) – and then the COLLECTION_NAME alias
+    is switched to it atomically, so searches never see a half-built index.
+    """
+    _connect()
+    target = f"{COLLECTION_NAME}_{int(time.time())}"
+    coll = _create_collection(target)
+    cache.set(REBUILD_KEY, target, timeout=None)     # deletions now reach the copy too
+
+    try:
+        t0 = time.perf_counter()
+        since = timezone.now() - REBUILD_CATCHUP_MARGIN
+        partitions = set()
+        inserted = _copy_chunks(coll, VectorChunk.objects.all(), partitions, chunk_size)
+
+        coll.flush()
+        if coll.num_entities != inserted:
+            coll.drop()
+            raise RuntimeError(
+                f"Milvus rebuild aborted: {coll.num_entities} entities in {target}, expected {inserted}"
+            )
+
+        # Most of the catch-up runs while indexing continues; the swap only redoes the tail
+        since = _catch_up(coll, since, partitions, chunk_size)
+        previous = _swap_collection_alias(target, coll, since, partitions, chunk_size)
+    finally:
+        cache.delete(REBUILD_KEY)
+
+    # The residency registry describes the old collection → force reloads
+    get_residency_manager().reset()
+
+    if previous and drop_old:
+        Collection(previous).drop()
+        LOGGER.info("🗑️ Dropped previous collection %s", previous)
+
+    elapsed = time.perf_counter() - t0
+    LOGGER.info(
+        "✅ Rebuilt Milvus: %s rows, %s partitions → %s in %.1fs",
+        inserted, len(partitions), target, elapsed,
+    )
+    return {
+        "collection": target,
+        "previous": previous,
+        "rows": inserted,
+        "partitions": len(partitions),
+        "seconds": round(elapsed, 1),
+    }
+
+
+def _copy_chunks(coll: Collection, chunks_qs, partitions: set, chunk_size: int) -> int:
+    """Stream `chunks_qs` (VectorChunks) into `coll`, partition by owner; returns rows inserted."""
+    rows_qs = (
+        chunks_qs
+        .order_by("user_id", "file_id", "chunk_index")
+        .values_list("user_id", "file_id", "file__filename", "chunk_text", "vector", "embedding")
+    )
+
+    inserted = 0
+    buf: List[Tuple[int, int, str, str, List[float]]] = []
+    file_chunks: List[str] = []
+    file_vectors: List[List[float]] = []
+    cur_user = cur_file = cur_name = None
+
+    def _end_file() -> None:
+        if file_chunks:
+            buf.extend(_milvus_rows(cur_file, cur_name, file_chunks, file_vectors))
+        file_chunks.clear()
+        file_vectors.clear()
+
+    def _flush_partition() -> None:
+        nonlocal inserted
+        if not buf:
+            return
+        part = _partition_name(cur_user)
+        if part not in partitions:
+            _ensure_partition(coll, part)
+            partitions.add(part)
+        _insert_batches(coll, buf, partition=part, batch=REBUILD_INSERT_BATCH, strict=True)
+        inserted += len(buf)
+        buf.clear()
+
+    for user_id, file_id, filename, text, vector, legacy in rows_qs.iterator(chunk_size=chunk_size):
+        if file_id != cur_file:
+            _end_file()
+            if user_id != cur_user or len(buf) >= REBUILD_INSERT_BATCH:
+                _flush_partition()
+            cur_user, cur_file, cur_name = user_id, file_id, filename
+        vec = vector if vector is not None else legacy
+        if vec is None:
+            continue
+        file_chunks.append(text)
+        file_vectors.append(vec.tolist() if hasattr(vec, "tolist") else vec)
+    _end_file()
+    _flush_partition()
+    return inserted
+
+
+def _catch_up(coll: Collection, since, partitions: set, chunk_size: int):
+    """
+    Re-copy every file whose VectorChunks were (re)written since `since` –
+    indexed or re-indexed after the copy's cursor passed it. Returns the
+    `since` for the next pass.
+    """
+    next_since = timezone.now() - REBUILD_CATCHUP_MARGIN
+    file_ids = list(
+        VectorChunk.objects.filter(created_at__gte=since).values_list("file_id", flat=True).distinct()
+    )
+    if file_ids:
+        _delete_file_rows(coll, file_ids)
+        rows = _copy_chunks(coll, VectorChunk.objects.filter(file_id__in=file_ids), partitions, chunk_size)
+        coll.flush()
+        LOGGER.info("🔁 Re-copied %s rows of %s files indexed during the rebuild", rows, len(file_ids))
+    return next_since
+
+
+def _swap_collection_alias(target: str, coll: Collection, since, partitions: set, chunk_size: int) -> str | None:
+    """
+    Point the COLLECTION_NAME alias at `target`; return the collection it
+    pointed to before (released, not dropped).
+
+    Indexing writes are held for the whole swap: running ones finish first,
+    the last catch-up pass copies what they wrote, and new ones resume
+    against the alias once it points at `target`. On the first run
+    COLLECTION_NAME is still a real collection; it is renamed out of the way
+    inside the same window, and `_ensure_collection` waits for the flag
+    instead of re-creating the name.
+    """
+    cache.set(SWAP_KEY, target, timeout=SWAP_TTL)
+    try:
+        deadline = time.monotonic() + SWAP_TTL / 2
+        while (cache.get(WRITERS_KEY) or 0) > 0:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Milvus rebuild aborted: indexing writes did not drain before the alias swap")
+            time.sleep(0.1)
+        _catch_up(coll, since, partitions, chunk_size)
+
+        previous = None
+        if utility.has_collection(COLLECTION_NAME):
+            current = Collection(COLLECTION_NAME)
+            real_name = current.describe().get("collection_name", COLLECTION_NAME)
+            previous = real_name if real_name != COLLECTION_NAME else None
+            if previous is None:
+                previous = f"{COLLECTION_NAME}_legacy_{int(time.time())}"
+                current.release()
+                utility.rename_collection(COLLECTION_NAME, previous)
+                utility.create_alias(target, COLLECTION_NAME)
+                return previous
+
+        if previous is None:
+            utility.create_alias(target, COLLECTION_NAME)
+        else:
+            utility.alter_alias(target, COLLECTION_NAME)
+            Collection(previous).release()
+        return previous
+    finally:
+        cache.delete(SWAP_KEY)
+
+
+@shared_task(name="document_search.evict_idle_partitions")
+def evict_idle_partitions() -> dict:
+    """
+    Periodic sweep (celery beat) that releases partitions nobody searched
+    within RESIDENCY_IDLE_SECONDS, and enforces the cluster-wide budget.
+
+    Works from the shared residency registry, so it releases partitions any
+    worker loaded; partitions Milvus has loaded that the registry lost track
+    of are adopted first and go out as idle.
+    """
+    coll = _ensure_collection()
+    manager = get_residency_manager()
+    tracked = set(manager.stats()["resident"])
+    untracked = [
+        p.name for p in coll.partitions
+        if p.name.startswith(PARTITION_PREFIX) and p.name not in tracked
+        and utility.load_state(COLLECTION_NAME, partition_names=[p.name]) == LoadState.Loaded
+    ]
+    manager.adopt(coll, untracked)
+    released = manager.evict(coll)
+    return {"released": released, "adopted": untracked}
+
+
 # ───────────── Optional alias for semantic clarity ─────────────
 process_file_for_search = index_file
 
@@ -0,0 +1,107 @@
+"""
+document_search.tenancy
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Which Milvus partitions a user may search, and with what filter.
+
+Chunks live in their owner's partition (`user_<owner_id>`), so a user's own
+partition contains only files they can read and needs no filter at all.
+Only files shared by OTHER owners need an explicit `file_id in [...]` list,
+and that list is normally small.
+
+    TenancyScope.full        partitions searched without any expr
+    TenancyScope.restricted  partitions searched with `file_id in ids`
+
+An owner who has shared every file with the user is promoted to `full`, so
+the filter never grows with the number of files a user can see: it grows
+with the number of individually shared files only.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core.models import File
+from document_operations.models import FileAccessEntry
+
+try:
+    from document_search import config
+    PARTITION_PREFIX = getattr(config, "PARTITION_PREFIX", "user_")
+    FULL_PARTITION_MIN_SHARED = getattr(config, "FULL_PARTITION_MIN_SHARED", 50)
+except ImportError:
+    PARTITION_PREFIX = "user_"
+    FULL_PARTITION_MIN_SHARED = 50
+
+
+@dataclass
+class TenancyScope:
+    full: Set[str] = field(default_factory=set)
+    restricted: Set[str] = field(default_factory=set)
+    ids: List[int] = field(default_factory=list)
+
+    @property
+    def partitions(self) -> Set[str]:
+        return self.full | self.restricted
+
+    @property
+    def expr(self) -> str:
+        """Filter for the restricted partitions."""
+        return f"file_id in [{','.join(map(str, self.ids))}]" if self.ids else ""
+
+    def __bool__(self) -> bool:
+        return bool(self.full or self.ids)
+
+
+def partition_for(owner_id: int) -> str:
+    return f"{PARTITION_PREFIX}{owner_id}"
+
+
+def build_scope(user, file_id: Optional[int] = None) -> TenancyScope:
+    """
+    Scope for `user`. With `file_id` the scope is that single file (the
+    caller has already checked access).
+    """
+    if file_id:
+        owner = File.objects.filter(pk=file_id).values_list("user_id", flat=True).first()
+        if owner is None:
+            return TenancyScope()
+        return TenancyScope(restricted={partition_for(owner)}, ids=[int(file_id)])
+
+    scope = TenancyScope(full={partition_for(user.pk)})
+
+    now = timezone.now()
+    shared = (
+        FileAccessEntry.objects.filter(user=user)
+        .filter(Q(expires_at__isnull=True) | Q(expires_at__gt=now))
+        .exclude(file_link__file__user_id=user.pk)
+        .values_list("file_link__file_id", "file_link__file__user_id")
+    )
+    by_owner: Dict[int, Set[int]] = defaultdict(set)
+    for fid, owner in shared:
+        if fid is not None:
+            by_owner[owner].add(fid)
+
+    # Owners who shared (nearly) everything: search their whole partition
+    big = [o for o, ids in by_owner.items() if len(ids) >= FULL_PARTITION_MIN_SHARED]
+    if big:
+        totals = dict(
+            File.objects.filter(user_id__in=big)
+            .values("user_id")
+            .annotate(n=Count("id"))
+            .values_list("user_id", "n")
+        )
+        for owner in big:
+            if totals.get(owner, 0) <= len(by_owner[owner]):
+                scope.full.add(partition_for(owner))
+                del by_owner[owner]
+
+    for owner, ids in by_owner.items():
+        scope.restricted.add(partition_for(owner))
+        scope.ids.extend(ids)
+    scope.ids.sort()
+    return scope
@@ -1,3 +1,460 @@
-from django.test import TestCase
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+
+from django.test import SimpleTestCase, override_settings
+
+from document_search.hashing import content_hash
+from document_search.hybrid import fuse, hybrid_search
+from document_search.pipeline import IndexJob, IndexingPipeline
+from document_search.residency import PartitionResidencyManager
+
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class _FakePartition:
+    def __init__(self, coll, name):
+        self._coll = coll
+        self.name = name
+        self.num_entities = 1000
+
+    def release(self):
+        self._coll.loaded.discard(self.name)
+
+
+class _FakeCollection:
+    """
+    Stand-in for a pymilvus Collection that counts partition loads;
+    searching a partition that is not loaded fails.
+    """
+
+    def __init__(self):
+        self.loaded = set()
+        self.loads = 0
+
+    def load(self, partition_names=None):
+        self.loads += len(partition_names or [])
+        self.loaded.update(partition_names or [])
+
+    def release(self):
+        self.loaded.clear()
+
+    def partition(self, name):
+        return _FakePartition(self, name)
+
+    def search(self, partition_names=None, **kwargs):
+        missing = set(partition_names or []) - self.loaded
+        if missing:
+            raise RuntimeError(f"partitions not loaded: {sorted(missing)}")
+        return [[]]
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class PartitionResidencyTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def test_resident_partition_is_loaded_once_across_searches(self):
+        coll = _FakeCollection()
+        manager = PartitionResidencyManager(idle_seconds=3600)
+
+        for _ in range(20):
+            with manager.acquire(coll, ["user_1"]):
+                coll.search(partition_names=["user_1"])
+
+        self.assertEqual(coll.loads, 1)
+        self.assertEqual(manager.stats()["loads"], 1)
+        self.assertEqual(manager.stats()["resident"], ["user_1"])
+
+    def test_pinned_partition_survives_budget_eviction(self):
+        coll = _FakeCollection()
+        manager = PartitionResidencyManager(max_partitions=1, idle_seconds=3600)
+
+        with manager.acquire(coll, ["user_1"]):
+            with manager.acquire(coll, ["user_2"]):
+                pass
+            # user_2 was unpinned and over the cap, user_1 is still in use
+            self.assertIn("user_1", coll.loaded)
+            coll.search(partition_names=["user_1"])
+
+        self.assertEqual(manager.stats()["resident"], ["user_1"])
+
+    def test_idle_partitions_are_released(self):
+        coll = _FakeCollection()
+        manager = PartitionResidencyManager(idle_seconds=0)
+
+        with manager.acquire(coll, ["user_1"]):
+            coll.search(partition_names=["user_1"])
+
+        self.assertNotIn("user_1", coll.loaded)
+        self.assertEqual(manager.stats()["resident"], [])
+
+    def test_any_worker_sweeps_partitions_another_worker_loaded(self):
+        coll = _FakeCollection()
+        searcher = PartitionResidencyManager(idle_seconds=3600)
+        sweeper = PartitionResidencyManager(idle_seconds=0)     # e.g. the beat worker
+
+        with searcher.acquire(coll, ["user_1"]):
+            self.assertEqual(sweeper.evict(coll, idle_only=True), [])    # in flight elsewhere
+        self.assertEqual(sweeper.evict(coll, idle_only=True), ["user_1"])
+        self.assertNotIn("user_1", coll.loaded)
+
+        with searcher.acquire(coll, ["user_1"]):                # the searcher notices and reloads
+            coll.search(partition_names=["user_1"])
+        self.assertEqual(coll.loads, 2)
+
+    def test_budget_is_shared_by_all_workers(self):
+        coll = _FakeCollection()
+        workers = [PartitionResidencyManager(max_partitions=2, idle_seconds=3600) for _ in range(3)]
+
+        for n, manager in enumerate(workers):
+            with manager.acquire(coll, [f"user_{n}"]):
+                coll.search(partition_names=[f"user_{n}"])
+
+        self.assertEqual(len(coll.loaded), 2)                    # not 2 per worker
+        self.assertEqual(workers[0].stats()["resident"], ["user_1", "user_2"])
+
+
+class _FakeEncoder:
+    """Deterministic bag-of-letters encoder; counts forward passes."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts, **kwargs):
+        self.calls += 1
+        out = np.zeros((len(texts), 26), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for ch in text.lower():
+                if "a" <= ch <= "z":
+                    out[row, ord(ch) - 97] += 1
+        return out
+
+
+class DocumentTypeClassifierTests(SimpleTestCase):
+    def test_label_matrix_is_encoded_once_and_reused_from_disk(self):
+        from document_search.classifier import DocumentTypeClassifier
+
+        labels = {"Invoice": "invoice bill payment total", "Resume": "resume work experience skills"}
+        encoder = _FakeEncoder()
+        with tempfile.TemporaryDirectory() as tmp, \
+                mock.patch("document_search.classifier._get_model", return_value=encoder):
+            first = DocumentTypeClassifier(labels=labels, model_name="fake", cache_dir=tmp)
+            self.assertEqual(
+                first.classify_texts(["invoice total due", "my work experience", "  "]),
+                ["Invoice", "Resume", "Unknown"],
+            )
+            label_passes = encoder.calls - 1       # one batched pass for the documents
+
+            second = DocumentTypeClassifier(labels=labels, model_name="fake", cache_dir=tmp)
+            second.classify_vectors(encoder.encode(["bill payment"]))
+
+        self.assertEqual(label_passes, 1)
+        self.assertEqual(encoder.calls, 3)         # second instance hit the .npy cache
+        self.assertEqual(first.cache_path, second.cache_path)
+
+
+# ─────────────────────── Batched indexing pipeline ───────────────────────
+def _fake_extract(path, md5=None):
+    return ". ".join(f"Clause {i} of {path} ({md5})" for i in range(8))
+
+
+def _fake_chunk(text):
+    return [c for c in text.split(". ") if c]
+
+
+class _FakeEmbedder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        return [[float(len(t))] * 4 for t in texts]
+
+
+class _FakeSink:
+    def __init__(self):
+        self.calls = 0
+        self.files = []
+
+    def __call__(self, jobs):
+        self.calls += 1
+        self.files.extend(jobs)
+
+
+class IndexingPipelineTests(SimpleTestCase):
+    FILES = 200
+
+    def _jobs(self):
+        return [
+            IndexJob(file_id=i, user_id=i % 3, filename=f"f{i}.txt", path=f"f{i}.txt", md5=f"{i:032x}")
+            for i in range(self.FILES)
+        ]
+
+    def test_files_are_embedded_and_persisted_in_batches(self):
+        embed, sink = _FakeEmbedder(), _FakeSink()
+        stats = IndexingPipeline(
+            extract=_fake_extract,
+            chunk=_fake_chunk,
+            embed=embed,
+            persist=sink,
+            extract_workers=4,
+            embed_batch=256,
+            persist_batch=50,
+            queue_size=8,
+            use_processes=False,
+        ).run(self._jobs())
+
+        self.assertEqual(stats.files, self.FILES)
+        self.assertEqual(sorted(j.file_id for j in sink.files), list(range(self.FILES)))
+        self.assertTrue(all(len(j.vectors) == len(j.chunks) and j.doc_vector for j in sink.files))
+        self.assertTrue(all(f"({j.md5})" in j.chunks[0] for j in sink.files))   # no re-hash in extract
+        self.assertLessEqual(sink.calls, 4)                   # per-file indexing: 200 writes
+        self.assertLess(embed.calls, self.FILES // 10)        # per-file indexing: 400 model calls
+        self.assertEqual(stats.embed_calls, embed.calls)
+
+    def test_persist_failure_propagates_without_deadlock(self):
+        def broken_sink(jobs):
+            raise RuntimeError("db down")
+
+        pipeline = IndexingPipeline(
+            extract=_fake_extract,
+            chunk=_fake_chunk,
+            embed=_FakeEmbedder(),
+            persist=broken_sink,
+            persist_batch=5,
+            queue_size=2,
+            use_processes=False,
+        )
+        with self.assertRaises(RuntimeError):
+            pipeline.run(self._jobs())
+
+
+# ─────────────────────── Stable chunk hashing ───────────────────────
+class ContentHashTests(SimpleTestCase):
+    def test_hash_is_identical_across_interpreters(self):
+        code = "from document_search.hashing import content_hash; print(content_hash('Governing law clause.'))"
+        values = set()
+        for seed in ("1", "2"):
+            env = dict(os.environ, PYTHONHASHSEED=seed)
+            out = subprocess.run(
+                [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+            values.add(int(out.stdout))
+        self.assertEqual(values, {content_hash("Governing law clause.")})
+
+    def test_hash_fits_milvus_int64(self):
+        h = content_hash("x" * 10_000)
+        self.assertTrue(-(2 ** 63) <= h < 2 ** 63)
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class EmbeddingCacheTests(SimpleTestCase):
+    def test_repeated_chunks_skip_the_model(self):
+        from document_search import utils
+
+        encoder = _FakeEncoder()
+        boilerplate = "This agreement is governed by the laws of England."
+        with mock.patch.object(utils, "_get_model", return_value=encoder):
+            first = utils.embed_texts_cached([boilerplate, "Party A pays.", boilerplate])
+            second = utils.embed_texts_cached(["Party B pays.", boilerplate])
+
+        self.assertEqual(encoder.calls, 2)
+        self.assertEqual(first[0], first[2])
+        self.assertEqual(second[1], first[0])
+
+
+# ─────────────────────── Hybrid BM25 + vector search ───────────────────────
+class HybridSearchTests(SimpleTestCase):
+    def _backends(self, barrier=None):
+        def lexical():
+            if barrier:
+                barrier.wait()
+            return [3, 1, 99]                       # 99 is not accessible
+
+        def dense():
+            if barrier:
+                barrier.wait()
+            return [
+                {"file_id": 1, "chunk_text": "termination for convenience", "score": 0.91},
+                {"file_id": 2, "chunk_text": "notice period", "score": 0.80},
+                {"file_id": 1, "chunk_text": "termination fee", "score": 0.75},
+            ]
+
+        return lexical, dense
+
+    def test_fan_out_overlaps_backends(self):
+        # each backend waits for the other: only completes if both run at once
+        lexical, dense = self._backends(threading.Barrier(2, timeout=10))
+        out = hybrid_search(None, "termination", top_k=5, accessible_ids=[1, 2, 3], lexical=lexical, dense=dense)
+
+        ids = [r["file_id"] for r in out["results"]]
+        self.assertEqual(ids[0], 1)                 # ranked by both backends
+        self.assertNotIn(99, ids)
+        self.assertEqual(set(ids), {1, 2, 3})
+
+    def test_chunk_granularity_inherits_file_rank(self):
+        rows = fuse(
+            [1, 3],
+            [
+                {"file_id": 2, "chunk_text": "a", "score": 0.9},
+                {"file_id": 1, "chunk_text": "b", "score": 0.8},
+            ],
+            granularity="chunk",
+        )
+        keys = [(r["file_id"], r["chunk_hash"] is None) for r in rows]
+        self.assertEqual(keys[0], (1, False))       # dense rank 2 + lexical rank 1
+        self.assertIn((3, True), keys)              # lexical-only file kept at file level
+
+    def test_failed_backend_degrades_to_the_other(self):
+        def broken():
+            raise ConnectionError("es down")
+
+        _, dense = self._backends()
+        out = hybrid_search(None, "termination", accessible_ids=[1, 2], lexical=broken, dense=dense)
+        self.assertEqual([r["file_id"] for r in out["results"]], [1, 2])
+
+
+# ─────────────────────────── Milvus tenancy scope ───────────────────────────
+class TenancyScopeTests(SimpleTestCase):
+    def _scope(self, shared_rows, owner_totals):
+        from document_search import tenancy
+
+        with mock.patch.object(tenancy, "FileAccessEntry") as fae, mock.patch.object(tenancy, "File") as file_model:
+            (fae.objects.filter.return_value.filter.return_value
+                .exclude.return_value.values_list.return_value) = shared_rows
+            (file_model.objects.filter.return_value.values.return_value
+                .annotate.return_value.values_list.return_value) = list(owner_totals.items())
+            return tenancy.build_scope(mock.Mock(pk=1))
+
+    def test_own_files_never_reach_the_expression(self):
+        scope = self._scope([(501, 7), (502, 7)], {})
+        self.assertEqual(scope.full, {"user_1"})
+        self.assertEqual(scope.restricted, {"user_7"})
+        self.assertEqual(scope.expr, "file_id in [501,502]")
+
+    def test_fully_shared_owner_is_searched_unfiltered(self):
+        rows = [(1000 + i, 8) for i in range(60)] + [(900, 9)]
+        scope = self._scope(rows, {8: 60})
+        self.assertEqual(scope.full, {"user_1", "user_8"})
+        self.assertEqual(scope.ids, [900])
+
+
+# ─────────────────────────── Cross-encoder rerank ───────────────────────────
+class _FakeCrossEncoder:
+    def __init__(self):
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.pairs += len(pairs)
+        return [float("termination" in text) + len(text) / 1000 for _, text in pairs]
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CrossEncoderRerankTests(SimpleTestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+
+    def _hits(self, n):
+        return [{"file_id": i, "chunk_text": f"clause {i}", "score": 1 - i / 100} for i in range(n)]
+
+    def test_rerank_promotes_relevant_chunk_and_caches_scores(self):
+        from document_search.rerank import CrossEncoderReranker
+
+        model = _FakeCrossEncoder()
+        reranker = CrossEncoderReranker(model=model, model_name="fake")
+        hits = self._hits(10) + [{"file_id": 99, "chunk_text": "termination for convenience", "score": 0.1}]
+
+        first = reranker.rerank("termination", [dict(h) for h in hits], top_k=3)
+        self.assertEqual(first[0]["file_id"], 99)
+        scored = model.pairs
+
+        reranker.rerank("termination", [dict(h) for h in hits], top_k=3)   # next page / repeat
+        self.assertEqual(model.pairs, scored)
+
+    def test_depth_adapts_to_latency_budget(self):
+        from document_search.rerank import CrossEncoderReranker, LatencyBudget
+
+        budget = LatencyBudget(budget_ms=20, min_depth=5, max_depth=200, warmup=1)
+        self.assertEqual(budget.depth(), 200)               # no samples yet: measure at full depth
+        budget.record(0.050, 25)                            # 2 ms/pair → 10 pairs in 20 ms
+        self.assertEqual(budget.depth(), 10)
+
+        model = _FakeCrossEncoder()
+        fixed = mock.Mock(depth=mock.Mock(return_value=10))
+        ranked = CrossEncoderReranker(model=model, model_name="fixed", budget=fixed).rerank("q", self._hits(50), top_k=5)
+        self.assertEqual(model.pairs, 10)                   # only the budgeted head is scored
+        self.assertEqual(len(ranked), 5)
+
+
+# ───────────────────────── Shared extraction cache ─────────────────────────
+@override_settings(CACHES=LOCMEM_CACHE)
+class ExtractionCacheTests(SimpleTestCase):
+    """
+    Upload → indexed with every pipeline asking for the same file's text:
+    File.content, search indexing, anonymizer, document structures.
+    """
+
+    def setUp(self):
+        from django.core.cache import cache
+        from core import extraction
+
+        cache.clear()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        patcher = mock.patch.object(extraction, "EXTRACTION_CACHE_DIR", os.path.join(self.tmp.name, "cache"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.calls = 0
+
+        def partition(path):
+            self.calls += 1
+            with open(path, encoding="utf-8") as fh:
+                body = fh.read()
+            return extraction.Extraction(text=body, elements=[{"type": "NarrativeText", "text": body}])
+
+        extraction.register_extractor("bench:partition")(partition)
+        self.extraction = extraction
+
+    def _upload(self, name, body):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write(body)
+        return path
+
+    def _upload_to_indexed(self, path, consumers=4):
+        return [self.extraction.extract(path, "bench:partition").joined() for _ in range(consumers)]
+
+    def test_each_file_is_partitioned_once_across_pipelines_and_users(self):
+        body = "This Agreement may be terminated for convenience. " * 200
+        texts = self._upload_to_indexed(self._upload("a.pdf", body))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(len(set(texts)), 1)
+
+        # same content uploaded by another user under another name
+        self._upload_to_indexed(self._upload("copy-of-a.pdf", body))
+        self.assertEqual(self.calls, 1)
+
+        stats = self.extraction.extraction_stats()["bench:partition"]
+        self.assertEqual(stats, {"hits": 7, "misses": 1, "hit_rate": 0.875})
+
+    def test_failed_extraction_is_not_cached(self):
+        def broken(path):
+            raise RuntimeError("poppler missing")
+
+        self.extraction.register_extractor("bench:broken")(broken)
+        path = self._upload("b.pdf", "x")
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                self.extraction.extract(path, "bench:broken")
+        self.assertEqual(self.extraction.extraction_stats()["bench:broken"]["misses"], 2)
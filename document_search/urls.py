@@ -6,6 +6,7 @@ from document_search import views
 urlpatterns = [
     # ──────────── 🔍 Search & Results ─────────────
     path("search/", views.ChunkedFileSearchView.as_view(), name="vector-search"),
+    path("hybrid-search/", views.HybridSearchView.as_view(), name="hybrid-search"),  # POST {query, top_k, granularity}
 
     # ──────────── 📦 Vectorized Chunk Data ────────
     path("chunks/", views.VectorChunkListView.as_view(), name="chunk-list"),  # admin only
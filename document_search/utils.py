@@ -16,9 +16,10 @@ Supported file types:
 - .jpg/.jpeg/.png → OCR (Tesseract)
 
 Public API:
-- extract_text(path: str)                   → str
+- extract_text(path: str, md5=None)         → str (shared extraction cache)
 - split_text(text: str)                     → list[str]
 - embed_texts(list[str])                    → list[list[float]]
+- embed_texts_cached(list[str])             → list[list[float]] (dedup + shared cache)
 - compute_chunks(path)                      → tuple[list[str], list[float]]
 """
 
@@ -30,8 +31,13 @@ import os
 from pathlib import Path
 from functools import lru_cache
 from typing import List, Tuple
+
+import numpy as np
+from django.core.cache import cache
+
 from core.models import File
-from unstructured.partition.pdf import partition_pdf
+from core.extraction import extract, unstructured_kind
+from document_search.hashing import content_hash
 import nltk
 from nltk.tokenize import sent_tokenize
 nltk.download('punkt')
@@ -39,9 +45,6 @@ nltk.download('punkt')
 from pathlib import Path
 import os
 import logging
-from unstructured.partition.pdf import partition_pdf
-from unstructured.partition.docx import partition_docx
-from unstructured.partition.html import partition_html
 
 LOGGER = logging.getLogger(__name__)
 
@@ -89,10 +92,12 @@ try:
     MODEL_NAME = getattr(config, "EMBEDDING_MODEL", "all-MiniLM-L6-v2")
     CHUNK_SIZE = getattr(config, "CHUNK_SIZE", 500)
     CHUNK_OVERLAP = getattr(config, "CHUNK_OVERLAP", 100)
+    EMBED_CACHE_TTL = getattr(config, "EMBED_CACHE_TTL", 30 * 24 * 3600)
 except ImportError:
     MODEL_NAME = "all-MiniLM-L6-v2"
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 100
+    EMBED_CACHE_TTL = 30 * 24 * 3600
 
 LOGGER = logging.getLogger(__name__)
 
@@ -134,6 +139,49 @@ def embed_text(text: str) -> List[float]:
     return embed_texts([text])[0]
 
 
+def _embed_cache_key(h: int) -> str:
+    return f"emb:{MODEL_NAME}:{h}"
+
+
+def embed_texts_cached(texts: List[str]) -> List[List[float]]:
+    """
+    Like embed_texts, but identical texts are embedded once, ever.
+
+    Vectors are cached in the shared Django cache (Redis) under
+    (model, content_hash) as packed float32, so boilerplate clauses repeated
+    across files and tenants skip the forward pass. Repeats inside the
+    same call are also collapsed before hitting the model.
+    """
+    if not texts:
+        return []
+
+    hashes = [content_hash(t) for t in texts]
+    unique = dict(zip(hashes, texts))                 # hash → text, first wins
+    found = cache.get_many([_embed_cache_key(h) for h in unique])
+
+    vectors = {}
+    for h in unique:
+        raw = found.get(_embed_cache_key(h))
+        if raw is not None:
+            vectors[h] = np.frombuffer(raw, dtype="<f4").tolist()
+
+    missing = [h for h in unique if h not in vectors]
+    if missing:
+        fresh = _get_model().encode([unique[h] for h in missing], show_progress_bar=False)
+        fresh = np.asarray(fresh, dtype="<f4")
+        cache.set_many(
+            {_embed_cache_key(h): vec.tobytes() for h, vec in zip(missing, fresh)},
+            timeout=EMBED_CACHE_TTL,
+        )
+        vectors.update(zip(missing, fresh.tolist()))
+
+    LOGGER.debug(
+        "Embedding cache: %s texts, %s unique, %s cached, %s encoded",
+        len(texts), len(unique), len(unique) - len(missing), len(missing),
+    )
+    return [vectors[h] for h in hashes]
+
+
 # ─────────────── Chunking ──────────────────────────────────
 '''
 def split_text(text: str, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP) -> List[str]:
@@ -311,23 +359,18 @@ def extract_text(path: str | os.PathLike) -> str:
 '''
 
 
-def extract_text(path: str | os.PathLike) -> str:
-    """Extract raw text from supported filetypes using unstructured or fallback extractors."""
+def extract_text(path: str | os.PathLike, md5: str | None = None) -> str:
+    """
+    Extract raw text from supported filetypes using unstructured or fallback extractors.
+    unstructured output comes from the shared extraction cache (core.extraction).
+    """
     p = Path(path)
     ext = p.suffix.lower()
 
     try:
-        if ext == ".pdf":
-            elements = partition_pdf(filename=str(p))
-            return "\n\n".join(el.text for el in elements if el.text)
-
-        elif ext == ".docx":
-            elements = partition_docx(filename=str(p))
-            return "\n\n".join(el.text for el in elements if el.text)
-
-        elif ext in [".html", ".htm"]:
-            elements = partition_html(filename=str(p))
-            return "\n\n".join(el.text for el in elements if el.text)
+        if ext in (".pdf", ".docx", ".html", ".htm"):
+            result = extract(str(p), f"unstructured:{unstructured_kind(str(p))}", md5=md5)
+            return result.joined(strip=False)
 
         elif ext == ".txt":
             with p.open("r", encoding="utf-8", errors="ignore") as f:
@@ -351,6 +394,7 @@ def compute_chunks(
     path: str | os.PathLike,
     chunk_size: int = CHUNK_SIZE,
     overlap: int = CHUNK_OVERLAP,
+    md5: str | None = None,
 ) -> Tuple[List[str], List[List[float]]]:
     """
     Full pipeline: file ➤ text ➤ chunks ➤ vectors.
@@ -358,12 +402,12 @@ def compute_chunks(
     Returns:
         (chunks, vectors)
     """
-    text = extract_text(path)
+    text = extract_text(path, md5=md5)
     if not text.strip():
         return [], []
 
     chunks = split_text(text, chunk_size, overlap)
-    vectors = embed_texts(chunks)
+    vectors = embed_texts_cached(chunks)
     return chunks, vectors
 
 
@@ -14,8 +14,9 @@ from custom_authentication.permissions import IsClientOrAdminOrSuperUser
 from django.core.cache import cache
 from celery.result import AsyncResult
 
-from document_search.models import VectorChunk
+from document_search.models import SearchQueryLog, VectorChunk
 from document_search.serializers import (
+    HybridSearchRequestSerializer,
     SearchRequestSerializer,
     SearchResultSerializer,
     VectorChunkSerializer,
@@ -23,7 +24,8 @@ from document_search.serializers import (
     AsyncSearchResponse
 )
 from core.models import File
-from document_search.utils import _get_model
+from document_search.utils import _get_model, preview_for_file
+from document_search.hybrid import hybrid_search
 
 from document_search.tasks import (
     index_file,
@@ -31,6 +33,8 @@ from document_search.tasks import (
 )
 from document_search.tasks import exec_search
 from document_search.tasks import semantic_search_task
+from document_search.tasks import _dense_search
+from document_search.tenancy import build_scope
 
 import time
 from django.db.models import Q
@@ -119,39 +123,24 @@ class ChunkedFileSearchView(APIView):
         embed_model = _get_model()
         query_vector = embed_model.encode([query])[0]
 
-        # ✅ Setup Milvus
-        collection = _get_collection()
-
         # ✅ Get file access scope
-        accessible_file_ids = get_user_accessible_file_ids(user)
+        accessible_file_ids = set(get_user_accessible_file_ids(user))
 
         # If filtering by file_id, validate access
-        expr = ""
-        if file_id:
-            if file_id not in accessible_file_ids:
-                return Response({"error": "You do not have access to this file."}, status=403)
-            expr = f"file_id == {file_id}"
-        else:
-            if not accessible_file_ids:
-                return Response([], status=200)
-            id_list = ",".join(map(str, accessible_file_ids))
-            expr = f"file_id in [{id_list}]"
+        if file_id and file_id not in accessible_file_ids:
+            return Response({"error": "You do not have access to this file."}, status=403)
+        if not accessible_file_ids:
+            return Response([], status=200)
 
+        # ✅ Milvus – own partition unfiltered, shared files by id (see tenancy.py)
         try:
-            results = collection.search(
-                data=[query_vector],
-                anns_field="vector",
-                param={"metric_type": "COSINE", "params": {"nprobe": 10}},
-                limit=top_k,
-                expr=expr,
-                output_fields=["file_id", "chunk_text"],
-            )
+            hits = _dense_search(query_vector, build_scope(user, file_id), top_k)
         except Exception as e:
             logger.exception("Search failed")
             return Response({"error": str(e)}, status=500)
 
         top_matches = []
-        for hit in results[0]:
+        for hit in hits:
             chunk_text = hit.entity.get("chunk_text", "")
             file_id = hit.entity.get("file_id")
             if file_id not in accessible_file_ids:
@@ -172,6 +161,52 @@ class ChunkedFileSearchView(APIView):
         return Response(response.data, status=200)
 
 
+# ─────────────────────────────────────────────────────────────
+# 🔀 Hybrid Search API (BM25 + vector, sync)
+# ─────────────────────────────────────────────────────────────
+class HybridSearchView(APIView):
+    """
+    POST /api/v1/document-search/hybrid-search/
+    body: {"query": "termination for convenience", "top_k": 10, "granularity": "file" | "chunk"}
+
+    Elasticsearch and Milvus are queried concurrently and fused with
+    reciprocal-rank fusion, so clients no longer call both endpoints.
+    """
+    authentication_classes = [OAuth2Authentication]
+    permission_classes = [IsAuthenticated, IsClientOrAdminOrSuperUser]
+
+    def post(self, request):
+        serializer = HybridSearchRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        out = hybrid_search(
+            request.user,
+            data["query"],
+            top_k=data["top_k"],
+            granularity=data["granularity"],
+        )
+        for row in out["results"]:
+            row["preview"] = preview_for_file(row["file_id"])
+
+        SearchQueryLog.objects.create(
+            user=request.user,
+            query_text=data["query"],
+            top_k=data["top_k"],
+            duration_ms=out["timings_ms"].get("total"),
+            result_count=len(out["results"]),
+            result_json=out["results"],
+        )
+        return Response({
+            "status": "ok",
+            "query": data["query"],
+            "granularity": data["granularity"],
+            "count": len(out["results"]),
+            "results": out["results"],
+            "timings_ms": out["timings_ms"],
+        })
+
+
 class VectorChunkListView(generics.ListAPIView):
     queryset = VectorChunk.objects.all().select_related("file")
     serializer_class = VectorChunkSerializer
@@ -239,6 +274,7 @@ class ChunkedFileSearchViewV2(APIView):
         query = request.data.get("query")
         file_id = request.data.get("file_id")
         top_k = int(request.data.get("top_k", 5))
+        rerank = str(request.data.get("rerank", "")).lower() in ("1", "true", "yes")
 
         if not query:
             return Response({"error": "Missing 'query' in request"}, status=400)
@@ -251,7 +287,7 @@ class ChunkedFileSearchViewV2(APIView):
                 return Response({"error": "You do not have permission to access this file."}, status=403)
 
         # 🚀 Submit task
-        task = exec_search.apply_async(args=[user.id, query, file_id, top_k])
+        task = exec_search.apply_async(args=[user.id, query, file_id, top_k], kwargs={"rerank": rerank})
 
         # Wait for result (max 60s)
         timeout = 60
@@ -1,9 +1,7 @@
 # document_structures/utils.py
 
 import os
-from unstructured.partition.pdf import partition_pdf
-from unstructured.partition.text import partition_text
-from unstructured.partition.auto import partition
+from core.extraction import extract_for_file, unstructured_kind
 
 from document_structures import models
 from core.models import File, Run, User
@@ -65,15 +63,19 @@ def run_partition(file: File, partition_strategy: str) -> list:
     file_path = file.filepath
     logger.warning(f"→ Partitioning file: {file_path} | strategy={partition_strategy}")
 
+    # Served from the shared extraction cache; `partition_auto` resolves to the
+    # same partitioner (and cache entry) as the file type's dedicated one.
     if partition_strategy == "partition_pdf":
-        elements = partition_pdf(filename=file_path)
+        extractor = "unstructured:pdf"
     elif partition_strategy == "partition_text":
-        elements = partition_text(filename=file_path)
+        extractor = "unstructured:text"
     elif partition_strategy == "partition_auto":
-        elements = partition(filename=file_path)
+        extractor = f"unstructured:{unstructured_kind(file_path)}"
     else:
         raise ValueError(f"Unknown partition strategy: {partition_strategy}")
 
+    elements = extract_for_file(file, extractor).as_elements()
+
     logger.warning(f"✅ Partition produced {len(elements)} elements.")
     return elements
 
@@ -0,0 +1,539 @@
+"""
+document_translation.batch
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Batched, non-blocking document translation.
+
+    submit  ─▶ one source + one target container per run, every file uploaded
+               (in parallel) ─▶ ONE begin_translation for the whole batch;
+               the operation id is stored on the TranslationRun
+    poll    ─▶ a short Celery task re-scheduled with a countdown until the
+               operation is terminal – no worker waits on Azure
+    collect ─▶ all outputs downloaded in parallel, TranslationFile rows and
+               generated Files written, containers deleted
+
+Blobs are named `<file id>/<filename>`, so outputs map back to their source
+file even when two files share a name. Collection only touches files still
+"Processing", so a collect that dies half-way is resumed by the next poll.
+
+Segmentable files go through the translation memory (memory.py): only
+their novel segments are uploaded, as `<file id>/<stem>.segments.txt`, and
+the output is reassembled from memory + provider translations at collect
+time. A run whose segments are all in memory never reaches Azure.
+Characters actually sent are billed to the upload Run (`characters`,
+`cost` at TRANSLATION_COST_PER_MILLION_CHARS).
+
+Storage and the translation endpoint sit behind a small backend interface:
+`AzureTranslationBackend` for production and `LocalTranslationBackend`, a
+filesystem stand-in used in development (TRANSLATION_BACKEND="local") and
+in tests.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from core import blobstore
+from core.models import Run
+from core.utils import register_generated_file
+from document_translation import memory
+from document_translation.models import TranslationFile, TranslationRun
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_BACKEND = getattr(settings, "TRANSLATION_BACKEND", "azure")
+TRANSLATION_LOCAL_ROOT = getattr(
+    settings, "TRANSLATION_LOCAL_ROOT", os.path.join(settings.MEDIA_ROOT, "translation_local")
+)
+TRANSLATION_POLL_INTERVAL = getattr(settings, "TRANSLATION_POLL_INTERVAL", 10)           # seconds
+TRANSLATION_POLL_MAX_INTERVAL = getattr(settings, "TRANSLATION_POLL_MAX_INTERVAL", 60)   # seconds
+TRANSLATION_MAX_POLLS = getattr(settings, "TRANSLATION_MAX_POLLS", 720)
+TRANSLATION_TRANSFER_WORKERS = getattr(settings, "TRANSLATION_TRANSFER_WORKERS", 8)
+TRANSLATION_MAX_BATCH_DOCUMENTS = getattr(settings, "TRANSLATION_MAX_BATCH_DOCUMENTS", 1000)  # Azure limit
+TRANSLATION_COST_PER_MILLION_CHARS = getattr(settings, "TRANSLATION_COST_PER_MILLION_CHARS", 15.0)
+
+# Operation states (Azure Document Translation)
+RUNNING_STATES = {"NotStarted", "Running", "Cancelling"}
+SUCCEEDED = "Succeeded"
+
+
+@dataclass
+class DocumentOutcome:
+    blob_name: str
+    status: str
+    error: Optional[str] = None
+    characters: int = 0
+
+    @property
+    def succeeded(self) -> bool:
+        return self.status == SUCCEEDED
+
+
+# ───────────────────────────── Backends ─────────────────────────────────────
+class AzureTranslationBackend:
+    """Blob Storage + Document Translation, via the existing AzureBlobService config."""
+
+    def __init__(self):
+        from azure.ai.translation.document import DocumentTranslationClient
+        from azure.core.credentials import AzureKeyCredential
+
+        from document_translation.utils import AzureBlobService
+
+        self.blobs = AzureBlobService()
+        self.client = DocumentTranslationClient(
+            self.blobs.config["translator_document_endpoint"],
+            AzureKeyCredential(os.getenv("TRANSLATOR_DOCUMENT_KEY")),
+        )
+
+    def create_container(self, name: str) -> None:
+        self.blobs.ensure_container_exists(name)
+
+    def delete_container(self, name: str) -> None:
+        self.blobs.force_delete_container(name)
+
+    def upload(self, container: str, blob_name: str, path: str) -> None:
+        with open(path, "rb") as data:
+            self.blobs.blob_service_client.get_blob_client(container, blob_name).upload_blob(data, overwrite=True)
+
+    def download(self, container: str, blob_name: str, destination: str) -> None:
+        with blobstore.replacing(destination) as tmp, open(tmp, "wb") as fh:
+            self.blobs.blob_service_client.get_blob_client(container, blob_name).download_blob().readinto(fh)
+
+    def start(self, source_container: str, target_container: str, source_language: str, target_language: str) -> str:
+        from azure.ai.translation.document import DocumentTranslationInput, TranslationTarget
+
+        translation_input = DocumentTranslationInput(
+            source_url=self.blobs.generate_sas_url(source_container),
+            targets=[TranslationTarget(target_url=self.blobs.generate_sas_url(target_container), language=target_language)],
+            source_language=source_language or None,
+        )
+        return self.client.begin_translation(inputs=[translation_input]).id
+
+    def status(self, operation_id: str) -> str:
+        return self.client.get_translation_status(operation_id).status
+
+    def documents(self, operation_id: str) -> List[DocumentOutcome]:
+        outcomes = []
+        for doc in self.client.list_document_statuses(operation_id):
+            # .../<container>/<blob name>
+            blob_name = unquote(urlparse(doc.source_document_url).path).lstrip("/").split("/", 1)[-1]
+            error = doc.error.message if doc.error else None
+            outcomes.append(DocumentOutcome(
+                blob_name=blob_name, status=doc.status, error=error, characters=doc.characters_charged or 0
+            ))
+        return outcomes
+
+
+def _copy_translation(source: str, destination: str, target_language: str) -> None:
+    shutil.copyfile(source, destination)
+
+
+class LocalTranslationBackend:
+    """
+    Filesystem stand-in for Blob Storage and the translation endpoint.
+
+    Containers are directories under `root`; operations are JSON files, so
+    state survives across Celery processes. An operation reports "Running"
+    for `polls` status calls, then runs `translate(src, dst, language)` on
+    every source blob (default: copy). `latency` is slept per transfer to
+    model network time.
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        polls: int = 1,
+        translate: Callable[[str, str, str], None] = _copy_translation,
+        latency: float = 0.0,
+    ):
+        self.root = Path(root or TRANSLATION_LOCAL_ROOT)
+        self.polls = polls
+        self.translate = translate
+        self.latency = latency
+
+    def _blob(self, container: str, blob_name: str) -> Path:
+        return self.root / container / blob_name
+
+    def _operation(self, operation_id: str) -> Path:
+        return self.root / "_operations" / f"{operation_id}.json"
+
+    def _save(self, operation_id: str, state: dict) -> None:
+        path = self._operation(operation_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(state))
+
+    def create_container(self, name: str) -> None:
+        (self.root / name).mkdir(parents=True, exist_ok=True)
+
+    def delete_container(self, name: str) -> None:
+        shutil.rmtree(self.root / name, ignore_errors=True)
+
+    def upload(self, container: str, blob_name: str, path: str) -> None:
+        time.sleep(self.latency)
+        target = self._blob(container, blob_name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target)
+
+    def download(self, container: str, blob_name: str, destination: str) -> None:
+        time.sleep(self.latency)
+        with blobstore.replacing(destination) as tmp:
+            shutil.copyfile(self._blob(container, blob_name), tmp)
+
+    def start(self, source_container: str, target_container: str, source_language: str, target_language: str) -> str:
+        operation_id = uuid.uuid4().hex
+        self._save(operation_id, {
+            "source": source_container,
+            "target": target_container,
+            "language": target_language,
+            "polls_left": self.polls,
+            "status": "NotStarted",
+            "documents": [],
+        })
+        return operation_id
+
+    def status(self, operation_id: str) -> str:
+        state = json.loads(self._operation(operation_id).read_text())
+        if state["status"] not in RUNNING_STATES:
+            return state["status"]
+        if state["polls_left"] > 0:
+            state["polls_left"] -= 1
+            state["status"] = "Running"
+        else:
+            state["documents"] = self._translate_all(state)
+            ok = any(d["status"] == SUCCEEDED for d in state["documents"])
+            state["status"] = SUCCEEDED if ok else "Failed"
+        self._save(operation_id, state)
+        return state["status"]
+
+    def _translate_all(self, state: dict) -> List[dict]:
+        source_root = self.root / state["source"]
+        documents = []
+        for source in sorted(p for p in source_root.rglob("*") if p.is_file()):
+            blob_name = source.relative_to(source_root).as_posix()
+            target = self._blob(state["target"], blob_name)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                self.translate(str(source), str(target), state["language"])
+                documents.append(asdict(DocumentOutcome(blob_name, SUCCEEDED, characters=source.stat().st_size)))
+            except Exception as e:
+                documents.append(asdict(DocumentOutcome(blob_name, "Failed", str(e))))
+        return documents
+
+    def documents(self, operation_id: str) -> List[DocumentOutcome]:
+        state = json.loads(self._operation(operation_id).read_text())
+        return [DocumentOutcome(**d) for d in state["documents"]]
+
+
+def get_backend():
+    if TRANSLATION_BACKEND == "local":
+        return LocalTranslationBackend()
+    return AzureTranslationBackend()
+
+
+# ───────────────────────────── Batch job ────────────────────────────────────
+class BatchJob:
+    """One container pair and one translation operation for many documents."""
+
+    def __init__(self, backend, source_container: str, target_container: str, workers: int = TRANSLATION_TRANSFER_WORKERS):
+        self.backend = backend
+        self.source_container = source_container
+        self.target_container = target_container
+        self.workers = workers
+
+    @classmethod
+    def for_run(cls, run, backend) -> "BatchJob":
+        return cls(
+            backend,
+            run.source_container or f"translation-source-{run.id}",
+            run.target_container or f"translation-target-{run.id}",
+        )
+
+    def _parallel(self, fn, items: Dict[str, str]) -> Dict[str, Optional[str]]:
+        """Run fn(blob_name, path) for every item on the transfer pool → {blob_name: error or None}."""
+        def attempt(item):
+            blob_name, path = item
+            try:
+                fn(blob_name, path)
+                return blob_name, None
+            except Exception as e:
+                logger.warning(f"⚠️ Transfer failed for '{blob_name}': {e}")
+                return blob_name, str(e)
+
+        if not items:
+            return {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(items)))) as pool:
+            return dict(pool.map(attempt, items.items()))
+
+    def prepare(self) -> None:
+        self.backend.create_container(self.source_container)
+        self.backend.create_container(self.target_container)
+
+    def upload(self, sources: Dict[str, str]) -> None:
+        """Upload {blob_name: local path}; any failure fails the submission."""
+        errors = {b: e for b, e in self._parallel(
+            lambda b, p: self.backend.upload(self.source_container, b, p), sources
+        ).items() if e}
+        if errors:
+            raise RuntimeError(f"Upload failed for {len(errors)} of {len(sources)} documents: {errors}")
+        logger.info(f"📤 Uploaded {len(sources)} documents to '{self.source_container}'")
+
+    def start(self, source_language: str, target_language: str) -> str:
+        return self.backend.start(self.source_container, self.target_container, source_language, target_language)
+
+    def download(self, destinations: Dict[str, str]) -> Dict[str, Optional[str]]:
+        """Download {blob_name: local path} → {blob_name: error or None}."""
+        def fetch(blob_name, path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.backend.download(self.target_container, blob_name, path)
+
+        return self._parallel(fetch, destinations)
+
+    def cleanup(self) -> None:
+        for container in (self.source_container, self.target_container):
+            try:
+                self.backend.delete_container(container)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not delete container '{container}': {e}")
+
+
+def blob_name_for(file) -> str:
+    return f"{file.id}/{os.path.basename(file.filepath)}"
+
+
+def segments_blob_name_for(file) -> str:
+    return f"{file.id}/{os.path.splitext(os.path.basename(file.filepath))[0]}.segments.txt"
+
+
+def sent_blob_name(tf: TranslationFile) -> Optional[str]:
+    """What was uploaded for this file: the file, its novel segments, or nothing (all from memory)."""
+    if tf.novel_segments is None:
+        return blob_name_for(tf.original_file)
+    return segments_blob_name_for(tf.original_file) if tf.novel_segments else None
+
+
+def output_path_for(file, to_language: str) -> str:
+    """Same location the per-file translator always used: <file dir>/translations/<lang>/<filename>."""
+    return os.path.join(os.path.dirname(file.filepath), "translations", to_language, os.path.basename(file.filepath))
+
+
+def poll_delay(attempt: int) -> int:
+    """Countdown before status check number `attempt` (0 = first): doubles up to the max interval."""
+    return min(TRANSLATION_POLL_MAX_INTERVAL, TRANSLATION_POLL_INTERVAL * 2 ** min(attempt, 10))
+
+
+# ───────────────────────────── Run lifecycle ────────────────────────────────
+def submit_run(run: TranslationRun, files, backend=None) -> Optional[str]:
+    """
+    Upload `files` (or just their novel segments) and start one translation
+    operation for them; returns its id, or None when memory covered everything.
+    """
+    files = list(files)
+    if not files:
+        raise ValueError("No files to translate")
+    if len(files) > TRANSLATION_MAX_BATCH_DOCUMENTS:
+        raise ValueError(f"Too many documents for one batch ({len(files)} > {TRANSLATION_MAX_BATCH_DOCUMENTS})")
+
+    scratch = tempfile.mkdtemp(prefix="translation-segments-")
+    try:
+        sources = {}
+        with transaction.atomic():
+            for f in files:
+                plan = memory.plan_document(f.filepath, run.from_language, run.to_language)
+                if plan is None:
+                    sources[blob_name_for(f)] = f.filepath
+                elif plan.novel:
+                    delta = os.path.join(scratch, f"{f.id}.segments.txt")
+                    memory.write_delta(plan, delta)
+                    sources[segments_blob_name_for(f)] = delta
+                TranslationFile.objects.update_or_create(
+                    original_file=f,
+                    run=run,
+                    defaults={
+                        "status": "Processing",
+                        "original_filepath": f.filepath,
+                        "novel_segments": plan.novel if plan else None,
+                        "segments_total": plan.total if plan else 0,
+                        "segments_from_memory": plan.from_memory if plan else 0,
+                        "characters_sent": plan.characters_sent if plan else 0,
+                        "updated_at": now(),
+                    },
+                )
+
+        if not sources:
+            logger.info(f"🧠 Translation run {run.id}: every segment served from translation memory")
+            return None
+
+        job = BatchJob.for_run(run, backend or get_backend())
+        run.source_container, run.target_container = job.source_container, job.target_container
+        run.save(update_fields=["source_container", "target_container", "updated_at"])
+        job.prepare()
+        job.upload(sources)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    run.operation_id = job.start(run.from_language, run.to_language)
+    run.status = "Translating"
+    run.submitted_at = now()
+    run.error_message = None
+    run.save(update_fields=["operation_id", "status", "submitted_at", "error_message", "updated_at"])
+    logger.info(f"🚀 Translation run {run.id}: {len(sources)} documents submitted as operation {run.operation_id}")
+    return run.operation_id
+
+
+def operation_status(run: TranslationRun, backend=None) -> str:
+    return (backend or get_backend()).status(run.operation_id)
+
+
+def collect_run(run: TranslationRun, backend=None) -> dict:
+    """Download every finished output in parallel, reassemble segmented files and record the results."""
+    job = BatchJob.for_run(run, backend or get_backend()) if run.operation_id else None
+    outcomes = {o.blob_name: o for o in job.backend.documents(run.operation_id)} if job else {}
+    pending = list(
+        run.translation_files.filter(status="Processing").select_related("original_file", "original_file__user")
+    )
+
+    destinations = {}
+    for tf in pending:
+        blob_name = sent_blob_name(tf)
+        outcome = outcomes.get(blob_name)
+        if outcome and outcome.succeeded:
+            output = output_path_for(tf.original_file, run.to_language)
+            destinations[blob_name] = output if tf.novel_segments is None else f"{output}.segments.txt"
+    download_errors = job.download(destinations) if job else {}
+
+    failures, registered = {}, []
+    for tf in pending:
+        blob_name = sent_blob_name(tf)
+        error = None
+        if blob_name is not None:
+            outcome = outcomes.get(blob_name)
+            if outcome is None:
+                error = "No result from the translation service"
+            elif not outcome.succeeded:
+                error = outcome.error or outcome.status
+            else:
+                error = download_errors.get(blob_name)
+                if tf.novel_segments is None:
+                    tf.characters_sent = outcome.characters
+        output = output_path_for(tf.original_file, run.to_language)
+        if not error and tf.novel_segments is not None:
+            error = _assemble(tf, run, output, destinations.get(blob_name))
+        elif not error:
+            _learn(tf, run, output)
+        tf.updated_at = now()
+        if error:
+            tf.status = "Failed"
+            failures[tf.original_file.filename] = error
+            continue
+        tf.status = "Completed"
+        tf.translated_filepath = output
+        registered.append(_register(tf, run.to_language))
+    TranslationFile.objects.bulk_update(
+        pending, ["status", "translated_filepath", "characters_sent", "updated_at"]
+    )
+    _bill([tf for tf in pending if tf.status == "Completed"])
+
+    completed = run.translation_files.filter(status="Completed").count()
+    run.status = "Completed" if completed else "Failed"
+    run.error_message = (
+        "; ".join(f"{name}: {error}" for name, error in failures.items()) if failures else None
+    )
+    run.save(update_fields=["status", "error_message", "updated_at"])
+    if job:
+        job.cleanup()
+
+    logger.info(f"✅ Translation run {run.id}: {completed} completed, {len(failures)} failed")
+    return {
+        "translation_run_id": str(run.id),
+        "status": run.status,
+        "completed": completed,
+        "failed": failures,
+        "registered_outputs": [r for r in registered if r],
+    }
+
+
+def _assemble(tf: TranslationFile, run: TranslationRun, output: str, delta: Optional[str]) -> Optional[str]:
+    """Write the translated document from memory + the provider's segment translations; returns an error."""
+    try:
+        memory.assemble(
+            tf.original_file.filepath, output, run.from_language, run.to_language, tf.novel_segments, delta
+        )
+    except Exception as e:
+        logger.error(f"❌ Could not reassemble translation of file_id={tf.original_file.id}: {e}")
+        return str(e)
+    finally:
+        if delta and os.path.exists(delta):
+            os.remove(delta)
+    return None
+
+
+def _learn(tf: TranslationFile, run: TranslationRun, output: str) -> None:
+    """Add the segments of a file translated whole to memory; never fails the file."""
+    try:
+        memory.learn(tf.original_file.filepath, output, run.from_language, run.to_language)
+    except Exception as e:
+        logger.warning(f"⚠️ Translation of file_id={tf.original_file.id} not added to memory: {e}")
+
+
+def translation_cost(characters: int) -> Decimal:
+    return Decimal(characters) * Decimal(str(TRANSLATION_COST_PER_MILLION_CHARS)) / Decimal(1_000_000)
+
+
+def _bill(completed: List[TranslationFile]) -> None:
+    """Add the characters actually sent for each file to its upload Run."""
+    per_run: Dict = {}
+    for tf in completed:
+        if tf.original_file.run_id and tf.characters_sent:
+            per_run[tf.original_file.run_id] = per_run.get(tf.original_file.run_id, 0) + tf.characters_sent
+    for run_id, characters in per_run.items():
+        Run.objects.filter(run_id=run_id).update(
+            characters=F("characters") + characters,
+            cost=F("cost") + translation_cost(characters),
+        )
+
+
+def _register(tf: TranslationFile, to_language: str) -> Optional[dict]:
+    original = tf.original_file
+    try:
+        registered = register_generated_file(
+            file_path=tf.translated_filepath,
+            user=original.user,
+            run=original.run,
+            project_id=original.project_id,
+            service_id=original.service_id,
+            folder_name=os.path.join("translations", to_language),
+        )
+    except Exception as e:
+        logger.error(f"❌ Could not register translation of file_id={original.id}: {e}")
+        return None
+    return {"filename": registered.filename, "file_id": registered.id, "path": registered.filepath}
+
+
+def fail_run(run: TranslationRun, error: str, backend=None) -> None:
+    """Mark the run and its unfinished files failed and drop its containers."""
+    run.status = "Failed"
+    run.error_message = error
+    run.save(update_fields=["status", "error_message", "updated_at"])
+    run.translation_files.filter(status="Processing").update(status="Failed", updated_at=now())
+    if run.source_container:
+        try:
+            BatchJob.for_run(run, backend or get_backend()).cleanup()
+        except Exception as e:
+            logger.warning(f"⚠️ Cleanup after failed run {run.id} skipped: {e}")
@@ -0,0 +1,155 @@
+"""
+Translation-memory benchmark over a versioned-contract corpus: for each
+version, the segments served from memory, the characters that would be
+sent to the provider vs. the whole document, and the cost saved.
+
+Without `--corpus` a synthetic corpus is generated – a contract template of
+`--clauses` clauses and `--versions` amended versions, each rewording
+`--amend` of the clauses and adding one. With `--corpus DIR` the .txt/.docx
+files in DIR are used as versions, in name order.
+
+Translation is simulated (no provider call); memory is in-process unless
+`--database` is given. Versions below TRANSLATION_MEMORY_MIN_HIT_RATIO
+(always the first) are "sent" whole and added to memory with `learn()`.
+
+Usage
+-----
+
+python manage.py translation_memory_benchmark [--versions 10] [--clauses 120] [--amend 0.05]
+python manage.py translation_memory_benchmark --corpus contracts/ --from en --to de [--database]
+"""
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_translation import memory
+from document_translation.batch import translation_cost
+
+SUBJECTS = ["The Supplier", "The Customer", "Either Party", "The Licensor", "The Contractor"]
+VERBS = ["shall deliver", "shall maintain", "may terminate", "shall indemnify", "shall notify"]
+OBJECTS = [
+    "the Services described in Schedule {n}",
+    "all Confidential Information received under clause {n}",
+    "insurance cover of not less than EUR {n},000,000",
+    "the other Party within {n} Business Days of any Change of Control",
+    "records of all Charges for a period of {n} years",
+]
+
+
+def _clause(rng, n):
+    return f"{n}. {rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS).format(n=rng.randint(2, 90))}."
+
+
+def versioned_contracts(versions, clauses, amend, seed=7):
+    rng = random.Random(seed)
+    current = [_clause(rng, i + 1) for i in range(clauses)]
+    corpus = [list(current)]
+    for _ in range(versions - 1):
+        for i in rng.sample(range(len(current)), max(1, int(len(current) * amend))):
+            current[i] = _clause(rng, i + 1)
+        current.append(_clause(rng, len(current) + 1))
+        corpus.append(list(current))
+    return corpus
+
+
+def _fake_translate(delta, out, to_language):
+    with open(delta, encoding="utf-8") as src, open(out, "w", encoding="utf-8") as dst:
+        dst.write("".join(f"[{to_language}] {line}" if line.strip() else line for line in src))
+
+
+def _fake_translate_whole(path, out, to_language):
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    if not path.lower().endswith(".docx"):
+        return _fake_translate(path, out, to_language)
+    from docx import Document
+
+    doc = Document(path)
+    for paragraph in memory._docx_paragraphs(doc):
+        runs = [r for r in paragraph.runs if r.text]
+        if runs:
+            runs[0].text = f"[{to_language}] {runs[0].text}"
+    doc.save(out)
+
+
+class Command(BaseCommand):
+    help = "Measure translation-memory hit ratio and characters saved on a versioned-contract corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corpus", default=None, help="Directory of contract versions (.txt/.docx)")
+        parser.add_argument("--versions", type=int, default=10)
+        parser.add_argument("--clauses", type=int, default=120)
+        parser.add_argument("--amend", type=float, default=0.05, help="Share of clauses reworded per version")
+        parser.add_argument("--from", dest="from_language", default="en")
+        parser.add_argument("--to", dest="to_language", default="de")
+        parser.add_argument("--database", action="store_true", help="Use the TranslationMemorySegment table")
+
+    def handle(self, *args, **options):
+        store = memory.DatabaseStore() if options["database"] else memory.DictStore()
+        src, dst = options["from_language"], options["to_language"]
+
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = self._corpus(options, tmp)
+            self.stdout.write(f"📚 {len(paths)} versions, {src} ➝ {dst}, {'database' if options['database'] else 'in-process'} memory")
+            sent_total = full_total = hits_total = segments_total = 0
+            for i, path in enumerate(paths, 1):
+                t0 = time.perf_counter()
+                plan = memory.plan_document(path, src, dst, store=store)
+                out = os.path.join(tmp, "out", f"v{i}{os.path.splitext(path)[1]}")
+                if plan is None:
+                    doc = memory.open_document(path)
+                    if doc is None:
+                        raise CommandError(f"{os.path.basename(path)} cannot be segmented")
+                    _fake_translate_whole(path, out, dst)
+                    memory.learn(path, out, src, dst, store=store)
+                    total, from_memory = len(doc.segments()), 0
+                    full = sent = sum(len(memory.normalize(s)) for s in doc.segments())
+                else:
+                    delta = os.path.join(tmp, f"delta_{i}.txt")
+                    translated = os.path.join(tmp, f"translated_{i}.txt")
+                    if plan.novel:
+                        memory.write_delta(plan, delta)
+                        _fake_translate(delta, translated, dst)
+                    memory.assemble(path, out, src, dst, plan.novel, translated if plan.novel else None, store=store)
+                    total, from_memory = plan.total, plan.from_memory
+                    full, sent = plan.characters_total, plan.characters_sent
+                elapsed = time.perf_counter() - t0
+
+                sent_total += sent
+                full_total += full
+                hits_total += from_memory
+                segments_total += total
+                self.stdout.write(
+                    f"v{i:<3} segments={total:<5} from_memory={from_memory / total if total else 0:6.1%} "
+                    f"chars_sent={sent:<7} of {full:<7} {elapsed * 1000:7.1f}ms{'  (whole)' if plan is None else ''}"
+                )
+
+        saved = full_total - sent_total
+        self.stdout.write(
+            f"✅ hit ratio {hits_total / segments_total if segments_total else 0:.1%}, "
+            f"characters sent {sent_total} of {full_total} ({saved / full_total if full_total else 0:.1%} saved, "
+            f"{translation_cost(saved):.2f} at the configured rate)"
+        )
+
+    def _corpus(self, options, tmp):
+        if options["corpus"]:
+            folder = options["corpus"]
+            if not os.path.isdir(folder):
+                raise CommandError(f"{folder} is not a directory")
+            paths = sorted(
+                os.path.join(folder, name) for name in os.listdir(folder)
+                if os.path.splitext(name)[1].lower() in memory.SEGMENTED_FORMATS
+            )
+            if not paths:
+                raise CommandError(f"No .txt/.md/.docx files in {folder}")
+            return paths
+
+        paths = []
+        for i, clauses in enumerate(versioned_contracts(options["versions"], options["clauses"], options["amend"]), 1):
+            path = os.path.join(tmp, f"contract_v{i}.txt")
+            with open(path, "w", encoding="utf-8") as fh:
+                fh.write("MASTER SERVICES AGREEMENT\n\n" + "\n\n".join(clauses) + "\n")
+            paths.append(path)
+        return paths
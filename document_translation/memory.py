@@ -0,0 +1,358 @@
+"""
+document_translation.memory
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Segment-level translation memory.
+
+    document ─▶ segments (DOCX paragraphs / text lines) ─▶ normalized hash
+             ─▶ memory lookup (hash, from, to) ─▶ only novel segments are sent,
+                one per line in a small ".segments.txt" document
+    collect  ─▶ translated lines stored in memory ─▶ every segment written back
+                into a copy of the original
+
+A document is sent whole, as before, when fewer than
+TRANSLATION_MEMORY_MIN_HIT_RATIO of its segments are in memory (always
+when none are): the provider then keeps the formatting and sees every
+segment in context. Its output is split back into segments with `learn()`,
+so the next version of the document hits. DOCX is only assembled from
+memory when every paragraph's text sits in a single plain run; bold or
+italic spans, hyperlinks and fields would not survive the flat segment
+text, so such documents are always sent whole. Formats without a
+segmenter (PDF, scans, …) are sent whole too.
+
+Normalization is NFC + collapsed whitespace, so re-flowed or re-indented
+clauses still match. Within a document each novel segment is sent once.
+
+Segment hits and misses are counted in the shared cache;
+`translation_memory_stats()` returns hits, misses, hit_rate and the
+characters sent vs. saved.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils.timezone import now
+
+from core import blobstore
+from document_translation.models import TranslationMemorySegment
+
+logger = logging.getLogger(__name__)
+
+TRANSLATION_MEMORY_ENABLED = getattr(settings, "TRANSLATION_MEMORY_ENABLED", True)
+TRANSLATION_MEMORY_MIN_HIT_RATIO = getattr(settings, "TRANSLATION_MEMORY_MIN_HIT_RATIO", 0.5)
+LOOKUP_CHUNK = 1000
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+def segment_hash(normalized: str) -> str:
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=20).hexdigest()
+
+
+# ───────────────────────────── Stores ───────────────────────────────────────
+class DatabaseStore:
+    """TranslationMemorySegment rows (Postgres)."""
+
+    def lookup(self, hashes: Iterable[str], from_language: str, to_language: str, touch: bool = True) -> Dict[str, str]:
+        hashes = list(hashes)
+        found: Dict[str, str] = {}
+        for i in range(0, len(hashes), LOOKUP_CHUNK):
+            rows = TranslationMemorySegment.objects.filter(
+                segment_hash__in=hashes[i:i + LOOKUP_CHUNK], from_language=from_language, to_language=to_language
+            )
+            chunk = dict(rows.values_list("segment_hash", "translated_text"))
+            if chunk and touch:
+                rows.filter(segment_hash__in=list(chunk)).update(hits=F("hits") + 1, last_used_at=now())
+            found.update(chunk)
+        return found
+
+    def remember(self, entries: Dict[str, Tuple[str, int]], from_language: str, to_language: str) -> None:
+        TranslationMemorySegment.objects.bulk_create(
+            [
+                TranslationMemorySegment(
+                    segment_hash=h, from_language=from_language, to_language=to_language,
+                    translated_text=text, characters=characters,
+                )
+                for h, (text, characters) in entries.items()
+            ],
+            batch_size=500,
+            ignore_conflicts=True,
+        )
+
+
+class DictStore:
+    """In-process memory for benchmarks and tests."""
+
+    def __init__(self):
+        self.entries: Dict[Tuple[str, str, str], str] = {}
+
+    def lookup(self, hashes, from_language, to_language, touch=True):
+        return {
+            h: self.entries[(h, from_language, to_language)]
+            for h in hashes if (h, from_language, to_language) in self.entries
+        }
+
+    def remember(self, entries, from_language, to_language):
+        for h, (text, _) in entries.items():
+            self.entries.setdefault((h, from_language, to_language), text)
+
+
+# ───────────────────────────── Segmented documents ──────────────────────────
+class _TextDocument:
+    """Plain text: one segment per non-blank line, indentation kept."""
+
+    assemblable = True
+
+    def __init__(self, path: str):
+        with open(path, encoding="utf-8") as fh:
+            self.lines = fh.read().split("\n")
+        self.slots = [i for i, line in enumerate(self.lines) if line.strip()]
+
+    def segments(self) -> List[str]:
+        return [self.lines[i] for i in self.slots]
+
+    def save(self, translated: List[str], path: str) -> None:
+        lines = list(self.lines)
+        for i, text in zip(self.slots, translated):
+            indent = lines[i][:len(lines[i]) - len(lines[i].lstrip())]
+            lines[i] = indent + text
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines))
+
+
+def _docx_paragraphs(doc):
+    seen = set()
+    paragraphs = list(doc.paragraphs)
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:      # merged cells repeat
+                paragraphs.extend(cell.paragraphs)
+    for p in paragraphs:
+        if p._p not in seen:
+            seen.add(p._p)
+            yield p
+
+
+def _text_run(paragraph):
+    """The one plain run holding all of the paragraph's text, or None (formatted spans, hyperlinks, fields …)."""
+    runs = [r for r in paragraph.runs if r.text]
+    if len(runs) != 1 or paragraph._p.xpath(".//w:fldChar | .//w:instrText"):
+        return None
+    if len(paragraph._p.xpath(".//w:t")) != len(runs[0]._r.xpath(".//w:t")):
+        return None
+    return runs[0]
+
+
+class _DocxDocument:
+    """
+    DOCX: one segment per non-empty body or table-cell paragraph. Only
+    assemblable when every such paragraph is a single plain run.
+    """
+
+    def __init__(self, path: str):
+        from docx import Document
+
+        self.doc = Document(path)
+        self.slots = [p for p in _docx_paragraphs(self.doc) if p.text.strip()]
+        self.runs = [_text_run(p) for p in self.slots]
+        self.assemblable = all(self.runs)
+
+    def segments(self) -> List[str]:
+        return [p.text for p in self.slots]
+
+    def save(self, translated: List[str], path: str) -> None:
+        if not self.assemblable:
+            raise ValueError("Paragraphs with formatted runs cannot be assembled from segments")
+        for run, text in zip(self.runs, translated):
+            run.text = text
+        self.doc.save(path)
+
+
+SEGMENTED_FORMATS = {".txt": _TextDocument, ".md": _TextDocument, ".docx": _DocxDocument}
+
+
+def open_document(path: str):
+    """Segmented view of `path`, or None when the format is sent whole."""
+    reader = SEGMENTED_FORMATS.get(os.path.splitext(path)[1].lower())
+    if reader is None:
+        return None
+    try:
+        return reader(path)
+    except Exception as e:       # undecodable text, corrupt DOCX … → whole-document translation
+        logger.warning(f"⚠️ Cannot segment {os.path.basename(path)}, sending it whole: {e}")
+        return None
+
+
+# ───────────────────────────── Plan / assemble ──────────────────────────────
+@dataclass
+class SegmentPlan:
+    hashes: List[str]                               # per segment, document order
+    texts: Dict[str, str]                           # hash → normalized source text
+    known: Dict[str, str]                           # hash → translation from memory
+    novel: List[str] = field(default_factory=list)  # unique hashes to send, first-occurrence order
+
+    @property
+    def total(self) -> int:
+        return len(self.hashes)
+
+    @property
+    def from_memory(self) -> int:
+        return sum(1 for h in self.hashes if h in self.known)
+
+    @property
+    def characters_sent(self) -> int:
+        return sum(len(self.texts[h]) for h in self.novel)
+
+    @property
+    def characters_total(self) -> int:
+        return sum(len(self.texts[h]) for h in self.hashes)
+
+
+def _hashed(doc) -> Tuple[List[str], Dict[str, str]]:
+    hashes, texts = [], {}
+    for segment in doc.segments():
+        text = normalize(segment)
+        h = segment_hash(text)
+        hashes.append(h)
+        texts[h] = text
+    return hashes, texts
+
+
+def plan_document(path: str, from_language: str, to_language: str, store=None) -> Optional[SegmentPlan]:
+    """Which segments of `path` the memory already covers; None → send the file whole."""
+    if not TRANSLATION_MEMORY_ENABLED:
+        return None
+    doc = open_document(path)
+    if doc is None:
+        return None
+    hashes, texts = _hashed(doc)
+    if not doc.assemblable:
+        logger.info(f"🧠 {os.path.basename(path)}: formatted runs, sending it whole")
+        _count("miss", len(hashes))
+        return None
+    known = (store or DatabaseStore()).lookup(texts, from_language, to_language)
+    plan = SegmentPlan(
+        hashes=hashes, texts=texts, known=known,
+        novel=list(dict.fromkeys(h for h in hashes if h not in known)),
+    )
+    if plan.total and (not plan.from_memory or plan.from_memory < plan.total * TRANSLATION_MEMORY_MIN_HIT_RATIO):
+        logger.info(f"🧠 {os.path.basename(path)}: {plan.from_memory}/{plan.total} segments from memory, sending it whole")
+        _count("miss", plan.total)
+        _count("chars_sent", plan.characters_total)
+        return None
+    _count("hit", plan.from_memory)
+    _count("miss", plan.total - plan.from_memory)
+    _count("chars_sent", plan.characters_sent)
+    _count("chars_saved", plan.characters_total - plan.characters_sent)
+    logger.info(
+        f"🧠 {os.path.basename(path)}: {plan.from_memory}/{plan.total} segments from memory, "
+        f"{len(plan.novel)} to translate ({plan.characters_sent}/{plan.characters_total} chars)"
+    )
+    return plan
+
+
+def write_delta(plan: SegmentPlan, path: str) -> None:
+    """The novel segments, one per line – what the provider translates instead of the file."""
+    with open(path, "w", encoding="utf-8") as fh:
+        fh.write("\n".join(plan.texts[h] for h in plan.novel) + "\n")
+
+
+def read_delta(novel: List[str], path: str) -> Dict[str, str]:
+    with open(path, encoding="utf-8") as fh:
+        lines = fh.read().rstrip("\n").split("\n")
+    if len(lines) != len(novel):
+        raise ValueError(f"Segment alignment lost: sent {len(novel)} segments, got {len(lines)} back")
+    return dict(zip(novel, (line.strip() for line in lines)))
+
+
+def assemble(
+    source_path: str,
+    output_path: str,
+    from_language: str,
+    to_language: str,
+    novel: List[str],
+    delta_path: Optional[str] = None,
+    store=None,
+) -> str:
+    """
+    Store the provider's translations of `novel` (read from `delta_path`) and
+    write the translated document: every segment from memory or the delta.
+    """
+    store = store or DatabaseStore()
+    doc = open_document(source_path)
+    if doc is None:
+        raise ValueError(f"Cannot segment {os.path.basename(source_path)}")
+    hashes, texts = _hashed(doc)
+
+    translated = read_delta(novel, delta_path) if novel else {}
+    if translated:
+        store.remember({h: (t, len(texts.get(h, ""))) for h, t in translated.items()}, from_language, to_language)
+    translations = store.lookup(set(hashes) - set(translated), from_language, to_language, touch=False)
+    translations.update(translated)
+
+    missing = [h for h in hashes if h not in translations]
+    if missing:
+        logger.warning(f"⚠️ {len(missing)} segments of {os.path.basename(source_path)} left untranslated (memory entry gone)")
+    with blobstore.replacing(output_path) as tmp:
+        doc.save([translations.get(h, texts[h]) for h in hashes], tmp)
+    return output_path
+
+
+def learn(source_path: str, translated_path: str, from_language: str, to_language: str, store=None) -> int:
+    """
+    Remember the segments of a document the provider translated whole, when
+    its segments still line up with the source; returns how many were stored.
+    """
+    if not TRANSLATION_MEMORY_ENABLED:
+        return 0
+    source, translated = open_document(source_path), open_document(translated_path)
+    if source is None or translated is None:
+        return 0
+    originals, translations = source.segments(), translated.segments()
+    if len(originals) != len(translations):
+        logger.info(
+            f"🧠 {os.path.basename(source_path)}: {len(originals)} segments in, {len(translations)} out, "
+            f"not added to memory"
+        )
+        return 0
+    entries: Dict[str, Tuple[str, int]] = {}
+    for original, translation in zip(originals, translations):
+        text = normalize(original)
+        entries.setdefault(segment_hash(text), (normalize(translation), len(text)))
+    (store or DatabaseStore()).remember(entries, from_language, to_language)
+    return len(entries)
+
+
+# ───────────────────────────── Metrics ──────────────────────────────────────
+def _count(name: str, n: int) -> None:
+    if not n:
+        return
+    key = f"tm:{name}"
+    try:
+        if not cache.add(key, n, timeout=None):
+            cache.incr(key, n)
+    except Exception:   # metrics must never break translation
+        pass
+
+
+def translation_memory_stats() -> dict:
+    found = cache.get_many([f"tm:{k}" for k in ("hit", "miss", "chars_sent", "chars_saved")])
+    hits, misses = found.get("tm:hit", 0), found.get("tm:miss", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "characters_sent": found.get("tm:chars_sent", 0),
+        "characters_saved": found.get("tm:chars_saved", 0),
+    }
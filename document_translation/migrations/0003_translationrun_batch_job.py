@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-16 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_translation', '0002_alter_translationstorage_run'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translationrun',
+            name='operation_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='translationrun',
+            name='source_container',
+            field=models.CharField(blank=True, max_length=63, null=True),
+        ),
+        migrations.AddField(
+            model_name='translationrun',
+            name='target_container',
+            field=models.CharField(blank=True, max_length=63, null=True),
+        ),
+        migrations.AddField(
+            model_name='translationrun',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-16 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_translation', '0003_translationrun_batch_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='translationfile',
+            name='novel_segments',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='translationfile',
+            name='segments_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='translationfile',
+            name='segments_from_memory',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='translationfile',
+            name='characters_sent',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='TranslationMemorySegment',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('segment_hash', models.CharField(max_length=40)),
+                ('from_language', models.CharField(max_length=10)),
+                ('to_language', models.CharField(max_length=10)),
+                ('translated_text', models.TextField()),
+                ('characters', models.PositiveIntegerField(default=0)),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('segment_hash', 'from_language', 'to_language')},
+            },
+        ),
+    ]
@@ -24,6 +24,12 @@ class TranslationRun(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     error_message = models.TextField(blank=True, null=True)  # ✅ Store errors if translation fails
 
+    # ✅ Batch job state (document_translation/batch.py): one container pair and one remote operation per run
+    operation_id = models.CharField(max_length=64, blank=True, null=True, db_index=True)
+    source_container = models.CharField(max_length=63, blank=True, null=True)
+    target_container = models.CharField(max_length=63, blank=True, null=True)
+    submitted_at = models.DateTimeField(blank=True, null=True)
+
     def __str__(self):
         return f"TranslationRun {self.id} - {self.status} ({self.from_language} ➝ {self.to_language})"
 
@@ -52,6 +58,13 @@ class TranslationFile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # ✅ Translation memory (document_translation/memory.py): hashes of the segments sent to the provider
+    # (None → the whole file was sent), segment counts and the characters billed for this file
+    novel_segments = models.JSONField(blank=True, null=True)
+    segments_total = models.PositiveIntegerField(default=0)
+    segments_from_memory = models.PositiveIntegerField(default=0)
+    characters_sent = models.PositiveIntegerField(default=0)
+
     class Meta:
         unique_together = ("original_file", "run")  # ✅ Prevents duplicate translations per language
 
@@ -87,3 +100,26 @@ class TranslationStorage(models.Model):
     
     def __str__(self):
         return f"Storage {self.storage_id} - {self.upload_storage_location} ➝ {self.translated_storage_location}"
+
+
+class TranslationMemorySegment(models.Model):
+    """
+    One translated segment, keyed by the hash of its normalized source text and the
+    language pair. Shared by every run, so repeated clauses are translated once.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    segment_hash = models.CharField(max_length=40)
+    from_language = models.CharField(max_length=10)
+    to_language = models.CharField(max_length=10)
+    translated_text = models.TextField()
+    characters = models.PositiveIntegerField(default=0)  # ✅ Source length, i.e. what a re-translation would bill
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("segment_hash", "from_language", "to_language")
+
+    def __str__(self):
+        return f"Segment {self.segment_hash[:12]} ({self.from_language} ➝ {self.to_language})"
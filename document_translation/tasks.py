@@ -1,27 +1,22 @@
 import os
 import logging
-import uuid
-import time
 from celery import shared_task
-from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils.timezone import now
 from core.models import File
 from document_translation.models import TranslationRun, TranslationFile
-from document_translation.utils import TranslationService, AzureBlobService
+from document_translation import batch
 from core.utils import register_generated_file
 
 
-# ✅ Initialize Services
 logger = logging.getLogger(__name__)
-translation_service = TranslationService()
-azure_service = AzureBlobService()
 
 
 
 
 @shared_task
 def translate_document_task(file_id, translation_run_id, from_language, to_language):
+    """Single-file entry point: submits a batch of one and returns without waiting for Azure."""
     logger.info(f"🔄 Starting translation for file_id={file_id}, {from_language} ➔ {to_language}, run_id={translation_run_id}")
     
     file_entry = get_object_or_404(File, id=file_id)
@@ -67,77 +62,79 @@ def translate_document_task(file_id, translation_run_id, from_language, to_langu
             }]
         }
 
-    # ✅ Set up translation containers
-    source_container = f"translation-source-{uuid.uuid4()}"
-    target_container = f"translation-target-{uuid.uuid4()}"
-    output_dir = os.path.join(os.path.dirname(file_entry.filepath), "translations", to_language)
-    os.makedirs(output_dir, exist_ok=True)
+    result = _start_batch(translation_run, [file_entry])
+    result["file_id"] = file_id
+    return result
 
-    try:
-        azure_service.ensure_container_exists(source_container)
-        azure_service.ensure_container_exists(target_container)
-        azure_service.upload_file_if_not_exists(source_container, file_entry.filepath)
 
-        result = translation_service.translate_file(file_id, translation_run.id, from_language, to_language)
-        translated_path = result.get("translated_file")
+@shared_task
+def translate_batch_task(translation_run_id, file_ids):
+    """
+    Translate many files in one Azure batch (one container pair, one operation).
+    Returns as soon as the batch is submitted; `poll_translation_batch_task` finishes it.
+    """
+    translation_run = get_object_or_404(TranslationRun, id=translation_run_id)
+    files = list(File.objects.filter(id__in=file_ids))
 
-        if not translated_path or not os.path.exists(translated_path):
-            raise ValueError("Translation completed but no output file found")
+    missing = [f for f in files if not os.path.exists(f.filepath)]
+    for f in missing:
+        logger.error(f"❌ File not found: {f.filepath}")
+    files = [f for f in files if f not in missing]
 
-        translation_run.status = "Completed"
-        translation_run.save()
+    if not files:
+        batch.fail_run(translation_run, "Original files not found")
+        return {"error": "Files not found", "translation_run_id": translation_run_id}
 
-        registered_files = []
+    return _start_batch(translation_run, files)
 
-        with transaction.atomic():
-            TranslationFile.objects.update_or_create(
-                original_file=file_entry,
-                run=translation_run,
-                defaults={
-                    "translated_filepath": translated_path,
-                    "status": "Completed",
-                    "updated_at": now()
-                }
-            )
 
-            upload_run = file_entry.run
-            registered = File.objects.filter(filepath=translated_path).first()
+def _start_batch(translation_run, files):
+    try:
+        operation_id = batch.submit_run(translation_run, files)
+    except Exception as e:
+        logger.error(f"❌ Translation submit failed for run_id={translation_run.id}: {e}")
+        batch.fail_run(translation_run, str(e))
+        return {"error": str(e), "translation_run_id": str(translation_run.id)}
 
-            if not registered:
-                registered = register_generated_file(
-                    file_path=translated_path,
-                    user=file_entry.user,
-                    run=upload_run,
-                    project_id=file_entry.project_id,
-                    service_id=file_entry.service_id,
-                    folder_name=os.path.join("translations", to_language)
-                )
+    if operation_id is None:     # every segment came from translation memory
+        return batch.collect_run(translation_run)
 
-            registered_files.append({
-                "filename": registered.filename,
-                "file_id": registered.id,
-                "path": registered.filepath
-            })
+    poll_translation_batch_task.apply_async((str(translation_run.id),), countdown=batch.poll_delay(0))
+    return {
+        "translation_run_id": str(translation_run.id),
+        "operation_id": operation_id,
+        "status": "Translating",
+        "documents": len(files),
+    }
 
-        logger.info(f"✅ Translation completed for run_id={translation_run_id}, file_id={file_id}")
-        return {
-            "translation_run_id": str(translation_run.id),
-            "file_id": file_id,
-            "status": "Completed",
-            "translated_filepath": translated_path,
-            "registered_outputs": registered_files
-        }
 
+@shared_task(bind=True, max_retries=batch.TRANSLATION_MAX_POLLS)
+def poll_translation_batch_task(self, translation_run_id):
+    """
+    Check the run's remote operation once. While it is running the task is
+    re-scheduled (countdown backs off to TRANSLATION_POLL_MAX_INTERVAL), so
+    no worker is held; once it is terminal every output is collected.
+    """
+    translation_run = TranslationRun.objects.filter(id=translation_run_id).first()
+    if not translation_run or translation_run.status != "Translating" or not translation_run.operation_id:
+        logger.info(f"⚠️ Nothing to poll for run_id={translation_run_id}")
+        return {"translation_run_id": translation_run_id, "status": getattr(translation_run, "status", None)}
+
+    try:
+        state = batch.operation_status(translation_run)
     except Exception as e:
-        logger.error(f"❌ Translation failed for run_id={translation_run_id}: {e}")
-        translation_run.status = "Failed"
-        translation_run.error_message = str(e)
-        translation_run.save()
-        return {"error": str(e), "file_id": file_id}
+        logger.warning(f"⚠️ Status check failed for run_id={translation_run_id}: {e}")
+        state = None
 
-    finally:
-        azure_service.delete_container(source_container)
-        azure_service.delete_container(target_container)
+    if state is None or state in batch.RUNNING_STATES:
+        if self.request.retries >= self.max_retries:
+            batch.fail_run(translation_run, "Translation did not finish in time")
+            return {"translation_run_id": translation_run_id, "status": "Failed"}
+        TranslationRun.objects.filter(id=translation_run.id).update(updated_at=now())   # heartbeat for the status views
+        raise self.retry(countdown=batch.poll_delay(self.request.retries + 1))
+
+    logger.info(f"📥 Operation {translation_run.operation_id} finished ({state}), collecting outputs")
+    return batch.collect_run(translation_run)
 
 
 
@@ -545,36 +542,21 @@ def check_translation_status_task(translation_run_id):
 @shared_task
 def download_translated_file_task(file_id):
     """
-    Celery task to download the translated document.
+    Location of the translated document. Outputs are downloaded when their
+    batch completes (batch.collect_run), so this only looks the path up.
     """
-    logger.info(f"🔄 Downloading translated file for file_id: {file_id}")
-
-    # ✅ Fetch translated file entry
-    translated_file = get_object_or_404(TranslationFile, original_file_id=file_id)
-    target_container = f"translation-target-{translated_file.run.to_language}"
+    logger.info(f"🔄 Looking up translated file for file_id: {file_id}")
 
-    # ✅ Define structured output directory (matching `document_ocr`)
-    translated_file_path = os.path.join(
-        os.path.dirname(translated_file.original_file.filepath),
-        "translations",
-        f"translated-{uuid.uuid4()}.pdf"
+    translated_file = (
+        TranslationFile.objects.filter(original_file_id=file_id, status="Completed")
+        .order_by("-updated_at")
+        .first()
     )
-    os.makedirs(os.path.dirname(translated_file_path), exist_ok=True)
 
-    # ✅ Download translated file from Azure
-    azure_service.download_files(target_container, os.path.dirname(translated_file_path))
-
-    # ✅ Verify translation file exists
-    if not os.path.exists(translated_file_path):
-        logger.error(f"❌ Translated file not found: {translated_file_path}")
+    if not translated_file or not translated_file.translated_filepath or not os.path.exists(translated_file.translated_filepath):
+        logger.error(f"❌ Translated file not found for file_id: {file_id}")
         return {"error": "Translated file not found", "file_id": file_id}
 
-    # ✅ Update `TranslationFile` model with correct path
-    with transaction.atomic():
-        translated_file.translated_filepath = translated_file_path
-        translated_file.status = "Ready for download"
-        translated_file.save()
-
     logger.info(f"✅ Translated file ready for download: {translated_file.translated_filepath}")
 
     return {
@@ -0,0 +1,264 @@
+import os
+import tempfile
+import threading
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from document_translation import memory
+from document_translation.batch import (
+    BatchJob,
+    LocalTranslationBackend,
+    RUNNING_STATES,
+    TRANSLATION_POLL_MAX_INTERVAL,
+    poll_delay,
+)
+
+
+def _upper(source, destination, language):
+    with open(source) as src, open(destination, "w") as dst:
+        dst.write(f"[{language}] {src.read().upper()}")
+
+
+class BatchTranslationTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.sources = {}
+        for i in range(6):
+            path = os.path.join(self.tmp.name, f"contract_{i}.txt")
+            with open(path, "w") as fh:
+                fh.write(f"clause {i}")
+            self.sources[f"{i}/contract_{i}.txt"] = path
+
+    def _job(self, **backend_kwargs):
+        backend = LocalTranslationBackend(root=os.path.join(self.tmp.name, "blob"), **backend_kwargs)
+        job = BatchJob(backend, "translation-source-run", "translation-target-run", workers=8)
+        job.prepare()
+        job.upload(self.sources)
+        return job
+
+    def test_one_operation_translates_the_whole_batch(self):
+        job = self._job(polls=2, translate=_upper)
+        operation_id = job.start("en", "de")
+
+        self.assertIn(job.backend.status(operation_id), RUNNING_STATES)
+        self.assertIn(job.backend.status(operation_id), RUNNING_STATES)
+        self.assertEqual(job.backend.status(operation_id), "Succeeded")
+
+        outcomes = job.backend.documents(operation_id)
+        self.assertEqual(sorted(o.blob_name for o in outcomes), sorted(self.sources))
+        out = os.path.join(self.tmp.name, "out")
+        destinations = {o.blob_name: os.path.join(out, o.blob_name) for o in outcomes}
+        self.assertEqual(job.download(destinations), dict.fromkeys(destinations))
+        with open(destinations["3/contract_3.txt"]) as fh:
+            self.assertEqual(fh.read(), "[de] CLAUSE 3")
+
+        job.cleanup()
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "blob", "translation-source-run")))
+
+    def test_failed_documents_are_reported_per_blob(self):
+        def flaky(source, destination, language):
+            if source.endswith("contract_4.txt"):
+                raise ValueError("Unsupported format")
+            _upper(source, destination, language)
+
+        job = self._job(polls=0, translate=flaky)
+        operation_id = job.start("en", "fr")
+        self.assertEqual(job.backend.status(operation_id), "Succeeded")
+
+        failed = {o.blob_name: o.error for o in job.backend.documents(operation_id) if not o.succeeded}
+        self.assertEqual(failed, {"4/contract_4.txt": "Unsupported format"})
+
+    def test_rerun_to_the_same_language_replaces_an_adopted_output(self):
+        out = os.path.join(self.tmp.name, "out")
+        destinations = {b: os.path.join(out, b) for b in self.sources}
+        target = destinations["3/contract_3.txt"]
+
+        def run(translate):
+            job = self._job(polls=0, translate=translate)
+            job.backend.status(job.start("en", "de"))
+            self.assertEqual(job.download(destinations), dict.fromkeys(destinations))
+
+        run(_upper)
+        # register_generated_file adopted the output: the stored object and an
+        # identical output elsewhere are hard links to the same inode
+        stored = os.path.join(self.tmp.name, "blob-object")
+        shared = os.path.join(self.tmp.name, "other-tenant.txt")
+        os.link(target, stored)
+        os.link(target, shared)
+
+        run(lambda source, destination, language: _upper(source, destination, "de-CH"))
+
+        with open(target) as fh:
+            self.assertEqual(fh.read(), "[de-CH] CLAUSE 3")
+        for path in (stored, shared):
+            with open(path) as fh:
+                self.assertEqual(fh.read(), "[de] CLAUSE 3")
+        self.assertFalse(os.path.samefile(target, stored))
+
+    def test_outputs_download_in_parallel(self):
+        job = self._job(polls=0)
+        operation_id = job.start("en", "es")
+        job.backend.status(operation_id)
+        out = os.path.join(self.tmp.name, "out")
+        destinations = {b: os.path.join(out, b) for b in self.sources}
+
+        # every download waits until all of them are in flight at once
+        barrier = threading.Barrier(len(destinations), timeout=10)
+        download = job.backend.download
+
+        def gated(container, blob_name, destination):
+            barrier.wait()
+            download(container, blob_name, destination)
+
+        job.backend.download = gated
+        self.assertEqual(job.download(destinations), dict.fromkeys(destinations))
+        self.assertTrue(all(os.path.exists(path) for path in destinations.values()))
+
+    def test_poll_delay_backs_off_to_the_max_interval(self):
+        delays = [poll_delay(n) for n in range(12)]
+        self.assertEqual(delays, sorted(delays))
+        self.assertEqual(delays[-1], TRANSLATION_POLL_MAX_INTERVAL)
+
+
+# ───────────────────────────── Translation memory ──────────────────────────
+def _translate_lines(source, destination, language="de"):
+    with open(source, encoding="utf-8") as src, open(destination, "w", encoding="utf-8") as dst:
+        dst.write("".join(f"[{language}] {line}" for line in src))
+
+
+class TranslationMemoryTests(SimpleTestCase):
+    CLAUSES = [f"{i}. The Supplier shall deliver the Services described in Schedule {i}." for i in range(1, 21)]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = memory.DictStore()
+        cache.clear()
+
+    def _write(self, name, lines):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, "w", encoding="utf-8") as fh:
+            fh.write("\n".join(lines) + "\n")
+        return path
+
+    def _remember(self, *segments):
+        self.store.remember(
+            {memory.segment_hash(memory.normalize(s)): (f"[de] {s}", len(s)) for s in segments}, "en", "de"
+        )
+
+    def _translate(self, path):
+        """Plan, 'send' the novel segments or the whole file, reassemble → (plan, translated lines)."""
+        plan = memory.plan_document(path, "en", "de", store=self.store)
+        out = os.path.join(self.tmp.name, "out", os.path.basename(path))
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        if plan is None:
+            _translate_lines(path, out)
+            memory.learn(path, out, "en", "de", store=self.store)
+        else:
+            translated = None
+            if plan.novel:
+                delta = os.path.join(self.tmp.name, "delta.txt")
+                translated = os.path.join(self.tmp.name, "delta.de.txt")
+                memory.write_delta(plan, delta)
+                _translate_lines(delta, translated)
+            memory.assemble(path, out, "en", "de", plan.novel, translated, store=self.store)
+        with open(out, encoding="utf-8") as fh:
+            return plan, fh.read().split("\n")
+
+    def test_amended_version_sends_only_changed_segments(self):
+        first, _ = self._translate(self._write("v1.txt", self.CLAUSES))
+        self.assertIsNone(first)                        # nothing in memory yet: sent whole, then learned
+        self.assertEqual(len(self.store.entries), 20)
+
+        amended = list(self.CLAUSES)
+        amended[4] = "5. The Customer may terminate this Agreement on 30 days notice."
+        amended[9] = "    10.  The Supplier   shall deliver the Services described in Schedule 10."   # re-flowed only
+        plan, lines = self._translate(self._write("v2.txt", amended))
+
+        self.assertEqual(plan.novel, [memory.segment_hash(memory.normalize(amended[4]))])
+        self.assertEqual(plan.from_memory, 19)
+        self.assertLess(plan.characters_sent, plan.characters_total / 10)
+        self.assertEqual(lines[4], "[de] 5. The Customer may terminate this Agreement on 30 days notice.")
+        self.assertEqual(lines[9], "    [de] 10. The Supplier shall deliver the Services described in Schedule 10.")
+
+    def test_reassembly_replaces_an_adopted_output(self):
+        path = self._write("v1.txt", self.CLAUSES[:2])
+        self._remember(*self.CLAUSES[:2])
+        out = os.path.join(self.tmp.name, "out", "v1.txt")
+        memory.assemble(path, out, "en", "de", [], store=self.store)
+        stored = os.path.join(self.tmp.name, "blob-object")
+        os.link(out, stored)
+
+        self._remember("Definitions")
+        self._write("v1.txt", self.CLAUSES[:2] + ["Definitions"])
+        memory.assemble(path, out, "en", "de", [], store=self.store)
+
+        with open(stored, encoding="utf-8") as fh:
+            self.assertNotIn("Definitions", fh.read())
+        with open(out, encoding="utf-8") as fh:
+            self.assertIn("[de] Definitions", fh.read())
+
+    def test_repeated_segments_are_sent_once(self):
+        self._remember("Term", "Schedule")
+        plan = memory.plan_document(
+            self._write("v1.txt", ["Definitions", "Term", "Definitions", "Schedule"]), "en", "de", store=self.store
+        )
+        self.assertEqual(plan.total, 4)
+        self.assertEqual(plan.novel, [memory.segment_hash("Definitions")])
+
+    def test_low_hit_ratio_sends_the_file_whole(self):
+        path = self._write("v1.txt", self.CLAUSES[:4])
+        self.assertIsNone(memory.plan_document(path, "en", "de", store=self.store))
+        self._remember(self.CLAUSES[0])                 # 1 of 4 < TRANSLATION_MEMORY_MIN_HIT_RATIO
+        self.assertIsNone(memory.plan_document(path, "en", "de", store=self.store))
+        self._remember(self.CLAUSES[1])
+        self.assertEqual(len(memory.plan_document(path, "en", "de", store=self.store).novel), 2)
+
+    def test_lost_alignment_fails_the_file(self):
+        path = self._write("v1.txt", self.CLAUSES[:4])
+        self._remember(*self.CLAUSES[:2])
+        plan = memory.plan_document(path, "en", "de", store=self.store)
+        bad = self._write("delta.de.txt", ["[de] merged clauses"])
+        with self.assertRaises(ValueError):
+            memory.assemble(path, os.path.join(self.tmp.name, "out.txt"), "en", "de", plan.novel, bad, store=self.store)
+        self.assertEqual(len(self.store.entries), 2)
+
+    def test_docx_runs_survive_assembly_and_formatted_paragraphs_go_whole(self):
+        from docx import Document
+
+        path = os.path.join(self.tmp.name, "v1.docx")
+        doc = Document()
+        doc.add_paragraph().add_run(self.CLAUSES[0]).bold = True
+        doc.add_paragraph(self.CLAUSES[1])
+        doc.save(path)
+        self._remember(*self.CLAUSES[:2])
+
+        plan = memory.plan_document(path, "en", "de", store=self.store)
+        out = os.path.join(self.tmp.name, "v1.de.docx")
+        memory.assemble(path, out, "en", "de", plan.novel, store=self.store)
+        first, second = Document(out).paragraphs
+        self.assertEqual([(r.text, r.bold) for r in first.runs], [(f"[de] {self.CLAUSES[0]}", True)])
+        self.assertEqual(second.text, f"[de] {self.CLAUSES[1]}")
+
+        # a formatted span inside a clause cannot be rebuilt from flat segment text
+        mixed = Document(path)
+        mixed.paragraphs[1].add_run(" (as amended)").italic = True
+        mixed.save(path)
+        self.assertIsNone(memory.plan_document(path, "en", "de", store=self.store))
+
+    def test_hit_ratio_over_versioned_contracts(self):
+        versions = [self.CLAUSES]
+        for v in range(1, 6):
+            clauses = list(versions[-1])
+            clauses[v] = f"{v + 1}. Amended in version {v + 1}."
+            versions.append(clauses)
+
+        for i, clauses in enumerate(versions):
+            plan, _ = self._translate(self._write(f"v{i}.txt", clauses))
+
+        stats = memory.translation_memory_stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 20 * len(versions))
+        self.assertEqual(stats["misses"], 20 + 5)
+        self.assertGreater(stats["hit_rate"], 0.75)
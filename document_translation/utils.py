@@ -43,6 +43,7 @@ from azure.storage.blob import (
 )
 from azure.core.exceptions import ResourceNotFoundError, ResourceExistsError
 from django.utils.timezone import now
+from core import blobstore
 from core.models import File
 from document_translation.models import TranslationRun, TranslationFile
 
@@ -154,7 +155,8 @@ class AzureBlobService:
             blob_data = blob_client_instance.download_blob()
             destination_file_path = os.path.join(destination_folder, blob.name)
 
-            with open(destination_file_path, "wb") as my_blob:
+            # the previous translation may be linked into the blob store – replace, don't rewrite
+            with blobstore.replacing(destination_file_path) as tmp, open(tmp, "wb") as my_blob:
                 blob_data.readinto(my_blob)
             logger.info(f"✅ Downloaded: {destination_file_path}")
             
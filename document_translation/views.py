@@ -12,7 +12,7 @@ from core.models import File
 from document_translation.models import TranslationRun, TranslationFile, TranslationLanguage, TranslationStorage
 
 from document_translation.tasks import (
-    translate_document_task,
+    translate_batch_task,
     check_translation_status_task,
     download_translated_file_task
 )
@@ -52,6 +52,10 @@ from_language_param = openapi.Parameter(
 to_language_param = openapi.Parameter(
     "to_language", openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True, description="Target language code"
 )
+submit_file_id_param = openapi.Parameter(
+    "file_id", openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+    description="File ID, or comma-separated File IDs translated together in one batch"
+)
 
 
 def health_check(request):
@@ -77,10 +81,10 @@ class SubmitTranslationAPIView(APIView):
     permission_classes = [IsAuthenticated, TokenHasReadWriteScope, IsClientOrAdminOrSuperUser]
 
     @swagger_auto_schema(
-        operation_description="Submit a file for translation.",
+        operation_description="Submit one or more files for translation (several files form one batch run).",
         tags=["Translation"],
         manual_parameters=[
-            client_id_param, client_secret_param, file_id_param, from_language_param, to_language_param
+            client_id_param, client_secret_param, submit_file_id_param, from_language_param, to_language_param
         ],
     )
     def post(self, request):
@@ -98,13 +102,19 @@ class SubmitTranslationAPIView(APIView):
         if not user:
             return Response({"error": "Invalid client ID"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        # ✅ Get the file instance
-        file_instance = get_object_or_404(File, id=file_id)
+        # ✅ Get the file instances
+        file_ids = list(dict.fromkeys(i.strip() for i in file_id.split(",") if i.strip()))
+        try:
+            files = list(File.objects.filter(id__in=file_ids))
+        except (ValueError, TypeError):
+            return Response({"error": "Invalid file_id"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(files) != len(file_ids):
+            return Response({"error": "File not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        if file_instance.user != user:
+        if any(f.user != user for f in files):
             raise PermissionDenied("You are not authorized to translate this file.")
 
-        if not os.path.exists(file_instance.filepath):
+        if not all(os.path.exists(f.filepath) for f in files):
             return Response({"error": "File not found."}, status=status.HTTP_404_NOT_FOUND)
 
         # ✅ Validate source and target languages
@@ -114,6 +124,7 @@ class SubmitTranslationAPIView(APIView):
             return Response({"error": f"Invalid target language: {to_lang}"}, status=status.HTTP_400_BAD_REQUEST)
 
         # ✅ Create a new translation run
+        file_instance = files[0]
         translation_run = TranslationRun.objects.create(
             project_id=file_instance.project_id,
             service_id=file_instance.service_id,
@@ -123,14 +134,13 @@ class SubmitTranslationAPIView(APIView):
             client_name=user.username if user and user.username else user.email
         )
 
-        # ✅ Start translation asynchronously
-        # translate_document_task.delay(file_id, from_lang, to_lang)
-        # translate_document_task.delay(file_id, str(run.id), from_language, to_language)
-        translate_document_task.delay(file_id, str(translation_run.id), from_lang, to_lang)
+        # ✅ Submit the whole batch; polling and download happen in follow-up tasks
+        translate_batch_task.delay(str(translation_run.id), [f.id for f in files])
 
         response_data = {
             "translation_run_id": str(translation_run.id),
             "file_id": str(file_instance.id),
+            "file_ids": [str(f.id) for f in files],
             "status": "Processing"
         }
 
@@ -235,6 +245,11 @@ class TranslationRunSummaryView(APIView):
 
         run = get_object_or_404(TranslationRun, id=run_id)
         file_count = run.translation_files.count()
+        segments = run.translation_files.aggregate(
+            total=models.Sum("segments_total"),
+            from_memory=models.Sum("segments_from_memory"),
+            characters_sent=models.Sum("characters_sent"),
+        )
 
         return Response({
             "run_id": str(run.id),
@@ -243,7 +258,13 @@ class TranslationRunSummaryView(APIView):
             "status": run.status,
             "error_message": run.error_message,
             "created_at": run.created_at,
-            "files_translated": file_count
+            "files_translated": file_count,
+            "translation_memory": {
+                "segments": segments["total"] or 0,
+                "segments_from_memory": segments["from_memory"] or 0,
+                "hit_ratio": round((segments["from_memory"] or 0) / segments["total"], 4) if segments["total"] else 0.0,
+                "characters_sent": segments["characters_sent"] or 0,
+            },
         })
 
 
@@ -121,6 +121,15 @@ if [ "$SERVICE_NAME" = "celery" ]; then
     sleep 10
     echo "🚀 Starting Celery Worker..."
     exec celery -A aiDocuMines worker --loglevel=info --concurrency=4
+elif [ "$SERVICE_NAME" = "celery_anonymizer" ]; then
+    # Dedicated spaCy/Presidio worker: models load once in the parent and are
+    # shared copy-on-write by the prefork children (document_anonymizer/nlp_registry.py)
+    echo "🕒 Waiting 10s to ensure Django is ready..."
+    sleep 10
+    echo "🚀 Starting Anonymizer Worker (queue: ${ANONYMIZER_QUEUE:-anonymizer})..."
+    export ANONYMIZER_PRELOAD="${ANONYMIZER_PRELOAD:-en}"
+    exec celery -A aiDocuMines worker --loglevel=info -Q "${ANONYMIZER_QUEUE:-anonymizer}" \
+        --concurrency="${ANONYMIZER_CONCURRENCY:-2}" --hostname="anonymizer@%h"
 elif [ "$SERVICE_NAME" = "celery_beat" ]; then
     echo "🕒 Waiting 10s to ensure Celery Worker is ready..."
     sleep 10
@@ -16,7 +16,7 @@ def create_index():
 
 def index_file(file_instance):
     # Extract text from the file path and index with ownership metadata
-    content_text = extract_document_text(file_instance.filepath)
+    content_text = extract_document_text(file_instance.filepath, md5=file_instance.md5_hash)
     doc = FileIndex(
         meta={"id": str(file_instance.id)},
         id=str(file_instance.id),
@@ -62,7 +62,7 @@ def _tenant_q(user, accessible_ids=None):
     return Q("bool", should=shoulds, minimum_should_match=1)
 
 
-def basic_search(query, scope="both", user=None, accessible_ids=None):
+def basic_search(query, scope="both", user=None, accessible_ids=None, size=None, with_content=True):
     if not query:
         return []
 
@@ -82,10 +82,14 @@ def basic_search(query, scope="both", user=None, accessible_ids=None):
         s = s.query("multi_match", query=query, fields=["filename", "filepath", "content"])
 
     # Optional: avoid returning full content payloads
-    # s = s.source(excludes=["content"])
+    if not with_content:
+        s = s.source(excludes=["content"])
     # Optional: highlight snippets
     # s = s.highlight("content", fragment_size=160, number_of_fragments=1)
 
+    if size:
+        s = s[:size]
+
     return s.execute()
 
 
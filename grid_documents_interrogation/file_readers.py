@@ -1,25 +1,18 @@
 # file_readers.py
 
 import pandas as pd
-from docx import Document
 import fitz
-import os
 import shutil
 import subprocess
 import glob
 
 import pytesseract
 from PIL import Image
-import tempfile
 
-import hashlib
+import io
 
-
-
-# Top of file_readers.py
-OCR_CACHE_DIR = "media/ocr_cache"
-
-os.makedirs(OCR_CACHE_DIR, exist_ok=True)  # Make sure it exists
+from core.extraction import Extraction, extract, register_extractor
+from core.ocr_cache import cached_page_text
 
 
 # Allow large images (disable Pillow safety)
@@ -64,43 +57,33 @@ def read_excel_file(file_path):
 
 def read_docx_file(file_path):
     try:
-        doc = Document(file_path)
-        return "\n".join(para.text for para in doc.paragraphs)
+        return extract(file_path, "text").text
     except Exception as e:
         print(f"Error reading DOCX: {e}")
         return None
 
 
 
-def compute_ocr_cache_path(file_path):
-    """
-    Generate a unique OCR cache path using a hash of the absolute file path.
-    Ensures no mixing between clients or topics.
-    """
-    ocr_cache_dir = os.path.join(os.path.dirname(file_path), ".ocr_cache")
-    os.makedirs(ocr_cache_dir, exist_ok=True)
+# Page-level OCR options: part of the cache key (core.ocr_cache)
+PDF_OCR_OPTIONS = {"engine": "pytesseract", "dpi": 96, "max_side": 2000, "fmt": "txt"}
+IMAGE_OCR_OPTIONS = {"engine": "tesseract", "oem": 1, "psm": 3, "fmt": "txt"}
 
-    file_hash = hashlib.sha256(file_path.encode()).hexdigest()[:16]
-    filename = f"{file_hash}.ocr.txt"
-    return os.path.join(ocr_cache_dir, filename)
 
+def _ocr_page_image(png_bytes):
+    image = Image.open(io.BytesIO(png_bytes))
+    if image.size[0] > 2000 or image.size[1] > 2000:
+        print(f"[⚠️ Resizing large image {image.size}]")
+        image = image.resize((int(image.width / 2), int(image.height / 2)))
+    return pytesseract.image_to_string(image)
 
 
 def perform_ocr_on_pdf(file_path):
     """
-    OCR with caching: Avoid repeated OCR if .txt exists AND is non-empty.
+    Lightweight OCR of a scanned PDF, page by page. Each rendered page is
+    looked up in the shared page cache (core.ocr_cache) first, so pages
+    already recognised in any file – copies, re-uploads, shared exhibits –
+    are not OCR'd again.
     """
-    ocr_cache_path = file_path + ".ocr.txt"
-
-    if os.path.exists(ocr_cache_path):
-        with open(ocr_cache_path, "r", encoding="utf-8") as f:
-            cached_text = f.read().strip()
-            if cached_text:
-                print(f"[OCR] Using cached OCR from {ocr_cache_path}")
-                return cached_text
-            else:
-                print(f"[OCR] Cached OCR is empty, re-running OCR for {file_path}")
-
     print(f"[OCR] Starting lightweight OCR on {file_path}")
     try:
         doc = fitz.open(file_path)
@@ -109,33 +92,22 @@ def perform_ocr_on_pdf(file_path):
         for page_number in range(len(doc)):
             print(f"[OCR] Rendering page {page_number + 1}/{len(doc)}")
             try:
-                pix = doc.load_page(page_number).get_pixmap(dpi=96)
-                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as img_temp:
-                    pix.save(img_temp.name)
-                    image = Image.open(img_temp.name)
+                pix = doc.load_page(page_number).get_pixmap(dpi=PDF_OCR_OPTIONS["dpi"])
 
-                    # safety check
-                    if image.size[0] * image.size[1] > 178_956_970:
-                        print(f"[⚠️ Skipping page {page_number + 1}] Too large, possible decompression bomb")
-                        continue
-                    if image.size[0] > 2000 or image.size[1] > 2000:
-                        print(f"[⚠️ Resizing large image {image.size}]")
-                        image = image.resize((int(image.width / 2), int(image.height / 2)))
+                # safety check
+                if pix.width * pix.height > 178_956_970:
+                    print(f"[⚠️ Skipping page {page_number + 1}] Too large, possible decompression bomb")
+                    continue
 
-                    text = pytesseract.image_to_string(image)
-                    extracted_text.append(text)
-                    os.remove(img_temp.name)
+                png = pix.tobytes("png")
+                text = cached_page_text(png, PDF_OCR_OPTIONS, lambda: _ocr_page_image(png))
+                extracted_text.append(text)
             except Exception as page_err:
                 print(f"[⚠️ Skipping page {page_number + 1}] Reason: {page_err}")
                 continue
 
         full_text = "\n".join(extracted_text).strip()
         print(f"[OCR] OCR complete. Extracted {len(full_text)} characters.")
-
-        if full_text:
-            with open(ocr_cache_path, "w", encoding="utf-8") as f:
-                f.write(full_text)
-
         return full_text
 
     except Exception as e:
@@ -298,12 +270,21 @@ def perform_ocr_on_pdf(file_path):
 '''
 
 
+@register_extractor("grid:ocr")
+def _ocr_extraction(file_path):
+    text = perform_ocr_on_pdf(file_path)
+    if not text:
+        raise ValueError("OCR produced no text")   # don't cache failures
+    return Extraction(text=text)
+
+
 def read_pdf_file(file_path):
     """
     Returns text content of PDF file. Uses OCR for scanned PDFs.
+    Served from the shared extraction cache (core.extraction) by content md5.
     """
     try:
-        return perform_ocr_on_pdf(file_path)
+        return extract(file_path, "grid:ocr").text
     except Exception as e:
         print(f"[❌ PDF READ ERROR] {e}")
         return ""
@@ -343,23 +324,21 @@ def convert_dataframe_to_text(df):
 
 def read_image_file(file_path):
     try:
-        temp_txt_path = file_path + ".ocr.txt"
-
-        # Run OCR directly on the image (PNG, JPG, etc.)
-        subprocess.run([
-            'tesseract',
-            file_path,
-            temp_txt_path.replace(".txt", ""),  # Tesseract appends `.txt`
-            '--oem', '1',
-            '--psm', '3'
-        ], check=True)
-
-        with open(temp_txt_path, 'r') as f:
-            text = f.read()
-
-        os.remove(temp_txt_path)
-        return text
+        with open(file_path, "rb") as f:
+            image = f.read()
+        return cached_page_text(image, IMAGE_OCR_OPTIONS, lambda: _tesseract_image(file_path))
     except Exception as e:
         print(f"Error reading image OCR: {e}")
         return None
 
+
+def _tesseract_image(file_path):
+    # Run OCR directly on the image (PNG, JPG, etc.); text on stdout, no sidecar file
+    result = subprocess.run([
+        'tesseract',
+        file_path,
+        'stdout',
+        '--oem', str(IMAGE_OCR_OPTIONS["oem"]),
+        '--psm', str(IMAGE_OCR_OPTIONS["psm"])
+    ], check=True, capture_output=True)
+    return result.stdout.decode("utf-8")
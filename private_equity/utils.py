@@ -6,6 +6,7 @@ import logging
 from typing import Dict, List, Optional, Tuple
 from django.contrib.auth import get_user_model
 from core.models import File
+from core.extraction import extract
 from .models import DocumentClassification, RiskClause, DueDiligenceRun
 
 logger = logging.getLogger(__name__)
@@ -15,25 +16,11 @@ User = get_user_model()
 def extract_document_text(file_path: str) -> str:
     """
     Extract text content from various document formats.
-    This is a placeholder implementation - replace with actual text extraction logic.
+    Uses the shared extraction cache (core.extraction), so files already
+    extracted by another pipeline are not parsed again.
     """
     try:
-        # Placeholder text extraction
-        # In a real implementation, this would use libraries like:
-        # - PyPDF2 or pdfplumber for PDFs
-        # - python-docx for Word documents
-        # - openpyxl for Excel files
-        # - etc.
-        
-        if file_path.lower().endswith('.pdf'):
-            return "Sample PDF text content for due diligence analysis..."
-        elif file_path.lower().endswith(('.doc', '.docx')):
-            return "Sample Word document text content for contract analysis..."
-        elif file_path.lower().endswith(('.xls', '.xlsx')):
-            return "Sample Excel spreadsheet content for financial analysis..."
-        else:
-            return "Sample text content for document analysis..."
-            
+        return extract(file_path, "text").text
     except Exception as e:
         logger.error(f"Failed to extract text from {file_path}: {str(e)}")
         return ""